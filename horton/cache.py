@@ -30,7 +30,7 @@ import numpy as np, types
 from horton.log import log
 
 
-__all__ = ['JustOnceClass', 'just_once', 'Cache']
+__all__ = ['JustOnceClass', 'just_once', 'Cache', 'MMapCache']
 
 
 class JustOnceClass(object):
@@ -261,6 +261,10 @@ class Cache(object):
         if not cleared:
             del self._store[key]
 
+    def _from_alloc(self, alloc, tags):
+        '''Create a new item for the alloc and tags arguments of load'''
+        return CacheItem.from_alloc(alloc, tags)
+
     def load(self, *key, **kwargs):
         '''Get a value from the cache
 
@@ -314,7 +318,7 @@ class Cache(object):
             # alloc is given. hence two return values: value, new
             if item is None:
                 # allocate a new item and store it
-                item = CacheItem.from_alloc(alloc, tags)
+                item = self._from_alloc(alloc, tags)
                 self._store[key] = item
                 return item.value, True
             elif not item.valid:
@@ -325,7 +329,7 @@ class Cache(object):
                     item.check_tags(tags)
                 except TypeError:
                     # if reuse fails, reallocate
-                    item = CacheItem.from_alloc(alloc, tags)
+                    item = self._from_alloc(alloc, tags)
                     self._store[key] = item
                 return item.value, True
             else:
@@ -417,3 +421,43 @@ class Cache(object):
         for key, item in self._store.iteritems():
             if item.valid and (len(tags) == 0 or len(item.tags & tags) > 0):
                 yield key, item.value
+
+
+class MMapCache(Cache):
+    '''Cache that stores large arrays in memory-mapped scratch files
+
+       All arrays allocated with the ``alloc`` argument of the ``load`` method
+       that are large enough are stored in temporary files instead of memory.
+       The files are removed as soon as they are mapped, such that they
+       disappear automatically when the arrays are deallocated. The operating
+       system keeps the recently used parts of the arrays in memory.
+    '''
+    def __init__(self, dirname=None, minsize=2**17):
+        '''
+           **Optional arguments:**
+
+           dirname
+                The directory in which the scratch files are created. When not
+                given, the default directory of the tempfile module is used,
+                which can be controlled with the environment variable
+                ``TMPDIR``.
+
+           minsize
+                The minimum number of elements of an array that is stored in a
+                scratch file. Smaller arrays are kept in memory.
+        '''
+        Cache.__init__(self)
+        self._dirname = dirname
+        self._minsize = minsize
+
+    def _get_dirname(self):
+        return self._dirname
+
+    dirname = property(_get_dirname)
+
+    def _from_alloc(self, alloc, tags):
+        alloc = _normalize_alloc(alloc)
+        if all(isinstance(i, int) for i in alloc) and np.product(alloc) >= self._minsize:
+            from horton.matrix.mmap import create_mmap
+            return CacheItem(create_mmap(tuple(alloc), self._dirname), tags=tags)
+        return Cache._from_alloc(self, alloc, tags)
@@ -190,7 +190,8 @@ class Perturbation(object):
                 * maxiter: (int) maximum number of iterations (default 200)
                 * guess: (np.array) initial guess (default None)
                 * indextrans: (str) 4-index transformation. One of ``einsum``,
-                              ``tensordot`` (default ``tensordot``)
+                              ``tensordot``, ``blocked`` (default
+                              ``tensordot``)
 
            **Returns**
                 List of energy contributions (total energy, seniority-0,
@@ -85,7 +85,7 @@ class RAp1rog(Geminal):
            **Keywords:**
 
             :indextrans: 4-index Transformation (str). Choice between
-                         ``tensordot`` (default) and ``einsum``
+                         ``tensordot`` (default), ``einsum`` and ``blocked``
             :warning: Print warnings (boolean) (default False)
             :guess: initial guess (dictionary) containing:
 
@@ -251,7 +251,7 @@ class RAp1rog(Geminal):
            **Keywords:**
 
             :indextrans: 4-index Transformation (str). Choice between
-                         ``tensordot`` (default) and ``einsum``
+                         ``tensordot`` (default), ``einsum`` and ``blocked``
             :warning: print warnings (boolean) (default False)
             :guess: initial guess (dictionary) containing:
 
@@ -57,7 +57,8 @@ def setup_esp_cost_cube(horton.grid.cext.UniformGrid ugrid not None,
                         np.ndarray[double, ndim=2] A not None,
                         np.ndarray[double, ndim=1] B not None,
                         np.ndarray[double, ndim=0] C not None,
-                        double rcut, double alpha, double gcut):
+                        double rcut, double alpha, double gcut,
+                        long nthreads=1):
 
     is0d = (ugrid.pbc == [0, 0, 0]).all()
     is3d = (ugrid.pbc == [1, 1, 1]).all()
@@ -90,10 +91,12 @@ def setup_esp_cost_cube(horton.grid.cext.UniformGrid ugrid not None,
         assert gcut > 0
     else:
         raise NotImplementedError
+    assert nthreads > 0
 
     electrostatics.setup_esp_cost_cube(ugrid._this, &vref[0, 0, 0],
         &weights[0, 0, 0], &centers[0, 0], &A[0, 0],
-        &B[0], <double*>np.PyArray_DATA(C), ncenter, rcut, alpha, gcut)
+        &B[0], <double*>np.PyArray_DATA(C), ncenter, rcut, alpha, gcut,
+        nthreads)
 
 
 def compute_esp_grid_cube(horton.grid.cext.UniformGrid ugrid not None,
@@ -60,7 +60,7 @@ class ESPCost(object):
         grp['natom'] = self.natom
 
     @classmethod
-    def from_grid_data(cls, coordinates, ugrid, vref, weights, rcut=20.0, alpha=None, gcut=None):
+    def from_grid_data(cls, coordinates, ugrid, vref, weights, rcut=20.0, alpha=None, gcut=None, nthreads=1):
         if len(coordinates.shape) != 2 or coordinates.shape[1] != 3:
             raise TypeError('The argument coordinates must be an array with three columns.')
         natom = coordinates.shape[0]
@@ -74,13 +74,13 @@ class ESPCost(object):
                 A = np.zeros((natom+1, natom+1), float)
                 B = np.zeros(natom+1, float)
                 C = np.zeros((), float)
-                setup_esp_cost_cube(ugrid, vref, weights, coordinates, A, B, C, rcut, alpha, gcut)
+                setup_esp_cost_cube(ugrid, vref, weights, coordinates, A, B, C, rcut, alpha, gcut, nthreads)
                 return cls(A, B, C, natom)
             else:
                 A = np.zeros((natom, natom), float)
                 B = np.zeros(natom, float)
                 C = np.zeros((), float)
-                setup_esp_cost_cube(ugrid, vref, weights, coordinates, A, B, C, 0.0, 0.0, 0.0)
+                setup_esp_cost_cube(ugrid, vref, weights, coordinates, A, B, C, 0.0, 0.0, 0.0, nthreads)
                 return cls(A, B, C, natom)
         else:
             raise NotImplementedError
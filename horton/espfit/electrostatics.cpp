@@ -22,8 +22,15 @@
 #include <cstdio>
 #include <cmath>
 #include <cstddef>
+#include <vector>
 #include "horton/espfit/electrostatics.h"
 
+#ifdef _OPENMP
+#include <omp.h>
+#else
+inline int omp_get_thread_num() {return 0;}
+#endif
+
 
 double pair_electrostatics(double* delta, const Cell* cell, double rcut,
     double alpha, double gcut) {
@@ -44,8 +51,8 @@ double pair_electrostatics(double* delta, const Cell* cell, double rcut,
 }
 
 
-double pair_ewald3d(double* delta, const Cell* cell, double rcut, double alpha,
-    double gcut) {
+double pair_ewald3d_real(double* delta, const Cell* cell, double rcut,
+    double alpha) {
 
     double result = 0;
 
@@ -71,6 +78,14 @@ double pair_ewald3d(double* delta, const Cell* cell, double rcut, double alpha,
             }
         }
     }
+    return result;
+}
+
+
+double pair_ewald3d(double* delta, const Cell* cell, double rcut, double alpha,
+    double gcut) {
+
+    double result = pair_ewald3d_real(delta, cell, rcut, alpha);
 
     // Precomput some factors
     double fac1 = 4.0*M_PI/cell->get_volume();
@@ -83,6 +98,7 @@ double pair_ewald3d(double* delta, const Cell* cell, double rcut, double alpha,
     kmax[2] = ceil(gcut/cell->get_gspacing(2));
 
     // add the reciprocal-space terms
+    double j[3];
     for (int j0=-kmax[0]; j0 <= kmax[0]; j0++) {
         j[0] = 2*M_PI*j0;
         for (int j1=-kmax[1]; j1 <= kmax[1]; j1++) {
@@ -107,60 +123,273 @@ double pair_ewald3d(double* delta, const Cell* cell, double rcut, double alpha,
 }
 
 
+EwaldGridTables::EwaldGridTables(UniformGrid* ugrid, double alpha, double gcut) {
+    Cell* cell = ugrid->get_cell();
+    if (cell->get_nvec() != 3) {
+        delete cell;
+        throw std::domain_error("Ewald tables require a grid with 3D periodic boundary conditions.");
+    }
+
+    // The same reciprocal vectors as in pair_ewald3d.
+    for (int m=0; m<3; m++) {
+        kmax[m] = ceil(gcut/cell->get_gspacing(m));
+        shape[m] = ugrid->shape[m];
+        origin[m] = ugrid->origin[m];
+    }
+    nk[0] = 2*kmax[0] + 1;
+    nk[1] = 2*kmax[1] + 1;
+    nk[2] = kmax[2] + 1;
+    ncoeff = nk[0]*nk[1]*nk[2];
+
+    // Precompute the wavevectors and the weights of all terms.
+    double fac1 = 4.0*M_PI/cell->get_volume();
+    double fac2 = 0.25/alpha/alpha;
+    kvecs.resize(3*ncoeff);
+    kweights.resize(ncoeff);
+    long icoeff = 0;
+    for (long j0=-kmax[0]; j0 <= kmax[0]; j0++) {
+        for (long j1=-kmax[1]; j1 <= kmax[1]; j1++) {
+            for (long j2=0; j2 <= kmax[2]; j2++) {
+                double j[3] = {2*M_PI*j0, 2*M_PI*j1, 2*M_PI*j2};
+                double* k = &kvecs[3*icoeff];
+                cell->g_lincomb(j, k);
+                double ksq = k[0]*k[0] + k[1]*k[1] + k[2]*k[2];
+                if ((j0==0) && (j1==0) && (j2==0)) {
+                    kweights[icoeff] = 0.0;
+                } else {
+                    kweights[icoeff] = (1+(j2>0))*fac1*exp(-ksq*fac2)/ksq;
+                }
+                icoeff++;
+            }
+        }
+    }
+
+    /*
+       The cell of the grid consists of the grid vectors multiplied by the
+       shape. Hence, the phase of a wavevector, relative to the origin, at grid
+       point (i0, i1, i2) is 2*pi*(j0*i0/shape0 + j1*i1/shape1 + j2*i2/shape2).
+       It factorizes into one table of phase factors per axis.
+    */
+    for (int m=0; m<3; m++) {
+        long jbegin = (m == 2) ? 0 : -kmax[m];
+        phase_cos[m].resize(nk[m]*shape[m]);
+        phase_sin[m].resize(nk[m]*shape[m]);
+        for (long ij=0; ij<nk[m]; ij++) {
+            long j = jbegin + ij;
+            for (long i=0; i<shape[m]; i++) {
+                // Integer arithmetic keeps the phases accurate for large grids.
+                long jimod = ((j*i) % shape[m] + shape[m]) % shape[m];
+                double phase = 2*M_PI*jimod/shape[m];
+                phase_cos[m][ij*shape[m] + i] = cos(phase);
+                phase_sin[m][ij*shape[m] + i] = sin(phase);
+            }
+        }
+    }
+
+    background = -M_PI/cell->get_volume()/alpha/alpha;
+    delete cell;
+}
+
+
+void EwaldGridTables::add_coeffs(double* center, double charge,
+    double* coeffs_real, double* coeffs_imag) const {
+    double delta[3];
+    delta[0] = center[0] - origin[0];
+    delta[1] = center[1] - origin[1];
+    delta[2] = center[2] - origin[2];
+    for (long icoeff=0; icoeff<ncoeff; icoeff++) {
+        if (kweights[icoeff] == 0.0) continue;
+        const double* k = &kvecs[3*icoeff];
+        double phase = k[0]*delta[0] + k[1]*delta[1] + k[2]*delta[2];
+        coeffs_real[icoeff] += charge*kweights[icoeff]*cos(phase);
+        coeffs_imag[icoeff] += charge*kweights[icoeff]*sin(phase);
+    }
+}
+
+
+void EwaldGridTables::compute_slab(const double* coeffs_real,
+    const double* coeffs_imag, long i0, double* output, long stride) const {
+    /*
+       The reciprocal sum at grid point (i0, i1, i2) is
+         Re sum_j C[j0,j1,j2] exp(-i*phase0[j0,i0] - i*phase1[j1,i1] - i*phase2[j2,i2])
+       It is evaluated as three partial sums, one axis at a time, such that
+       the cost per grid point is proportional to nk[1] instead of the total
+       number of wavevectors.
+    */
+    const long n1 = shape[1];
+    const long n2 = shape[2];
+    const long nk12 = nk[1]*nk[2];
+
+    // Sum over j0 for the given i0: P[j1,j2]
+    std::vector<double> p_real(nk12, 0.0), p_imag(nk12, 0.0);
+    for (long ij0=0; ij0<nk[0]; ij0++) {
+        double c = phase_cos[0][ij0*shape[0] + i0];
+        double s = phase_sin[0][ij0*shape[0] + i0];
+        const double* cr = coeffs_real + ij0*nk12;
+        const double* ci = coeffs_imag + ij0*nk12;
+        for (long ij12=0; ij12<nk12; ij12++) {
+            p_real[ij12] += cr[ij12]*c + ci[ij12]*s;
+            p_imag[ij12] += ci[ij12]*c - cr[ij12]*s;
+        }
+    }
+
+    // Sum over j2: Q[j1,i2]
+    std::vector<double> q_real(nk[1]*n2, 0.0), q_imag(nk[1]*n2, 0.0);
+    for (long ij1=0; ij1<nk[1]; ij1++) {
+        for (long ij2=0; ij2<nk[2]; ij2++) {
+            double pr = p_real[ij1*nk[2] + ij2];
+            double pi = p_imag[ij1*nk[2] + ij2];
+            const double* c = &phase_cos[2][ij2*n2];
+            const double* s = &phase_sin[2][ij2*n2];
+            double* qr = &q_real[ij1*n2];
+            double* qi = &q_imag[ij1*n2];
+            for (long i2=0; i2<n2; i2++) {
+                qr[i2] += pr*c[i2] + pi*s[i2];
+                qi[i2] += pi*c[i2] - pr*s[i2];
+            }
+        }
+    }
+
+    // Sum over j1, real part only: F[i1,i2]
+    for (long i1=0; i1<n1; i1++) {
+        double* out = output + i1*n2*stride;
+        for (long i2=0; i2<n2; i2++) {
+            out[i2*stride] = 0.0;
+        }
+        for (long ij1=0; ij1<nk[1]; ij1++) {
+            double c = phase_cos[1][ij1*n1 + i1];
+            double s = phase_sin[1][ij1*n1 + i1];
+            const double* qr = &q_real[ij1*n2];
+            const double* qi = &q_imag[ij1*n2];
+            for (long i2=0; i2<n2; i2++) {
+                out[i2*stride] += qr[i2]*c + qi[i2]*s;
+            }
+        }
+    }
+}
+
+
 void setup_esp_cost_cube(UniformGrid* ugrid, double* vref,
     double* weights, double* centers, double* A, double* B, double* C,
-    long ncenter, double rcut, double alpha, double gcut) {
+    long ncenter, double rcut, double alpha, double gcut, long nthreads) {
 
+    if (nthreads < 1) {
+        throw std::domain_error("The number of threads must be strictly positive.");
+    }
     Cell* cell = ugrid->get_cell();
     Cell* grid_cell = ugrid->get_grid_cell();
     double gvol = grid_cell->get_volume();
     bool is3d = (cell->get_nvec() == 3);
     long neq = ncenter + is3d;
-    double* work = new double[neq];
-    double grid_cart[3];
-
-    Cube3Iterator c3i = Cube3Iterator(NULL, ugrid->shape);
-    long i[3];
-    long npoint = c3i.get_npoint();
-
-    for (long ipoint=0; ipoint<npoint; ipoint++) {
-        c3i.set_point(ipoint, i);
-        grid_cart[0] = 0;
-        grid_cart[1] = 0;
-        grid_cart[2] = 0;
-        ugrid->delta_grid_point(grid_cart, i);
-
-        if (*weights > 0) {
-            double sqrtw = sqrt((*weights)*gvol);
+    const long nslab = ugrid->shape[1]*ugrid->shape[2];
+
+    // Reciprocal-space coefficients of every center, shared by all grid points.
+    EwaldGridTables* tables = NULL;
+    long ncoeff = 0;
+    std::vector<double> coeffs_real, coeffs_imag;
+    if (is3d) {
+        tables = new EwaldGridTables(ugrid, alpha, gcut);
+        ncoeff = tables->get_ncoeff();
+        coeffs_real.resize(ncenter*ncoeff, 0.0);
+        coeffs_imag.resize(ncenter*ncoeff, 0.0);
+        for (long icenter=0; icenter<ncenter; icenter++) {
+            tables->add_coeffs(centers + 3*icenter, 1.0,
+                &coeffs_real[icenter*ncoeff], &coeffs_imag[icenter*ncoeff]);
+        }
+    }
 
-            // Do some electrostatics
-            for (long icenter=0; icenter<ncenter; icenter++) {
-                double delta[3];
-                delta[0] = centers[3*icenter]   - grid_cart[0];
-                delta[1] = centers[3*icenter+1] - grid_cart[1];
-                delta[2] = centers[3*icenter+2] - grid_cart[2];
+    // Partial sums of every thread. Only the upper triangle of A is computed.
+    std::vector<double> partial_A(nthreads*neq*neq, 0.0);
+    std::vector<double> partial_B(nthreads*neq, 0.0);
+    std::vector<double> partial_C(nthreads, 0.0);
+
+    /*
+       The grid is processed in slabs of points with a fixed i0. Every thread
+       fills the design matrix of a slab, one row per grid point with a
+       non-zero weight, and adds its contribution to the cost function with a
+       rank-k update. The static schedule assigns the same slabs to each
+       thread in every run, such that the result is reproducible.
+    */
+#pragma omp parallel num_threads(nthreads)
+    {
+        const int ithread = omp_get_thread_num();
+        std::vector<double> work(nslab*neq);
+        std::vector<double> vrefw(nslab);
+        double grid_cart[3];
+        long i[3];
+
+#pragma omp for schedule(static)
+        for (long i0=0; i0<ugrid->shape[0]; i0++) {
+            // The reciprocal-space terms are first computed for all points
+            // of the slab, directly in the rows of the design matrix.
+            if (is3d) {
+                for (long icenter=0; icenter<ncenter; icenter++) {
+                    tables->compute_slab(&coeffs_real[icenter*ncoeff],
+                        &coeffs_imag[icenter*ncoeff], i0, &work[icenter], neq);
+                }
+            }
 
-                work[icenter] = sqrtw*pair_electrostatics(delta, cell, rcut, alpha, gcut);
+            long nrow = 0;
+            for (long islab=0; islab<nslab; islab++) {
+                const double weight = weights[i0*nslab + islab];
+                if (weight <= 0) continue;
+                i[0] = i0;
+                i[1] = islab/ugrid->shape[2];
+                i[2] = islab%ugrid->shape[2];
+                grid_cart[0] = 0;
+                grid_cart[1] = 0;
+                grid_cart[2] = 0;
+                ugrid->delta_grid_point(grid_cart, i);
+                double sqrtw = sqrt(weight*gvol);
+
+                // Do some electrostatics. Rows are moved up to skip points
+                // with a zero weight. (nrow <= islab)
+                double* row = &work[nrow*neq];
+                for (long icenter=0; icenter<ncenter; icenter++) {
+                    double delta[3];
+                    delta[0] = centers[3*icenter]   - grid_cart[0];
+                    delta[1] = centers[3*icenter+1] - grid_cart[1];
+                    delta[2] = centers[3*icenter+2] - grid_cart[2];
+                    double pot;
+                    if (is3d) {
+                        pot = pair_ewald3d_real(delta, cell, rcut, alpha) +
+                              work[islab*neq + icenter] +
+                              tables->get_background();
+                    } else {
+                        pot = pair_electrostatics(delta, cell, rcut, alpha, gcut);
+                    }
+                    row[icenter] = sqrtw*pot;
+                }
+                if (is3d) row[ncenter] = sqrtw;
+                vrefw[nrow] = vref[i0*nslab + islab]*sqrtw;
+                nrow++;
             }
-            if (is3d) work[ncenter] = sqrtw;
 
             // Add to the quadratic cost function
-            double vrefw = (*vref)*sqrtw;
-            for (long ic0=0; ic0<neq; ic0++) {
-                for (long ic1=0; ic1<neq; ic1++) {
-                    A[ic0+neq*ic1] += work[ic0]*work[ic1];
-                }
-                B[ic0] += vrefw*work[ic0];
+            if (nrow > 0) {
+                cblas_dsyrk(CblasRowMajor, CblasUpper, CblasTrans, neq, nrow,
+                    1.0, &work[0], neq, 1.0, &partial_A[ithread*neq*neq], neq);
+                cblas_dgemv(CblasRowMajor, CblasTrans, nrow, neq, 1.0, &work[0],
+                    neq, &vrefw[0], 1, 1.0, &partial_B[ithread*neq], 1);
+                partial_C[ithread] += cblas_ddot(nrow, &vrefw[0], 1, &vrefw[0], 1);
             }
-            *C += vrefw*vrefw;
         }
+    }
 
-        // move on
-        vref++;
-        weights++;
+    // Reduce the partial sums in a fixed order.
+    for (long ithread=0; ithread<nthreads; ithread++) {
+        const double* pA = &partial_A[ithread*neq*neq];
+        for (long ic0=0; ic0<neq; ic0++) {
+            for (long ic1=ic0; ic1<neq; ic1++) {
+                A[ic0*neq + ic1] += pA[ic0*neq + ic1];
+                if (ic1 != ic0) A[ic1*neq + ic0] += pA[ic0*neq + ic1];
+            }
+            B[ic0] += partial_B[ithread*neq + ic0];
+        }
+        *C += partial_C[ithread];
     }
 
-    delete[] work;
+    delete tables;
     delete cell;
     delete grid_cell;
 }
@@ -175,6 +404,30 @@ void compute_esp_cube(UniformGrid* ugrid, double* esp,
     long i[3];
     long npoint = c3i.get_npoint();
     Cell* cell = ugrid->get_cell();
+    bool is3d = (cell->get_nvec() == 3);
+
+    // In the 3D case, the reciprocal-space part is computed for all grid points
+    // at once with the structure factors of all centers.
+    EwaldGridTables* tables = NULL;
+    double background = 0.0;
+    if (is3d) {
+        tables = new EwaldGridTables(ugrid, alpha, gcut);
+        long ncoeff = tables->get_ncoeff();
+        std::vector<double> coeffs_real(ncoeff, 0.0), coeffs_imag(ncoeff, 0.0);
+        double total_charge = 0.0;
+        for (long icenter=0; icenter<ncenter; icenter++) {
+            tables->add_coeffs(centers + 3*icenter, charges[icenter],
+                &coeffs_real[0], &coeffs_imag[0]);
+            total_charge += charges[icenter];
+        }
+        const long nslab = ugrid->shape[1]*ugrid->shape[2];
+        for (long i0=0; i0<ugrid->shape[0]; i0++) {
+            tables->compute_slab(&coeffs_real[0], &coeffs_imag[0], i0,
+                esp + i0*nslab, 1);
+        }
+        background = total_charge*tables->get_background();
+        delete tables;
+    }
 
     for (long ipoint=0; ipoint<npoint; ipoint++) {
         // Compute the position of the grid point
@@ -191,10 +444,18 @@ void compute_esp_cube(UniformGrid* ugrid, double* esp,
             delta[0] = centers[3*icenter]   - grid_cart[0];
             delta[1] = centers[3*icenter+1] - grid_cart[1];
             delta[2] = centers[3*icenter+2] - grid_cart[2];
-            tmp += charges[icenter]*pair_electrostatics(delta, cell, rcut,
-                                                        alpha, gcut);
+            if (is3d) {
+                tmp += charges[icenter]*pair_ewald3d_real(delta, cell, rcut, alpha);
+            } else {
+                tmp += charges[icenter]*pair_electrostatics(delta, cell, rcut,
+                                                            alpha, gcut);
+            }
+        }
+        if (is3d) {
+            (*esp) += tmp + background;
+        } else {
+            (*esp) = tmp;
         }
-        (*esp) = tmp;
 
         // move on
         esp++;
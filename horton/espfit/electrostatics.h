@@ -23,18 +23,89 @@
 #ifndef HORTON_ESPFIT_ELECTROSTATICS_H
 #define HORTON_ESPFIT_ELECTROSTATICS_H
 
+#include <stdexcept>
+#include <vector>
 #include "horton/cell.h"
 #include "horton/grid/uniform.h"
 
+// Include the CBLAS headers
+#ifdef BLAS_MKL
+#include <mkl.h>
+#else
+extern "C"
+{
+#include <cblas.h>
+}
+#endif
+
 double pair_electrostatics(double* delta, const Cell* cell, double rcut, double alpha,
     double gcut);
 
 double pair_ewald3d(double* delta, const Cell* cell, double rcut, double alpha,
     double gcut);
 
+/** The real-space part of pair_ewald3d. */
+double pair_ewald3d_real(double* delta, const Cell* cell, double rcut,
+    double alpha);
+
+/**
+    @brief
+        The reciprocal-space part of the Ewald sum on a periodic uniform grid.
+
+    The wavevectors are the same as in pair_ewald3d. Their weights and phase
+    factors at the grid points are computed once and shared by all grid
+    points and centers. The contribution of a set of centers is represented by
+    complex coefficients (structure factors) for all wavevectors.
+*/
+class EwaldGridTables {
+    private:
+        long kmax[3], nk[3], shape[3];
+        long ncoeff;
+        double origin[3];
+        double background;
+        std::vector<double> kvecs;
+        std::vector<double> kweights;
+        std::vector<double> phase_cos[3];
+        std::vector<double> phase_sin[3];
+    public:
+        /**
+            @param ugrid
+                A uniform grid with 3D periodic boundary conditions.
+
+            @param alpha, gcut
+                The Ewald parameters, as in pair_ewald3d.
+        */
+        EwaldGridTables(UniformGrid* ugrid, double alpha, double gcut);
+
+        /** The number of coefficients (real and imaginary). */
+        long get_ncoeff() const {return ncoeff;};
+
+        /** The background correction for a unit charge. */
+        double get_background() const {return background;};
+
+        /**
+            @brief
+                Add the structure factor of a point charge to the coefficients.
+        */
+        void add_coeffs(double* center, double charge, double* coeffs_real,
+            double* coeffs_imag) const;
+
+        /**
+            @brief
+                Compute the reciprocal-space potential due to the coefficients
+                at all grid points (i0, i1, i2) with a given i0.
+
+            @param output
+                The result for (i1, i2) is written to
+                output[(i1*shape[2] + i2)*stride].
+        */
+        void compute_slab(const double* coeffs_real, const double* coeffs_imag,
+            long i0, double* output, long stride) const;
+};
+
 void setup_esp_cost_cube(UniformGrid* ugrid, double* vref,
     double* weights, double* centers, double* A, double* B, double* C,
-    long ncenter, double rcut, double alpha, double gcut);
+    long ncenter, double rcut, double alpha, double gcut, long nthreads);
 
 void compute_esp_cube(UniformGrid* ugrid, double* esp,
     double* centers, double* charges, long ncenter, double rcut, double alpha,
@@ -31,8 +31,9 @@ cdef extern from "horton/espfit/electrostatics.h":
 
     void setup_esp_cost_cube(horton.grid.uniform.UniformGrid* ugrid,
         double* vref, double* weights, double* centers, double* A, double* B,
-        double* C, long ncenter, double rcut, double alpha, double gcut) except +
+        double* C, long ncenter, double rcut, double alpha, double gcut,
+        long nthreads) except +
 
     void compute_esp_cube(horton.grid.uniform.UniformGrid* ugrid, double* esp,
         double* centers, double* charges, long ncenter, double rcut,
-        double alpha, double gcut)
+        double alpha, double gcut) except +
@@ -40,3 +40,65 @@ def test_pair_ewald3d_invariance_rcut():
         results.append(pair_ewald(delta, cell, rcut, alpha, gcut))
     results = np.array(results)
     assert abs(results - results.mean()).max() < 1e-7
+
+
+def get_random_ewald_grid():
+    origin = np.random.uniform(-3, 3, 3)
+    grid_rvecs = np.diag(np.random.uniform(1.5, 2.0, 3))
+    grid_rvecs += np.random.uniform(-0.1, 0.1, (3, 3))
+    shape = np.array([4, 5, 6])
+    pbc = np.array([1, 1, 1])
+    return UniformGrid(origin, grid_rvecs, shape, pbc)
+
+
+def get_ewald_direct(ugrid, coordinates, rcut, alpha, gcut):
+    '''Compute the Ewald sum for every grid point and center with pair_ewald'''
+    cell = ugrid.get_cell()
+    result = np.zeros(tuple(ugrid.shape) + (len(coordinates),))
+    for i0 in xrange(ugrid.shape[0]):
+        for i1 in xrange(ugrid.shape[1]):
+            for i2 in xrange(ugrid.shape[2]):
+                point = ugrid.origin + np.dot([i0, i1, i2], ugrid.grid_rvecs)
+                for icenter in xrange(len(coordinates)):
+                    delta = coordinates[icenter] - point
+                    result[i0, i1, i2, icenter] = pair_ewald(delta, cell, rcut, alpha, gcut)
+    return result
+
+
+def test_compute_esp_grid_cube_direct():
+    np.random.seed(1)
+    ugrid = get_random_ewald_grid()
+    coordinates = np.random.uniform(0, 8, (4, 3))
+    charges = np.random.normal(0, 1, 4)
+    rcut = 10.0
+    alpha = 3.0/rcut
+    gcut = 1.1*alpha
+    esp = np.zeros(ugrid.shape)
+    compute_esp_grid_cube(ugrid, esp, coordinates, charges, rcut, alpha, gcut)
+    direct = get_ewald_direct(ugrid, coordinates, rcut, alpha, gcut)
+    assert abs(esp - np.dot(direct, charges)).max() < 1e-10
+
+
+def test_setup_esp_cost_cube_direct():
+    np.random.seed(2)
+    ugrid = get_random_ewald_grid()
+    coordinates = np.random.uniform(0, 8, (4, 3))
+    vref = np.random.normal(0, 1, ugrid.shape)
+    weights = np.random.uniform(0, 1, ugrid.shape)
+    weights[weights < 0.3] = 0.0
+    rcut = 10.0
+    alpha = 3.0/rcut
+    gcut = 1.1*alpha
+    A = np.zeros((5, 5))
+    B = np.zeros(5)
+    C = np.zeros(())
+    setup_esp_cost_cube(ugrid, vref, weights, coordinates, A, B, C, rcut, alpha, gcut)
+    # Reference with a design matrix based on the direct sum
+    direct = get_ewald_direct(ugrid, coordinates, rcut, alpha, gcut)
+    design = np.concatenate([direct, np.ones(tuple(ugrid.shape) + (1,))], axis=3).reshape(-1, 5)
+    sqrtw = np.sqrt(weights.ravel()*ugrid.get_grid_cell().volume)
+    design *= sqrtw.reshape(-1, 1)
+    vrefw = vref.ravel()*sqrtw
+    assert abs(A - np.dot(design.T, design)).max() < 1e-10
+    assert abs(B - np.dot(design.T, vrefw)).max() < 1e-10
+    assert abs(C - np.dot(vrefw, vrefw)) < 1e-10
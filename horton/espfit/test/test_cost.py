@@ -201,6 +201,19 @@ def test_esp_cost_cube3d_gradient():
     check_delta(cost.value, cost.gradient, x0, dxs)
 
 
+def test_esp_cost_cube_nthreads():
+    for get_args in get_random_esp_cost_cube3d_args, get_random_esp_cost_cube0d_args:
+        coordinates, numbers, origin, grid_rvecs, shape, pbc, vref, weights = get_args()
+        weights[weights < 0.2] = 0.0
+        grid = UniformGrid(origin, grid_rvecs, shape, pbc)
+        cost1 = ESPCost.from_grid_data(coordinates, grid, vref, weights)
+        cost3 = ESPCost.from_grid_data(coordinates, grid, vref, weights, nthreads=3)
+        assert abs(cost1._A - cost1._A.T).max() < 1e-10
+        assert abs(cost1._A - cost3._A).max() < 1e-10
+        assert abs(cost1._B - cost3._B).max() < 1e-10
+        assert abs(cost1._C - cost3._C) < 1e-10
+
+
 def test_esp_cost_solve():
     A = np.random.uniform(-1, 1, (11, 11))
     A = np.dot(A, A.T)
@@ -24,6 +24,7 @@
 #ifdef DEBUG
 #include <cstdio>
 #endif
+#include <cmath>
 #include <cstring>
 #include <stdexcept>
 #include "horton/gbasis/common.h"
@@ -414,3 +415,28 @@ void cart_to_pure_low(double *work_cart, double* work_pure, long shell_type,
         }
     }
 }
+
+
+/*
+    The largest sum of the absolute values of the coefficients in the linear
+    combinations of Cartesian functions that make up the Pure functions. This
+    is an upper bound for the ratio of the largest Pure and Cartesian function
+    values.
+*/
+
+double cart_to_pure_norm(long shell_type) {
+    if ((shell_type>MAX_SHELL_TYPE) || (shell_type<0)) {
+        throw std::domain_error("The shell type must be in the interval [0,9].");
+    }
+    const long npure = 2*shell_type+1;
+    const type_sparse_tf* tf = &cptf[shell_type];
+    double result = 0.0;
+    for (long ipure=0; ipure<npure; ipure++) {
+        double norm = 0.0;
+        for (long i=0; i<tf->size; i++) {
+            if (tf->elements[i].ipure == ipure) norm += fabs(tf->elements[i].x);
+        }
+        if (norm > result) result = norm;
+    }
+    return result;
+}
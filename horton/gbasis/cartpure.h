@@ -26,6 +26,7 @@
 
 void cart_to_pure_low(double *work_cart, double* work_pure, long shell_type,
     long nant, long npost);
+double cart_to_pure_norm(long shell_type);
 
 
 #endif
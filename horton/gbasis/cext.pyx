@@ -43,6 +43,7 @@ import atexit
 
 from horton.log import log
 from horton.matrix import LinalgFactory, CholeskyLinalgFactory
+from horton.matrix.mmap import create_mmap
 from horton.cext import compute_grid_nucpot
 from horton.utils import typecheck_geo
 
@@ -67,7 +68,7 @@ __all__ = [
     'GB2NuclearAttractionIntegral',
     'GB4ElectronRepulsionIntegralLibInt',
     # fns
-    'GB1DMGridDensityFn', 'GB1DMGridGradientFn',
+    'GB1DMGridDensityFn', 'GB1DMGridGradientFn', 'GB1DMGridGGAFn',
     # iter_gb
     'IterGB1', 'IterGB2', 'IterGB4',
     # iter_pow
@@ -103,28 +104,75 @@ def cart_to_pure_low(np.ndarray[double] work_cart not None,
 # cholesky wrappers
 #
 
-def compute_cholesky(GOBasis gobasis, double threshold=1e-8, lf = None):
+def compute_cholesky(GOBasis gobasis, double threshold=1e-8, lf=None,
+                     double schwarz_threshold=0.0, dirname=None,
+                     long max_memory=0):
+    '''Compute the Cholesky vectors of the electron repulsion integrals
+
+       **Arguments:**
+
+       gobasis
+            The Gaussian basis set.
+
+       **Optional arguments:**
+
+       threshold
+            The decomposition stops when the error on the diagonal of the
+            integrals falls below this threshold.
+
+       lf
+            When a ``CholeskyLinalgFactory`` is given, it is used to construct
+            the four-index object with the Cholesky vectors. Otherwise, the
+            array with the vectors is returned.
+
+       schwarz_threshold
+            When strictly positive, integrals in the slices of the four-index
+            object whose Cauchy-Schwarz upper bound falls below this threshold
+            are not computed. This threshold should not exceed ``threshold``.
+
+       dirname
+            When given, the vectors that do not fit in ``max_memory`` bytes are
+            stored in temporary files in this directory during the
+            decomposition, and the returned array is memory-mapped to a
+            temporary file in this directory.
+
+       max_memory
+            The number of bytes of vectors kept in memory during the
+            decomposition when ``dirname`` is given.
+
+       The slices of the four-index object are computed with ``gobasis.nthreads``
+       threads.
+    '''
     cdef ints.GB4ElectronRepulsionIntegralLibInt* gb4int = NULL
     cdef gbw.GB4IntegralWrapper* gb4w = NULL
-    cdef double* data = NULL
-    cdef np.npy_intp dims[3]
-    cdef np.ndarray result
+    cdef cholesky.CholeskyVectors* vectors = NULL
+    cdef char* c_dirname = NULL
+    cdef np.ndarray[double, ndim=3] result
 
+    if dirname is not None:
+        c_dirname = dirname
     try:
         gb4int = new ints.GB4ElectronRepulsionIntegralLibInt(
                             gobasis.max_shell_type)
         gb4w = new gbw.GB4IntegralWrapper((<gbasis.GOBasis* > gobasis._this),
                             <ints.GB4Integral*> gb4int)
-        nvec = cholesky.cholesky(gb4w, &data, threshold)
-        dims[0] = <np.npy_intp> nvec
-        dims[1] = <np.npy_intp> gobasis.nbasis
-        dims[2] = <np.npy_intp> gobasis.nbasis
-        result = np.PyArray_SimpleNewFromData(3, dims, np.NPY_DOUBLE, data)
+        vectors = new cholesky.CholeskyVectors(gobasis.nbasis*gobasis.nbasis,
+                            c_dirname, max_memory)
+        nvec = cholesky.cholesky(gb4w, vectors, threshold, schwarz_threshold)
+        shape = (nvec, gobasis.nbasis, gobasis.nbasis)
+        if dirname is None:
+            result = np.empty(shape)
+        else:
+            result = create_mmap(shape, dirname)
+        if nvec > 0:
+            vectors.copy_to(&result[0, 0, 0])
     finally:
-        if gb4int is not NULL:
-            del gb4int
+        if vectors is not NULL:
+            del vectors
         if gb4w is not NULL:
             del gb4w
+        if gb4int is not NULL:
+            del gb4int
 
     if lf is not None and isinstance(lf, CholeskyLinalgFactory):
         result_py = lf.create_four_index(gobasis.nbasis, array=result)
@@ -464,6 +512,18 @@ cdef class GBasis:
         def __get__(self):
             return self._this.get_max_shell_type()
 
+    property nthreads:
+        '''The number of threads used to compute integrals and grid functions
+
+           The results do not depend on the number of threads, except for
+           rounding errors in operators computed from grid data.
+        '''
+        def __get__(self):
+            return self._this.get_nthreads()
+
+        def __set__(self, long nthreads):
+            self._this.set_nthreads(nthreads)
+
     def _log_init(self):
         '''Write a summary of the basis to the screen logger'''
         if log.do_medium:
@@ -725,7 +785,21 @@ cdef class GOBasis(GBasis):
         # done
         return output
 
-    def compute_electron_repulsion(self, output):
+    def compute_schwarz_bounds(self):
+        '''Compute the Cauchy-Schwarz bounds for all pairs of shells
+
+           **Returns:** a symmetric array with shape (nshell, nshell). Element
+           (a, b) contains the square root of the largest diagonal integral
+           (ij|ij), with i in shell a and j in shell b. The magnitude of any
+           electron repulsion integral (ij|kl) with i, j, k and l in the shells
+           a, b, c and d, respectively, does not exceed the product of elements
+           (a, b) and (c, d).
+        '''
+        cdef np.ndarray[double, ndim=2] output = np.zeros((self.nshell, self.nshell), float)
+        (<gbasis.GOBasis*>self._this).compute_electron_repulsion_schwarz(&output[0, 0])
+        return output
+
+    def compute_electron_repulsion(self, output, double schwarz_threshold=0.0):
         '''Compute electron-electron repulsion integrals
 
            **Argument:**
@@ -737,6 +811,15 @@ cdef class GOBasis(GBasis):
                 is used to construct the four-index object in which the
                 integrals are stored.
 
+           **Optional arguments:**
+
+           schwarz_threshold
+                When strictly positive, shell quartets whose Cauchy-Schwarz
+                upper bound falls below this threshold are not computed. The
+                corresponding integrals are set to zero. When the integrals
+                are Cholesky decomposed, this threshold is used to screen the
+                integrals in the slices of the four-index object.
+
            **Returns:** The four-index object with the electron repulsion
            integrals.
 
@@ -746,19 +829,116 @@ cdef class GOBasis(GBasis):
         # prepare the output array
         if isinstance(output, CholeskyLinalgFactory):
             lf = output
-            output = compute_cholesky(self, lf=lf)
+            output = compute_cholesky(self, lf=lf, schwarz_threshold=schwarz_threshold)
             return output
         cdef np.ndarray[double, ndim=4] output_array
+        cdef np.ndarray[double, ndim=2] schwarz
+        cdef np.ndarray[long, ndim=1] nquartet
         if isinstance(output, LinalgFactory):
             lf = output
             output = lf.create_four_index(self.nbasis)
         output_array = output._array
         self.check_matrix_four_index(output_array)
         # call the low-level routine
-        (<gbasis.GOBasis*>self._this).compute_electron_repulsion(&output_array[0, 0, 0, 0])
+        if schwarz_threshold > 0:
+            schwarz = self.compute_schwarz_bounds()
+            nquartet = np.zeros(2, int)
+            (<gbasis.GOBasis*>self._this).compute_electron_repulsion(
+                &output_array[0, 0, 0, 0], &schwarz[0, 0], schwarz_threshold,
+                &nquartet[0])
+            self._log_schwarz(schwarz_threshold, nquartet)
+        else:
+            (<gbasis.GOBasis*>self._this).compute_electron_repulsion(
+                &output_array[0, 0, 0, 0], NULL, 0.0, NULL)
         # done
         return output
 
+    def _log_schwarz(self, schwarz_threshold, nquartet):
+        '''Write the statistics of the Schwarz screening to the screen logger'''
+        if log.do_medium:
+            ncomputed, nskipped = nquartet
+            ntotal = ncomputed + nskipped
+            log('Schwarz screening of electron repulsion integrals')
+            log.deflist([
+                ('Threshold', '%.1e' % schwarz_threshold),
+                ('Unique shell quartets', ntotal),
+                ('Computed shell quartets', ncomputed),
+                ('Skipped shell quartets', '%i (%.1f%%)' % (nskipped, 100.0*nskipped/max(ntotal, 1))),
+            ])
+            log.blank()
+
+    def compute_electron_repulsion_dm(self, dm, coulomb=None, exchange=None,
+                                      np.ndarray[double, ndim=2] schwarz=None,
+                                      double schwarz_threshold=0.0):
+        '''Compute Coulomb and exchange matrices without storing the integrals
+
+           **Arguments:**
+
+           dm
+                A density matrix. For now, this must be a DenseTwoIndex object.
+
+           **Optional arguments:**
+
+           coulomb
+                A DenseTwoIndex object for the Coulomb matrix,
+                ``sum_bd <ab|cd> dm_bd``. Its contents are overwritten.
+
+           exchange
+                A DenseTwoIndex object for the exchange matrix,
+                ``sum_bc <ab|cd> dm_cb``. Its contents are overwritten.
+
+           schwarz
+                Cauchy-Schwarz bounds as returned by
+                ``compute_schwarz_bounds``. They are computed when not given
+                and needed.
+
+           schwarz_threshold
+                When strictly positive, shell quartets are skipped when the
+                product of their Cauchy-Schwarz bound and the largest
+                corresponding density matrix element is below this threshold.
+
+           The electron repulsion integrals are recomputed on the fly and are
+           directly contracted with the density matrix, such that the memory
+           usage only scales quadratically with the size of the basis.
+           Both matrices are constructed in a single pass over the integrals
+           when both are requested.
+
+           **Returns:** an array with the number of computed and skipped
+           unique shell quartets.
+        '''
+        log.cite('valeev2014', 'the efficient implementation of four-center electron repulsion integrals')
+        cdef np.ndarray[double, ndim=2] dm_array = dm._array
+        self.check_matrix_two_index(dm_array)
+        cdef np.ndarray[double, ndim=2] coulomb_array
+        cdef np.ndarray[double, ndim=2] exchange_array
+        cdef double* coulomb_ptr = NULL
+        cdef double* exchange_ptr = NULL
+        if coulomb is not None:
+            coulomb.clear()
+            coulomb_array = coulomb._array
+            self.check_matrix_two_index(coulomb_array)
+            coulomb_ptr = &coulomb_array[0, 0]
+        if exchange is not None:
+            exchange.clear()
+            exchange_array = exchange._array
+            self.check_matrix_two_index(exchange_array)
+            exchange_ptr = &exchange_array[0, 0]
+        cdef np.ndarray[long, ndim=1] nquartet = np.zeros(2, int)
+        if schwarz_threshold > 0:
+            if schwarz is None:
+                schwarz = self.compute_schwarz_bounds()
+            assert schwarz.flags['C_CONTIGUOUS']
+            assert schwarz.shape[0] == self.nshell
+            assert schwarz.shape[1] == self.nshell
+            (<gbasis.GOBasis*>self._this).compute_electron_repulsion_dm(
+                &dm_array[0, 0], coulomb_ptr, exchange_ptr, &schwarz[0, 0],
+                schwarz_threshold, &nquartet[0])
+        else:
+            (<gbasis.GOBasis*>self._this).compute_electron_repulsion_dm(
+                &dm_array[0, 0], coulomb_ptr, exchange_ptr, NULL, 0.0,
+                &nquartet[0])
+        return nquartet
+
     def compute_grid_orbitals_exp(self, exp,
                                   np.ndarray[double, ndim=2] points not None,
                                   np.ndarray[long, ndim=1] iorbs not None,
@@ -930,6 +1110,65 @@ cdef class GOBasis(GBasis):
         self._compute_grid1_dm(dm, points, GB1DMGridGradientFn(self.max_shell_type), output, epsilon)
         return output
 
+    def compute_grid_gga_dms(self, dms,
+                             np.ndarray[double, ndim=2] points not None,
+                             np.ndarray[double, ndim=3] output=None,
+                             double epsilon=0):
+        '''Compute densities and their gradients on a grid for several density matrices.
+
+           The basis functions and their derivatives are evaluated only once
+           in each grid point, which is more efficient than separate calls to
+           ``compute_grid_density_dm`` and ``compute_grid_gradient_dm`` for
+           each density matrix, e.g. for the alpha and beta density matrix.
+
+           **Arguments:**
+
+           dms
+                A list of density matrices. For now, these must be
+                DenseTwoIndex objects.
+
+           points
+                A Numpy array with grid points, shape (npoint,3).
+
+           **Optional arguments:**
+
+           output
+                A Numpy array for the output, shape (len(dms), npoint, 4). The
+                last index runs over the density and the three components of
+                its gradient. When not given, it will be allocated.
+
+           epsilon
+                Allow errors on the density of this magnitude for the sake of
+                efficiency.
+
+           **Warning:** the results are added to the output array!
+
+           **Returns:** the output array. (It is allocated when not given.)
+        '''
+        ndm = len(dms)
+        cdef np.ndarray[double, ndim=3] dmsar = np.array([dm._array for dm in dms])
+        self.check_matrix_two_index(dmsar[0])
+        cdef np.ndarray[double, ndim=2] dmmaxrows = np.abs(dmsar).max(axis=1)
+
+        # Check the points and output arrays
+        assert points.flags['C_CONTIGUOUS']
+        npoint = points.shape[0]
+        assert points.shape[1] == 3
+        if output is None:
+            output = np.zeros((ndm, npoint, 4), float)
+        else:
+            assert output.flags['C_CONTIGUOUS']
+            assert output.shape[0] == ndm
+            assert output.shape[1] == npoint
+            assert output.shape[2] == 4
+
+        # Go!
+        cdef GB1DMGridFn grid_fn = GB1DMGridGGAFn(self.max_shell_type)
+        (<gbasis.GOBasis*>self._this).compute_grid1_dms(
+            ndm, &dmsar[0, 0, 0], npoint, &points[0, 0], grid_fn._this,
+            &output[0, 0, 0], epsilon, &dmmaxrows[0, 0])
+        return output
+
     def compute_grid_kinetic_dm(self, dm,
                                 np.ndarray[double, ndim=2] points not None,
                                 np.ndarray[double, ndim=1] output=None):
@@ -1139,6 +1378,35 @@ cdef class GOBasis(GBasis):
         '''
         self._compute_grid1_fock(points, weights, pots, GB1DMGridGradientFn(self.max_shell_type), fock)
 
+    def compute_grid_gga_fock(self, np.ndarray[double, ndim=2] points not None,
+                              np.ndarray[double, ndim=1] weights not None,
+                              np.ndarray[double, ndim=2] pots not None, fock):
+        '''Compute a two-index operator based on density and gradient potentials on a grid in real-space
+
+           This is equivalent to ``compute_grid_density_fock`` and
+           ``compute_grid_gradient_fock`` together, but the basis functions
+           are evaluated only once in each grid point.
+
+           **Arguments:**
+
+           points
+                A Numpy array with grid points, shape (npoint,3).
+
+           weights
+                A Numpy array with integration weights, shape (npoint,).
+
+           pots
+                A Numpy array with the density potential and the gradient
+                potential data, shape (npoint, 4).
+
+           fock
+                A two-index operator. For now, this must be a DenseTwoIndex
+                object.
+
+           **Warning:** the results are added to the fock operator!
+        '''
+        self._compute_grid1_fock(points, weights, pots, GB1DMGridGGAFn(self.max_shell_type), fock)
+
     def compute_grid_kinetic_fock(self, np.ndarray[double, ndim=2] points not None,
                                   np.ndarray[double, ndim=1] weights not None,
                                   np.ndarray[double, ndim=1] pots not None, fock):
@@ -1216,9 +1484,18 @@ def compute_diagonal(GOBasis gobasis, np.ndarray[double, ndim=2] diagonal not
             del gb4w
 
 def get_2index_slice(GOBasis gobasis, long index0, long index2,
-                        np.ndarray[double, ndim=2] slice not None):
+                        np.ndarray[double, ndim=2] slice not None,
+                        double schwarz_threshold=0.0):
+    '''Compute a slice of the electron repulsion integrals
+
+       When ``schwarz_threshold`` is strictly positive, the integrals with a
+       Cauchy-Schwarz upper bound below this threshold are set to zero. The
+       number of pairs of shells that were skipped is returned.
+    '''
     cdef ints.GB4ElectronRepulsionIntegralLibInt* gb4int = NULL
     cdef gbw.GB4IntegralWrapper* gb4w = NULL
+    cdef np.ndarray[double, ndim=2] diagonal
+    cdef long nskip
     assert slice.flags['C_CONTIGUOUS']
     assert slice.shape[0] == gobasis.nbasis
     assert slice.shape[1] == gobasis.nbasis
@@ -1233,8 +1510,12 @@ def get_2index_slice(GOBasis gobasis, long index0, long index2,
                             gobasis.max_shell_type)
         gb4w = new gbw.GB4IntegralWrapper((<gbasis.GOBasis* > gobasis._this),
                             <ints.GB4Integral*> gb4int)
+        if schwarz_threshold > 0:
+            # The Schwarz bounds are computed along with the diagonal.
+            diagonal = np.zeros((gobasis.nbasis, gobasis.nbasis))
+            gb4w.compute_diagonal(&diagonal[0, 0])
         gb4w.select_2index(index0, index2, &pbegin0, &pend0, &pbegin2, &pend2)
-        gb4w.compute()
+        nskip = gb4w.compute(schwarz_threshold)
         output = gb4w.get_2index_slice(index0, index2)
         print output[0]
         print sizeof(double)*gobasis.nbasis*gobasis.nbasis
@@ -1247,6 +1528,7 @@ def get_2index_slice(GOBasis gobasis, long index0, long index2,
             del gb4int
         if gb4w is not NULL:
             del gb4w
+    return nskip
 
 
 #
@@ -1519,6 +1801,11 @@ cdef class GB1DMGridGradientFn(GB1DMGridFn):
         self._this = <fns.GB1DMGridFn*>(new fns.GB1DMGridGradientFn(max_nbasis))
 
 
+cdef class GB1DMGridGGAFn(GB1DMGridFn):
+    def __cinit__(self, long max_nbasis):
+        self._this = <fns.GB1DMGridFn*>(new fns.GB1DMGridGGAFn(max_nbasis))
+
+
 cdef class GB1DMGridKineticFn(GB1DMGridFn):
     def __cinit__(self, long max_nbasis):
         self._this = <fns.GB1DMGridFn*>(new fns.GB1DMGridKineticFn(max_nbasis))
@@ -19,11 +19,145 @@
 //--
 
 #include <cstddef>
+#include <cstdlib>
 #include <cstring>
 #include <cmath>
+#include <new>
 #include <stdexcept>
+#include <sys/mman.h>
+#include <unistd.h>
 #include "horton/gbasis/cholesky.h"
 
+// The maximum size of a chunk of vectors in bytes.
+const long max_chunk_memory = 1 << 27;
+// The number of vectors in the first chunk.
+const long initial_chunk_nvec = 16;
+
+
+CholeskyVectors::CholeskyVectors(long size, const char* dirname, long max_memory) :
+    size(size), nvec(0), max_memory(max_memory), memory(0)
+{
+  if (size <= 0) {
+    throw std::domain_error("The size of a Cholesky vector must be strictly positive.");
+  }
+  if (dirname != NULL) {
+    this->dirname = dirname;
+  }
+  max_chunk_nvec = max_chunk_memory/(size*sizeof(double));
+  if (max_chunk_nvec < 1) max_chunk_nvec = 1;
+}
+
+CholeskyVectors::~CholeskyVectors() {
+  for (size_t ichunk = 0; ichunk < chunks.size(); ichunk++) {
+    release_chunk(ichunk);
+  }
+}
+
+void CholeskyVectors::add_chunk() {
+  // The capacity grows geometrically, until the maximum chunk size is reached.
+  long chunk_nvec = (nvec < initial_chunk_nvec) ? initial_chunk_nvec : nvec;
+  if (chunk_nvec > max_chunk_nvec) chunk_nvec = max_chunk_nvec;
+  const size_t nbyte = chunk_nvec*size*sizeof(double);
+  double* chunk = NULL;
+  bool mapped = false;
+  if (dirname.empty() || (memory + (long)nbyte <= max_memory)) {
+    chunk = reinterpret_cast<double*>(malloc(nbyte));
+    if (chunk == NULL) {
+      throw std::bad_alloc();
+    }
+    memory += nbyte;
+  } else {
+    std::string filename = dirname + "/cholesky-XXXXXX";
+    std::vector<char> buffer(filename.begin(), filename.end());
+    buffer.push_back('\0');
+    int fd = mkstemp(&buffer[0]);
+    if (fd == -1) {
+      throw std::runtime_error("Could not create a file for Cholesky vectors in " + dirname);
+    }
+    // The mapping remains valid after the file is removed.
+    unlink(&buffer[0]);
+    void* address = MAP_FAILED;
+    if (ftruncate(fd, nbyte) == 0) {
+      address = mmap(NULL, nbyte, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    }
+    close(fd);
+    if (address == MAP_FAILED) {
+      throw std::runtime_error("Could not map a file for Cholesky vectors in " + dirname);
+    }
+    chunk = reinterpret_cast<double*>(address);
+    mapped = true;
+  }
+  chunks.push_back(chunk);
+  chunk_nvecs.push_back(chunk_nvec);
+  chunk_mapped.push_back(mapped);
+}
+
+void CholeskyVectors::release_chunk(long ichunk) {
+  if (chunks[ichunk] == NULL) return;
+  const size_t nbyte = chunk_nvecs[ichunk]*size*sizeof(double);
+  if (chunk_mapped[ichunk]) {
+    munmap(chunks[ichunk], nbyte);
+  } else {
+    free(chunks[ichunk]);
+    memory -= nbyte;
+  }
+  chunks[ichunk] = NULL;
+}
+
+double* CholeskyVectors::add() {
+  // Find the chunk and the position of the new vector in that chunk.
+  long ivec = nvec;
+  for (size_t ichunk = 0; ichunk < chunks.size(); ichunk++) {
+    if (ivec < chunk_nvecs[ichunk]) {
+      nvec++;
+      return chunks[ichunk] + ivec*size;
+    }
+    ivec -= chunk_nvecs[ichunk];
+  }
+  add_chunk();
+  nvec++;
+  return chunks.back();
+}
+
+void CholeskyVectors::project_out(long ncand, const long* indexes, double* residuals) {
+  std::vector<double> coeffs;
+  long nleft = nvec;
+  for (size_t ichunk = 0; (ichunk < chunks.size()) && (nleft > 0); ichunk++) {
+    const long nblock = (nleft < chunk_nvecs[ichunk]) ? nleft : chunk_nvecs[ichunk];
+    const double* block = chunks[ichunk];
+    // Gather the coefficients of the projections.
+    coeffs.resize(ncand*nblock);
+    for (long icand = 0; icand < ncand; icand++) {
+      for (long l = 0; l < nblock; l++) {
+        coeffs[icand*nblock + l] = block[l*size + indexes[icand]];
+      }
+    }
+    // residuals -= coeffs . block
+    cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans, ncand, size, nblock,
+                -1.0, &coeffs[0], nblock, block, size, 1.0, residuals, size);
+    nleft -= nblock;
+  }
+}
+
+void CholeskyVectors::copy_to(double* output) {
+  long nleft = nvec;
+  for (size_t ichunk = 0; ichunk < chunks.size(); ichunk++) {
+    const long nblock = (nleft < chunk_nvecs[ichunk]) ? nleft : chunk_nvecs[ichunk];
+    if (nblock > 0) {
+      memcpy(output, chunks[ichunk], nblock*size*sizeof(double));
+      output += nblock*size;
+      nleft -= nblock;
+    }
+    // Release every chunk as soon as possible, to limit the peak memory usage.
+    release_chunk(ichunk);
+  }
+  chunks.clear();
+  chunk_nvecs.clear();
+  chunk_mapped.clear();
+  nvec = 0;
+}
+
+
 /**
     Find the maximum diagonal error, used several times in the cholesky routine.
 */
@@ -46,58 +180,38 @@ double find_maxdiag(double* diagerr, long nbasis, long begin1, long end1,
 }
 
 
-long cholesky(GB4IntegralWrapper* gbw4, double** uninit_result,
-    double threshold)
+long cholesky(GB4IntegralWrapper* gbw4, CholeskyVectors* vectors,
+    double threshold, double schwarz_threshold)
 {
   if (threshold <= 0) {
     // The algorithm below may go crazy with a non-positive threshold.
     throw std::domain_error("Cholesky threshold must be strictly positive.");
   }
 
-  long nbasis = gbw4->get_nbasis();
-  double* diagonal = new double[nbasis*nbasis];  // allocate 2 index object
-  double* diagerr = new double[nbasis*nbasis];   //  "
-  double* slice = NULL;                          //  "
-  // storage for 2-index cholesky vectors, start with allocation of 15% of the
-  // full 4-center matrix
-  std::vector<double>* vectors = new std::vector<double>;
-  vectors->reserve(nbasis*nbasis*nbasis*nbasis*0.15);
-
-  /*
-    In some future version, we'll introduce a mask to only compute integrals
-    that will be relevant after some pre-screening test. These will be flagged
-    with a mask array.
-  */
-  //bool* mask = NULL;        // 2-index object
+  const long nbasis = gbw4->get_nbasis();
+  const long size = nbasis*nbasis;
+  if (vectors->get_size() != size) {
+    throw std::domain_error("The size of the Cholesky vectors does not match the basis.");
+  }
+  std::vector<double> diagerr(size);     // 2 index object
+  std::vector<long> candidates;          // pivot candidates in the selected shells
+  std::vector<double> residuals;         // their slices minus projections
 
   /*
     Initialize the diagonal and set the diagerr equal to the diagonal (because
-    we start with zero Cholesky vectors).
-  */
-  gbw4->compute_diagonal(diagonal);
-  memcpy(diagerr, diagonal, sizeof(double)*nbasis*nbasis);
-
-  /*
-    This is extra stuff in the wrapper we'll need in future:
-    gb4w->compute_centers(centers);
-        centers of products 3 two 2-index objects
-        (one for x, one for y and one for z)
-    gb4w->compute_extents(extents);
-        2-index object (should be 2-index for shells)
-    gb4w->compute_qs(qs);
-        2-index object (should be 2-index for shells) ?????
+    we start with zero Cholesky vectors). This also computes the Schwarz bounds
+    of the pairs of shells, used to screen the integrals in the slices.
   */
+  gbw4->compute_diagonal(&diagerr[0]);
 
   // Locate the maximum of diagerr -> 2 indexes. This determines the first
   // Cholesky vector that will be computed.
   long index1;
   long index2;
-  double maxdiag = find_maxdiag(diagerr, nbasis, 0, nbasis, 0, nbasis,
+  double maxdiag = find_maxdiag(&diagerr[0], nbasis, 0, nbasis, 0, nbasis,
                                 index1, index2);
 
-  // std::cout << "initial maxdiag " << maxdiag << " " << index1 << " " << index2 << std::endl;
-  unsigned long nvec=0;
-  do {
+  while (maxdiag > threshold) {
     // call wrapper to let it select a pair of shells for the given variables
     // index1 and index2.
     long begin1;
@@ -106,73 +220,75 @@ long cholesky(GB4IntegralWrapper* gbw4, double** uninit_result,
     long end2;
     // index 2 is least significant
     gbw4->select_2index(index1, index2, &begin1, &end1, &begin2, &end2);
-    // All integrals are computed for the selected pair of shells.
-    // gbw4->compute(mask);
-    gbw4->compute();
+    // All integrals are computed for the selected pair of shells, except for
+    // those that are negligible according to the Schwarz screening.
+    gbw4->compute(schwarz_threshold);
 
-    do {
-      // Get the the slice of computed four-center integrals that correspond
-      // to the pair index1,index2.
-      slice = gbw4->get_2index_slice(index1, index2);
-
-      // construct new cholesky vector
-      double* pastvector_sum = new double[nbasis*nbasis];
-      memset(pastvector_sum, 0, sizeof(double)*nbasis*nbasis);
-      maxdiag = 1.0 / sqrt(maxdiag);
-
-      //compute sum of past Ls
-      for (unsigned long l=0; l<nvec; l++){
-        /*
-        for (long i=0; i<nbasis; i++){
-          for (long j=0; j<nbasis; j++){
-            pastvector_sum[i*nbasis + j] +=
-                (*vectors)[(l*nbasis*nbasis) + index1*nbasis + index2]
-                *(*vectors)[(l*nbasis*nbasis) + i*nbasis + j];
-          }
+    // Only the current pivot and the elements whose error exceeds the
+    // threshold of the loop below can become pivots within these shells. (The
+    // errors on the diagonal can only decrease.) Their residual slices, i.e.
+    // the computed slices minus the projections on all previous vectors, are
+    // computed with one matrix-matrix product per chunk of vectors.
+    candidates.clear();
+    for (long i1=begin1; i1<end1; i1++){
+      for (long i2=begin2; i2<end2; i2++){
+        if (((i1 == index1) && (i2 == index2)) ||
+            (diagerr[i1*nbasis + i2] > threshold*1000)) {
+          candidates.push_back(i1*nbasis + i2);
         }
-        */
-        cblas_daxpy(nbasis*nbasis,
-                    (*vectors)[(l*nbasis*nbasis) + index1*nbasis + index2],
-                    &(*vectors)[l*nbasis*nbasis], 1, pastvector_sum, 1);
       }
+    }
+    const long ncand = candidates.size();
+    residuals.resize(ncand*size);
+    for (long icand=0; icand<ncand; icand++){
+      memcpy(&residuals[icand*size],
+             gbw4->get_2index_slice(candidates[icand]/nbasis, candidates[icand]%nbasis),
+             sizeof(double)*size);
+    }
+    vectors->project_out(ncand, &candidates[0], &residuals[0]);
 
-      //compute current L
-      for (long i=0; i<nbasis; i++){
-        for (long j=0; j<nbasis; j++){
-          vectors->push_back(maxdiag * (slice[i*nbasis + j] -
-                             pastvector_sum[i*nbasis + j]));
+    do {
+      if (vectors->get_nvec() >= size) {
+        throw std::runtime_error("The Cholesky decomposition did not converge. Is the four-index object positive definite?");
+      }
+      // Locate the residual slice of the pivot.
+      long icand = 0;
+      while (candidates[icand] != index1*nbasis + index2) {
+        icand++;
+        if (icand == ncand) {
+          throw std::logic_error("The Cholesky pivot is not a candidate.");
         }
       }
 
-      // update diagerr
-      for (long i=0; i<nbasis; i++){
-        for (long j=0; j<nbasis; j++){
-          diagerr[i*nbasis + j] -=
-              (*vectors)[(nvec*nbasis*nbasis) + i*nbasis + j] *
-              (*vectors)[(nvec*nbasis*nbasis) + i*nbasis + j];
-        }
+      // construct new cholesky vector and update diagerr
+      double* vector = vectors->add();
+      const double factor = 1.0 / sqrt(maxdiag);
+      const double* residual = &residuals[icand*size];
+      for (long i=0; i<size; i++){
+        vector[i] = factor*residual[i];
+        diagerr[i] -= vector[i]*vector[i];
       }
 
-      // We've just added one vector.
-      nvec++;
+      // Also subtract the projection on the new vector from the other residual
+      // slices.
+      for (long jcand=0; jcand<ncand; jcand++){
+        if (jcand != icand) {
+          cblas_daxpy(size, -vector[candidates[jcand]], vector, 1,
+                      &residuals[jcand*size], 1);
+        }
+      }
 
       // Decide which 2-index within the shell, i.e. largest error.
       // Here, begin1, end1, begin2 and end2 are used to limit the search for
       // the maximum to the selected shells.
-      maxdiag = find_maxdiag(diagerr, nbasis, begin1, end1, begin2, end2,
+      maxdiag = find_maxdiag(&diagerr[0], nbasis, begin1, end1, begin2, end2,
                              index1, index2);
-      // std::cout << "current maxdiag " << maxdiag << " " << index1 << " " << index2 << std::endl;
     } while (maxdiag > threshold*1000);
 
     // Look for the new maximum error on the diagonal
-    maxdiag = find_maxdiag(diagerr, nbasis, 0, nbasis, 0, nbasis,
+    maxdiag = find_maxdiag(&diagerr[0], nbasis, 0, nbasis, 0, nbasis,
                            index1, index2);
+  }
 
-    // std::cout << "shell maxdiag " << maxdiag << " " << index1 << " " << index2 << std::endl;
-  } while (maxdiag > threshold);
-
-  // Concatenate results array. Not efficient! Who cares?
-  *uninit_result = &((*vectors)[0]);
-
-  return nvec;
+  return vectors->get_nvec();
 }
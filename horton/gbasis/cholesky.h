@@ -23,6 +23,7 @@
 #ifndef CHOLESKY_H
 #define CHOLESKY_H
 
+#include <string>
 #include <vector>
 #include "horton/gbasis/gbw.h"
 
@@ -36,6 +37,92 @@ extern "C"
 }
 #endif
 
+/**
+    @brief
+        A growable store of Cholesky vectors
+
+    The vectors are stored in chunks of consecutive vectors, such that the
+    store can grow without copying the vectors computed so far. The capacity
+    of a new chunk is comparable to the number of vectors already stored,
+    with an upper limit on the size of a chunk. When a directory is given,
+    chunks that no longer fit in the memory limit are stored in (unlinked)
+    memory-mapped files in that directory.
+*/
+class CholeskyVectors {
+    private:
+        long size;            // number of elements in one vector
+        long nvec;            // number of vectors stored
+        long max_chunk_nvec;  // maximum number of vectors in one chunk
+        long max_memory;      // maximum number of bytes of chunks in memory
+        long memory;          // number of bytes of chunks in memory
+        std::string dirname;  // directory for chunks on disk, empty if none
+        std::vector<double*> chunks;
+        std::vector<long> chunk_nvecs; // capacity of every chunk
+        std::vector<bool> chunk_mapped; // whether a chunk is a mapped file
+
+        /**
+            @brief
+                Allocate a new chunk that can hold at least one vector.
+        */
+        void add_chunk();
+
+        /**
+            @brief
+                Release the storage of a chunk.
+        */
+        void release_chunk(long ichunk);
+    public:
+        /**
+            @param size
+                The number of elements in one vector.
+
+            @param dirname
+                A directory for chunks that do not fit in memory. When NULL,
+                all chunks are kept in memory.
+
+            @param max_memory
+                The maximum number of bytes of chunks kept in memory when a
+                directory is given.
+        */
+        CholeskyVectors(long size, const char* dirname, long max_memory);
+        ~CholeskyVectors();
+
+        long get_size() const {return size;};
+        long get_nvec() const {return nvec;};
+
+        /**
+            @brief
+                Return a pointer to the storage of a new (uninitialized) vector.
+        */
+        double* add();
+
+        /**
+            @brief
+                Subtract the projections on all stored vectors from a set of
+                residual vectors, with one matrix-matrix product per chunk:
+                residuals[c] -= sum_l vectors[l][indexes[c]] vectors[l]
+
+            @param ncand
+                The number of residual vectors.
+
+            @param indexes
+                For every residual vector, the element of the stored vectors
+                that is used as the coefficient of the projection.
+
+            @param residuals
+                The residual vectors (size=ncand*size), modified in place.
+        */
+        void project_out(long ncand, const long* indexes, double* residuals);
+
+        /**
+            @brief
+                Copy all vectors to one contiguous output array (size=nvec*size)
+                and release the storage of the chunks. The store is empty
+                afterwards.
+        */
+        void copy_to(double* output);
+};
+
 /**
     @brief
         Computes Cholesky vectors for a four-index object
@@ -43,23 +130,31 @@ extern "C"
     Only the 4-center integrals relevant for the decomposition are actually
     computed. This implementation computes slices of the four-index object for
     a pair of shells at a time. (This is because most implementations of a
-    four-center work like that.)
+    four-center work like that.) The projections of the slices of one pair of
+    shells on all previous vectors are subtracted with one matrix-matrix
+    product per chunk of vectors.
 
     @param gbw4
         A wrapper around a definition of the 4-center integral. See gbw.h
 
-    @param uninit_result
-        An output pointer. The Cholesky vectors will be allocated as part of
-        this routine and the pointer to the Cholesky vectors is assigned to this
-        output argument.
+    @param vectors
+        The (empty) store to which the Cholesky vectors are added.
 
     @param threshold
         A threshold for the error on the (double) diagonal of the four-center
         object. The Cholesky decomposition stops when sufficient vectors are
         generated such that the error on the diagonal falls below this
         threshold.
+
+    @param schwarz_threshold
+        When strictly positive, the integrals in a slice whose Schwarz bound
+        falls below this threshold are not computed. See
+        GB4IntegralWrapper::compute.
+
+    @return
+        The number of Cholesky vectors.
 */
-long cholesky(GB4IntegralWrapper* gbw4, double** uninit_result,
-    double threshold);
+long cholesky(GB4IntegralWrapper* gbw4, CholeskyVectors* vectors,
+    double threshold, double schwarz_threshold);
 
 #endif
@@ -21,4 +21,11 @@
 cimport gbw
 
 cdef extern from "horton/gbasis/cholesky.h":
-    long cholesky(gbw.GB4IntegralWrapper* gbw4, double** uninit_result, double threshold)
+    cdef cppclass CholeskyVectors:
+        CholeskyVectors(long size, char* dirname, long max_memory) except +
+        long get_size()
+        long get_nvec()
+        void copy_to(double* output)
+
+    long cholesky(gbw.GB4IntegralWrapper* gbw4, CholeskyVectors* vectors,
+                  double threshold, double schwarz_threshold) except +
@@ -27,6 +27,17 @@
 #include <cstdlib>
 #include <cstring>
 #include <stdexcept>
+
+// Include the CBLAS headers
+#ifdef BLAS_MKL
+#include <mkl.h>
+#else
+extern "C"
+{
+#include <cblas.h>
+}
+#endif
+
 #include "horton/moments.h"
 #include "horton/gbasis/boys.h"
 #include "horton/gbasis/cartpure.h"
@@ -106,16 +117,6 @@ void GB1ExpGridOrbitalFn::add(double coeff, double alpha0, const double* scales0
 #endif
 }
 
-void GB1ExpGridOrbitalFn::compute_point_from_exp(double* work_basis, double* coeffs, long nbasis, double* output) {
-    for (long i=0; i < norb; i++) {
-        long iorb = iorbs[i];
-        for (long ibasis=0; ibasis < nbasis; ibasis++) {
-            output[i] += coeffs[ibasis*nfn + iorb]*work_basis[ibasis];
-        }
-    }
-}
-
-
 /*
     GB1DMGridDensityFn
 */
@@ -142,58 +143,44 @@ void GB1DMGridDensityFn::add(double coeff, double alpha0, const double* scales0)
     }
 }
 
-void GB1DMGridDensityFn::compute_point_from_dm(double* work_basis, double* dm, long nbasis, double* output, double epsilon, double* dmmaxrow) {
-    double absmax_basis = 0.0;
-    if (epsilon > 0) {
-        // compute the maximum basis function
-        for (long ibasis=0; ibasis<nbasis; ibasis++) {
-            double tmp = fabs(work_basis[ibasis]);
-            if (tmp > absmax_basis) absmax_basis = tmp;
-        }
-        // upper estimate of the density
-        double rho_upper = 0.0;
-        for (long ibasis=0; ibasis<nbasis; ibasis++) {
-            rho_upper += fabs(work_basis[ibasis])*dmmaxrow[ibasis];
-        }
-        rho_upper *= nbasis*absmax_basis;
-
-        // if the upper bound is too low, do not compute density.
-        if (rho_upper < epsilon) return;
-
-        // modify epsilon to avoid recomputation
-        epsilon /= absmax_basis*nbasis*nbasis;
-    }
-
-    // Loop over all basis functions and add significant contributions
-    double rho = 0.0;
-    for (long ibasis0=0; ibasis0<nbasis; ibasis0++) {
-        // if the contribution of this loop is smaller than epsilon/nbasis, skipt it.
-        if (epsilon>0) {
-            if (fabs(work_basis[ibasis0])*dmmaxrow[ibasis0] < epsilon)
-                continue;
+void GB1DMGridDensityFn::compute_block_from_dm(const double* phi, long npoint, long nphi, const double* dm, double* work, double* output, double epsilon, const double* dmmaxrow) {
+    // work = phi dm
+    cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans, npoint, nphi, nphi,
+                1.0, phi, nphi, dm, nphi, 0.0, work, nphi);
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        const double* phi_row = phi + ipoint*nphi;
+        if (epsilon > 0) {
+            // Skip points where an upper estimate of the density is too low.
+            double absmax_basis = 0.0;
+            double rho_upper = 0.0;
+            for (long iphi=0; iphi<nphi; iphi++) {
+                double tmp = fabs(phi_row[iphi]);
+                if (tmp > absmax_basis) absmax_basis = tmp;
+                rho_upper += tmp*dmmaxrow[iphi];
+            }
+            rho_upper *= nphi*absmax_basis;
+            if (rho_upper < epsilon) continue;
         }
-        double tmp = 0;
-        for (long ibasis1=ibasis0-1; ibasis1>=0; ibasis1--) {
-            tmp += work_basis[ibasis1]*dm[ibasis0*nbasis+ibasis1];
+        double rho = 0.0;
+        for (long iphi=0; iphi<nphi; iphi++) {
+            rho += work[ipoint*nphi + iphi]*phi_row[iphi];
         }
-        rho += (2*tmp+dm[ibasis0*(nbasis+1)]*work_basis[ibasis0])*work_basis[ibasis0];
+        output[ipoint] += rho;
     }
-    *output += rho;
 }
 
-void GB1DMGridDensityFn::compute_fock_from_pot(double* pot, double* work_basis, long nbasis, double* output) {
-    for (long ibasis0=0; ibasis0<nbasis; ibasis0++) {
-        double tmp1 = (*pot)*work_basis[ibasis0];
-        for (long ibasis1=0; ibasis1<=ibasis0; ibasis1++) {
-            double tmp2 = tmp1*work_basis[ibasis1];
-            output[ibasis0*nbasis+ibasis1] += tmp2;
-            if (ibasis0 != ibasis1) output[ibasis1*nbasis+ibasis0] += tmp2;
+void GB1DMGridDensityFn::compute_fock_from_block(const double* pots, const double* phi, long npoint, long nphi, double* work, double* fock) {
+    // fock += phi^T diag(pots) phi
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        for (long iphi=0; iphi<nphi; iphi++) {
+            work[ipoint*nphi + iphi] = pots[ipoint]*phi[ipoint*nphi + iphi];
         }
     }
+    cblas_dgemm(CblasRowMajor, CblasTrans, CblasNoTrans, nphi, nphi, npoint,
+                1.0, phi, nphi, work, nphi, 1.0, fock, nphi);
 }
 
 
-
 /*
     GB1DMGridGradientFn
 */
@@ -248,42 +235,102 @@ void GB1DMGridGradientFn::add(double coeff, double alpha0, const double* scales0
     } while (i1p.inc());
 }
 
-void GB1DMGridGradientFn::compute_point_from_dm(double* work_basis, double* dm, long nbasis, double* output, double epsilon, double* dmmaxrow) {
-    double rho_x = 0, rho_y = 0, rho_z = 0;
-    for (long ibasis0=0; ibasis0<nbasis; ibasis0++) {
-        double row = 0;
-        for (long ibasis1=0; ibasis1<nbasis; ibasis1++) {
-            row += work_basis[ibasis1*4]*dm[ibasis0*nbasis+ibasis1];
+void GB1DMGridGradientFn::compute_block_from_dm(const double* phi, long npoint, long nphi, const double* dm, double* work, double* output, double epsilon, const double* dmmaxrow) {
+    // work = phi dm, using the basis function values (first component)
+    cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans, npoint, nphi, nphi,
+                1.0, phi, nphi, dm, nphi, 0.0, work, nphi);
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        for (long i=0; i<3; i++) {
+            // derivatives of the basis functions towards x, y and z
+            const double* dphi_row = phi + ((i+1)*npoint + ipoint)*nphi;
+            double tmp = 0.0;
+            for (long iphi=0; iphi<nphi; iphi++) {
+                tmp += work[ipoint*nphi + iphi]*dphi_row[iphi];
+            }
+            output[ipoint*3 + i] += 2*tmp;
+        }
+    }
+}
+
+void GB1DMGridGradientFn::compute_fock_from_block(const double* pots, const double* phi, long npoint, long nphi, double* work, double* fock) {
+    // work = pot . grad phi
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        for (long iphi=0; iphi<nphi; iphi++) {
+            work[ipoint*nphi + iphi] =
+                pots[ipoint*3  ]*phi[(  npoint + ipoint)*nphi + iphi] +
+                pots[ipoint*3+1]*phi[(2*npoint + ipoint)*nphi + iphi] +
+                pots[ipoint*3+2]*phi[(3*npoint + ipoint)*nphi + iphi];
         }
-        rho_x += row*work_basis[ibasis0*4+1];
-        rho_y += row*work_basis[ibasis0*4+2];
-        rho_z += row*work_basis[ibasis0*4+3];
     }
-    output[0] += 2*rho_x;
-    output[1] += 2*rho_y;
-    output[2] += 2*rho_z;
+    // fock += phi^T work + work^T phi
+    cblas_dgemm(CblasRowMajor, CblasTrans, CblasNoTrans, nphi, nphi, npoint,
+                1.0, phi, nphi, work, nphi, 1.0, fock, nphi);
+    cblas_dgemm(CblasRowMajor, CblasTrans, CblasNoTrans, nphi, nphi, npoint,
+                1.0, work, nphi, phi, nphi, 1.0, fock, nphi);
 }
 
-void GB1DMGridGradientFn::compute_fock_from_pot(double* pot, double* work_basis, long nbasis, double* output) {
-    for (long ibasis0=0; ibasis0<nbasis; ibasis0++) {
-        double tmp0 = work_basis[ibasis0*4];
-        double tmp1 = pot[0]*work_basis[ibasis0*4+1] +
-                      pot[1]*work_basis[ibasis0*4+2] +
-                      pot[2]*work_basis[ibasis0*4+3];
-        for (long ibasis1=0; ibasis1<=ibasis0; ibasis1++) {
-            double result = tmp0*(pot[0]*work_basis[ibasis1*4+1] +
-                                  pot[1]*work_basis[ibasis1*4+2] +
-                                  pot[2]*work_basis[ibasis1*4+3]) +
-                            tmp1*work_basis[ibasis1*4];
-            output[ibasis1*nbasis+ibasis0] += result;
-            if (ibasis1!=ibasis0) {
-                // Enforce symmetry
-                output[ibasis0*nbasis+ibasis1] += result;
+
+/*
+    GB1DMGridGGAFn
+*/
+
+void GB1DMGridGGAFn::compute_block_from_dm(const double* phi, long npoint, long nphi, const double* dm, double* work, double* output, double epsilon, const double* dmmaxrow) {
+    // work = phi dm is shared by the density and the gradient.
+    cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans, npoint, nphi, nphi,
+                1.0, phi, nphi, dm, nphi, 0.0, work, nphi);
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        const double* work_row = work + ipoint*nphi;
+        // density, screened as in GB1DMGridDensityFn
+        const double* phi_row = phi + ipoint*nphi;
+        bool skip = false;
+        if (epsilon > 0) {
+            double absmax_basis = 0.0;
+            double rho_upper = 0.0;
+            for (long iphi=0; iphi<nphi; iphi++) {
+                double tmp = fabs(phi_row[iphi]);
+                if (tmp > absmax_basis) absmax_basis = tmp;
+                rho_upper += tmp*dmmaxrow[iphi];
             }
+            rho_upper *= nphi*absmax_basis;
+            skip = (rho_upper < epsilon);
+        }
+        if (!skip) {
+            double rho = 0.0;
+            for (long iphi=0; iphi<nphi; iphi++) {
+                rho += work_row[iphi]*phi_row[iphi];
+            }
+            output[ipoint*4] += rho;
+        }
+        // gradient, as in GB1DMGridGradientFn
+        for (long i=0; i<3; i++) {
+            const double* dphi_row = phi + ((i+1)*npoint + ipoint)*nphi;
+            double tmp = 0.0;
+            for (long iphi=0; iphi<nphi; iphi++) {
+                tmp += work_row[iphi]*dphi_row[iphi];
+            }
+            output[ipoint*4 + i + 1] += 2*tmp;
         }
     }
 }
 
+void GB1DMGridGGAFn::compute_fock_from_block(const double* pots, const double* phi, long npoint, long nphi, double* work, double* fock) {
+    // work = 0.5 pot_rho phi + pot_grad . grad phi
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        for (long iphi=0; iphi<nphi; iphi++) {
+            work[ipoint*nphi + iphi] =
+                0.5*pots[ipoint*4]*phi[ipoint*nphi + iphi] +
+                pots[ipoint*4+1]*phi[(  npoint + ipoint)*nphi + iphi] +
+                pots[ipoint*4+2]*phi[(2*npoint + ipoint)*nphi + iphi] +
+                pots[ipoint*4+3]*phi[(3*npoint + ipoint)*nphi + iphi];
+        }
+    }
+    // fock += phi^T work + work^T phi
+    cblas_dgemm(CblasRowMajor, CblasTrans, CblasNoTrans, nphi, nphi, npoint,
+                1.0, phi, nphi, work, nphi, 1.0, fock, nphi);
+    cblas_dgemm(CblasRowMajor, CblasTrans, CblasNoTrans, nphi, nphi, npoint,
+                1.0, work, nphi, phi, nphi, 1.0, fock, nphi);
+}
+
 
 /*
     GB1DMGridKineticFn
@@ -328,41 +375,33 @@ void GB1DMGridKineticFn::add(double coeff, double alpha0, const double* scales0)
     } while (i1p.inc());
 }
 
-void GB1DMGridKineticFn::compute_point_from_dm(double* work_basis, double* dm, long nbasis, double* output, double epsilon, double* dmmaxrow) {
-    double tau = 0.0;
-    for (long ibasis0=0; ibasis0<nbasis; ibasis0++) {
-        double tmp_x = 0;
-        double tmp_y = 0;
-        double tmp_z = 0;
-        for (long ibasis1=0; ibasis1<ibasis0; ibasis1++) {
-            tmp_x += work_basis[ibasis1*3  ]*dm[ibasis0*nbasis+ibasis1];
-            tmp_y += work_basis[ibasis1*3+1]*dm[ibasis0*nbasis+ibasis1];
-            tmp_z += work_basis[ibasis1*3+2]*dm[ibasis0*nbasis+ibasis1];
+void GB1DMGridKineticFn::compute_block_from_dm(const double* phi, long npoint, long nphi, const double* dm, double* work, double* output, double epsilon, const double* dmmaxrow) {
+    for (long i=0; i<3; i++) {
+        // derivatives of the basis functions towards x, y and z
+        const double* dphi = phi + i*npoint*nphi;
+        cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans, npoint, nphi, nphi,
+                    1.0, dphi, nphi, dm, nphi, 0.0, work, nphi);
+        for (long ipoint=0; ipoint<npoint; ipoint++) {
+            double tmp = 0.0;
+            for (long iphi=0; iphi<nphi; iphi++) {
+                tmp += work[ipoint*nphi + iphi]*dphi[ipoint*nphi + iphi];
+            }
+            output[ipoint] += 0.5*tmp;
         }
-        tmp_x += 0.5*work_basis[ibasis0*3  ]*dm[ibasis0*nbasis+ibasis0];
-        tmp_y += 0.5*work_basis[ibasis0*3+1]*dm[ibasis0*nbasis+ibasis0];
-        tmp_z += 0.5*work_basis[ibasis0*3+2]*dm[ibasis0*nbasis+ibasis0];
-        tau += tmp_x*work_basis[ibasis0*3  ] +
-               tmp_y*work_basis[ibasis0*3+1] +
-               tmp_z*work_basis[ibasis0*3+2];
     }
-    *output += tau;
 }
 
-void GB1DMGridKineticFn::compute_fock_from_pot(double* pot, double* work_basis, long nbasis, double* output) {
-    for (long ibasis0=0; ibasis0<nbasis; ibasis0++) {
-        double tmp_x = 0.5*(*pot)*work_basis[ibasis0*3  ];
-        double tmp_y = 0.5*(*pot)*work_basis[ibasis0*3+1];
-        double tmp_z = 0.5*(*pot)*work_basis[ibasis0*3+2];
-        for (long ibasis1=0; ibasis1<=ibasis0; ibasis1++) {
-            double result = tmp_x*work_basis[ibasis1*3  ] +
-                            tmp_y*work_basis[ibasis1*3+1] +
-                            tmp_z*work_basis[ibasis1*3+2];
-            output[ibasis1*nbasis+ibasis0] += result;
-            if (ibasis0 != ibasis1) {
-                output[ibasis0*nbasis+ibasis1] += result;
+void GB1DMGridKineticFn::compute_fock_from_block(const double* pots, const double* phi, long npoint, long nphi, double* work, double* fock) {
+    for (long i=0; i<3; i++) {
+        // derivatives of the basis functions towards x, y and z
+        const double* dphi = phi + i*npoint*nphi;
+        for (long ipoint=0; ipoint<npoint; ipoint++) {
+            for (long iphi=0; iphi<nphi; iphi++) {
+                work[ipoint*nphi + iphi] = 0.5*pots[ipoint]*dphi[ipoint*nphi + iphi];
             }
         }
+        cblas_dgemm(CblasRowMajor, CblasTrans, CblasNoTrans, nphi, nphi, npoint,
+                    1.0, dphi, nphi, work, nphi, 1.0, fock, nphi);
     }
 }
 
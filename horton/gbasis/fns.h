@@ -55,7 +55,6 @@ class GB1ExpGridFn : public GB1GridFn  {
         long nfn;
     public:
         GB1ExpGridFn(long max_shell_type, long nfn, long dim_work, long dim_output) : GB1GridFn(max_shell_type, dim_work, dim_output), nfn(nfn) {};
-        virtual void compute_point_from_exp(double* work_basis, double* coeffs, long nbasis, double* output) = 0;
     };
 
 
@@ -66,7 +65,6 @@ class GB1ExpGridOrbitalFn : public GB1ExpGridFn  {
     public:
         GB1ExpGridOrbitalFn(long max_shell_type, long nfn, long* iorbs, long norb) : GB1ExpGridFn(max_shell_type, nfn, 1, norb), iorbs(iorbs), norb(norb) {};
         virtual void add(double coeff, double alpha0, const double* scales0);
-        virtual void compute_point_from_exp(double* work_basis, double* coeffs, long nbasis, double* output);
     };
 
 
@@ -75,8 +73,18 @@ class GB1ExpGridOrbitalFn : public GB1ExpGridFn  {
 class GB1DMGridFn : public GB1GridFn  {
     public:
         GB1DMGridFn(long max_shell_type, long dim_work, long dim_output) : GB1GridFn(max_shell_type, dim_work, dim_output) {};
-        virtual void compute_point_from_dm(double* work_basis, double* dm, long nbasis, double* output, double epsilon, double* dmmaxrow) = 0;
-        virtual void compute_fock_from_pot(double* pot, double* work_basis, long nbasis, double* output) = 0;
+        // The following methods work on a block of npoint grid points. The
+        // (significant) basis functions and their derivatives in the block are
+        // stored in phi with shape (dim_work, npoint, nphi), see
+        // GBasis::compute_grid_block1. The matrices dm and fock have shape
+        // (nphi, nphi) and work is a scratch array of size npoint*nphi. The
+        // results are added to output, with shape (npoint, dim_output), or to
+        // fock. The potential in pots has shape (npoint, dim_output) and must
+        // include the integration weights.
+        virtual void compute_block_from_dm(const double* phi, long npoint, long nphi, const double* dm, double* work, double* output, double epsilon, const double* dmmaxrow) = 0;
+        virtual void compute_fock_from_block(const double* pots, const double* phi, long npoint, long nphi, double* work, double* fock) = 0;
+        // A new instance of the same kind, e.g. to give each thread its own work arrays.
+        virtual GB1DMGridFn* clone() const = 0;
     };
 
 
@@ -89,18 +97,34 @@ class GB1DMGridDensityFn : public GB1DMGridFn  {
 
         virtual void reset(long _shell_type0, const double* _r0, const double* _point);
         virtual void add(double coeff, double alpha0, const double* scales0);
-        virtual void compute_point_from_dm(double* work_basis, double* dm, long nbasis, double* output, double epsilon, double* dmmaxrow);
-        virtual void compute_fock_from_pot(double* pot, double* work_basis, long nbasis, double* output);
+        virtual void compute_block_from_dm(const double* phi, long npoint, long nphi, const double* dm, double* work, double* output, double epsilon, const double* dmmaxrow);
+        virtual void compute_fock_from_block(const double* pots, const double* phi, long npoint, long nphi, double* work, double* fock);
+        virtual GB1DMGridFn* clone() const {return new GB1DMGridDensityFn(max_shell_type);};
     };
 
 
 class GB1DMGridGradientFn : public GB1DMGridFn  {
+    protected:
+        GB1DMGridGradientFn(long max_shell_type, long dim_output): GB1DMGridFn(max_shell_type, 4, dim_output) {};
     public:
         GB1DMGridGradientFn(long max_shell_type): GB1DMGridFn(max_shell_type, 4, 3) {};
 
         virtual void add(double coeff, double alpha0, const double* scales0);
-        virtual void compute_point_from_dm(double* work_basis, double* dm, long nbasis, double* output, double epsilon, double* dmmaxrow);
-        virtual void compute_fock_from_pot(double* pot, double* work_basis, long nbasis, double* output);
+        virtual void compute_block_from_dm(const double* phi, long npoint, long nphi, const double* dm, double* work, double* output, double epsilon, const double* dmmaxrow);
+        virtual void compute_fock_from_block(const double* pots, const double* phi, long npoint, long nphi, double* work, double* fock);
+        virtual GB1DMGridFn* clone() const {return new GB1DMGridGradientFn(max_shell_type);};
+    };
+
+
+// The density and its gradient at once: the output contains rho, d/dx, d/dy
+// and d/dz rho for each point.
+class GB1DMGridGGAFn : public GB1DMGridGradientFn  {
+    public:
+        GB1DMGridGGAFn(long max_shell_type): GB1DMGridGradientFn(max_shell_type, 4) {};
+
+        virtual void compute_block_from_dm(const double* phi, long npoint, long nphi, const double* dm, double* work, double* output, double epsilon, const double* dmmaxrow);
+        virtual void compute_fock_from_block(const double* pots, const double* phi, long npoint, long nphi, double* work, double* fock);
+        virtual GB1DMGridFn* clone() const {return new GB1DMGridGGAFn(max_shell_type);};
     };
 
 
@@ -109,8 +133,9 @@ class GB1DMGridKineticFn : public GB1DMGridFn  {
         GB1DMGridKineticFn(long max_shell_type): GB1DMGridFn(max_shell_type, 3, 1) {};
 
         virtual void add(double coeff, double alpha0, const double* scales0);
-        virtual void compute_point_from_dm(double* work_basis, double* dm, long nbasis, double* output, double epsilon, double* dmmaxrow);
-        virtual void compute_fock_from_pot(double* pot, double* work_basis, long nbasis, double* output);
+        virtual void compute_block_from_dm(const double* phi, long npoint, long nphi, const double* dm, double* work, double* output, double epsilon, const double* dmmaxrow);
+        virtual void compute_fock_from_block(const double* pots, const double* phi, long npoint, long nphi, double* work, double* fock);
+        virtual GB1DMGridFn* clone() const {return new GB1DMGridKineticFn(max_shell_type);};
     };
 
 
@@ -28,11 +28,20 @@
 #include <stdexcept>
 #include <cstdlib>
 #include <cstring>
+#include <algorithm>
+#include <vector>
 #include "horton/gbasis/gbasis.h"
+#include "horton/gbasis/cartpure.h"
 #include "horton/gbasis/common.h"
 #include "horton/gbasis/iter_gb.h"
 using std::abs;
 
+#ifdef _OPENMP
+#include <omp.h>
+#else
+inline int omp_get_thread_num() {return 0;}
+#endif
+
 /*
 
   Auxiliary routines
@@ -50,6 +59,85 @@ const double gob_pure_normalization(const double alpha, const long l) {
            /fac2(2*l-1));
 }
 
+/*
+    Basis functions whose absolute value (or that of their derivatives) is
+    below this tolerance are neglected in the grid routines.
+*/
+
+const double grid_basis_tolerance = 1e-15;
+
+/*
+    Number of grid points in a block for the evaluation of basis functions.
+*/
+
+const long grid_block_size = 128;
+
+/*
+    Edge of the cubic bins used to sort grid points in space.
+*/
+
+const double grid_bin_size = 1.0;
+
+static unsigned long long spread_bits(unsigned long long x) {
+    // Insert two zero bits between each of the lower 21 bits of x.
+    x &= 0x1fffff;
+    x = (x | x << 32) & 0x1f00000000ffffULL;
+    x = (x | x << 16) & 0x1f0000ff0000ffULL;
+    x = (x | x << 8) & 0x100f00f00f00f00fULL;
+    x = (x | x << 4) & 0x10c30c30c30c30c3ULL;
+    x = (x | x << 2) & 0x1249249249249249ULL;
+    return x;
+}
+
+void sort_grid_points(long npoint, const double* points, long* order) {
+    // Sort the grid points along a Morton (Z-order) curve through cubic bins,
+    // such that consecutive points in order are close in space. Blocks of
+    // sorted points then have small bounding spheres and only few shells are
+    // significant in each block.
+    if (npoint == 0) return;
+    double lower[3] = {points[0], points[1], points[2]};
+    for (long ipoint=1; ipoint<npoint; ipoint++) {
+        for (long i=0; i<3; i++) {
+            lower[i] = std::min(lower[i], points[3*ipoint + i]);
+        }
+    }
+    std::vector<std::pair<unsigned long long, long> > keys(npoint);
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        unsigned long long key = 0;
+        for (long i=0; i<3; i++) {
+            double bin = std::min((points[3*ipoint + i] - lower[i])/grid_bin_size, double(0x1fffff));
+            key |= spread_bits((unsigned long long)bin) << i;
+        }
+        keys[ipoint] = std::make_pair(key, ipoint);
+    }
+    std::sort(keys.begin(), keys.end());
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        order[ipoint] = keys[ipoint].second;
+    }
+}
+
+void gather_grid_points(long npoint, const double* points, const long* order, double* output) {
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        output[3*ipoint] = points[3*order[ipoint]];
+        output[3*ipoint + 1] = points[3*order[ipoint] + 1];
+        output[3*ipoint + 2] = points[3*order[ipoint] + 2];
+    }
+}
+
+/*
+    Decode a triangular index into a pair of shells, ishell1 <= ishell0. The
+    pairs are ordered in the same way as in IterGB2.
+*/
+
+void decode_pair(long ipair, long* ishell0, long* ishell1) {
+    long i = (long)((sqrt(8.0*ipair + 1.0) - 1.0)/2.0);
+    // Fix possible rounding errors
+    while (i*(i + 1)/2 > ipair) i--;
+    while ((i + 1)*(i + 2)/2 <= ipair) i++;
+    *ishell0 = i;
+    *ishell1 = ipair - i*(i + 1)/2;
+}
+
 /*
     GBasis
 
@@ -61,7 +149,7 @@ const double gob_pure_normalization(const double alpha, const long l) {
 GBasis::GBasis(const double* centers, const long* shell_map, const long* nprims,
                const long* shell_types, const double* alphas, const double* con_coeffs,
                const long ncenter, const long nshell, const long nprim_total) :
-    nbasis(0), nscales(0), max_shell_type(0),
+    nbasis(0), nscales(0), max_shell_type(0), nthreads(1),
     centers(centers), shell_map(shell_map), nprims(nprims),
     shell_types(shell_types), alphas(alphas), con_coeffs(con_coeffs),
     ncenter(ncenter), nshell(nshell), nprim_total(nprim_total)
@@ -118,6 +206,9 @@ GBasis::GBasis(const double* centers, const long* shell_map, const long* nprims,
     // scales
     scales = new double[nscales];
     scales_offsets = new long[nprim_total];
+
+    // shell_extents
+    shell_extents = new double[nshell];
 }
 
 GBasis::~GBasis() {
@@ -126,6 +217,7 @@ GBasis::~GBasis() {
     delete[] shell_lookup;
     delete[] scales;
     delete[] scales_offsets;
+    delete[] shell_extents;
 }
 
 void GBasis::init_scales() {
@@ -147,10 +239,93 @@ void GBasis::init_scales() {
     }
 }
 
+/*
+    Upper bound for the absolute value of the basis functions in a shell and
+    their first derivatives, at a distance r from the center. For a primitive
+    with angular momentum l, this is
+
+        |c| s exp(-a r^2) max(r^l, l r^(l-1) + 2 a r^(l+1))
+
+    with c the contraction coefficient and s the largest normalization
+    constant. Pure functions are at most cart_to_pure_norm(l) times larger.
+*/
+
+double shell_bound(const GBasis* gbasis, long ishell, double r) {
+    const long shell_type = gbasis->shell_types[ishell];
+    const long l = abs(shell_type);
+    const long ncart = get_shell_nbasis(l);
+    const long oprim = gbasis->get_prim_offsets()[ishell];
+    double result = 0.0;
+    for (long iprim=oprim; iprim<oprim+gbasis->nprims[ishell]; iprim++) {
+        const double alpha = gbasis->alphas[iprim];
+        const double* scales = gbasis->get_scales(iprim);
+        double scale = 0.0;
+        for (long icart=0; icart<ncart; icart++) {
+            scale = std::max(scale, fabs(scales[icart]));
+        }
+        double poly = 2*alpha*pow(r, l+1);
+        if (l > 0) poly += l*pow(r, l-1);
+        poly = std::max(poly, pow(r, l));
+        result += fabs(gbasis->con_coeffs[iprim])*scale*poly*exp(-alpha*r*r);
+    }
+    if (shell_type < 0) result *= cart_to_pure_norm(l);
+    return result;
+}
+
+void GBasis::init_shell_extents() {
+    // For every shell, find a radius beyond which the basis functions and
+    // their first derivatives are certainly below grid_basis_tolerance.
+    for (long ishell=0; ishell<nshell; ishell++) {
+        const long l = abs(shell_types[ishell]);
+        const long oprim = prim_offsets[ishell];
+        double alpha_min = alphas[oprim];
+        for (long iprim=oprim; iprim<oprim+nprims[ishell]; iprim++) {
+            alpha_min = std::min(alpha_min, alphas[iprim]);
+        }
+        // The bound is a decreasing function of r beyond r_low.
+        double r_low = sqrt((l + 1)/(2*alpha_min));
+        double r_high = r_low;
+        while (shell_bound(this, ishell, r_high) >= grid_basis_tolerance) {
+            r_low = r_high;
+            r_high *= 2;
+        }
+        // Bisection, to locate the extent with a relative error of about 1e-3.
+        while (r_high - r_low > 1e-3*r_high) {
+            const double r = 0.5*(r_low + r_high);
+            if (shell_bound(this, ishell, r) >= grid_basis_tolerance) {
+                r_low = r;
+            } else {
+                r_high = r;
+            }
+        }
+        shell_extents[ishell] = r_high;
+    }
+}
+
+void GBasis::set_nthreads(long _nthreads) {
+    if (_nthreads < 1) {
+        throw std::domain_error("The number of threads must be strictly positive.");
+    }
+    nthreads = _nthreads;
+}
+
+/*
+    The loops over shells in compute_two_index, compute_four_index and
+    compute_schwarz are OpenMP work-sharing constructs. When they are called
+    from within a parallel region, every thread must pass its own integral
+    object and the pairs of shells are distributed dynamically over the
+    threads. Every unique block of the output is computed by exactly one thread,
+    such that the result does not depend on the number of threads.
+*/
+
 void GBasis::compute_two_index(double* output, GB2Integral* integral) {
     IterGB2 iter = IterGB2(this);
-    iter.update_shell();
-    do {
+    const long npair = (nshell*(nshell + 1))/2;
+#pragma omp for schedule(dynamic)
+    for (long ipair=0; ipair<npair; ipair++) {
+        long ishell0, ishell1;
+        decode_pair(ipair, &ishell0, &ishell1);
+        iter.set_shell(ishell0, ishell1);
         integral->reset(iter.shell_type0, iter.shell_type1, iter.r0, iter.r1);
         iter.update_prim();
         do {
@@ -158,23 +333,179 @@ void GBasis::compute_two_index(double* output, GB2Integral* integral) {
         } while (iter.inc_prim());
         integral->cart_to_pure();
         iter.store(integral->get_work(), output);
-    } while (iter.inc_shell());
+    }
 }
 
-void GBasis::compute_four_index(double* output, GB4Integral* integral) {
+void GBasis::compute_four_index(double* output, GB4Integral* integral,
+                                const double* schwarz, double threshold,
+                                long* nquartet) {
+    long ncomputed = 0;
+    long nskipped = 0;
+    if (schwarz != NULL) {
+        // Skipped quartets are never stored, so start from a clean output.
+#pragma omp single
+        memset(output, 0, nbasis*nbasis*nbasis*nbasis*sizeof(double));
+    }
     IterGB4 iter = IterGB4(this);
-    iter.update_shell();
-    do {
-        integral->reset(iter.shell_type0, iter.shell_type1, iter.shell_type2, iter.shell_type3,
-                        iter.r0, iter.r1, iter.r2, iter.r3);
-        iter.update_prim();
-        do {
-            integral->add(iter.con_coeff, iter.alpha0, iter.alpha1, iter.alpha2, iter.alpha3,
-                          iter.scales0, iter.scales1, iter.scales2, iter.scales3);
-        } while (iter.inc_prim());
+    // Only the (ishell0, ishell1) pairs are distributed over the threads. The
+    // inner loops run over the same unique quartets as IterGB4::inc_shell.
+    const long npair = (nshell*(nshell + 1))/2;
+#pragma omp for schedule(dynamic)
+    for (long ipair=0; ipair<npair; ipair++) {
+        long ishell0, ishell1;
+        decode_pair(ipair, &ishell0, &ishell1);
+        for (long ishell2=0; ishell2<=ishell0; ishell2++) {
+            const long ishell3_max = (ishell0 == ishell1) ? ishell2 : ishell1;
+            for (long ishell3=0; ishell3<=ishell3_max; ishell3++) {
+                // Cauchy-Schwarz screening: |<01|23>| = |(02|13)| <= Q_02*Q_13
+                if ((schwarz != NULL) &&
+                    (schwarz[ishell0*nshell + ishell2]*
+                     schwarz[ishell1*nshell + ishell3] < threshold)) {
+                    nskipped++;
+                    continue;
+                }
+                iter.set_shell(ishell0, ishell1, ishell2, ishell3);
+                integral->reset(iter.shell_type0, iter.shell_type1, iter.shell_type2, iter.shell_type3,
+                                iter.r0, iter.r1, iter.r2, iter.r3);
+                iter.update_prim();
+                do {
+                    integral->add(iter.con_coeff, iter.alpha0, iter.alpha1, iter.alpha2, iter.alpha3,
+                                  iter.scales0, iter.scales1, iter.scales2, iter.scales3);
+                } while (iter.inc_prim());
+                integral->cart_to_pure();
+                iter.store(integral->get_work(), output);
+                ncomputed++;
+            }
+        }
+    }
+    if (nquartet != NULL) {
+        // The counts of all threads are added to the (zero-initialized) output.
+#pragma omp atomic
+        nquartet[0] += ncomputed;
+#pragma omp atomic
+        nquartet[1] += nskipped;
+    }
+}
+
+void GBasis::compute_schwarz(double* output, GB4Integral* integral) {
+    // The Schwarz bound of a pair of shells (a,b) is the square root of the
+    // largest diagonal element (ab|ab) = <aa|bb> in the corresponding block.
+    const long npair = (nshell*(nshell + 1))/2;
+#pragma omp for schedule(dynamic)
+    for (long ipair=0; ipair<npair; ipair++) {
+        long ishell0, ishell1;
+        decode_pair(ipair, &ishell0, &ishell1);
+        const long shell_type0 = shell_types[ishell0];
+        const long shell_type1 = shell_types[ishell1];
+        const long n0 = get_shell_nbasis(shell_type0);
+        const long n1 = get_shell_nbasis(shell_type1);
+        const long oprim0 = prim_offsets[ishell0];
+        const long oprim1 = prim_offsets[ishell1];
+        const double* r0 = centers + 3*shell_map[ishell0];
+        const double* r1 = centers + 3*shell_map[ishell1];
+        integral->reset(shell_type0, shell_type0, shell_type1, shell_type1,
+                        r0, r0, r1, r1);
+        for (long iprim0=oprim0; iprim0<oprim0+nprims[ishell0]; iprim0++) {
+            for (long iprim1=oprim0; iprim1<oprim0+nprims[ishell0]; iprim1++) {
+                for (long iprim2=oprim1; iprim2<oprim1+nprims[ishell1]; iprim2++) {
+                    for (long iprim3=oprim1; iprim3<oprim1+nprims[ishell1]; iprim3++) {
+                        integral->add(con_coeffs[iprim0]*con_coeffs[iprim1]*
+                                      con_coeffs[iprim2]*con_coeffs[iprim3],
+                                      alphas[iprim0], alphas[iprim1],
+                                      alphas[iprim2], alphas[iprim3],
+                                      get_scales(iprim0), get_scales(iprim1),
+                                      get_scales(iprim2), get_scales(iprim3));
+                    }
+                }
+            }
+        }
         integral->cart_to_pure();
-        iter.store(integral->get_work(), output);
-    } while (iter.inc_shell());
+        const double* work = integral->get_work();
+        double maxdiag = 0.0;
+        for (long i0=0; i0<n0; i0++) {
+            for (long i1=0; i1<n1; i1++) {
+                double value = fabs(work[(i0*n0 + i0)*n1*n1 + i1*n1 + i1]);
+                if (value > maxdiag) maxdiag = value;
+            }
+        }
+        output[ishell0*nshell + ishell1] = sqrt(maxdiag);
+        output[ishell1*nshell + ishell0] = sqrt(maxdiag);
+    }
+}
+
+void GBasis::compute_four_index_dm(const double* dm, double* coulomb, double* exchange,
+                                   GB4Integral* integral, const double* schwarz,
+                                   const double* dmmax, double threshold,
+                                   long* nquartet) {
+    // Integral-direct construction of the Coulomb and exchange matrices. The
+    // results are added to coulomb and exchange (which may be NULL). Within a
+    // parallel region, every thread must have private output arrays.
+    long ncomputed = 0;
+    long nskipped = 0;
+    IterGB4 iter = IterGB4(this);
+    const long npair = (nshell*(nshell + 1))/2;
+#pragma omp for schedule(dynamic)
+    for (long ipair=0; ipair<npair; ipair++) {
+        long ishell0, ishell1;
+        decode_pair(ipair, &ishell0, &ishell1);
+        for (long ishell2=0; ishell2<=ishell0; ishell2++) {
+            const long ishell3_max = (ishell0 == ishell1) ? ishell2 : ishell1;
+            for (long ishell3=0; ishell3<=ishell3_max; ishell3++) {
+                if (schwarz != NULL) {
+                    // Density-weighted Cauchy-Schwarz screening: the bound on
+                    // the integrals is multiplied by the largest density
+                    // matrix element that is contracted with this quartet.
+                    double dmax = dmmax[ishell0*nshell + ishell1];
+                    dmax = fmax(dmax, dmmax[ishell0*nshell + ishell2]);
+                    dmax = fmax(dmax, dmmax[ishell0*nshell + ishell3]);
+                    dmax = fmax(dmax, dmmax[ishell1*nshell + ishell2]);
+                    dmax = fmax(dmax, dmmax[ishell1*nshell + ishell3]);
+                    dmax = fmax(dmax, dmmax[ishell2*nshell + ishell3]);
+                    if (schwarz[ishell0*nshell + ishell2]*
+                        schwarz[ishell1*nshell + ishell3]*dmax < threshold) {
+                        nskipped++;
+                        continue;
+                    }
+                }
+                iter.set_shell(ishell0, ishell1, ishell2, ishell3);
+                integral->reset(iter.shell_type0, iter.shell_type1, iter.shell_type2, iter.shell_type3,
+                                iter.r0, iter.r1, iter.r2, iter.r3);
+                iter.update_prim();
+                do {
+                    integral->add(iter.con_coeff, iter.alpha0, iter.alpha1, iter.alpha2, iter.alpha3,
+                                  iter.scales0, iter.scales1, iter.scales2, iter.scales3);
+                } while (iter.inc_prim());
+                integral->cart_to_pure();
+                iter.contract_dm(integral->get_work(), dm, coulomb, exchange);
+                ncomputed++;
+            }
+        }
+    }
+    if (nquartet != NULL) {
+#pragma omp atomic
+        nquartet[0] += ncomputed;
+#pragma omp atomic
+        nquartet[1] += nskipped;
+    }
+}
+
+void GBasis::compute_shell_dmmax(const double* dm, double* output) {
+    // The largest absolute value of the density matrix in each block of shells.
+    for (long ishell0=0; ishell0<nshell; ishell0++) {
+        const long begin0 = basis_offsets[ishell0];
+        const long end0 = begin0 + get_shell_nbasis(shell_types[ishell0]);
+        for (long ishell1=0; ishell1<nshell; ishell1++) {
+            const long begin1 = basis_offsets[ishell1];
+            const long end1 = begin1 + get_shell_nbasis(shell_types[ishell1]);
+            double dmax = 0.0;
+            for (long ibasis0=begin0; ibasis0<end0; ibasis0++) {
+                for (long ibasis1=begin1; ibasis1<end1; ibasis1++) {
+                    dmax = fmax(dmax, fabs(dm[ibasis0*nbasis + ibasis1]));
+                }
+            }
+            output[ishell0*nshell + ishell1] = dmax;
+        }
+    }
 }
 
 void GBasis::compute_grid_point1(double* output, double* point, GB1GridFn* grid_fn) {
@@ -191,6 +522,70 @@ void GBasis::compute_grid_point1(double* output, double* point, GB1GridFn* grid_
     } while (iter.inc_shell());
 }
 
+long GBasis::compute_grid_block1(double* output, long npoint, const double* points,
+                                 GB1GridFn* grid_fn, long* ibasis_sig) {
+    // Evaluate the basis functions (and derivatives) in a block of grid points,
+    // skipping shells that are negligible in the entire block. The significant
+    // basis functions are stored in output with shape (dim_work, npoint, nsig),
+    // where nsig is the return value. Their indexes are written to ibasis_sig.
+
+    // A) Bounding sphere of the block of points
+    double center[3] = {0.0, 0.0, 0.0};
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        center[0] += points[3*ipoint];
+        center[1] += points[3*ipoint+1];
+        center[2] += points[3*ipoint+2];
+    }
+    center[0] /= npoint;
+    center[1] /= npoint;
+    center[2] /= npoint;
+    double radius = 0.0;
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        radius = std::max(radius, sqrt(dist_sq(center, points + 3*ipoint)));
+    }
+
+    // B) Select the shells that reach the bounding sphere
+    std::vector<long> ishells_sig;
+    long nsig = 0;
+    for (long ishell=0; ishell<nshell; ishell++) {
+        const double* r0 = centers + 3*shell_map[ishell];
+        if (sqrt(dist_sq(center, r0)) - radius < shell_extents[ishell]) {
+            ishells_sig.push_back(ishell);
+            const long begin = basis_offsets[ishell];
+            const long end = begin + get_shell_nbasis(shell_types[ishell]);
+            for (long ibasis=begin; ibasis<end; ibasis++) {
+                ibasis_sig[nsig] = ibasis;
+                nsig++;
+            }
+        }
+    }
+
+    // C) Evaluate the significant shells in all points
+    const long dim_work = grid_fn->get_dim_work();
+    IterGB1 iter = IterGB1(this);
+    for (long ipoint=0; ipoint<npoint; ipoint++) {
+        long isig = 0;
+        for (size_t i=0; i<ishells_sig.size(); i++) {
+            iter.set_shell(ishells_sig[i]);
+            grid_fn->reset(iter.shell_type0, iter.r0, points + 3*ipoint);
+            iter.update_prim();
+            do {
+                grid_fn->add(iter.con_coeff, iter.alpha0, iter.scales0);
+            } while (iter.inc_prim());
+            grid_fn->cart_to_pure();
+            const double* work = grid_fn->get_work();
+            const long n = get_shell_nbasis(iter.shell_type0);
+            for (long ibasis=0; ibasis<n; ibasis++) {
+                for (long k=0; k<dim_work; k++) {
+                    output[(k*npoint + ipoint)*nsig + isig + ibasis] = work[ibasis*dim_work + k];
+                }
+            }
+            isig += n;
+        }
+    }
+    return nsig;
+}
+
 double GBasis::compute_grid_point2(double* dm, double* point, GB2DMGridFn* grid_fn) {
     double result = 0.0;
     IterGB2 iter = IterGB2(this);
@@ -213,6 +608,7 @@ GOBasis::GOBasis(const double* centers, const long* shell_map, const long* nprim
     GBasis(centers, shell_map, nprims, shell_types, alphas, con_coeffs,
     ncenter, nshell, nprim_total) {
     init_scales();
+    init_shell_extents();
 }
 
 const double GOBasis::normalization(const double alpha, const long* n) const {
@@ -220,123 +616,346 @@ const double GOBasis::normalization(const double alpha, const long* n) const {
 }
 
 void GOBasis::compute_overlap(double* output) {
-    GB2OverlapIntegral integral = GB2OverlapIntegral(get_max_shell_type());
-    compute_two_index(output, &integral);
+#pragma omp parallel num_threads(get_nthreads())
+    {
+        GB2OverlapIntegral integral = GB2OverlapIntegral(get_max_shell_type());
+        compute_two_index(output, &integral);
+    }
 }
 
 void GOBasis::compute_kinetic(double* output) {
-    GB2KineticIntegral integral = GB2KineticIntegral(get_max_shell_type());
-    compute_two_index(output, &integral);
+#pragma omp parallel num_threads(get_nthreads())
+    {
+        GB2KineticIntegral integral = GB2KineticIntegral(get_max_shell_type());
+        compute_two_index(output, &integral);
+    }
 }
 
 void GOBasis::compute_nuclear_attraction(double* charges, double* centers, long ncharge, double* output) {
-    GB2NuclearAttractionIntegral integral = GB2NuclearAttractionIntegral(get_max_shell_type(), charges, centers, ncharge);
-    compute_two_index(output, &integral);
+#pragma omp parallel num_threads(get_nthreads())
+    {
+        GB2NuclearAttractionIntegral integral = GB2NuclearAttractionIntegral(get_max_shell_type(), charges, centers, ncharge);
+        compute_two_index(output, &integral);
+    }
 }
 
-void GOBasis::compute_electron_repulsion(double* output) {
-    GB4ElectronRepulsionIntegralLibInt integral = GB4ElectronRepulsionIntegralLibInt(get_max_shell_type());
-    compute_four_index(output, &integral);
+void GOBasis::compute_electron_repulsion(double* output, const double* schwarz,
+                                         double threshold, long* nquartet) {
+#pragma omp parallel num_threads(get_nthreads())
+    {
+        GB4ElectronRepulsionIntegralLibInt integral = GB4ElectronRepulsionIntegralLibInt(get_max_shell_type());
+        compute_four_index(output, &integral, schwarz, threshold, nquartet);
+    }
 }
 
-void GOBasis::compute_grid1_exp(long nfn, double* coeffs, long npoint, double* points, long norb, long* iorbs, double* output) {
-    // The work array contains the basis functions evaluated at the grid point,
-    // and optionally some of its derivatives.
-    GB1ExpGridOrbitalFn grid_fn = GB1ExpGridOrbitalFn(get_max_shell_type(), nfn, iorbs, norb);
+void GOBasis::compute_electron_repulsion_schwarz(double* output) {
+#pragma omp parallel num_threads(get_nthreads())
+    {
+        GB4ElectronRepulsionIntegralLibInt integral = GB4ElectronRepulsionIntegralLibInt(get_max_shell_type());
+        compute_schwarz(output, &integral);
+    }
+}
 
-    long nwork = get_nbasis()*grid_fn.get_dim_work();
-    long dim_output = grid_fn.get_dim_output();
-    double* work_basis = new double[nwork];
+void GOBasis::compute_electron_repulsion_dm(const double* dm, double* coulomb, double* exchange,
+                                            const double* schwarz, double threshold,
+                                            long* nquartet) {
+    // The Coulomb and exchange matrices are added to the outputs. With more than
+    // one thread, every thread accumulates its contributions in private
+    // matrices, which are added to the outputs in a fixed order afterwards.
+    const long nbasis = get_nbasis();
+    const long nthreads = get_nthreads();
+    double* dmmax = NULL;
+    if (schwarz != NULL) {
+        dmmax = new double[nshell*nshell];
+        compute_shell_dmmax(dm, dmmax);
+    }
+    double* work_coulomb = NULL;
+    double* work_exchange = NULL;
+    if ((nthreads > 1) && (coulomb != NULL)) {
+        work_coulomb = new double[nthreads*nbasis*nbasis];
+        memset(work_coulomb, 0, nthreads*nbasis*nbasis*sizeof(double));
+    }
+    if ((nthreads > 1) && (exchange != NULL)) {
+        work_exchange = new double[nthreads*nbasis*nbasis];
+        memset(work_exchange, 0, nthreads*nbasis*nbasis*sizeof(double));
+    }
 
-    for (long ipoint=0; ipoint<npoint; ipoint++) {
-        // A) clear the basis functions.
-        memset(work_basis, 0, nwork*sizeof(double));
+#pragma omp parallel num_threads(nthreads)
+    {
+        const long ithread = omp_get_thread_num();
+        double* thread_coulomb = (work_coulomb == NULL) ? coulomb : work_coulomb + ithread*nbasis*nbasis;
+        double* thread_exchange = (work_exchange == NULL) ? exchange : work_exchange + ithread*nbasis*nbasis;
+        GB4ElectronRepulsionIntegralLibInt integral = GB4ElectronRepulsionIntegralLibInt(get_max_shell_type());
+        compute_four_index_dm(dm, thread_coulomb, thread_exchange, &integral,
+                              schwarz, dmmax, threshold, nquartet);
+    }
 
-        // B) evaluate the basis functions in the current point.
-        compute_grid_point1(work_basis, points, &grid_fn);
+    for (long ithread=0; ithread<nthreads; ithread++) {
+        for (long i=0; i<nbasis*nbasis; i++) {
+            if (work_coulomb != NULL) coulomb[i] += work_coulomb[ithread*nbasis*nbasis + i];
+            if (work_exchange != NULL) exchange[i] += work_exchange[ithread*nbasis*nbasis + i];
+        }
+    }
+    delete[] work_coulomb;
+    delete[] work_exchange;
+    delete[] dmmax;
+}
 
-        // C) Use the basis function results and the density matrix to evaluate
-        // the function at the grid point. The result is added to the output.
-        grid_fn.compute_point_from_exp(work_basis, coeffs, get_nbasis(), output);
+/*
+    The grid points are distributed over the threads. Each thread has its own
+    work arrays and grid function (cloned from the given one).
+
+    In compute_grid1_exp, compute_grid1_dms and compute_grid1_fock, the grid
+    points are sorted in space and processed in blocks of grid_block_size
+    points. Only the basis functions that are not negligible somewhere in the
+    block are evaluated and the contractions with the density matrix or the
+    potential are carried out with BLAS.
+*/
 
-        // D) Prepare for next iteration
-        output += dim_output;
-        points += 3;
-    }
+void GOBasis::compute_grid1_exp(long nfn, double* coeffs, long npoint, double* points, long norb, long* iorbs, double* output) {
+    const long nbasis = get_nbasis();
+    const long nblock = (npoint + grid_block_size - 1)/grid_block_size;
+    std::vector<long> order(npoint);
+    sort_grid_points(npoint, points, &order[0]);
+#pragma omp parallel num_threads(get_nthreads())
+    {
+        // The work array contains the basis functions evaluated at the grid point,
+        // and optionally some of its derivatives.
+        GB1ExpGridOrbitalFn grid_fn = GB1ExpGridOrbitalFn(get_max_shell_type(), nfn, iorbs, norb);
+
+        double* work_basis = new double[grid_fn.get_dim_work()*grid_block_size*nbasis];
+        double* work_points = new double[3*grid_block_size];
+        long* ibasis_sig = new long[nbasis];
+
+#pragma omp for schedule(dynamic)
+        for (long iblock=0; iblock<nblock; iblock++) {
+            const long begin = iblock*grid_block_size;
+            const long size = std::min(grid_block_size, npoint - begin);
+
+            // A) evaluate the significant basis functions in the block.
+            gather_grid_points(size, points, &order[begin], work_points);
+            const long nsig = compute_grid_block1(work_basis, size, work_points, &grid_fn, ibasis_sig);
+            if (nsig == 0) continue;
+
+            // B) Use the basis function results and the expansion coefficients
+            // to evaluate the orbitals. The result is added to the output.
+            for (long ipoint=0; ipoint<size; ipoint++) {
+                double* point_output = output + order[begin + ipoint]*norb;
+                const double* phi_row = work_basis + ipoint*nsig;
+                for (long i=0; i<norb; i++) {
+                    double tmp = 0.0;
+                    for (long isig=0; isig<nsig; isig++) {
+                        tmp += coeffs[ibasis_sig[isig]*nfn + iorbs[i]]*phi_row[isig];
+                    }
+                    point_output[i] += tmp;
+                }
+            }
+        }
 
-    delete[] work_basis;
+        delete[] work_basis;
+        delete[] work_points;
+        delete[] ibasis_sig;
+    }
 }
 
 void GOBasis::compute_grid1_dm(double* dm, long npoint, double* points, GB1DMGridFn* grid_fn, double* output, double epsilon, double* dmmaxrow) {
-    // The work array contains the basis functions evaluated at the grid point,
-    // and optionally some of its derivatives.
-    long nwork = get_nbasis()*grid_fn->get_dim_work();
-    long dim_output = grid_fn->get_dim_output();
-    double* work_basis = new double[nwork];
-
-    for (long ipoint=0; ipoint<npoint; ipoint++) {
-        // A) clear the basis functions.
-        memset(work_basis, 0, nwork*sizeof(double));
-
-        // B) evaluate the basis functions in the current point.
-        compute_grid_point1(work_basis, points, grid_fn);
-#ifdef DEBUG
-        for (int i=0; i<nwork; i++) printf("%f ", work_basis[i]);
-        printf("\n");
-#endif
+    compute_grid1_dms(1, dm, npoint, points, grid_fn, output, epsilon, dmmaxrow);
+}
 
-        // C) Use the basis function results and the density matrix to evaluate
-        // the function at the grid point. The result is added to the output.
-        grid_fn->compute_point_from_dm(work_basis, dm, get_nbasis(), output, epsilon, dmmaxrow);
+void GOBasis::compute_grid1_dms(long ndm, double* dms, long npoint, double* points, GB1DMGridFn* grid_fn, double* outputs, double epsilon, double* dmmaxrows) {
+    // The basis functions in a block of points are evaluated once and
+    // contracted with ndm density matrices, e.g. for both spin channels. The
+    // density matrices have shape (ndm, nbasis, nbasis), the outputs have
+    // shape (ndm, npoint, dim_output) and dmmaxrows has shape (ndm, nbasis).
+    const long nbasis = get_nbasis();
+    const long nblock = (npoint + grid_block_size - 1)/grid_block_size;
+    std::vector<long> order(npoint);
+    sort_grid_points(npoint, points, &order[0]);
+#pragma omp parallel num_threads(get_nthreads())
+    {
+        GB1DMGridFn* thread_fn = (omp_get_thread_num() == 0) ? grid_fn : grid_fn->clone();
+        const long dim_output = thread_fn->get_dim_output();
+
+        // Work arrays for the basis functions in a block of points, the
+        // corresponding part of the density matrix and intermediate results.
+        double* work_basis = new double[thread_fn->get_dim_work()*grid_block_size*nbasis];
+        double* work_dm = new double[nbasis*nbasis];
+        double* work_dmmaxrow = new double[nbasis];
+        double* work = new double[grid_block_size*nbasis];
+        double* work_points = new double[3*grid_block_size];
+        double* work_output = new double[grid_block_size*dim_output];
+        long* ibasis_sig = new long[nbasis];
+
+#pragma omp for schedule(dynamic)
+        for (long iblock=0; iblock<nblock; iblock++) {
+            const long begin = iblock*grid_block_size;
+            const long size = std::min(grid_block_size, npoint - begin);
+
+            // A) evaluate the significant basis functions in the block.
+            gather_grid_points(size, points, &order[begin], work_points);
+            const long nsig = compute_grid_block1(work_basis, size, work_points, thread_fn, ibasis_sig);
+            if (nsig == 0) continue;
+
+            for (long idm=0; idm<ndm; idm++) {
+                const double* dm = dms + idm*nbasis*nbasis;
+                const double* dmmaxrow = dmmaxrows + idm*nbasis;
+
+                // B) take the relevant part of the density matrix.
+                for (long isig0=0; isig0<nsig; isig0++) {
+                    for (long isig1=0; isig1<nsig; isig1++) {
+                        work_dm[isig0*nsig + isig1] = dm[ibasis_sig[isig0]*nbasis + ibasis_sig[isig1]];
+                    }
+                    work_dmmaxrow[isig0] = dmmaxrow[ibasis_sig[isig0]];
+                }
+
+                // C) Use the basis function results and the density matrix to evaluate
+                // the function in the block of points. The result is added to the output.
+                memset(work_output, 0, size*dim_output*sizeof(double));
+                thread_fn->compute_block_from_dm(work_basis, size, nsig, work_dm, work, work_output, epsilon, work_dmmaxrow);
+                double* output = outputs + idm*npoint*dim_output;
+                for (long ipoint=0; ipoint<size; ipoint++) {
+                    for (long i=0; i<dim_output; i++) {
+                        output[order[begin + ipoint]*dim_output + i] += work_output[ipoint*dim_output + i];
+                    }
+                }
+            }
+        }
 
-        // D) Prepare for next iteration
-        output += dim_output;
-        points += 3;
+        delete[] work_basis;
+        delete[] work_dm;
+        delete[] work_dmmaxrow;
+        delete[] work;
+        delete[] work_points;
+        delete[] work_output;
+        delete[] ibasis_sig;
+        if (thread_fn != grid_fn) delete thread_fn;
     }
-
-    delete[] work_basis;
 }
 
 void GOBasis::compute_grid2_dm(double* dm, long npoint, double* points, double* output) {
     // For the moment, it is only possible to compute the Hartree potential on
     // a grid with this routine. Generalizations with electrical field and
     // other things are for later.
-    GB2DMGridHartreeFn grid_fn = GB2DMGridHartreeFn(get_max_shell_type());
 
-    for (long ipoint=0; ipoint<npoint; ipoint++) {
-        *output += compute_grid_point2(dm, points, &grid_fn);
-        output++;
-        points += 3;
+    // Only pairs of shells that overlap somewhere in space contribute, i.e.
+    // when the distance between their centers is below the sum of their
+    // extents. This is an approximation: the extents are the radii beyond
+    // which the shells drop below grid_basis_tolerance, so the neglected
+    // products are bounded by roughly grid_basis_tolerance.
+    std::vector<long> pairs;
+    for (long ishell0=0; ishell0<nshell; ishell0++) {
+        const double* r0 = centers + 3*shell_map[ishell0];
+        for (long ishell1=0; ishell1<=ishell0; ishell1++) {
+            const double* r1 = centers + 3*shell_map[ishell1];
+            if (sqrt(dist_sq(r0, r1)) < get_shell_extents()[ishell0] + get_shell_extents()[ishell1]) {
+                pairs.push_back(ishell0);
+                pairs.push_back(ishell1);
+            }
+        }
+    }
+    const long npair = pairs.size()/2;
+
+#pragma omp parallel num_threads(get_nthreads())
+    {
+        GB2DMGridHartreeFn grid_fn = GB2DMGridHartreeFn(get_max_shell_type());
+        IterGB2 iter = IterGB2(this);
+
+#pragma omp for schedule(static)
+        for (long ipoint=0; ipoint<npoint; ipoint++) {
+            double result = 0.0;
+            for (long ipair=0; ipair<npair; ipair++) {
+                iter.set_shell(pairs[2*ipair], pairs[2*ipair + 1]);
+                grid_fn.reset(iter.shell_type0, iter.shell_type1, iter.r0, iter.r1, points + 3*ipoint);
+                iter.update_prim();
+                do {
+                    grid_fn.add(iter.con_coeff, iter.alpha0, iter.alpha1, iter.scales0, iter.scales1);
+                } while (iter.inc_prim());
+                grid_fn.cart_to_pure();
+                result += iter.dot(grid_fn.get_work(), dm);
+            }
+            output[ipoint] += result;
+        }
     }
 }
 
 void GOBasis::compute_grid1_fock(long npoint, double* points, double* weights, long pot_stride, double* pots, GB1DMGridFn* grid_fn, double* output) {
-    // The work array contains the basis functions evaluated at the grid point,
-    // and optionally some of its derivatives.
-    long nwork = get_nbasis()*grid_fn->get_dim_work();
-    double* work_basis = new double[nwork];
-    long dim_output = grid_fn->get_dim_output();
-    double* work_pot = new double[dim_output];
-
-    for (long ipoint=0; ipoint<npoint; ipoint++) {
-        // A) clear the work array.
-        memset(work_basis, 0, nwork*sizeof(double));
-
-        // B) evaluate the basis functions in the current point.
-        compute_grid_point1(work_basis, points, grid_fn);
+    // With more than one thread, every thread accumulates its contributions in
+    // a private operator. These are added to the output in a fixed order, such
+    // that the result is reproducible for a given number of threads. Different
+    // numbers of threads sum the points in a different order, so the results
+    // may differ by rounding errors.
+    const long nbasis = get_nbasis();
+    const long nblock = (npoint + grid_block_size - 1)/grid_block_size;
+    std::vector<long> order(npoint);
+    sort_grid_points(npoint, points, &order[0]);
+    double* work_fock = NULL;
+    if (get_nthreads() > 1) {
+        work_fock = new double[get_nthreads()*nbasis*nbasis];
+        memset(work_fock, 0, get_nthreads()*nbasis*nbasis*sizeof(double));
+    }
 
-        // C) Add the contribution from this grid point to the operator
-        for (long i=dim_output-1; i>=0; i--) {
-            work_pot[i] = (*weights)*pots[i];
+#pragma omp parallel num_threads(get_nthreads())
+    {
+        const long ithread = omp_get_thread_num();
+        GB1DMGridFn* thread_fn = (ithread == 0) ? grid_fn : grid_fn->clone();
+        double* thread_output = (work_fock == NULL) ? output : work_fock + ithread*nbasis*nbasis;
+        const long dim_output = thread_fn->get_dim_output();
+
+        // Work arrays for the basis functions in a block of points, the
+        // weighted potential, the contribution to the operator from the
+        // significant basis functions and intermediate results.
+        double* work_basis = new double[thread_fn->get_dim_work()*grid_block_size*nbasis];
+        double* work_pot = new double[grid_block_size*dim_output];
+        double* work_block = new double[nbasis*nbasis];
+        double* work = new double[grid_block_size*nbasis];
+        double* work_points = new double[3*grid_block_size];
+        long* ibasis_sig = new long[nbasis];
+
+#pragma omp for schedule(static)
+        for (long iblock=0; iblock<nblock; iblock++) {
+            const long begin = iblock*grid_block_size;
+            const long size = std::min(grid_block_size, npoint - begin);
+
+            // A) evaluate the significant basis functions in the block.
+            gather_grid_points(size, points, &order[begin], work_points);
+            const long nsig = compute_grid_block1(work_basis, size, work_points, thread_fn, ibasis_sig);
+            if (nsig == 0) continue;
+
+            // B) multiply the potential with the integration weights.
+            for (long ipoint=0; ipoint<size; ipoint++) {
+                const long jpoint = order[begin + ipoint];
+                for (long i=0; i<dim_output; i++) {
+                    work_pot[ipoint*dim_output + i] = weights[jpoint]*pots[jpoint*pot_stride + i];
+                }
+            }
+
+            // C) compute the contribution from this block and add it to the
+            // operator. The result is symmetrized to remove rounding errors.
+            memset(work_block, 0, nsig*nsig*sizeof(double));
+            thread_fn->compute_fock_from_block(work_pot, work_basis, size, nsig, work, work_block);
+            for (long isig0=0; isig0<nsig; isig0++) {
+                for (long isig1=0; isig1<nsig; isig1++) {
+                    thread_output[ibasis_sig[isig0]*nbasis + ibasis_sig[isig1]] +=
+                        0.5*(work_block[isig0*nsig + isig1] + work_block[isig1*nsig + isig0]);
+                }
+            }
         }
-        grid_fn->compute_fock_from_pot(work_pot, work_basis, get_nbasis(), output);
 
-        // D) Prepare for next iteration
-        points += 3;
-        weights++;
-        pots += pot_stride;
+        delete[] work_basis;
+        delete[] work_pot;
+        delete[] work_block;
+        delete[] work;
+        delete[] work_points;
+        delete[] ibasis_sig;
+        if (thread_fn != grid_fn) delete thread_fn;
     }
 
-    delete[] work_basis;
-    delete[] work_pot;
+    if (work_fock != NULL) {
+        for (long ithread=0; ithread<get_nthreads(); ithread++) {
+            for (long i=0; i<nbasis*nbasis; i++) {
+                output[i] += work_fock[ithread*nbasis*nbasis + i];
+            }
+        }
+        delete[] work_fock;
+    }
 }
@@ -23,6 +23,7 @@
 #ifndef HORTON_GBASIS_GBASIS_H
 #define HORTON_GBASIS_GBASIS_H
 
+#include <cstddef>
 #include "horton/gbasis/ints.h"
 #include "horton/gbasis/fns.h"
 
@@ -39,8 +40,10 @@ class GBasis {
         long* scales_offsets;
         long* shell_lookup;
         double* scales; // pre-computed normalization constants.
+        double* shell_extents; // radii beyond which the shells are negligible.
         long nbasis, nscales;
         long max_shell_type;
+        long nthreads; // number of threads used by the compute routines.
 
     public:
         // Arrays that fully describe the basis set.
@@ -58,18 +61,32 @@ class GBasis {
         virtual ~GBasis();
         virtual const double normalization(const double alpha, const long* n) const =0;
         void init_scales();
+        void init_shell_extents();
         void compute_two_index(double* output, GB2Integral* integral);
-        void compute_four_index(double* output, GB4Integral* integral);
+        void compute_four_index(double* output, GB4Integral* integral,
+                                const double* schwarz=NULL, double threshold=0.0,
+                                long* nquartet=NULL);
+        void compute_schwarz(double* output, GB4Integral* integral);
+        void compute_four_index_dm(const double* dm, double* coulomb, double* exchange,
+                                   GB4Integral* integral, const double* schwarz=NULL,
+                                   const double* dmmax=NULL, double threshold=0.0,
+                                   long* nquartet=NULL);
+        void compute_shell_dmmax(const double* dm, double* output);
         void compute_grid_point1(double* output, double* point, GB1GridFn* grid_fn);
+        long compute_grid_block1(double* output, long npoint, const double* points,
+                                 GB1GridFn* grid_fn, long* ibasis_sig);
         double compute_grid_point2(double* dm, double* point, GB2DMGridFn* grid_fn);
 
         const long get_nbasis() const {return nbasis;};
         const long get_nscales() const {return nscales;};
         const long get_max_shell_type() const {return max_shell_type;};
+        const long get_nthreads() const {return nthreads;};
+        void set_nthreads(long _nthreads);
         const long* get_basis_offsets() const {return basis_offsets;};
         const long* get_prim_offsets() const {return prim_offsets;};
         const long* get_shell_lookup() const {return shell_lookup;};
         const double* get_scales(long iprim) const {return scales + scales_offsets[iprim];};
+        const double* get_shell_extents() const {return shell_extents;};
     };
 
 
@@ -84,9 +101,15 @@ class GOBasis : public GBasis {
         void compute_overlap(double* output);
         void compute_kinetic(double* output);
         void compute_nuclear_attraction(double* charges, double* centers, long ncharge, double* output);
-        void compute_electron_repulsion(double* output);
+        void compute_electron_repulsion(double* output, const double* schwarz=NULL,
+                                        double threshold=0.0, long* nquartet=NULL);
+        void compute_electron_repulsion_schwarz(double* output);
+        void compute_electron_repulsion_dm(const double* dm, double* coulomb, double* exchange,
+                                           const double* schwarz=NULL, double threshold=0.0,
+                                           long* nquartet=NULL);
         void compute_grid1_exp(long nfn, double* coeffs, long npoint, double* points, long norb, long* iorbs, double* output);
         void compute_grid1_dm(double* dm, long npoint, double* points, GB1DMGridFn* grid_fn, double* output, double epsilon, double* dmmaxrow);
+        void compute_grid1_dms(long ndm, double* dms, long npoint, double* points, GB1DMGridFn* grid_fn, double* outputs, double epsilon, double* dmmaxrows);
         void compute_grid2_dm(double* dm, long npoint, double* points, double* output);
         void compute_grid1_fock(long npoint, double* points, double* weights, long pot_stride, double* pots, GB1DMGridFn* grid_fn, double* output);
     };
@@ -40,6 +40,8 @@ cdef extern from "horton/gbasis/gbasis.h":
         long get_nbasis()
         long get_nscales()
         long get_max_shell_type()
+        long get_nthreads()
+        void set_nthreads(long nthreads) except +
         double* get_scales(long iprim)
         long* get_shell_lookup()
         long* get_basis_offsets()
@@ -56,8 +58,11 @@ cdef extern from "horton/gbasis/gbasis.h":
         void compute_overlap(double* output)
         void compute_kinetic(double* output)
         void compute_nuclear_attraction(double* charges, double* centers, long ncharge, double* output)
-        void compute_electron_repulsion(double* output)
+        void compute_electron_repulsion(double* output, double* schwarz, double threshold, long* nquartet)
+        void compute_electron_repulsion_schwarz(double* output)
+        void compute_electron_repulsion_dm(double* dm, double* coulomb, double* exchange, double* schwarz, double threshold, long* nquartet)
         void compute_grid1_exp(long nfn, double* coeffs, long npoint, double* points, long norb, long* iorbs, double* output)
         void compute_grid1_dm(double* dm, long npoint, double* points, fns.GB1DMGridFn* grid_fn, double* output, double epsilon, double* dmmaxrow)
+        void compute_grid1_dms(long ndm, double* dms, long npoint, double* points, fns.GB1DMGridFn* grid_fn, double* outputs, double epsilon, double* dmmaxrows)
         void compute_grid2_dm(double* dm, long npoint, double* points, double* output)
         void compute_grid1_fock(long npoint, double* points, double* weights, long pot_stride, double* pots, fns.GB1DMGridFn* grid_fn, double* output)
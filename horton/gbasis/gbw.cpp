@@ -19,11 +19,20 @@
 //--
 
 
+#include <cmath>
+#include <cstring>
+#include <stdexcept>
 #include "horton/gbasis/gbw.h"
 #include "horton/gbasis/common.h"
 
+#ifdef _OPENMP
+#include <omp.h>
+#else
+inline int omp_get_thread_num() {return 0;}
+#endif
+
 GB4IntegralWrapper::GB4IntegralWrapper(GOBasis* gobasis, GB4Integral* gb4int) :
-    gobasis(gobasis), gb4int(gb4int)
+    gobasis(gobasis), have_schwarz(false)
 {
   max_shell_size = get_shell_nbasis(gobasis->get_max_shell_type());
   slice_size = gobasis->get_nbasis()*gobasis->get_nbasis();
@@ -34,16 +43,27 @@ GB4IntegralWrapper::GB4IntegralWrapper(GOBasis* gobasis, GB4Integral* gb4int) :
        - The size of a 2-index object is nbasis*nbasis.
   */
   integrals = new double[max_shell_size*max_shell_size*slice_size];
+  schwarz = new double[gobasis->nshell*gobasis->nshell];
+  // The first thread uses the given integral object, the others a clone.
+  gb4ints.push_back(gb4int);
+  for (long ithread = 1; ithread < gobasis->get_nthreads(); ithread++) {
+    gb4ints.push_back(gb4int->clone());
+  }
 }
 
 GB4IntegralWrapper::~GB4IntegralWrapper() {
   delete[] integrals;
+  delete[] schwarz;
+  for (size_t ithread = 1; ithread < gb4ints.size(); ithread++) {
+    delete gb4ints[ithread];
+  }
 }
 
-void GB4IntegralWrapper::compute_shell(long ishell1, long ishell3)
+void GB4IntegralWrapper::compute_shell(GB4Integral* gb4int, long ishell0,
+    long ishell1, long ishell2, long ishell3)
 {
   // Configure the four-center integral with the right input for this
-  // quadruple of shells. (index0 and index2 are fixed.)
+  // quadruple of shells.
   gb4int->reset(gobasis->shell_types[ishell0], gobasis->shell_types[ishell1],
                 gobasis->shell_types[ishell2], gobasis->shell_types[ishell3],
                 gobasis->centers + gobasis->shell_map[ishell0]*3, gobasis->centers + gobasis->shell_map[ishell1]*3,
@@ -90,28 +110,59 @@ void GB4IntegralWrapper::select_2index(long index0, long index2,
   *pend2 = *pbegin2 + get_shell_nbasis(gobasis->shell_types[ishell2]);
 }
 
-void GB4IntegralWrapper::compute() {
+long GB4IntegralWrapper::compute(double schwarz_threshold) {
+  if ((schwarz_threshold > 0) && !have_schwarz) {
+    throw std::logic_error("The Schwarz screening requires a call to compute_diagonal first.");
+  }
+  const long nshell = gobasis->nshell;
+  const long nbasis = gobasis->get_nbasis();
+  const long n0 = get_shell_nbasis(gobasis->shell_types[ishell0]);
+  const long n2 = get_shell_nbasis(gobasis->shell_types[ishell2]);
+  long nskip = 0;
   // Double loop over second and fourth shell of the four-index object. The
   // entire range over these two indexes is included in the 2-index slices.
-  for (long ishell1 = 0; ishell1 < gobasis->nshell; ishell1++) {
-    for (long ishell3 = 0; ishell3 < gobasis->nshell; ishell3++) {
+  // Both loops are merged into one, such that the work can be distributed
+  // over the threads.
+#pragma omp parallel num_threads(gb4ints.size()) reduction(+:nskip)
+  {
+    GB4Integral* gb4int = gb4ints[omp_get_thread_num()];
+#pragma omp for schedule(dynamic)
+    for (long ipair = 0; ipair < nshell*nshell; ipair++) {
+      const long ishell1 = ipair/nshell;
+      const long ishell3 = ipair%nshell;
+      const long n1 = get_shell_nbasis(gobasis->shell_types[ishell1]);
+      const long n3 = get_shell_nbasis(gobasis->shell_types[ishell3]);
+      const long offset1 = gobasis->get_basis_offsets()[ishell1];
+      const long offset3 = gobasis->get_basis_offsets()[ishell3];
+
+      // Skip negligible combinations of shells. The pair of the selected
+      // shells itself is always computed, as it contains the pivots.
+      if ((schwarz_threshold > 0) && ((ishell1 != ishell0) || (ishell3 != ishell2)) &&
+          (schwarz[ishell0*nshell + ishell2]*schwarz[ipair] < schwarz_threshold)) {
+        for (long i0=0; i0<n0; i0++) {
+          for (long i2=0; i2<n2; i2++) {
+            for (long i1=0; i1<n1; i1++) {
+              memset(integrals + ((i0)*max_shell_size + i2)*slice_size +
+                     (i1+offset1)*nbasis + offset3, 0, n3*sizeof(double));
+            }
+          }
+        }
+        nskip++;
+        continue;
+      }
+
       // Compute integrals for the given combination of shells.
-      compute_shell(ishell1, ishell3);
+      compute_shell(gb4int, ishell0, ishell1, ishell2, ishell3);
 
       // Copy data from work array to ``integrals``, the temporary storage of
       // this wrapper.
       const double* tmp = gb4int->get_work();
-      const long n0 = get_shell_nbasis(gobasis->shell_types[ishell0]);
-      const long n1 = get_shell_nbasis(gobasis->shell_types[ishell1]);
-      const long n2 = get_shell_nbasis(gobasis->shell_types[ishell2]);
-      const long n3 = get_shell_nbasis(gobasis->shell_types[ishell3]);
       for (long i0=0; i0<n0; i0++) {
         for (long i1=0; i1<n1; i1++) {
           for (long i2=0; i2<n2; i2++) {
             for (long i3=0; i3<n3; i3++) {
               integrals[((i0)*max_shell_size + i2)*slice_size +
-                        (i1+gobasis->get_basis_offsets()[ishell1])*gobasis->get_nbasis() +
-                        (i3+gobasis->get_basis_offsets()[ishell3])] = *tmp;
+                        (i1+offset1)*nbasis + (i3+offset3)] = *tmp;
               tmp++;
             }
           }
@@ -119,30 +170,41 @@ void GB4IntegralWrapper::compute() {
       }
     }
   }
+  return nskip;
 }
 
 void GB4IntegralWrapper::compute_diagonal(double* diagonal) {
+  const long nshell = gobasis->nshell;
+  const long nbasis = gobasis->get_nbasis();
   // Double loop over second and fourth shell of the four-index object. The
   // entire range over these two indexes is included in the 2-index slices.
-  for (long ishell1 = 0; ishell1 < gobasis->nshell; ishell1++) {
-    for (long ishell3 = 0; ishell3 < gobasis->nshell; ishell3++) {
+#pragma omp parallel num_threads(gb4ints.size())
+  {
+    GB4Integral* gb4int = gb4ints[omp_get_thread_num()];
+#pragma omp for schedule(dynamic)
+    for (long ipair = 0; ipair < nshell*nshell; ipair++) {
+      const long ishell1 = ipair/nshell;
+      const long ishell3 = ipair%nshell;
       // Compute integrals for the given combination of shells.
-      ishell0 = ishell1;
-      ishell2 = ishell3;
-      compute_shell(ishell1, ishell3);
+      compute_shell(gb4int, ishell1, ishell1, ishell3, ishell3);
 
       // copy data from work array to the output array.
       const double* tmp = gb4int->get_work();
       const long n1 = get_shell_nbasis(gobasis->shell_types[ishell1]);
       const long n3 = get_shell_nbasis(gobasis->shell_types[ishell3]);
+      double maxdiag = 0.0;
       for (long i1=0; i1<n1; i1++) {
         for (long i3=0; i3<n3; i3++) {
-          diagonal[(i1+gobasis->get_basis_offsets()[ishell1])*gobasis->get_nbasis() +
-                   (i3+gobasis->get_basis_offsets()[ishell3])] = tmp[(n1*i1+i1)*n3*n3 + n3*i3+i3];
+          const double value = tmp[(n1*i1+i1)*n3*n3 + n3*i3+i3];
+          diagonal[(i1+gobasis->get_basis_offsets()[ishell1])*nbasis +
+                   (i3+gobasis->get_basis_offsets()[ishell3])] = value;
+          if (value > maxdiag) maxdiag = value;
         }
       }
+      schwarz[ipair] = sqrt(maxdiag);
     }
   }
+  have_schwarz = true;
 }
 
 double* GB4IntegralWrapper::get_2index_slice(long index0, long index2) {
@@ -23,6 +23,7 @@
 #ifndef GBW_H
 #define GBW_H
 
+#include <vector>
 #include "horton/gbasis/gbasis.h"
 #include "horton/gbasis/ints.h"
 
@@ -30,14 +31,20 @@
     @brief
         A wrapper around a four-center integral implementation that is suitable
         for a Cholesky algorithm.
+
+    The slices are computed with as many threads as set in the Gaussian basis.
+    Every thread beyond the first one works with a clone of the four-center
+    integral given to the constructor.
 */
 class GB4IntegralWrapper {
     private:
         GOBasis* gobasis;
-        GB4Integral* gb4int;
+        std::vector<GB4Integral*> gb4ints; // one integral object per thread
         long max_shell_size;
         long slice_size;
         double* integrals;
+        double* schwarz; // Schwarz bounds for all pairs of shells (nshell*nshell)
+        bool have_schwarz;
 
         long ishell0;
         long ishell2;
@@ -48,8 +55,13 @@ class GB4IntegralWrapper {
             @brief
                 Compute four-center integrals for a quadruplet of shells
                 (defined by ishell0, ishell1, ishell2 and ishell3).
+
+            @param gb4int
+                The integral object used for the computation. The result is
+                stored in its work array.
         */
-        void compute_shell(long ishell1, long ishell3);
+        void compute_shell(GB4Integral* gb4int, long ishell0, long ishell1,
+                           long ishell2, long ishell3);
     public:
         /**
             @brief
@@ -107,13 +119,25 @@ class GB4IntegralWrapper {
             @brief
                 Compute four-center integrals for the slices selected with
                 the select_2index method.
+
+            @param schwarz_threshold
+                When strictly positive, the integrals for pairs of shells
+                (ishell1, ishell3) whose Schwarz bound, combined with that of
+                the selected pair, falls below this threshold are not computed
+                and set to zero instead. This requires a prior call to
+                compute_diagonal.
+
+            @return
+                The number of pairs of shells that were skipped.
         */
-        void compute();
+        long compute(double schwarz_threshold=0.0);
 
         /**
             @brief
                 Compute the (double) diagonal of the four-index object. This
                 is usually needed in the initialization of a Cholesky algorithm.
+                As a by-product, the Schwarz bounds of all pairs of shells are
+                stored for the screening in the compute method.
 
             @param diagonal
                 The output array to which the result is written
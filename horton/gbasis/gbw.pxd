@@ -28,6 +28,6 @@ cdef extern from "horton/gbasis/gbw.h":
         void select_2index(long index0, long index2,
                             long* pbegin0, long* pend0,
                             long* pbegin2, long* pend2)
-        void compute()
+        long compute(double schwarz_threshold) except +
         void compute_diagonal(double* diagonal)
         double* get_2index_slice(long index0, long index2)
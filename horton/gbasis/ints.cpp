@@ -378,6 +378,10 @@ GB4ElectronRepulsionIntegralLibInt::~GB4ElectronRepulsionIntegralLibInt() {
     libint2_cleanup_eri(&erieval);
 }
 
+GB4Integral* GB4ElectronRepulsionIntegralLibInt::clone() const {
+    return new GB4ElectronRepulsionIntegralLibInt(max_shell_type);
+}
+
 void GB4ElectronRepulsionIntegralLibInt::reset(
     long _shell_type0, long _shell_type1, long _shell_type2, long _shell_type3,
     const double* _r0, const double* _r1, const double* _r2, const double* _r3)
@@ -82,6 +82,7 @@ class GB4Integral : public GBCalculator {
         GB4Integral(long max_shell_type);
         virtual void reset(long shell_type0, long shell_type1, long shell_type2, long shell_type3, const double* r0, const double* r1, const double* r2, const double* r3);
         virtual void add(double coeff, double alpha0, double alpha1, double alpha2, double alpha3, const double* scales0, const double* scales1, const double* scales2, const double* scales3) = 0;
+        virtual GB4Integral* clone() const = 0; // a new object of the same kind, to be deleted by the caller
         void cart_to_pure();
 
         const long get_shell_type0() const {return shell_type0;};
@@ -107,6 +108,7 @@ class GB4ElectronRepulsionIntegralLibInt : public GB4Integral {
     public:
         GB4ElectronRepulsionIntegralLibInt(long max_shell_type);
         ~GB4ElectronRepulsionIntegralLibInt();
+        virtual GB4Integral* clone() const;
         virtual void reset(long shell_type0, long shell_type1, long shell_type2, long shell_type3, const double* r0, const double* r1, const double* r2, const double* r3);
         virtual void add(double coeff, double alpha0, double alpha1, double alpha2, double alpha3, const double* scales0, const double* scales1, const double* scales2, const double* scales3);
     };
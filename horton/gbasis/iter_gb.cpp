@@ -72,6 +72,14 @@ void IterGB1::update_shell() {
 }
 
 
+void IterGB1::set_shell(long _ishell0) {
+    // Jump to an arbitrary shell, e.g. to skip insignificant shells.
+    ishell0 = _ishell0;
+    oprim0 = gbasis->get_prim_offsets()[ishell0];
+    update_shell();
+}
+
+
 int IterGB1::inc_prim() {
     // Increment primitive counters.
     if (iprim0 < nprim0-1) {
@@ -165,6 +173,17 @@ void IterGB2::update_shell() {
 }
 
 
+void IterGB2::set_shell(long _ishell0, long _ishell1) {
+    // Jump to an arbitrary pair of shells, e.g. to distribute the work over
+    // threads.
+    ishell0 = _ishell0;
+    ishell1 = _ishell1;
+    oprim0 = gbasis->get_prim_offsets()[ishell0];
+    oprim1 = gbasis->get_prim_offsets()[ishell1];
+    update_shell();
+}
+
+
 int IterGB2::inc_prim() {
     // Increment primitive counters.
     if (iprim1 < nprim1-1) {
@@ -360,6 +379,21 @@ void IterGB4::update_shell() {
 }
 
 
+void IterGB4::set_shell(long _ishell0, long _ishell1, long _ishell2, long _ishell3) {
+    // Jump to an arbitrary quartet of shells, e.g. to distribute the work over
+    // threads.
+    ishell0 = _ishell0;
+    ishell1 = _ishell1;
+    ishell2 = _ishell2;
+    ishell3 = _ishell3;
+    oprim0 = gbasis->get_prim_offsets()[ishell0];
+    oprim1 = gbasis->get_prim_offsets()[ishell1];
+    oprim2 = gbasis->get_prim_offsets()[ishell2];
+    oprim3 = gbasis->get_prim_offsets()[ishell3];
+    update_shell();
+}
+
+
 int IterGB4::inc_prim() {
     // Increment primitive counters.
     if (iprim3 < nprim3-1) {
@@ -442,3 +476,50 @@ void IterGB4::store(const double *work, double *output) {
         }
     }
 }
+
+void IterGB4::contract_dm(const double* work, const double* dm, double* coulomb, double* exchange) {
+    // The contributions of all elements of the dense four-index object that
+    // are equivalent to the current block are added to the Coulomb
+    // (<ab|cd> D_bd -> J_ac) and exchange (<ab|cd> D_cb -> K_ad) matrices.
+    // Permutations that map the current quartet of shells onto itself or onto
+    // a block that was already treated are skipped, such that every element
+    // of the four-index object is included exactly once.
+    static const long perms[8][4] = {
+        {0, 1, 2, 3}, {1, 0, 3, 2}, {2, 3, 0, 1}, {3, 2, 1, 0},
+        {0, 3, 2, 1}, {1, 2, 3, 0}, {2, 1, 0, 3}, {3, 0, 1, 2}};
+    const long ishells[4] = {ishell0, ishell1, ishell2, ishell3};
+    const long ibasis[4] = {ibasis0, ibasis1, ibasis2, ibasis3};
+    const long n[4] = {get_shell_nbasis(shell_type0), get_shell_nbasis(shell_type1),
+                       get_shell_nbasis(shell_type2), get_shell_nbasis(shell_type3)};
+    const long nbasis = gbasis->get_nbasis();
+    for (long iperm=0; iperm<8; iperm++) {
+        const long* p = perms[iperm];
+        bool duplicate = false;
+        for (long jperm=0; jperm<iperm; jperm++) {
+            const long* q = perms[jperm];
+            if ((ishells[p[0]] == ishells[q[0]]) && (ishells[p[1]] == ishells[q[1]]) &&
+                (ishells[p[2]] == ishells[q[2]]) && (ishells[p[3]] == ishells[q[3]])) {
+                duplicate = true;
+                break;
+            }
+        }
+        if (duplicate) continue;
+        const double* tmp = work;
+        long i[4];
+        for (i[0]=0; i[0]<n[0]; i[0]++) {
+            for (i[1]=0; i[1]<n[1]; i[1]++) {
+                for (i[2]=0; i[2]<n[2]; i[2]++) {
+                    for (i[3]=0; i[3]<n[3]; i[3]++) {
+                        const long a = ibasis[p[0]] + i[p[0]];
+                        const long b = ibasis[p[1]] + i[p[1]];
+                        const long c = ibasis[p[2]] + i[p[2]];
+                        const long d = ibasis[p[3]] + i[p[3]];
+                        if (coulomb != NULL) coulomb[a*nbasis + c] += (*tmp)*dm[b*nbasis + d];
+                        if (exchange != NULL) exchange[a*nbasis + d] += (*tmp)*dm[c*nbasis + b];
+                        tmp++;
+                    }
+                }
+            }
+        }
+    }
+}
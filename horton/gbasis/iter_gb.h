@@ -35,6 +35,7 @@ class IterGB1 {
 
         int inc_shell();
         void update_shell();
+        void set_shell(long ishell0);
         int inc_prim();
         void update_prim();
         void store(const double* work, double* output, long dim);
@@ -62,6 +63,7 @@ class IterGB2 {
 
         int inc_shell();
         void update_shell();
+        void set_shell(long ishell0, long ishell1);
         int inc_prim();
         void update_prim();
         void store(const double* work, double* output);
@@ -92,9 +94,11 @@ class IterGB4 {
 
         int inc_shell();
         void update_shell();
+        void set_shell(long ishell0, long ishell1, long ishell2, long ishell3);
         int inc_prim();
         void update_prim();
         void store(const double* work, double* output);
+        void contract_dm(const double* work, const double* dm, double* coulomb, double* exchange);
 
         // 'public' iterator fields
         long shell_type0, shell_type1, shell_type2, shell_type3;
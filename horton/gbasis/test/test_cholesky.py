@@ -20,15 +20,18 @@
 #--
 #pylint: skip-file
 
+import os
+
 import numpy as np
 from nose.tools import assert_raises
 
 from horton import *
+from horton.test.common import tmpdir
 
-def get_h2o_er(linalg_factory=DenseLinalgFactory):
+def get_h2o_er(linalg_factory=DenseLinalgFactory, stretch=1.0):
     fn = context.get_fn('test/water.xyz')
     mol = IOData.from_file(fn)
-    obasis = get_gobasis(mol.coordinates, mol.numbers, 'sto-3g')
+    obasis = get_gobasis(mol.coordinates*stretch, mol.numbers, 'sto-3g')
     lf = linalg_factory(obasis.nbasis)
     return obasis, obasis.compute_electron_repulsion(lf)._array
 
@@ -67,3 +70,33 @@ def test_cholesky_from_gbasis():
     test_er = np.einsum('kac,kbd->abcd', vecs, vecs)
 
     assert np.allclose(ref_er, test_er), abs(ref_er - test_er).max()
+
+def test_cholesky_schwarz():
+    # In a stretched molecule, the integrals between distant shells are
+    # negligible and they are skipped by the Schwarz screening.
+    obasis, ref_er = get_h2o_er(stretch=5.0)
+    schwarz_threshold = 1e-10
+    schwarz = obasis.compute_schwarz_bounds()
+    assert (np.outer(schwarz, schwarz) < schwarz_threshold).any()
+    vecs = compute_cholesky(obasis, schwarz_threshold=schwarz_threshold)
+    test_er = np.einsum('kac,kbd->abcd', vecs, vecs)
+    assert np.allclose(ref_er, test_er), abs(ref_er - test_er).max()
+
+def test_cholesky_threads():
+    obasis, ref_er = get_h2o_er()
+    vecs1 = compute_cholesky(obasis)
+    obasis.nthreads = 2
+    vecs2 = compute_cholesky(obasis)
+    assert vecs1.shape == vecs2.shape
+    assert abs(vecs1 - vecs2).max() < 1e-12
+
+def test_cholesky_dirname():
+    obasis, ref_er = get_h2o_er()
+    vecs1 = compute_cholesky(obasis)
+    with tmpdir('horton.gbasis.test.test_cholesky.test_cholesky_dirname') as dn:
+        vecs2 = compute_cholesky(obasis, dirname=dn, max_memory=8*obasis.nbasis**2*10)
+        assert isinstance(vecs2, np.memmap)
+        assert vecs1.shape == vecs2.shape
+        assert abs(vecs1 - vecs2).max() < 1e-12
+        # The temporary files are removed immediately.
+        assert os.listdir(dn) == []
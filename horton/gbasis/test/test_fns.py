@@ -184,6 +184,34 @@ def test_density_epsilon():
         assert ((rho2[mask] == 0.0) | (abs(rho1[mask]-rho2[mask]) < epsilon)).all()
 
 
+def test_grid_blocks():
+    # The results may not depend on the way the grid points are grouped in
+    # blocks, nor on the screening of basis functions in far away blocks.
+    fn_fchk = context.get_fn('test/n2_hfs_sto3g.fchk')
+    mol = IOData.from_file(fn_fchk)
+    grid = BeckeMolGrid(mol.coordinates, mol.numbers, mol.pseudo_numbers, random_rotate=False)
+    dm_full = mol.get_dm_full()
+    far = np.random.uniform(100, 101, (50, 3))
+    points = np.concatenate([grid.points, far])
+    permutation = np.random.permutation(len(points))
+    for compute in (mol.obasis.compute_grid_density_dm,
+                    mol.obasis.compute_grid_gradient_dm,
+                    mol.obasis.compute_grid_kinetic_dm):
+        result1 = compute(dm_full, points)
+        result2 = compute(dm_full, points[permutation])
+        assert abs(result1[permutation] - result2).max() < 1e-10
+        assert (result1[-len(far):] == 0.0).all()
+    pots = np.random.uniform(0, 1, len(points))
+    weights = np.concatenate([grid.weights, np.ones(len(far))])
+    fock1 = mol.lf.create_two_index()
+    mol.obasis.compute_grid_density_fock(points, weights, pots, fock1)
+    fock2 = mol.lf.create_two_index()
+    mol.obasis.compute_grid_density_fock(points[permutation], weights[permutation],
+                                         pots[permutation], fock2)
+    assert abs(fock1._array - fock2._array).max() < 1e-10
+    assert (fock1._array == fock1._array.T).all()
+
+
 def test_density_functional_deriv():
     fn_fchk = context.get_fn('test/n2_hfs_sto3g.fchk')
     mol = IOData.from_file(fn_fchk)
@@ -358,6 +386,39 @@ def test_gradient_functional_deriv():
     check_delta(fun, fun_deriv, x, dxs)
 
 
+def test_gga_dms_h3_321g():
+    fn_fchk = context.get_fn('test/h3_hfs_321g.fchk')
+    mol = IOData.from_file(fn_fchk)
+    obasis = mol.obasis
+    dm_alpha = mol.exp_alpha.to_dm()
+    dm_beta = mol.exp_beta.to_dm()
+    points = np.random.normal(0, 1, (200, 3))
+
+    output = obasis.compute_grid_gga_dms([dm_alpha, dm_beta], points)
+    assert output.shape == (2, 200, 4)
+    for i, dm in enumerate([dm_alpha, dm_beta]):
+        rho = obasis.compute_grid_density_dm(dm, points)
+        grad = obasis.compute_grid_gradient_dm(dm, points)
+        assert abs(output[i,:,0] - rho).max() < 1e-10
+        assert abs(output[i,:,1:] - grad).max() < 1e-10
+
+
+def test_gga_fock_h3_321g():
+    fn_fchk = context.get_fn('test/h3_hfs_321g.fchk')
+    mol = IOData.from_file(fn_fchk)
+    obasis = mol.obasis
+    points = np.random.normal(0, 1, (200, 3))
+    weights = np.random.uniform(0, 1, 200)
+    pots = np.random.normal(0, 1, (200, 4))
+
+    fock1 = mol.lf.create_two_index()
+    obasis.compute_grid_density_fock(points, weights, pots[:,0].copy(), fock1)
+    obasis.compute_grid_gradient_fock(points, weights, pots[:,1:].copy(), fock1)
+    fock2 = mol.lf.create_two_index()
+    obasis.compute_grid_gga_fock(points, weights, pots, fock2)
+    assert abs(fock1._array - fock2._array).max() < 1e-10
+
+
 def check_orbitals(mol):
     points = np.array([
         [0.1, 0.3, 0.2],
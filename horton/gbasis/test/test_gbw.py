@@ -25,10 +25,10 @@ from nose.tools import assert_raises
 
 from horton import *
 
-def get_h2o_er():
+def get_h2o_er(stretch=1.0):
     fn = context.get_fn('test/water.xyz')
     mol = IOData.from_file(fn)
-    obasis = get_gobasis(mol.coordinates, mol.numbers, 'sto-3g')
+    obasis = get_gobasis(mol.coordinates*stretch, mol.numbers, 'sto-3g')
     lf = DenseLinalgFactory(obasis.nbasis)
     return obasis, obasis.compute_electron_repulsion(lf)._array
 
@@ -77,3 +77,18 @@ def test_get_2index_slice():
             get_2index_slice(obasis, index0, index2, test_slice)
             assert np.allclose(ref_slice, test_slice), (index0, index2,
                     ref_slice,test_slice)
+
+def test_get_2index_slice_schwarz():
+    # In a stretched molecule, the integrals between distant shells are
+    # negligible.
+    obasis, er = get_h2o_er(stretch=5.0)
+    schwarz_threshold = 1e-10
+    nskip = 0
+    for index0 in np.arange(obasis.nbasis):
+        for index2 in np.arange(obasis.nbasis):
+            ref_slice = er[index0,:,index2,:]
+            test_slice = np.zeros_like(ref_slice)
+            nskip += get_2index_slice(obasis, index0, index2, test_slice,
+                                      schwarz_threshold)
+            assert abs(ref_slice - test_slice).max() < schwarz_threshold
+    assert nskip > 0
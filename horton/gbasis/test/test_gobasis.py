@@ -498,6 +498,34 @@ def test_gobasis_output_args_grid_hartree_dm():
     assert (pots1 == pots2).all()
 
 
+def test_gobasis_grid_point_order():
+    # The grid points are sorted internally. The results must not depend on
+    # the order of the points.
+    mol = IOData.from_file(context.get_fn('test/water_hfs_321g.fchk'))
+    points = np.random.uniform(-5, 5, (300, 3))
+    perm = np.random.permutation(300)
+    dm_full = mol.get_dm_full()
+    iorbs = np.array([1, 3])
+
+    rhos1 = mol.obasis.compute_grid_density_dm(dm_full, points)
+    rhos2 = mol.obasis.compute_grid_density_dm(dm_full, points[perm])
+    assert abs(rhos1[perm] - rhos2).max() < 1e-10
+    orbs1 = mol.obasis.compute_grid_orbitals_exp(mol.exp_alpha, points, iorbs)
+    orbs2 = mol.obasis.compute_grid_orbitals_exp(mol.exp_alpha, points[perm], iorbs)
+    assert abs(orbs1[perm] - orbs2).max() < 1e-10
+    pots1 = mol.obasis.compute_grid_hartree_dm(dm_full, points)
+    pots2 = mol.obasis.compute_grid_hartree_dm(dm_full, points[perm])
+    assert abs(pots1[perm] - pots2).max() < 1e-10
+
+    weights = np.random.uniform(0, 1, 300)
+    pots = np.random.normal(0, 1, 300)
+    fock1 = mol.lf.create_two_index()
+    mol.obasis.compute_grid_density_fock(points, weights, pots, fock1)
+    fock2 = mol.lf.create_two_index()
+    mol.obasis.compute_grid_density_fock(points[perm], weights[perm], pots[perm], fock2)
+    assert abs(fock1._array - fock2._array).max() < 1e-10
+
+
 def test_subset_simple():
     mol = IOData.from_file(context.get_fn('test/water_hfs_321g.fchk'))
     # select a basis set for the first hydrogen atom
@@ -562,3 +590,117 @@ def test_basis_atoms():
         icenter += 1
         ibasis_all.extend(ibasis_list)
     assert ibasis_all == range(mol.obasis.nbasis)
+
+
+def test_gobasis_schwarz_bounds():
+    mol = IOData.from_file(context.get_fn('test/water.xyz'))
+    obasis = get_gobasis(mol.coordinates, mol.numbers, '3-21g')
+    lf = DenseLinalgFactory(obasis.nbasis)
+    schwarz = obasis.compute_schwarz_bounds()
+    assert schwarz.shape == (obasis.nshell, obasis.nshell)
+    assert (schwarz == schwarz.T).all()
+    assert (schwarz > 0).all()
+    er = obasis.compute_electron_repulsion(lf)._array
+    # Expand the bounds to basis functions: |<ab|cd>| <= Q_ac Q_bd
+    q = schwarz[obasis.shell_lookup][:,obasis.shell_lookup]
+    bounds = np.einsum('ac,bd->abcd', q, q)
+    assert (abs(er) <= bounds*(1+1e-10)).all()
+    # The bounds are the largest diagonal elements of each block.
+    diag = np.sqrt(abs(np.einsum('aacc->ac', er)))
+    for ishell0 in xrange(obasis.nshell):
+        mask0 = obasis.shell_lookup == ishell0
+        for ishell1 in xrange(obasis.nshell):
+            mask1 = obasis.shell_lookup == ishell1
+            assert abs(diag[mask0][:,mask1].max() - schwarz[ishell0, ishell1]) < 1e-10
+
+
+def test_gobasis_electron_repulsion_schwarz():
+    mol = IOData.from_file(context.get_fn('test/water.xyz'))
+    obasis = get_gobasis(mol.coordinates, mol.numbers, '3-21g')
+    lf = DenseLinalgFactory(obasis.nbasis)
+    er_ref = obasis.compute_electron_repulsion(lf)._array
+    # A tiny threshold gives (nearly) identical results.
+    er1 = obasis.compute_electron_repulsion(lf, schwarz_threshold=1e-14)._array
+    assert abs(er1 - er_ref).max() < 1e-14
+    # Skipped integrals are zero and smaller than the threshold.
+    er2 = lf.create_four_index(obasis.nbasis)
+    er2._array[:] = np.nan
+    obasis.compute_electron_repulsion(er2, schwarz_threshold=1e-3)
+    assert not np.isnan(er2._array).any()
+    assert (er2._array == 0.0).sum() > (er_ref == 0.0).sum()
+    assert abs(er2._array - er_ref).max() < 1e-3
+    # The result must still have the eight-fold symmetry.
+    assert (er2._array == er2._array.transpose(1, 0, 3, 2)).all()
+    assert (er2._array == er2._array.transpose(2, 3, 0, 1)).all()
+    assert (er2._array == er2._array.transpose(0, 3, 2, 1)).all()
+
+
+def test_gobasis_electron_repulsion_dm():
+    mol = IOData.from_file(context.get_fn('test/water_hfs_321g.fchk'))
+    obasis = mol.obasis
+    er = obasis.compute_electron_repulsion(mol.lf)
+    dm = mol.get_dm_full()
+    coulomb1 = mol.lf.create_two_index()
+    exchange1 = mol.lf.create_two_index()
+    er.contract_two_to_two('abcd,bd->ac', dm, coulomb1)
+    er.contract_two_to_two('abcd,cb->ad', dm, exchange1)
+    coulomb2 = mol.lf.create_two_index()
+    exchange2 = mol.lf.create_two_index()
+    nquartet = obasis.compute_electron_repulsion_dm(dm, coulomb2, exchange2)
+    assert nquartet[1] == 0
+    assert abs(coulomb1._array - coulomb2._array).max() < 1e-10
+    assert abs(exchange1._array - exchange2._array).max() < 1e-10
+    # Only one of both operators
+    exchange3 = mol.lf.create_two_index()
+    obasis.compute_electron_repulsion_dm(dm, exchange=exchange3)
+    assert abs(exchange1._array - exchange3._array).max() < 1e-10
+    # A small threshold gives nearly identical results.
+    obasis.compute_electron_repulsion_dm(dm, coulomb2, exchange2, schwarz_threshold=1e-10)
+    assert abs(coulomb1._array - coulomb2._array).max() < 1e-8
+    assert abs(exchange1._array - exchange2._array).max() < 1e-8
+    # A huge threshold skips everything.
+    nquartet = obasis.compute_electron_repulsion_dm(dm, coulomb2, exchange2, schwarz_threshold=1e10)
+    assert nquartet[0] == 0
+    assert (coulomb2._array == 0.0).all()
+    assert (exchange2._array == 0.0).all()
+
+
+def test_gobasis_nthreads():
+    mol = IOData.from_file(context.get_fn('test/water_hfs_321g.fchk'))
+    obasis = mol.obasis
+    assert obasis.nthreads == 1
+    with assert_raises(ValueError):
+        obasis.nthreads = 0
+    lf = DenseLinalgFactory(obasis.nbasis)
+    dm_full = mol.get_dm_full()
+    points = np.random.uniform(-5, 5, (100, 3))
+    weights = np.random.uniform(0, 1, 100)
+    pots = np.random.uniform(-1, 1, 100)
+
+    def compute_all():
+        result = {}
+        result['olp'] = obasis.compute_overlap(lf)._array
+        result['kin'] = obasis.compute_kinetic(lf)._array
+        result['na'] = obasis.compute_nuclear_attraction(mol.coordinates, mol.pseudo_numbers, lf)._array
+        result['er'] = obasis.compute_electron_repulsion(lf)._array
+        result['er_schwarz'] = obasis.compute_electron_repulsion(lf, schwarz_threshold=1e-6)._array
+        result['schwarz'] = obasis.compute_schwarz_bounds()
+        result['orbs'] = obasis.compute_grid_orbitals_exp(mol.exp_alpha, points, np.array([2, 3]))
+        result['rho'] = obasis.compute_grid_density_dm(dm_full, points)
+        result['grad'] = obasis.compute_grid_gradient_dm(dm_full, points)
+        result['hartree'] = obasis.compute_grid_hartree_dm(dm_full, points)
+        fock = lf.create_two_index()
+        obasis.compute_grid_density_fock(points, weights, pots, fock)
+        result['fock'] = fock._array
+        return result
+
+    serial = compute_all()
+    obasis.nthreads = 4
+    assert obasis.nthreads == 4
+    parallel = compute_all()
+    for key, value in serial.iteritems():
+        if key == 'fock':
+            # Only a different order of summation in the reduction over points
+            assert abs(value - parallel[key]).max() < 1e-12
+        else:
+            assert (value == parallel[key]).all()
@@ -24,6 +24,7 @@
 from horton.grid.base import *
 from horton.grid.atgrid import *
 from horton.grid.cext import *
+from horton.grid.gridcache import *
 from horton.grid.int1d import *
 from horton.grid.molgrid import *
 from horton.grid.ode2 import *
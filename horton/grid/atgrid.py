@@ -40,7 +40,7 @@ __all__ = [
 
 
 class AtomicGrid(IntGrid):
-    def __init__(self, number, pseudo_number, center, agspec='medium', random_rotate=True, points=None):
+    def __init__(self, number, pseudo_number, center, agspec='medium', random_rotate=True, points=None, seed=None):
         '''
            **Arguments:**
 
@@ -68,6 +68,11 @@ class AtomicGrid(IntGrid):
 
            points
                 Array to store the grid points
+
+           seed
+                An integer seed for the random rotations. When given, the
+                random rotations are reproducible and the global state of
+                Numpy's random number generator is not used.
         '''
         self._number = number
         self._pseudo_number = pseudo_number
@@ -86,27 +91,20 @@ class AtomicGrid(IntGrid):
             assert len(points) == size
         weights = np.zeros(size, float)
 
-        # Fill the points and weights arrays
-        offset = 0
-        nsphere = len(self._nlls)
-        radii = self._rgrid.radii
-        rweights = self._rgrid.weights
-
-        for i in xrange(nsphere):
-            nll = self._nlls[i]
-            my_points = points[offset:offset+nll]
-            my_weights = weights[offset:offset+nll]
-
-            lebedev_laikov_sphere(my_points, my_weights)
-            my_points *= radii[i]
-            if self.random_rotate:
-                rotmat = get_random_rotation()
-                my_points[:] = np.dot(my_points, rotmat)
-            my_weights *= rweights[i]
-
-            offset += nll
-
-        points[:] += self.center
+        # Fill the points and weights arrays by scaling, rotating and
+        # translating the template for this radial grid and nlls.
+        directions, tweights, radii, spheres = _get_template(self._rgrid, self._nlls)
+        if self.random_rotate:
+            if seed is None:
+                rotmats = _get_random_rotations(len(self._nlls), np.random)
+            else:
+                rotmats = _get_random_rotations(len(self._nlls), np.random.RandomState(seed))
+            points[:] = np.einsum('ij,ijk->ik', directions, rotmats[spheres])
+        else:
+            points[:] = directions
+        points *= radii.reshape(-1, 1)
+        points += self.center
+        weights[:] = tweights
 
         IntGrid.__init__(self, points, weights)
         self._log_init()
@@ -300,6 +298,79 @@ def get_random_rotation():
     return get_rotation_matrix(axis, angle)
 
 
+def _get_random_rotations(nrot, rng):
+    '''Return an array with random rotation matrices, shape (nrot, 3, 3)
+
+       The rotations are generated in the same way as with
+       ``get_random_rotation``, using the given random number generator.
+    '''
+    # Get random unit vectors for the axes
+    axes = np.zeros((nrot, 3), float)
+    nfilled = 0
+    while nfilled < nrot:
+        trial = rng.uniform(-1, 1, (nrot - nfilled, 3))
+        norms = np.sqrt((trial**2).sum(axis=1))
+        trial = trial[(norms < 1.0) & (norms > 0.1)]
+        axes[nfilled:nfilled+len(trial)] = trial
+        nfilled += len(trial)
+    axes /= np.sqrt((axes**2).sum(axis=1)).reshape(-1, 1)
+
+    # Get random rotation angles
+    angles = rng.uniform(0, 2*np.pi, nrot)
+
+    # Rodrigues' rotation formula for all axes at once
+    x, y, z = axes.T
+    c = np.cos(angles)
+    s = np.sin(angles)
+    return np.array([
+        [x*x*(1-c)+c  , x*y*(1-c)-z*s, x*z*(1-c)+y*s],
+        [x*y*(1-c)+z*s, y*y*(1-c)+c  , y*z*(1-c)-x*s],
+        [x*z*(1-c)-y*s, y*z*(1-c)+x*s, z*z*(1-c)+c  ],
+    ]).transpose(2, 0, 1)
+
+
+_templates = {}
+
+
+def _get_template(rgrid, nlls):
+    '''Return a cached template of an atomic grid
+
+       **Arguments:**
+
+       rgrid
+            The radial grid.
+
+       nlls
+            The number of Lebedev-Laikov points on each sphere.
+
+       **Returns:** ``(directions, weights, radii, spheres)``. The directions
+       are unit vectors of the (unrotated) Lebedev-Laikov grids, the weights
+       are the final integration weights, the radii are the radii of the
+       corresponding spheres and spheres contains the index of the sphere of
+       each grid point. These arrays are read-only because they are shared by
+       all atomic grids with the same radial grid and nlls, i.e. by all atoms
+       of the same element with the same AtomicGridSpec.
+    '''
+    key = (rgrid.int1d.__class__.__name__, rgrid.rtransform.to_string(), tuple(nlls))
+    result = _templates.get(key)
+    if result is None:
+        size = nlls.sum()
+        directions = np.zeros((size, 3), float)
+        weights = np.zeros(size, float)
+        offset = 0
+        for nll in nlls:
+            lebedev_laikov_sphere(directions[offset:offset+nll], weights[offset:offset+nll])
+            offset += nll
+        spheres = np.repeat(np.arange(len(nlls)), nlls)
+        weights *= rgrid.weights[spheres]
+        radii = rgrid.radii[spheres]
+        result = directions, weights, radii, spheres
+        for array in result:
+            array.setflags(write=False)
+        _templates[key] = result
+    return result
+
+
 def _normalize_nlls(nlls, size):
     '''Make sure nlls is an array of the proper size'''
     if hasattr(nlls, '__iter__'):
@@ -26,7 +26,8 @@ import numpy as np
 from horton.log import timer
 from horton.grid.utils import parse_args_integrate
 from horton.grid.cext import dot_multi, eval_spline_grid, \
-    dot_multi_moments, eval_decomposition_grid
+    dot_multi_moments, eval_decomposition_grid, eval_splines_grid, \
+    eval_decompositions_grid
 from horton.cext import Cell
 
 
@@ -191,3 +192,71 @@ class IntGrid(object):
         if cell is None:
             cell = Cell(None)
         eval_decomposition_grid(cubic_splines, center, output, self.points, cell)
+
+    @timer.with_section('Eval spher')
+    def eval_splines(self, cubic_splines, centers, output, cell=None, binsize=2.0):
+        '''Evaluate the sum of many spherically symmetric functions
+
+           This is equivalent to calling ``eval_spline`` for each spline, but
+           all functions are evaluated at once. Grid points are grouped in
+           spatial bins, such that functions that do not reach a bin are
+           skipped.
+
+           **Arguments:**
+
+           cubic_splines
+                A list of cubic splines with the radial dependences
+
+           centers
+                The centers of the spherically symmetric functions, an array
+                with shape (len(cubic_splines), 3).
+
+           output
+                The output array
+
+           **Optional arguments:**
+
+           cell
+                A unit cell when periodic boundary conditions are used.
+
+           binsize
+                The edge of the cubic bins in which the grid points are
+                grouped.
+        '''
+        if cell is None:
+            cell = Cell(None)
+        eval_splines_grid(cubic_splines, centers, output, self.points, cell, binsize)
+
+    @timer.with_section('Eval decomp')
+    def eval_decompositions(self, decompositions, centers, output, cell=None, binsize=2.0):
+        '''Evaluate the sum of many spherical decompositions
+
+           This is equivalent to calling ``eval_decomposition`` for each
+           decomposition, but all decompositions are evaluated at once.
+
+           **Arguments:**
+
+           decompositions
+                A list of spherical decompositions. Each item is a list of
+                cubic splines as in ``eval_decomposition``. All items must have
+                the same length.
+
+           centers
+                The centers of the decompositions, an array with shape
+                (len(decompositions), 3).
+
+           output
+                The output array
+
+           **Optional arguments:**
+
+           cell
+                A unit cell when periodic boundary conditions are used.
+
+           binsize
+                The edge of the cubic bins in which the grid points are
+                grouped.
+        '''
+        if cell is None:
+            cell = Cell(None)
+        eval_decompositions_grid(decompositions, centers, output, self.points, cell, binsize)
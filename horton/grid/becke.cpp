@@ -24,12 +24,20 @@
 #ifdef DEBUG
 #include <cstdio>
 #endif
+#include <algorithm>
 #include <cmath>
 #include <stdexcept>
+#include <vector>
 
 #include "horton/grid/becke.h"
 
 
+/* Atoms whose Becke cell function is provably smaller than this fraction of
+   the cell function of the nearest atom are left out of the normalization.
+   See becke_helper_atom for details. */
+const double becke_prune_threshold = 1e-15;
+
+
 /* dist
 
    compute the Euclidian distance between two points.
@@ -46,6 +54,37 @@ static double dist(double* p0, double* p1) {
 }
 
 
+/* becke_switch
+
+   The (heteronuclear) switching function s(mu_ij) for a pair of atoms, given
+   the distances of the grid point to both atoms.
+*/
+static double becke_switch(double dist0, double dist1, double atomic_dist,
+                           double alpha, int order) {
+    double s = (dist0 - dist1)/atomic_dist; // Eq. (11)
+    s = s + alpha*(1-s*s); // Eq. (A2)
+    for (int k=1; k <= order; k++) { // Eq. (19) and (20)
+        s = 0.5*s*(3-s*s);
+    }
+    return 0.5*(1-s); // Eq. (18)
+}
+
+
+/* CloserAtom
+
+   Comparison of atom indexes by their distance to a grid point.
+*/
+class CloserAtom {
+    private:
+        const double* point_dists;
+    public:
+        CloserAtom(const double* point_dists) : point_dists(point_dists) {}
+        bool operator()(int iatom0, int iatom1) const {
+            return point_dists[iatom0] < point_dists[iatom1];
+        }
+};
+
+
 /* becke_helper_atom
 
    Computes the Becke weighting function for every point in the grid
@@ -75,18 +114,30 @@ static double dist(double* p0, double* p1) {
    order
         The order of the switching function in the Becke scheme.
 
+   nthreads
+        The number of OpenMP threads among which the grid points are
+        distributed.
+
    See Becke's paper for the details:
    A. D. Becke, The Journal of Chemical Physics 88, 2547 (1988)
    URL http://dx.doi.org/10.1063/1.454033.
+
+   The cell function of an atom is a product of switching functions that all
+   lie in the interval [0, 1], so partial products are upper bounds for it.
+   For every grid point, the atoms are sorted by their distance to the point
+   and the products are built up from the nearest atoms outwards. The cell
+   function of the nearest atom is computed first. The product for any other
+   atom is abandoned as soon as it drops below becke_prune_threshold times
+   the former, which happens after a few factors for all but the neighbors of
+   the grid point. This reduces the cost per grid point from O(natom^2) to
+   roughly O(natom log(natom)) for large molecules.
 */
 void becke_helper_atom(int npoint, double* points, double* weights, int natom,
-                       double* radii, double* centers, int select, int order)
+                       double* radii, double* centers, int select, int order,
+                       int nthreads)
 {
-    double nom, denom; // The nominator and the denominator in the weight definition
-    double p, s; // Used to build up the value of the switching function
-
     // precompute the the alpha parameters for each atom pair
-    double alphas[(natom*(natom+1))/2];
+    std::vector<double> alphas((natom*(natom+1))/2);
     long offset = 0;
     for (int iatom0 = 0; iatom0 < natom; iatom0++) {
         for (int iatom1 = 0; iatom1 <= iatom0; iatom1++) {
@@ -106,7 +157,7 @@ void becke_helper_atom(int npoint, double* points, double* weights, int natom,
     }
 
     // precompute interatomic distances
-    double atomic_dists[(natom*(natom+1))/2];
+    std::vector<double> atomic_dists((natom*(natom+1))/2);
     offset = 0;
     for (int iatom0 = 0; iatom0 < natom; iatom0++) {
         for (int iatom1 = 0; iatom1 <= iatom0; iatom1++) {
@@ -115,51 +166,66 @@ void becke_helper_atom(int npoint, double* points, double* weights, int natom,
         }
     }
 
-    // actual computations of Becke weights
-    for (int ipoint = npoint-1; ipoint>=0; ipoint--) {
-        nom = 0;
-        denom = 0;
-        for (int iatom0 = 0; iatom0 < natom; iatom0++) {
-            p = 1;
-            for (int iatom1 = 0; iatom1 < natom; iatom1++) {
-                if (iatom0 == iatom1) continue;
-
-                // compute offset for alpha and interatomic distance
-                if (iatom0 < iatom1) {
-                    offset = (iatom1*(iatom1+1))/2+iatom0;
-                } else {
-                    offset = (iatom0*(iatom0+1))/2+iatom1;
-                }
-
-                // Diatomic switching function
-                s = (dist(points, &centers[3*iatom0])
-                     -dist(points, &centers[3*iatom1]))
-                    /atomic_dists[offset]; // Eq. (11)
-                s = s + alphas[offset]*(1 - 2*(iatom0<iatom1))*(1-s*s); // Eq. (A2)
-
-                for (int k=1; k <= order; k++) { // Eq. (19) and (20)
-                    s = 0.5*s*(3-s*s);
-                }
-                s = 0.5*(1-s); // Eq. (18)
-
-                p *= s; // Eq. (13)
+#pragma omp parallel num_threads(nthreads)
+    {
+        // distances from the current grid point to all atoms
+        std::vector<double> point_dists(natom);
+        // atom indexes sorted by increasing distance from the grid point
+        std::vector<int> neighbors(natom);
+
+        // actual computations of Becke weights
+#pragma omp for schedule(static)
+        for (int ipoint = 0; ipoint < npoint; ipoint++) {
+            double* point = points + 3*ipoint;
+            for (int iatom = 0; iatom < natom; iatom++) {
+                point_dists[iatom] = dist(point, &centers[3*iatom]);
+                neighbors[iatom] = iatom;
+            }
+            std::sort(neighbors.begin(), neighbors.end(),
+                      CloserAtom(&point_dists[0]));
+
+            double nom = 0; // The nominator in the weight definition
+            double denom = 0; // The denominator in the weight definition
+            double cutoff = 0; // Cell functions below this value are neglected
+            for (int ineighbor0 = 0; ineighbor0 < natom; ineighbor0++) {
+                int iatom0 = neighbors[ineighbor0];
+                double p = 1; // Used to build up the value of the cell function
+                for (int ineighbor1 = 0; ineighbor1 < natom; ineighbor1++) {
+                    int iatom1 = neighbors[ineighbor1];
+                    if (iatom0 == iatom1) continue;
+
+                    // compute offset for alpha and interatomic distance
+                    const long offset = (iatom0 < iatom1) ?
+                        (iatom1*(iatom1+1))/2+iatom0 :
+                        (iatom0*(iatom0+1))/2+iatom1;
+
+                    // Diatomic switching function
+                    double s = becke_switch(
+                        point_dists[iatom0], point_dists[iatom1],
+                        atomic_dists[offset],
+                        alphas[offset]*(1 - 2*(iatom0<iatom1)), order);
+
+                    p *= s; // Eq. (13)
 #ifdef DEBUG
-                printf("iatom0=%i  iatom1=%i s=%f p=%f\n", iatom0, iatom1, s, p);
+                    printf("iatom0=%i  iatom1=%i s=%f p=%f\n", iatom0, iatom1, s, p);
 #endif
-            }
+                    // The remaining factors can only decrease p.
+                    if (p < cutoff) {
+                        p = 0;
+                        break;
+                    }
+                }
 
-            if (iatom0 == select) nom = p;
-            denom += p; // Eq. (22)
-        }
+                if (ineighbor0 == 0) cutoff = becke_prune_threshold*p;
+                if (iatom0 == select) nom = p;
+                denom += p; // Eq. (22)
+            }
 #ifdef DEBUG
-        printf("nom=%f  denom=%f\n", nom, denom);
+            printf("nom=%f  denom=%f\n", nom, denom);
 #endif
 
-        // Weight function at this grid point:
-        *weights *= nom/denom; // Eq. (22)
-
-        // go to next point
-        points += 3;
-        weights++;
+            // Weight function at this grid point:
+            weights[ipoint] *= nom/denom; // Eq. (22)
+        }
     }
 }
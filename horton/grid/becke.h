@@ -24,6 +24,7 @@
 #define HORTON_GRID_BECKE_H
 
 void becke_helper_atom(int npoint, double* points, double* weights, int natom,
-                       double* radii, double* centers, int select, int order);
+                       double* radii, double* centers, int select, int order,
+                       int nthreads);
 
 #endif
@@ -23,4 +23,4 @@
 cdef extern from "horton/grid/becke.h":
     void becke_helper_atom(int npoint, double* points, double* weights,
                            int natom, double* radii, double* centers, int
-                           select, int order)
+                           select, int order, int nthreads)
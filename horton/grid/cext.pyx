@@ -44,6 +44,8 @@ cimport utils
 
 cimport horton.cext
 
+cimport openmp
+
 
 __all__ = [
     # lebedev_laikov
@@ -56,7 +58,7 @@ __all__ = [
     'compute_cubic_spline_int_weights',
     # evaluate
     'index_wrap', 'eval_spline_cube', 'eval_spline_grid',
-    'eval_decomposition_grid',
+    'eval_decomposition_grid', 'eval_splines_grid', 'eval_decompositions_grid',
     # ode2
     'hermite_overlap2', 'hermite_overlap3', 'hermite_node', 'hermite_product2',
     'build_ode2',
@@ -67,6 +69,7 @@ __all__ = [
     'UniformGrid', 'UniformGridWindow', 'index_wrap', 'Block3Iterator',
     # utils
     'dot_multi', 'dot_multi_moments_cube', 'dot_multi_moments',
+    'set_omp_num_threads',
 ]
 
 
@@ -134,8 +137,8 @@ def becke_helper_atom(np.ndarray[double, ndim=2] points not None,
                       np.ndarray[double, ndim=1] weights not None,
                       np.ndarray[double, ndim=1] radii not None,
                       np.ndarray[double, ndim=2] centers not None,
-                      int select, int order):
-    '''beck_helper_atom(points, weights, radii, centers, i, k)
+                      int select, int order, int nthreads=1):
+    '''beck_helper_atom(points, weights, radii, centers, i, k, nthreads=1)
 
        Compute the Becke weights for a given atom an a grid.
 
@@ -162,6 +165,14 @@ def becke_helper_atom(np.ndarray[double, ndim=2] points not None,
        order
             The order of the switching functions. (That is k in Becke's paper.)
 
+       **Optional arguments:**
+
+       nthreads
+            The number of OpenMP threads used to compute the weights.
+
+       Atoms whose Becke cell function is negligible (relative to 1e-15) at a
+       grid point are not taken into account for that point.
+
        See Becke's paper for the details: http://dx.doi.org/10.1063/1.454033
     '''
     assert points.flags['C_CONTIGUOUS']
@@ -176,9 +187,10 @@ def becke_helper_atom(np.ndarray[double, ndim=2] points not None,
     assert centers.shape[1] == 3
     assert select >= 0 and select < natom
     assert order > 0
+    assert nthreads > 0
 
     becke.becke_helper_atom(points.shape[0], &points[0, 0], &weights[0], natom,
-                            &radii[0], &centers[0, 0], select, order)
+                            &radii[0], &centers[0, 0], select, order, nthreads)
 
 
 #
@@ -584,6 +596,134 @@ def eval_decomposition_grid(splines not None,
         free(cpp_splines)
 
 
+def eval_splines_grid(splines not None,
+                      np.ndarray[double, ndim=2] centers not None,
+                      np.ndarray[double, ndim=1] output not None,
+                      np.ndarray[double, ndim=2] points not None,
+                      horton.cext.Cell cell not None, double binsize=2.0):
+    '''Evaluate many spherically symmetric functions on a general grid
+
+       **Arguments:**
+
+       splines
+            A list of cubic splines with radial functions.
+
+       centers
+            The centers of the spherically symmetric functions, with shape
+            (len(splines), 3).
+
+       output
+            The output array to which the sum of all functions is added.
+
+       points
+            An array with grid points, with shape (N, 3)
+
+       cell
+            A specification of the periodic boundary conditions.
+
+       **Optional arguments:**
+
+       binsize
+            The edge of the cubic bins in which the grid points are grouped.
+            For each bin, the functions that do not reach any point in the bin
+            are skipped at once.
+    '''
+    # parse the splines argument and construct an array of c++ cubic spline objects
+    cdef CubicSpline spline
+    cdef cubic_spline.CubicSpline** cpp_splines = <cubic_spline.CubicSpline**>malloc(len(splines)*sizeof(cubic_spline.CubicSpline*))
+    if cpp_splines == NULL and len(splines) > 0:
+        raise MemoryError()
+
+    try:
+        for i in xrange(len(splines)):
+            spline = splines[i]
+            cpp_splines[i] = spline._this
+
+        assert centers.flags['C_CONTIGUOUS']
+        assert centers.shape[0] == len(splines)
+        assert centers.shape[1] == 3
+        assert output.flags['C_CONTIGUOUS']
+        assert points.flags['C_CONTIGUOUS']
+        assert points.shape[1] == 3
+        assert points.shape[0] == output.shape[0]
+
+        evaluate.eval_splines_grid(cpp_splines, <double*>centers.data,
+            <double*>output.data, <double*>points.data, cell._this,
+            len(splines), output.shape[0], binsize)
+    finally:
+        free(cpp_splines)
+
+
+def eval_decompositions_grid(decompositions not None,
+                             np.ndarray[double, ndim=2] centers not None,
+                             np.ndarray[double, ndim=1] output not None,
+                             np.ndarray[double, ndim=2] points not None,
+                             horton.cext.Cell cell not None,
+                             double binsize=2.0):
+    '''Evaluate many spherical decompositions on a general grid
+
+       **Arguments:**
+
+       decompositions
+            A list of spherical decompositions, i.e. lists of splines, as
+            generated with AtomicGrid.get_spherical_decomposition. All
+            decompositions must have the same number of splines.
+
+       centers
+            The centers of the decompositions, with shape
+            (len(decompositions), 3).
+
+       output
+            The output array to which the sum of all decompositions is added.
+
+       points
+            An array with grid points, with shape (N, 3)
+
+       cell
+            A specification of the periodic boundary conditions.
+
+       **Optional arguments:**
+
+       binsize
+            The edge of the cubic bins in which the grid points are grouped.
+            For each bin, the decompositions that do not reach any point in
+            the bin are skipped at once.
+    '''
+    # parse the splines argument and construct an array of c++ cubic spline objects
+    cdef long ncenter = len(decompositions)
+    cdef long nspline = 0
+    if ncenter > 0:
+        nspline = len(decompositions[0])
+        assert nspline > 0
+    cdef CubicSpline spline
+    cdef cubic_spline.CubicSpline** cpp_splines = <cubic_spline.CubicSpline**>malloc(ncenter*nspline*sizeof(cubic_spline.CubicSpline*))
+    if cpp_splines == NULL and ncenter > 0:
+        raise MemoryError()
+
+    try:
+        for icenter in xrange(ncenter):
+            assert len(decompositions[icenter]) == nspline
+            for i in xrange(nspline):
+                spline = decompositions[icenter][i]
+                cpp_splines[icenter*nspline+i] = spline._this
+
+        assert centers.flags['C_CONTIGUOUS']
+        assert centers.shape[0] == ncenter
+        assert centers.shape[1] == 3
+        assert output.flags['C_CONTIGUOUS']
+        assert points.flags['C_CONTIGUOUS']
+        assert points.shape[1] == 3
+        assert points.shape[0] == output.shape[0]
+
+        if ncenter > 0:
+            evaluate.eval_decompositions_grid(cpp_splines,
+                <double*>centers.data, <double*>output.data,
+                <double*>points.data, cell._this, ncenter, nspline,
+                output.shape[0], binsize)
+    finally:
+        free(cpp_splines)
+
+
 #
 # ode2
 #
@@ -1242,6 +1382,88 @@ cdef class UniformGrid(object):
 
         evaluate.eval_spline_cube(spline._this, &center[0], &output[0, 0, 0], self._this)
 
+    def compute_stockholder_weights(self, splines not None,
+                                    np.ndarray[double, ndim=2] centers not None,
+                                    windows not None, at_weights not None,
+                                    np.ndarray[double, ndim=3] promoldens not None,
+                                    long blocksize=16, long nthreads=1):
+        '''Compute the promolecule and the atomic weights of a stockholder scheme
+
+           **Arguments:**
+
+           splines
+                A list with one proatom spline per atom.
+
+           centers
+                The positions of the atoms, array with shape (natom, 3).
+
+           windows
+                A list with one UniformGridWindow per atom. The atomic weights
+                are computed on these windows.
+
+           at_weights
+                A list of output arrays for the atomic weights, with the shapes
+                of the windows.
+
+           promoldens
+                The output array for the promolecular density on this grid.
+
+           **Optional arguments:**
+
+           blocksize
+                The size of the cubic tiles in which the grid is divided. Only
+                the atoms whose windows overlap with a tile are considered for
+                that tile.
+
+           nthreads
+                The number of threads among which the tiles are distributed.
+
+           For every point of a window, the proatom is evaluated, including a
+           small constant of 1e-100, and added to the promolecule. The atomic
+           weights are the ratios of the proatoms and the promolecule, clipped
+           to the interval [0, 1]. This gives the same result as evaluating the
+           proatoms with ``UniformGridWindow.eval_spline`` and combining them
+           with ``UniformGridWindow.wrap`` and ``UniformGridWindow.extend``.
+        '''
+        cdef long natom = len(splines)
+        assert centers.flags['C_CONTIGUOUS']
+        assert centers.shape[0] == natom
+        assert centers.shape[1] == 3
+        assert len(windows) == natom
+        assert len(at_weights) == natom
+        assert promoldens.flags['C_CONTIGUOUS']
+        assert promoldens.shape[0] == self.shape[0]
+        assert promoldens.shape[1] == self.shape[1]
+        assert promoldens.shape[2] == self.shape[2]
+
+        cdef np.ndarray[long, ndim=2] begins = np.zeros((natom, 3), int)
+        cdef np.ndarray[long, ndim=2] ends = np.zeros((natom, 3), int)
+        cdef CubicSpline spline
+        cdef np.ndarray[double, ndim=3] output
+        cdef cubic_spline.CubicSpline** cpp_splines = <cubic_spline.CubicSpline**>malloc(natom*sizeof(cubic_spline.CubicSpline*))
+        cdef double** pointers = <double**>malloc(natom*sizeof(double*))
+        try:
+            if cpp_splines == NULL or pointers == NULL:
+                raise MemoryError()
+            for i in xrange(natom):
+                spline = splines[i]
+                cpp_splines[i] = spline._this
+                window = windows[i]
+                assert window.ugrid is self
+                begins[i] = window.begin
+                ends[i] = window.end
+                output = at_weights[i]
+                assert output.flags['C_CONTIGUOUS']
+                assert (window.shape == [output.shape[0], output.shape[1], output.shape[2]]).all()
+                pointers[i] = &output[0, 0, 0]
+            promoldens[:] = 0.0
+            evaluate.compute_stockholder_weights_cube(cpp_splines,
+                &centers[0, 0], self._this, &begins[0, 0], &ends[0, 0],
+                pointers, &promoldens[0, 0, 0], natom, blocksize, nthreads)
+        finally:
+            free(cpp_splines)
+            free(pointers)
+
     def integrate(self, *args):
         '''Integrate the product of all arguments
 
@@ -1697,6 +1919,16 @@ cdef class Block3Iterator(object):
 #
 
 
+def set_omp_num_threads(int nthreads):
+    '''Set the number of OpenMP threads used by subsequent parallel regions
+
+       This affects all HORTON extensions in the current process because they
+       share the same OpenMP runtime.
+    '''
+    assert nthreads > 0
+    openmp.omp_set_num_threads(nthreads)
+
+
 def _check_integranda(integranda, npoint=None):
     assert len(integranda) > 0
     for integrandum in integranda:
@@ -1748,7 +1980,8 @@ def dot_multi(*integranda, np.ndarray[long, ndim=1] segments=None):
     cdef np.ndarray[double, ndim=1] output = np.zeros(nsegment)
     cdef double** pointers = _parse_integranda(integranda)
     try:
-        utils.dot_multi(npoint, len(integranda), pointers, &segments[0], &output[0])
+        utils.dot_multi(npoint, len(integranda), pointers, nsegment,
+                        &segments[0], &output[0])
     finally:
         free(pointers)
     if nsegment == 1:
@@ -1867,7 +2100,7 @@ def dot_multi_moments(integranda,
     try:
         utils.dot_multi_moments(npoint, len(integranda), pointers,
             &points[0, 0], &center[0], lmax, mtype,
-            &segments[0], &output[0, 0], nmoment)
+            nsegment, &segments[0], &output[0, 0], nmoment)
     finally:
         free(pointers)
     if nsegment == 1:
@@ -26,6 +26,7 @@
 
 #include <cmath>
 #include <stdexcept>
+#include <vector>
 #include "horton/moments.h"
 #include "horton/grid/evaluate.h"
 
@@ -128,6 +129,35 @@ void eval_spline_grid(CubicSpline* spline, double* center, double* output,
 
 #define INV_SQRT_4_PI 0.28209479177387814347 // 1/sqrt(4*pi)
 
+double eval_decomposition_point(CubicSpline** splines, long lmax, double x,
+                                double y, double z, double d, double* work) {
+    // l == 0
+    double s;
+    splines[0]->eval(&d, &s, 1);
+    double result = s*INV_SQRT_4_PI;
+
+    if (lmax > 0) {
+        // l > 0
+        work[0] = z;
+        work[1] = x;
+        work[2] = y;
+        if (lmax > 1) fill_pure_polynomials(work, lmax);
+
+        long counter = 0;
+        double dpowl = 1.0;
+        for (long l=1; l <= lmax; l++) {
+            dpowl /= d;
+            double factor = sqrt(2*l+1);
+            for (long m=-l; m<=l; m++) {
+                splines[counter+1]->eval(&d, &s, 1);
+                result += s*factor*INV_SQRT_4_PI*dpowl*work[counter];
+                counter++;
+            }
+        }
+    }
+    return result;
+}
+
 void eval_decomposition_grid(CubicSpline** splines, double* center,
                              double* output, double* points, Cell* cell,
                              long nspline, long npoint) {
@@ -170,30 +200,7 @@ void eval_decomposition_grid(CubicSpline** splines, double* center,
 
                     // Evaluate splines if needed
                     if ((d < rcut) || splines[0]->get_extrapolation()->has_tail()) {
-                        // l == 0
-                        double s;
-                        splines[0]->eval(&d, &s, 1);
-                        *output += s*INV_SQRT_4_PI;
-
-                        if (lmax > 0) {
-                            // l > 0
-                            work[0] = z;
-                            work[1] = x;
-                            work[2] = y;
-                            if (lmax > 1) fill_pure_polynomials(work, lmax);
-
-                            long counter = 0;
-                            double dpowl = 1.0;
-                            for (long l=1; l <= lmax; l++) {
-                                dpowl /= d;
-                                double factor = sqrt(2*l+1);
-                                for (long m=-l; m<=l; m++) {
-                                    splines[counter+1]->eval(&d, &s, 1);
-                                    *output += s*factor*INV_SQRT_4_PI*dpowl*work[counter];
-                                    counter++;
-                                }
-                            }
-                        }
+                        *output += eval_decomposition_point(splines, lmax, x, y, z, d, work);
                     }
                 }
             }
@@ -205,3 +212,382 @@ void eval_decomposition_grid(CubicSpline** splines, double* center,
         npoint--;
     }
 }
+
+
+
+/*
+    Batched evaluation of many splines on general grids
+*/
+
+long bin_points(double* points, long npoint, double binsize, long* order,
+                std::vector<long>& bin_begins) {
+    // Bounding box of all points
+    double lower[3], upper[3];
+    for (int i=0; i < 3; i++) {
+        lower[i] = points[i];
+        upper[i] = points[i];
+    }
+    for (long ipoint=1; ipoint < npoint; ipoint++) {
+        for (int i=0; i < 3; i++) {
+            double x = points[3*ipoint+i];
+            if (x < lower[i]) lower[i] = x;
+            if (x > upper[i]) upper[i] = x;
+        }
+    }
+
+    // Number of bins along each axis. The bins are made larger when there
+    // would be more bins than points, e.g. for sparse grids in big boxes.
+    long nbin[3];
+    while (true) {
+        for (int i=0; i < 3; i++)
+            nbin[i] = long((upper[i] - lower[i])/binsize) + 1;
+        if (nbin[0]*nbin[1]*nbin[2] <= npoint) break;
+        binsize *= 2;
+    }
+    long nbin_total = nbin[0]*nbin[1]*nbin[2];
+
+    // Counting sort of the points by bin index
+    std::vector<long> keys(npoint);
+    std::vector<long> counts(nbin_total+1, 0);
+    for (long ipoint=0; ipoint < npoint; ipoint++) {
+        long key = 0;
+        for (int i=0; i < 3; i++) {
+            long j = long((points[3*ipoint+i] - lower[i])/binsize);
+            if (j >= nbin[i]) j = nbin[i]-1;
+            key = key*nbin[i] + j;
+        }
+        keys[ipoint] = key;
+        counts[key+1]++;
+    }
+    for (long ibin=0; ibin < nbin_total; ibin++)
+        counts[ibin+1] += counts[ibin];
+    // Only the non-empty bins are kept.
+    bin_begins.clear();
+    for (long ibin=0; ibin < nbin_total; ibin++)
+        if (counts[ibin+1] > counts[ibin]) bin_begins.push_back(counts[ibin]);
+    bin_begins.push_back(npoint);
+    for (long ipoint=0; ipoint < npoint; ipoint++) {
+        order[counts[keys[ipoint]]] = ipoint;
+        counts[keys[ipoint]]++;
+    }
+    return bin_begins.size() - 1;
+}
+
+void eval_spline_point_images(CubicSpline** splines, long lmax,
+                              double* center, double* output, double* points,
+                              Cell* cell, long* order, long begin, long end,
+                              double* work) {
+    // Reference algorithm for splines with a tail: all images within the
+    // cutoff of each point are included, as in eval_decomposition_grid.
+    double rcut = splines[0]->get_last_x();
+    for (long k=begin; k < end; k++) {
+        long ipoint = order[k];
+        double delta[3];
+        for (int i=0; i < 3; i++)
+            delta[i] = points[3*ipoint+i] - center[i];
+        long ranges_begin[3], ranges_end[3];
+        cell->set_ranges_rcut(delta, rcut, ranges_begin, ranges_end);
+        for (int i=cell->get_nvec(); i < 3; i++) {
+            ranges_begin[i] = 0;
+            ranges_end[i] = 1;
+        }
+
+        for (long i0 = ranges_begin[0]; i0 < ranges_end[0]; i0++) {
+            for (long i1 = ranges_begin[1]; i1 < ranges_end[1]; i1++) {
+                for (long i2 = ranges_begin[2]; i2 < ranges_end[2]; i2++) {
+                    double frac[3], cart[3];
+                    frac[0] = i0;
+                    frac[1] = i1;
+                    frac[2] = i2;
+                    cell->to_cart(frac, cart);
+                    double x = cart[0] + delta[0];
+                    double y = cart[1] + delta[1];
+                    double z = cart[2] + delta[2];
+                    double d = sqrt(x*x+y*y+z*z);
+                    if (lmax < 0) {
+                        double s;
+                        splines[0]->eval(&d, &s, 1);
+                        output[ipoint] += s;
+                    } else {
+                        output[ipoint] += eval_decomposition_point(splines, lmax, x, y, z, d, work);
+                    }
+                }
+            }
+        }
+    }
+}
+
+void eval_spline_bin_images(CubicSpline** splines, long lmax,
+                            double* center, double* output, double* points,
+                            Cell* cell, long* order, long begin, long end,
+                            double* bin_center, double bin_radius,
+                            double* work) {
+    // All points in the bin lie within bin_radius of bin_center. Images of
+    // the center further away than rcut + bin_radius are skipped at once.
+    double rcut = splines[0]->get_last_x();
+    double delta[3];
+    for (int i=0; i < 3; i++)
+        delta[i] = bin_center[i] - center[i];
+    long ranges_begin[3], ranges_end[3];
+    cell->set_ranges_rcut(delta, rcut + bin_radius, ranges_begin, ranges_end);
+    for (int i=cell->get_nvec(); i < 3; i++) {
+        ranges_begin[i] = 0;
+        ranges_end[i] = 1;
+    }
+
+    for (long i0 = ranges_begin[0]; i0 < ranges_end[0]; i0++) {
+        for (long i1 = ranges_begin[1]; i1 < ranges_end[1]; i1++) {
+            for (long i2 = ranges_begin[2]; i2 < ranges_end[2]; i2++) {
+                double frac[3], image[3];
+                frac[0] = i0;
+                frac[1] = i1;
+                frac[2] = i2;
+                cell->to_cart(frac, image);
+                for (int i=0; i < 3; i++)
+                    image[i] = center[i] - image[i];
+                double dx = bin_center[0] - image[0];
+                double dy = bin_center[1] - image[1];
+                double dz = bin_center[2] - image[2];
+                if (dx*dx + dy*dy + dz*dz >= (rcut + bin_radius)*(rcut + bin_radius))
+                    continue;
+
+                for (long k=begin; k < end; k++) {
+                    long ipoint = order[k];
+                    double x = points[3*ipoint] - image[0];
+                    double y = points[3*ipoint+1] - image[1];
+                    double z = points[3*ipoint+2] - image[2];
+                    double d = sqrt(x*x+y*y+z*z);
+                    if (d >= rcut) continue;
+                    if (lmax < 0) {
+                        double s;
+                        splines[0]->eval(&d, &s, 1);
+                        output[ipoint] += s;
+                    } else {
+                        output[ipoint] += eval_decomposition_point(splines, lmax, x, y, z, d, work);
+                    }
+                }
+            }
+        }
+    }
+}
+
+void eval_splines_grid_low(CubicSpline** splines, double* centers,
+                           double* output, double* points, Cell* cell,
+                           long ncenter, long nspline, long lmax, long npoint,
+                           double binsize) {
+    if (npoint == 0) return;
+    if (binsize <= 0) {
+        throw std::domain_error("The bin size must be strictly positive.");
+    }
+
+    std::vector<long> order(npoint);
+    std::vector<long> bin_begins;
+    long nbin = bin_points(points, npoint, binsize, &order[0], bin_begins);
+
+    // Each bin contains different points, such that the bins can be
+    // processed in parallel without conflicting writes to the output.
+    #pragma omp parallel for schedule(dynamic)
+    for (long ibin=0; ibin < nbin; ibin++) {
+        long begin = bin_begins[ibin];
+        long end = bin_begins[ibin+1];
+
+        // Bounding sphere of the points in this bin
+        double lower[3], upper[3];
+        for (int i=0; i < 3; i++) {
+            lower[i] = points[3*order[begin]+i];
+            upper[i] = lower[i];
+        }
+        for (long k=begin+1; k < end; k++) {
+            for (int i=0; i < 3; i++) {
+                double x = points[3*order[k]+i];
+                if (x < lower[i]) lower[i] = x;
+                if (x > upper[i]) upper[i] = x;
+            }
+        }
+        double bin_center[3];
+        double bin_radius = 0.0;
+        for (int i=0; i < 3; i++) {
+            bin_center[i] = 0.5*(lower[i] + upper[i]);
+            bin_radius += 0.25*(upper[i] - lower[i])*(upper[i] - lower[i]);
+        }
+        bin_radius = sqrt(bin_radius);
+
+        std::vector<double> work(nspline);
+        for (long icenter=0; icenter < ncenter; icenter++) {
+            CubicSpline** center_splines = splines + icenter*nspline;
+            if (center_splines[0]->get_extrapolation()->has_tail()) {
+                eval_spline_point_images(center_splines, lmax,
+                    centers + 3*icenter, output, points, cell, &order[0],
+                    begin, end, &work[0]);
+            } else {
+                eval_spline_bin_images(center_splines, lmax,
+                    centers + 3*icenter, output, points, cell, &order[0],
+                    begin, end, bin_center, bin_radius, &work[0]);
+            }
+        }
+    }
+}
+
+void eval_splines_grid(CubicSpline** splines, double* centers, double* output,
+                       double* points, Cell* cell, long nspline, long npoint,
+                       double binsize) {
+    eval_splines_grid_low(splines, centers, output, points, cell, nspline, 1,
+                          -1, npoint, binsize);
+}
+
+void eval_decompositions_grid(CubicSpline** splines, double* centers,
+                              double* output, double* points, Cell* cell,
+                              long ncenter, long nspline, long npoint,
+                              double binsize) {
+    long lmax = sqrt(nspline)-1;
+    if ((lmax+1)*(lmax+1) != nspline) {
+        throw std::domain_error("The number of splines does not match a well-defined lmax.");
+    }
+    eval_splines_grid_low(splines, centers, output, points, cell, ncenter,
+                          nspline, lmax, npoint, binsize);
+}
+
+
+/*
+    Helpers for compute_stockholder_weights_cube
+*/
+
+void set_tile_ranges(long itile, long* ntile, long blocksize, long* shape,
+                     long* tile_begin, long* tile_end) {
+    tile_begin[0] = (itile/(ntile[1]*ntile[2]))*blocksize;
+    tile_begin[1] = ((itile/ntile[2])%ntile[1])*blocksize;
+    tile_begin[2] = (itile%ntile[2])*blocksize;
+    for (int i=0; i<3; i++) {
+        tile_end[i] = tile_begin[i] + blocksize;
+        if (tile_end[i] > shape[i]) tile_end[i] = shape[i];
+    }
+}
+
+void update_tile_window(UniformGrid* ugrid, long* tile_begin, long* tile_end,
+                        long* begin, long* end, long* b, CubicSpline* spline,
+                        double* center, double* at_weights, double* promoldens,
+                        bool divide) {
+    // Loop over all points of a tile of the periodic grid that lie in the
+    // window of one atom, translated by b times the periodic cell. When divide
+    // is false, the proatom is evaluated and added to the promolecule.
+    // Otherwise, the proatom is divided by the promolecule.
+    long* shape = ugrid->shape;
+    long lo[3], hi[3];
+    for (int i=0; i<3; i++) {
+        lo[i] = begin[i] - b[i]*shape[i];
+        if (lo[i] < tile_begin[i]) lo[i] = tile_begin[i];
+        hi[i] = end[i] - b[i]*shape[i];
+        if (hi[i] > tile_end[i]) hi[i] = tile_end[i];
+        if (lo[i] >= hi[i]) return;
+    }
+    double rcut = spline->get_last_x();
+    bool tail = spline->get_extrapolation()->has_tail();
+    long wshape1 = end[1] - begin[1];
+    long wshape2 = end[2] - begin[2];
+    long jwrap[3], j[3];
+    for (jwrap[0]=lo[0]; jwrap[0]<hi[0]; jwrap[0]++) {
+        j[0] = jwrap[0] + b[0]*shape[0];
+        for (jwrap[1]=lo[1]; jwrap[1]<hi[1]; jwrap[1]++) {
+            j[1] = jwrap[1] + b[1]*shape[1];
+            double* w = at_weights + ((j[0]-begin[0])*wshape1 + (j[1]-begin[1]))*wshape2
+                        - begin[2] + b[2]*shape[2];
+            double* p = promoldens + (jwrap[0]*shape[1] + jwrap[1])*shape[2];
+            for (jwrap[2]=lo[2]; jwrap[2]<hi[2]; jwrap[2]++) {
+                if (divide) {
+                    double ratio = w[jwrap[2]]/p[jwrap[2]];
+                    if (ratio < 0.0) ratio = 0.0;
+                    if (ratio > 1.0) ratio = 1.0;
+                    w[jwrap[2]] = ratio;
+                } else {
+                    j[2] = jwrap[2] + b[2]*shape[2];
+                    double d = ugrid->dist_grid_point(center, j);
+                    double s = 0.0;
+                    if ((d < rcut) || tail) {
+                        spline->eval(&d, &s, 1);
+                    }
+                    // The small constant avoids divisions by zero.
+                    s += 1e-100;
+                    w[jwrap[2]] = s;
+                    p[jwrap[2]] += s;
+                }
+            }
+        }
+    }
+}
+
+
+void compute_stockholder_weights_cube(CubicSpline** splines, double* centers,
+                                      UniformGrid* ugrid, long* begins,
+                                      long* ends, double** at_weights,
+                                      double* promoldens, long natom,
+                                      long blocksize, long nthreads) {
+    if (blocksize <= 0) {
+        throw std::domain_error("The block size must be strictly positive.");
+    }
+    if (nthreads <= 0) {
+        throw std::domain_error("The number of threads must be strictly positive.");
+    }
+    long* shape = ugrid->shape;
+
+    // A) The periodic grid is divided into tiles of blocksize**3 points. For
+    //    each tile, make a list of atoms (and periodic images) whose window
+    //    overlaps with the tile. Every item consists of four numbers: the atom
+    //    index and the image of the periodic cell. Atoms are added in order,
+    //    such that the promolecular density does not depend on the number of
+    //    threads.
+    long ntile[3];
+    for (int i=0; i<3; i++) {
+        ntile[i] = (shape[i] + blocksize - 1)/blocksize;
+    }
+    std::vector<std::vector<long> > tiles(ntile[0]*ntile[1]*ntile[2]);
+    for (long iatom=0; iatom < natom; iatom++) {
+        Block3Iterator b3i = Block3Iterator(begins + 3*iatom, ends + 3*iatom, shape);
+        for (long iblock=0; iblock < b3i.get_nblock(); iblock++) {
+            long b[3];
+            b3i.set_block(iblock, b);
+            long cube_begin[3], cube_end[3];
+            b3i.set_cube_ranges(b, cube_begin, cube_end);
+            long tile_begin[3], tile_end[3];
+            bool empty = false;
+            for (int i=0; i<3; i++) {
+                if (cube_end[i] <= cube_begin[i]) empty = true;
+                tile_begin[i] = cube_begin[i]/blocksize;
+                tile_end[i] = (cube_end[i] - 1)/blocksize + 1;
+            }
+            if (empty) continue;
+            for (long t0=tile_begin[0]; t0 < tile_end[0]; t0++) {
+                for (long t1=tile_begin[1]; t1 < tile_end[1]; t1++) {
+                    for (long t2=tile_begin[2]; t2 < tile_end[2]; t2++) {
+                        std::vector<long>& items = tiles[(t0*ntile[1] + t1)*ntile[2] + t2];
+                        items.push_back(iatom);
+                        items.push_back(b[0]);
+                        items.push_back(b[1]);
+                        items.push_back(b[2]);
+                    }
+                }
+            }
+        }
+    }
+
+    // B) Evaluate the proatoms and the promolecule (divide=false) and then
+    //    divide the proatoms by the promolecule (divide=true). Only the atoms
+    //    that overlap with a tile are considered. Each point of a window
+    //    belongs to exactly one tile, such that tiles can be processed in
+    //    parallel.
+    long ntile_total = tiles.size();
+    for (int divide=0; divide < 2; divide++) {
+        #pragma omp parallel for schedule(dynamic) num_threads(nthreads)
+        for (long itile=0; itile < ntile_total; itile++) {
+            long tile_begin[3], tile_end[3];
+            set_tile_ranges(itile, ntile, blocksize, shape, tile_begin, tile_end);
+            std::vector<long>& items = tiles[itile];
+            for (size_t iitem=0; iitem < items.size(); iitem += 4) {
+                long iatom = items[iitem];
+                update_tile_window(ugrid, tile_begin, tile_end, begins + 3*iatom,
+                                   ends + 3*iatom, &items[iitem+1], splines[iatom],
+                                   centers + 3*iatom, at_weights[iatom],
+                                   promoldens, divide);
+            }
+        }
+    }
+}
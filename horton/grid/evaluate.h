@@ -38,4 +38,19 @@ void eval_spline_grid(CubicSpline* spline, double* center, double* output,
 void eval_decomposition_grid(CubicSpline** splines, double* center,
                              double* output, double* points, Cell* cell,
                              long nspline, long npoint);
+
+void eval_splines_grid(CubicSpline** splines, double* centers, double* output,
+                       double* points, Cell* cell, long nspline, long npoint,
+                       double binsize);
+
+void eval_decompositions_grid(CubicSpline** splines, double* centers,
+                              double* output, double* points, Cell* cell,
+                              long ncenter, long nspline, long npoint,
+                              double binsize);
+
+void compute_stockholder_weights_cube(CubicSpline** splines, double* centers,
+                                      UniformGrid* ugrid, long* begins,
+                                      long* ends, double** at_weights,
+                                      double* promoldens, long natom,
+                                      long blocksize, long nthreads);
 #endif
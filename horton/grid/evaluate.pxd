@@ -35,3 +35,17 @@ cdef extern from "horton/grid/evaluate.h":
     void eval_decomposition_grid(cubic_spline.CubicSpline** splines,
         double* center, double* output, double* points, horton.cell.Cell* cell,
         long nspline, long npoint)
+
+    void eval_splines_grid(cubic_spline.CubicSpline** splines, double* centers,
+        double* output, double* points, horton.cell.Cell* cell, long nspline,
+        long npoint, double binsize) except +
+
+    void eval_decompositions_grid(cubic_spline.CubicSpline** splines,
+        double* centers, double* output, double* points,
+        horton.cell.Cell* cell, long ncenter, long nspline, long npoint,
+        double binsize) except +
+
+    void compute_stockholder_weights_cube(cubic_spline.CubicSpline** splines,
+        double* centers, uniform.UniformGrid* ugrid, long* begins, long* ends,
+        double** at_weights, double* promoldens, long natom,
+        long blocksize, long nthreads) except +
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+'''Persistent on-disk cache for integration grids'''
+
+
+import hashlib, os, shutil, tempfile
+
+import numpy as np
+
+from horton.log import log
+
+
+__all__ = ['GridCache']
+
+
+class GridCache(object):
+    '''A content-addressed cache of grid arrays in a directory
+
+       Each entry is a subdirectory, named after a hash of all parameters that
+       determine the grid, with one ``.npy`` file per array. Arrays are loaded
+       as copy-on-write memory maps, such that data is only read from disk when
+       it is used and the files are never modified. The cache can be shared by
+       concurrent jobs: new entries are written to a temporary directory that
+       is renamed when complete. When a maximum size is given, the least
+       recently used entries are removed after a new entry is stored.
+    '''
+    # Change this when the layout of the entries or the meaning of the keys
+    # changes, such that old entries are no longer used.
+    version = 1
+
+    def __init__(self, dirname, max_size=None, seed=1):
+        '''
+           **Arguments:**
+
+           dirname
+                The directory with the cached grids. It is created if needed.
+
+           **Optional arguments:**
+
+           max_size
+                The maximum total size of all entries in bytes.
+
+           seed
+                The seed of the random number generator used for the random
+                rotation of atomic grids. Grids with random rotations can only
+                be reused when they are constructed with a fixed seed.
+        '''
+        if max_size is not None and max_size <= 0:
+            raise ValueError('The maximum size of the grid cache must be strictly positive.')
+        self.dirname = dirname
+        self.max_size = max_size
+        self.seed = seed
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+    def get_key(self, *fields):
+        '''Return a hash of the given fields
+
+           **Arguments:**
+
+           field1, field2, ...
+                Numpy arrays, strings or numbers that determine the cached
+                data. Arrays are hashed with their dtype and shape.
+        '''
+        h = hashlib.sha1()
+        h.update('version=%i;seed=%i;' % (self.version, self.seed))
+        for field in fields:
+            if isinstance(field, np.ndarray):
+                field = np.ascontiguousarray(field)
+                h.update('%s%s;' % (field.dtype.str, field.shape))
+                h.update(field.data)
+            else:
+                h.update('%r;' % (field,))
+        return h.hexdigest()
+
+    def _get_entries(self):
+        '''Return a list of (last use, size, path) for all entries'''
+        result = []
+        for name in os.listdir(self.dirname):
+            path = os.path.join(self.dirname, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, fn)) for fn in os.listdir(path))
+                result.append((os.path.getmtime(path), size, path))
+            except OSError:
+                # The entry was removed by another process.
+                pass
+        return result
+
+    def _get_size(self):
+        '''The total size of all entries in bytes'''
+        return sum(size for mtime, size, path in self._get_entries())
+
+    size = property(_get_size)
+
+    def load(self, key):
+        '''Return a dictionary with the arrays of an entry or None if missing
+
+           **Arguments:**
+
+           key
+                The key obtained with the ``get_key`` method.
+        '''
+        path = os.path.join(self.dirname, key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            result = {}
+            for fn in os.listdir(path):
+                if fn.endswith('.npy'):
+                    result[fn[:-4]] = np.load(os.path.join(path, fn), mmap_mode='c')
+            # Mark the entry as recently used.
+            os.utime(path, None)
+        except (OSError, IOError):
+            # The entry was removed by another process.
+            return None
+        if log.do_medium:
+            log('Loaded cached grid %s from %s' % (key, self.dirname))
+        return result
+
+    def dump(self, key, **arrays):
+        '''Store arrays in a new entry
+
+           **Arguments:**
+
+           key
+                The key obtained with the ``get_key`` method.
+
+           **Optional arguments:**
+
+           name1=array1, name2=array2, ...
+                The arrays to be stored.
+        '''
+        path = os.path.join(self.dirname, key)
+        if os.path.isdir(path):
+            return
+        tmp = tempfile.mkdtemp(prefix='.%s-' % key, dir=self.dirname)
+        try:
+            for name, array in arrays.iteritems():
+                np.save(os.path.join(tmp, '%s.npy' % name), array)
+            os.rename(tmp, path)
+        except OSError:
+            # Another process has stored the same entry in the meantime.
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        if log.do_medium:
+            log('Stored grid %s in %s' % (key, self.dirname))
+        if self.max_size is not None:
+            self._evict(key)
+
+    def _evict(self, keep):
+        '''Remove least recently used entries until the cache is small enough
+
+           **Arguments:**
+
+           keep
+                The key of an entry that must not be removed.
+        '''
+        entries = self._get_entries()
+        entries.sort()
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            if os.path.basename(path) == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        '''Remove all entries'''
+        for mtime, size, path in self._get_entries():
+            shutil.rmtree(path, ignore_errors=True)
@@ -42,7 +42,7 @@ class BeckeMolGrid(IntGrid):
     '''Molecular integration grid using Becke weights'''
 
     @timer.with_section('Becke-Lebedev')
-    def __init__(self, centers, numbers, pseudo_numbers=None, agspec='medium', k=3, random_rotate=True, mode='discard'):
+    def __init__(self, centers, numbers, pseudo_numbers=None, agspec='medium', k=3, random_rotate=True, mode='discard', nthreads=1, cache=None):
         '''
            **Arguments:**
 
@@ -81,6 +81,18 @@ class BeckeMolGrid(IntGrid):
                 * ``'only'`` means that only the subgrids are constructed and
                   that the computation of the molecular integration weights
                   (based on the Becke partitioning) is skipped.
+
+           nthreads
+                The number of OpenMP threads used to compute the Becke weights.
+                The weights do not depend on the number of threads.
+
+           cache
+                An instance of GridCache. When given, the grid is loaded from
+                this cache when it was constructed before with the same
+                parameters. Otherwise, the grid is constructed and stored in
+                the cache. Random rotations of the atomic grids are then
+                generated with the seed of the cache, which makes them
+                reproducible.
         '''
         natom, centers, numbers, pseudo_numbers = typecheck_geo(centers, numbers, pseudo_numbers)
         self._centers = centers
@@ -101,11 +113,27 @@ class BeckeMolGrid(IntGrid):
         self._random_rotate = random_rotate
         self._mode = mode
 
+        # Try to load the grid from the cache
+        if cache is not None:
+            key = self._get_cache_key(cache)
+            record = cache.load(key)
+            if random_rotate:
+                # Make random rotations reproducible
+                rng_state = np.random.get_state()
+                np.random.seed(cache.seed)
+        else:
+            record = None
+
         # allocate memory for the grid
         size = sum(agspec.get_size(self.numbers[i], self.pseudo_numbers[i]) for i in xrange(natom))
-        points = np.zeros((size, 3), float)
-        weights = np.zeros(size, float)
-        self._becke_weights = np.ones(size, float)
+        if record is None:
+            points = np.zeros((size, 3), float)
+            weights = np.zeros(size, float)
+            self._becke_weights = np.ones(size, float)
+        else:
+            points = record['points']
+            weights = record['weights']
+            self._becke_weights = record['becke_weights']
         log.mem.announce(points.nbytes + weights.nbytes)
 
         # construct the atomic grids
@@ -120,23 +148,37 @@ class BeckeMolGrid(IntGrid):
             cov_radii = np.array([periodic[n].cov_radius for n in self.numbers])
 
         # The actual work:
-        if log.do_medium:
-            log('Preparing Becke-Lebedev molecular integration grid.')
-        pb = log.progress(natom)
-        for i in xrange(natom):
-            atsize = agspec.get_size(self.numbers[i], self.pseudo_numbers[i])
-            atgrid = AtomicGrid(
-                self.numbers[i], self.pseudo_numbers[i],
-                self.centers[i], agspec, random_rotate,
-                points[offset:offset+atsize])
-            if mode != 'only':
-                atbecke_weights = self._becke_weights[offset:offset+atsize]
-                becke_helper_atom(points[offset:offset+atsize], atbecke_weights, cov_radii, self.centers, i, self._k)
-                weights[offset:offset+atsize] = atgrid.weights*atbecke_weights
-            if mode != 'discard':
-                atgrids.append(atgrid)
-            offset += atsize
-            pb()
+        if record is None:
+            if log.do_medium:
+                log('Preparing Becke-Lebedev molecular integration grid.')
+            pb = log.progress(natom)
+            for i in xrange(natom):
+                atsize = agspec.get_size(self.numbers[i], self.pseudo_numbers[i])
+                atgrid = AtomicGrid(
+                    self.numbers[i], self.pseudo_numbers[i],
+                    self.centers[i], agspec, random_rotate,
+                    points[offset:offset+atsize])
+                if mode != 'only':
+                    atbecke_weights = self._becke_weights[offset:offset+atsize]
+                    becke_helper_atom(points[offset:offset+atsize], atbecke_weights, cov_radii, self.centers, i, self._k, nthreads)
+                    weights[offset:offset+atsize] = atgrid.weights*atbecke_weights
+                if mode != 'discard':
+                    atgrids.append(atgrid)
+                offset += atsize
+                pb()
+            if cache is not None:
+                cache.dump(key, points=points, weights=weights,
+                           becke_weights=self._becke_weights)
+        elif mode != 'discard':
+            # The subgrids are cheap to reconstruct. They get their own arrays
+            # with points, such that the memory maps are not modified.
+            for i in xrange(natom):
+                atgrids.append(AtomicGrid(
+                    self.numbers[i], self.pseudo_numbers[i],
+                    self.centers[i], agspec, random_rotate))
+
+        if cache is not None and random_rotate:
+            np.random.set_state(rng_state)
 
         # finish
         IntGrid.__init__(self, points, weights, atgrids)
@@ -144,6 +186,18 @@ class BeckeMolGrid(IntGrid):
         # Some screen info
         self._log_init()
 
+    def _get_cache_key(self, cache):
+        '''Return the key of this grid in a GridCache'''
+        fields = [
+            self._centers, self._numbers, self._pseudo_numbers, self._k,
+            self._random_rotate, self._mode,
+        ]
+        # Only the atomic grids of the elements in this molecule are relevant.
+        for i in xrange(len(self._numbers)):
+            rgrid, nlls = self._agspec.get(self._numbers[i], self._pseudo_numbers[i])
+            fields.extend([rgrid.rtransform.to_string(), nlls])
+        return cache.get_key(*fields)
+
     def __del__(self):
         if log is not None and hasattr(self, 'weights'):
             log.mem.denounce(self.points.nbytes + self.weights.nbytes)
@@ -312,6 +312,47 @@ def test_atgrid_attrs():
     assert ag.random_rotate
 
 
+def test_atomic_grid_template():
+    center = np.array([0.7, 0.2, -0.5], float)
+    rgrid = RadialGrid(ExpRTransform(1e-3, 1e1, 3), StubIntegrator1D())
+    nlls = [6, 14, 26]
+    ag = AtomicGrid(3, 3, center, (rgrid, nlls), random_rotate=False)
+    # Manual construction of the same grid
+    offset = 0
+    for i in xrange(3):
+        points = np.zeros((nlls[i], 3), float)
+        weights = np.zeros(nlls[i], float)
+        lebedev_laikov_sphere(points, weights)
+        points *= rgrid.radii[i]
+        points += center
+        weights *= rgrid.weights[i]
+        assert abs(ag.points[offset:offset+nlls[i]] - points).max() < 1e-10
+        assert abs(ag.weights[offset:offset+nlls[i]] - weights).max() < 1e-10
+        offset += nlls[i]
+    # The template is shared and can not be modified through a grid.
+    ag.points[:] = 0.0
+    ag.weights[:] = 0.0
+    ag = AtomicGrid(3, 3, center, (rgrid, nlls), random_rotate=False)
+    assert abs(ag.points[:6] - center).max() > 1e-3
+    assert (ag.weights > 0).all()
+
+
+def test_atomic_grid_seed():
+    center = np.array([0.7, 0.2, -0.5], float)
+    rgrid = RadialGrid(ExpRTransform(1e-3, 1e1, 10))
+    ag0 = AtomicGrid(3, 3, center, (rgrid, 26), seed=1)
+    ag1 = AtomicGrid(3, 3, center, (rgrid, 26), seed=1)
+    ag2 = AtomicGrid(3, 3, center, (rgrid, 26), seed=2)
+    ag3 = AtomicGrid(3, 3, center, (rgrid, 26), random_rotate=False)
+    assert abs(ag0.points - ag1.points).max() < 1e-15
+    assert abs(ag0.points - ag2.points).max() > 1e-3
+    assert abs(ag0.weights - ag3.weights).max() < 1e-15
+    # Rotations do not change the radii.
+    radii0 = np.sqrt(((ag0.points - center)**2).sum(axis=1))
+    radii3 = np.sqrt(((ag3.points - center)**2).sum(axis=1))
+    assert abs(radii0 - radii3).max() < 1e-10
+
+
 def test_random_rotation():
     for i in xrange(10):
         rotmat = get_random_rotation()
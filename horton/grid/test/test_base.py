@@ -21,9 +21,10 @@
 #pylint: skip-file
 
 
+from nose.tools import assert_raises
 import numpy as np
 from horton import *
-from horton.grid.test.common import get_cosine_spline
+from horton.grid.test.common import get_cosine_spline, get_exp_spline
 from horton.test.common import get_random_cell
 
 
@@ -124,6 +125,36 @@ def test_grid_integrate_cartesian_moments_segments():
         assert abs(ints[i, 9] - (grid.weights*dens*z*z)[begin:end].sum()) < 1e-10
 
 
+def test_grid_integrate_large_segments():
+    # The segments span several blocks of the threaded reduction and include
+    # an empty segment.
+    segments = np.array([3000, 0, 1024, 1, 2500])
+    npoint = segments.sum()
+    grid = IntGrid(np.random.normal(0, 1, (npoint,3)), np.random.normal(0, 1, npoint))
+    pot = np.random.normal(0, 1, npoint)
+    dens = np.random.normal(0, 1, npoint)
+    center = np.random.normal(0, 1, 3)
+    x = grid.points[:,0]-center[0]
+    z = grid.points[:,2]-center[2]
+
+    assert abs(grid.integrate(pot, dens) - (grid.weights*pot*dens).sum()) < 1e-10
+    ints = grid.integrate(pot, dens, segments=segments)
+    assert ints.shape == (5,)
+    moments = grid.integrate(dens, center=center, lmax=2, mtype=1, segments=segments)
+    assert moments.shape == (5, 10)
+    begin = 0
+    for i in xrange(len(segments)):
+        end = begin + segments[i]
+        assert abs(ints[i] - (grid.weights*pot*dens)[begin:end].sum()) < 1e-10
+        assert abs(moments[i, 0] - (grid.weights*dens)[begin:end].sum()) < 1e-10
+        assert abs(moments[i, 1] - (grid.weights*dens*x)[begin:end].sum()) < 1e-10
+        assert abs(moments[i, 6] - (grid.weights*dens*x*z)[begin:end].sum()) < 1e-10
+        begin = end
+
+    with assert_raises(ValueError):
+        grid.integrate(pot, segments=np.array([10, 20]))
+
+
 def test_grid_integrate_pure_moments():
     npoint = 10
     grid = IntGrid(np.random.normal(0, 1, (npoint,3)), np.random.normal(0, 1, npoint))
@@ -323,6 +354,71 @@ def test_eval_spline_grid_add_random():
         assert abs(output1 + output2 - output3).max() < 1e-10
 
 
+def test_eval_splines_random():
+    npoint = 100
+    ncenter = 5
+    for i in xrange(10):
+        cell = get_random_cell(1.0, np.random.randint(4))
+        points = np.random.normal(-2, 3, (npoint,3))
+        g = IntGrid(points, np.random.normal(0, 1.0, npoint))
+        cs = [get_cosine_spline(), get_exp_spline()]*3
+        cs = cs[:ncenter]
+        centers = np.random.uniform(-2, 2, (ncenter, 3))
+
+        output1 = np.zeros(npoint)
+        for spline, center in zip(cs, centers):
+            g.eval_spline(spline, center, output1, cell)
+
+        output2 = np.zeros(npoint)
+        g.eval_splines(cs, centers, output2, cell)
+        assert abs(output1 - output2).max() < 1e-10
+
+        output3 = np.zeros(npoint)
+        g.eval_splines(cs, centers, output3, cell, binsize=0.7)
+        assert abs(output1 - output3).max() < 1e-10
+
+
+def test_eval_splines_tail():
+    npoint = 100
+    rtf = LinearRTransform(0.0, 2.0, 100)
+    x = rtf.get_radii()
+    cs = CubicSpline(np.exp(-x), -np.exp(-x), rtf, PowerExtrapolation(-1))
+    points = np.random.normal(0, 3, (npoint,3))
+    g = IntGrid(points, np.random.normal(0, 1.0, npoint))
+    centers = np.random.uniform(-2, 2, (3, 3))
+
+    output1 = np.zeros(npoint)
+    for center in centers:
+        g.eval_spline(cs, center, output1)
+
+    output2 = np.zeros(npoint)
+    g.eval_splines([cs]*3, centers, output2)
+    assert abs(output1 - output2).max() < 1e-10
+
+
+def test_eval_decompositions_random():
+    npoint = 100
+    ncenter = 3
+    for i in xrange(10):
+        cell = get_random_cell(1.0, np.random.randint(4))
+        points = np.random.normal(-2, 3, (npoint,3))
+        g = IntGrid(points, np.random.normal(0, 1.0, npoint))
+        decompositions = [[get_cosine_spline()] + [get_exp_spline()]*8]*ncenter
+        centers = np.random.uniform(-2, 2, (ncenter, 3))
+
+        output1 = np.zeros(npoint)
+        for splines, center in zip(decompositions, centers):
+            g.eval_decomposition(splines, center, output1, cell)
+
+        output2 = np.zeros(npoint)
+        g.eval_decompositions(decompositions, centers, output2, cell)
+        assert abs(output1 - output2).max() < 1e-10
+
+        output3 = np.zeros(npoint)
+        g.eval_decompositions(decompositions, centers, output3, cell, binsize=0.7)
+        assert abs(output1 - output3).max() < 1e-10
+
+
 def test_density_decomposition_n2():
     # compute reference density and becke_weights for the first atom
     mol = IOData.from_file(context.get_fn('test/n2_hfs_sto3g.fchk'))
@@ -83,3 +83,45 @@ def test_becke_special_points():
     assert abs(weights[0]) < 1e-10
     assert abs(weights[1]) < 1e-10
     assert abs(weights[2] - 1.0) < 1e-10
+
+
+def becke_reference(points, radii, centers, select, order):
+    '''Straightforward evaluation of the Becke weights, without pruning'''
+    natom = len(centers)
+    dists = np.sqrt(((points[:, None, :] - centers)**2).sum(axis=2))
+    cell = np.ones((len(points), natom), float)
+    for iatom0 in xrange(natom):
+        for iatom1 in xrange(natom):
+            if iatom0 == iatom1:
+                continue
+            alpha = (radii[iatom0] - radii[iatom1])/(radii[iatom0] + radii[iatom1])
+            alpha = np.clip(alpha/(alpha*alpha - 1), -0.45, 0.45)
+            s = (dists[:, iatom0] - dists[:, iatom1])/np.linalg.norm(centers[iatom0] - centers[iatom1])
+            s = s + alpha*(1 - s*s)
+            for k in xrange(order):
+                s = 0.5*s*(3 - s*s)
+            cell[:, iatom0] *= 0.5*(1 - s)
+    return cell[:, select]/cell.sum(axis=1)
+
+
+def test_becke_pruning_threads():
+    # A chain of atoms, long enough to have pruned contributions
+    natom = 12
+    centers = np.zeros((natom, 3), float)
+    centers[:, 0] = 1.4*np.arange(natom)
+    centers[:, 1:] = np.random.uniform(-0.3, 0.3, (natom, 2))
+    radii = np.random.uniform(0.5, 1.5, natom)
+    points = np.random.uniform(-2.0, 17.0, (500, 3))
+    points[:, 1:] /= 5
+    total = np.zeros(len(points), float)
+    for select in 0, 5, natom-1:
+        expected = becke_reference(points, radii, centers, select, 3)
+        for nthreads in 1, 3:
+            weights = np.ones(len(points), float)
+            becke_helper_atom(points, weights, radii, centers, select, 3, nthreads)
+            assert abs(weights - expected).max() < 1e-12
+    for select in xrange(natom):
+        weights = np.ones(len(points), float)
+        becke_helper_atom(points, weights, radii, centers, select, 3, 2)
+        total += weights
+    assert abs(total - 1).max() < 1e-12
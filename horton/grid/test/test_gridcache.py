@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+#pylint: skip-file
+
+
+import os
+
+import numpy as np
+
+from horton import *
+from horton.test.common import tmpdir
+
+
+def get_water():
+    numbers = np.array([8, 1, 1])
+    centers = np.array([[0.0, 0.0, 0.2], [0.0, 1.4, -0.8], [0.0, -1.4, -0.8]])
+    return numbers, centers
+
+
+def test_grid_cache_reuse():
+    numbers, centers = get_water()
+    with tmpdir('horton.grid.test.test_gridcache.test_grid_cache_reuse') as dn:
+        cache = GridCache(dn, seed=5)
+        grid1 = BeckeMolGrid(centers, numbers, agspec='coarse', cache=cache)
+        assert len(os.listdir(dn)) == 1
+        grid2 = BeckeMolGrid(centers, numbers, agspec='coarse', cache=cache)
+        assert isinstance(grid2.weights, np.memmap)
+        assert (grid1.points == grid2.points).all()
+        assert (grid1.weights == grid2.weights).all()
+        assert (grid1.becke_weights == grid2.becke_weights).all()
+        # The random rotations are reproducible.
+        grid3 = BeckeMolGrid(centers, numbers, agspec='coarse', cache=GridCache(dn, seed=5))
+        assert (grid1.points == grid3.points).all()
+        # Any change in the parameters gives a new entry.
+        BeckeMolGrid(centers, numbers, agspec='coarse', k=4, cache=cache)
+        BeckeMolGrid(centers, numbers, agspec='coarse', cache=GridCache(dn, seed=6))
+        BeckeMolGrid(centers+0.1, numbers, agspec='coarse', cache=cache)
+        BeckeMolGrid(centers, numbers, agspec='fine', cache=cache)
+        assert len(os.listdir(dn)) == 5
+
+
+def test_grid_cache_keep():
+    numbers, centers = get_water()
+    with tmpdir('horton.grid.test.test_gridcache.test_grid_cache_keep') as dn:
+        cache = GridCache(dn)
+        grid1 = BeckeMolGrid(centers, numbers, agspec='coarse', mode='keep', cache=cache)
+        grid2 = BeckeMolGrid(centers, numbers, agspec='coarse', mode='keep', cache=cache)
+        assert len(grid1.subgrids) == len(grid2.subgrids)
+        for atgrid1, atgrid2 in zip(grid1.subgrids, grid2.subgrids):
+            assert (atgrid1.points == atgrid2.points).all()
+            assert (atgrid1.weights == atgrid2.weights).all()
+        # The cached grid is usable.
+        fn = np.exp(-((grid2.points - centers[0])**2).sum(axis=1))
+        assert abs(grid1.integrate(fn) - grid2.integrate(fn)) < 1e-14
+        assert abs(grid2.integrate(fn) - np.pi**1.5) < 1e-4
+
+
+def test_grid_cache_evict():
+    numbers, centers = get_water()
+    with tmpdir('horton.grid.test.test_gridcache.test_grid_cache_evict') as dn:
+        cache = GridCache(dn)
+        BeckeMolGrid(centers, numbers, agspec='coarse', cache=cache)
+        size = cache.size
+        assert size > 0
+        cache.max_size = 2*size + 1
+        key1 = BeckeMolGrid(centers+0.1, numbers, agspec='coarse', cache=cache)._get_cache_key(cache)
+        key2 = BeckeMolGrid(centers+0.2, numbers, agspec='coarse', cache=cache)._get_cache_key(cache)
+        assert sorted(os.listdir(dn)) == sorted([key1, key2])
+        assert cache.size <= cache.max_size
+        cache.clear()
+        assert cache.size == 0
@@ -719,6 +719,49 @@ def test_window0():
     check_window_wrap(window, center, radius)
 
 
+def check_stockholder_weights(pbc, blocksize, nthreads):
+    origin = np.zeros(3, float)
+    grid_rvecs = np.identity(3, float)*0.1
+    shape = np.array([8, 10, 12])
+    ugrid = UniformGrid(origin, grid_rvecs, shape, pbc)
+    natom = 4
+    centers = np.random.uniform(0, 1, (natom, 3))
+    splines = [get_random_spline(np.random.uniform(0.3, 1.5)) for i in xrange(natom)]
+    windows = [ugrid.get_window(centers[i], splines[i].rtransform.get_radii()[-1]) for i in xrange(natom)]
+
+    # compute the promolecule and the atomic weights in the conventional way
+    expected_promoldens = ugrid.zeros()
+    expected_at_weights = []
+    for i in xrange(natom):
+        proatom = windows[i].zeros()
+        windows[i].eval_spline(splines[i], centers[i], proatom)
+        proatom += 1e-100
+        windows[i].wrap(proatom, expected_promoldens)
+        expected_at_weights.append(proatom)
+    for i in xrange(natom):
+        local_promoldens = windows[i].zeros()
+        windows[i].extend(expected_promoldens, local_promoldens)
+        expected_at_weights[i] /= local_promoldens
+        np.clip(expected_at_weights[i], 0, 1, out=expected_at_weights[i])
+
+    # compare with the fused routine
+    promoldens = ugrid.zeros()
+    at_weights = [window.zeros() for window in windows]
+    ugrid.compute_stockholder_weights(splines, centers, windows, at_weights, promoldens, blocksize, nthreads)
+    assert expected_promoldens.max() > 1
+    assert abs(promoldens - expected_promoldens).max() < 1e-10
+    for i in xrange(natom):
+        assert at_weights[i].max() > 0
+        assert abs(at_weights[i] - expected_at_weights[i]).max() < 1e-10
+
+
+def test_stockholder_weights():
+    for pbc in [1, 1, 1], [1, 0, 1], [0, 0, 0]:
+        for blocksize in 1, 3, 16:
+            for nthreads in 1, 3:
+                check_stockholder_weights(np.array(pbc), blocksize, nthreads)
+
+
 def test_block3iterator():
     b3i = Block3Iterator(np.array([0, 0, 0]), np.array([4, 6, 9]), np.array([4, 6, 9]))
     assert (b3i.block_begin == [0, 0, 0]).all()
@@ -25,8 +25,10 @@
 #include <cstdio>
 #endif
 
+#include <algorithm>
 #include <cmath>
 #include <stdexcept>
+#include <vector>
 #include "horton/moments.h"
 #include "horton/grid/utils.h"
 
@@ -44,15 +46,6 @@ double data_product(long ipoint, long nvector, double** data) {
 }
 
 
-void shift_segment(long ipoint, long* &segments, long &segment_end, double* &output, long increment) {
-    if (ipoint == segment_end) {
-        segments++;
-        segment_end += *segments;
-        output += increment;
-    }
-}
-
-
 void fill_polynomials_wrapper(double* work, double* delta, long lmax, long mtype) {
     if (mtype==1) {
         work[0] = delta[0];
@@ -78,25 +71,132 @@ void fill_polynomials_wrapper(double* work, double* delta, long lmax, long mtype
 
 
 /*
-    Public stuff
+    The reductions in dot_multi and dot_multi_moments divide each segment in
+    blocks of at most dot_block_size consecutive points. The partial sums of the
+    blocks are computed in parallel and then combined per segment with pairwise
+    summation. The block layout only depends on the segments, such that the
+    result does not depend on the number of threads.
 */
 
+const long dot_block_size = 1024;
+
+
+void dot_multi_block(long begin, long end, long nvector, double** data,
+    double* points, double* center, long lmax, long mtype, double* output,
+    long nmoment, double* work) {
+    for (long ipoint=begin; ipoint < end; ipoint++) {
+        // do the usual product of integranda
+        double term = data_product(ipoint, nvector, data);
+
+        output[0] += term;
+
+        if (lmax > 0) {
+            // construct relative vector
+            double delta[3];
+            delta[0] = points[ipoint*3  ] - center[0];
+            delta[1] = points[ipoint*3+1] - center[1];
+            delta[2] = points[ipoint*3+2] - center[2];
+
+            // evaluate polynomials in work array
+            fill_polynomials_wrapper(work, delta, lmax, mtype);
+
+            // add product of polynomial and integrand to output
+            for (long imoment=1; imoment < nmoment; imoment++) {
+                output[imoment] += term*work[imoment-1];
+            }
+        }
+    }
+}
+
+
+void pairwise_sum(long nblock, long nmoment, double* block_output, double* output) {
+    for (long stride=1; stride < nblock; stride *= 2) {
+        for (long iblock=0; iblock+stride < nblock; iblock += 2*stride) {
+            double* dest = block_output + iblock*nmoment;
+            double* src = block_output + (iblock+stride)*nmoment;
+            for (long imoment=0; imoment < nmoment; imoment++) {
+                dest[imoment] += src[imoment];
+            }
+        }
+    }
+    if (nblock > 0) {
+        for (long imoment=0; imoment < nmoment; imoment++) {
+            output[imoment] += block_output[imoment];
+        }
+    }
+}
+
+
+void dot_multi_blocks(long npoint, long nvector, double** data, double* points,
+    double* center, long lmax, long mtype, long nsegment, long* segments,
+    double* output, long nmoment) {
 
-void dot_multi(long npoint, long nvector, double** data, long* segments, double* output) {
-    long segment_end = *segments;
-    for (long ipoint=0; ipoint < npoint; ipoint++) {
-        // shift the output array if needed
-        shift_segment(ipoint, segments, segment_end, output, 1);
+    // Lay out the blocks. segment_blocks[isegment] is the index of the first
+    // block in segment isegment.
+    std::vector<long> segment_blocks(nsegment+1);
+    segment_blocks[0] = 0;
+    long total = 0;
+    for (long isegment=0; isegment < nsegment; isegment++) {
+        if (segments[isegment] < 0) {
+            throw std::domain_error("Segment sizes can not be negative.");
+        }
+        total += segments[isegment];
+        segment_blocks[isegment+1] = segment_blocks[isegment] +
+            (segments[isegment] + dot_block_size - 1)/dot_block_size;
+    }
+    if (total != npoint) {
+        throw std::domain_error("The sum of the segment sizes must match the number of grid points.");
+    }
+    long nblock = segment_blocks[nsegment];
+    std::vector<long> block_begin(nblock);
+    std::vector<long> block_end(nblock);
+    long begin = 0;
+    for (long isegment=0; isegment < nsegment; isegment++) {
+        long end = begin + segments[isegment];
+        for (long iblock=segment_blocks[isegment]; iblock < segment_blocks[isegment+1]; iblock++) {
+            block_begin[iblock] = begin + (iblock - segment_blocks[isegment])*dot_block_size;
+            block_end[iblock] = std::min(block_begin[iblock] + dot_block_size, end);
+        }
+        begin = end;
+    }
 
-        // add product to output
-        *output += data_product(ipoint, nvector, data);
+    // Partial sums of all blocks. Small grids, e.g. radial grids, fit in one
+    // block and are handled without starting a team of threads.
+    std::vector<double> block_output(nblock*nmoment, 0.0);
+    #pragma omp parallel if(nblock > 1)
+    {
+        std::vector<double> work(nmoment);
+        #pragma omp for schedule(static)
+        for (long iblock=0; iblock < nblock; iblock++) {
+            dot_multi_block(block_begin[iblock], block_end[iblock], nvector,
+                data, points, center, lmax, mtype,
+                &block_output[iblock*nmoment], nmoment, &work[0]);
+        }
+    }
+
+    // Combine the partial sums of each segment
+    for (long isegment=0; isegment < nsegment; isegment++) {
+        pairwise_sum(segment_blocks[isegment+1] - segment_blocks[isegment], nmoment,
+            &block_output[segment_blocks[isegment]*nmoment], output + isegment*nmoment);
 #ifdef DEBUG
-        printf("*output=%f; ipoint=%i; segment_end=%i\n", *output, ipoint, segment_end);
+        printf("output[%li]=%f\n", isegment*nmoment, output[isegment*nmoment]);
 #endif
     }
 }
 
 
+/*
+    Public stuff
+*/
+
+
+void dot_multi(long npoint, long nvector, double** data, long nsegment,
+    long* segments, double* output) {
+    dot_multi_blocks(npoint, nvector, data, NULL, NULL, 0, 1, nsegment,
+        segments, output, 1);
+}
+
+
 void dot_multi_moments_cube(long nvector, double** data, UniformGrid* ugrid, double* center, long lmax, long mtype, double* output, long nmoment) {
     Cell* cell = ugrid->get_cell();
     long nvec = cell->get_nvec();
@@ -142,8 +242,8 @@ void dot_multi_moments_cube(long nvector, double** data, UniformGrid* ugrid, dou
 }
 
 void dot_multi_moments(long npoint, long nvector, double** data, double* points,
-    double* center, long lmax, long mtype, long* segments, double* output,
-    long nmoment) {
+    double* center, long lmax, long mtype, long nsegment, long* segments,
+    double* output, long nmoment) {
 
     if (lmax<0) {
         throw std::domain_error("lmax can not be negative.");
@@ -152,31 +252,6 @@ void dot_multi_moments(long npoint, long nvector, double** data, double* points,
         throw std::domain_error("mtype should be 1, 2, 3 or 4.");
     }
 
-    long segment_end = *segments;
-    for (long ipoint=0; ipoint < npoint; ipoint++) {
-        // shift the output array if needed
-        shift_segment(ipoint, segments, segment_end, output, nmoment);
-
-        // do the usual product of integranda
-        double term = data_product(ipoint, nvector, data);
-
-        output[0] += term;
-
-        if (lmax > 0) {
-            // construct relative vector
-            double delta[3];
-            delta[0] = points[ipoint*3  ] - center[0];
-            delta[1] = points[ipoint*3+1] - center[1];
-            delta[2] = points[ipoint*3+2] - center[2];
-
-            // evaluate polynomials in work array
-            double work[nmoment-1];
-            fill_polynomials_wrapper(work, delta, lmax, mtype);
-
-            // add product of polynomial and integrand to output
-            for (long imoment=1; imoment < nmoment; imoment++) {
-                output[imoment] += term*work[imoment-1];
-            }
-        }
-    }
+    dot_multi_blocks(npoint, nvector, data, points, center, lmax, mtype,
+        nsegment, segments, output, nmoment);
 }
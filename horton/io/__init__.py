@@ -32,6 +32,7 @@
 
 from horton.io.cif import *
 from horton.io.cp2k import *
+from horton.io.cache import *
 from horton.io.cube import *
 from horton.io.gaussian import *
 from horton.io.iodata import *
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+'''Binary cache of data loaded from text files
+
+   Parsing large text files, e.g. formatted checkpoint files, takes much
+   longer than loading the same data from HDF5. The functions in this module
+   store the data loaded from a text file in an HDF5 file next to it, which is
+   used instead of the text file as long as the latter does not change.
+'''
+
+
+import os, tempfile
+
+from horton.log import log
+from horton.io.internal import load_h5, dump_h5
+from horton.io.lockedh5 import LockedH5File
+
+
+__all__ = ['get_cache_filename', 'load_cached']
+
+
+# Change this when the layout of the cache files changes, such that old cache
+# files are no longer used.
+cache_version = 1
+
+
+def get_cache_filename(filename):
+    '''Return the filename of the binary cache of a text file'''
+    return '%s.cache.h5' % filename
+
+
+def _get_source_attrs(filename):
+    '''Return the attributes that identify the current version of a file'''
+    stat = os.stat(filename)
+    return {
+        'cache_version': cache_version,
+        'source_size': stat.st_size,
+        'source_mtime': stat.st_mtime,
+    }
+
+
+def load_cached(filename, load, lf, lazy=False):
+    '''Load data from a text file or from its binary cache
+
+       **Arguments:**
+
+       filename
+            The text file.
+
+       load
+            The function that loads the text file. It is called as
+            ``load(filename, lf)`` and must return a dictionary.
+
+       lf
+            A LinalgFactory instance.
+
+       **Optional arguments:**
+
+       lazy
+            When set to True, the data is loaded from the cache in lazy mode.
+            See :py:func:`horton.io.internal.load_h5`. When the cache file is
+            missing or outdated, the text file is loaded completely, the cache
+            file is written and then loaded in lazy mode.
+
+       **Returns:** the dictionary returned by the load function.
+
+       The cache file is an HDF5 file with all the data returned by the load
+       function, except for ``lf``, see :py:func:`get_cache_filename`. It also
+       contains the size and modification time of the text file. When these no
+       longer match, the text file is loaded again and the cache file is
+       replaced. When the cache file can not be written, e.g. because the
+       directory is read-only, the data is only returned.
+    '''
+    fn_cache = get_cache_filename(filename)
+    source_attrs = _get_source_attrs(filename)
+    result = _load_cache(fn_cache, source_attrs, lf, lazy)
+    if result is None:
+        result = load(filename, lf)
+        if _dump_cache(fn_cache, source_attrs, lf, result) and lazy:
+            # Replace the data in memory by the memory-mapped cache file.
+            cached = _load_cache(fn_cache, source_attrs, lf, lazy)
+            if cached is not None:
+                result = cached
+    return result
+
+
+def _load_cache(fn_cache, source_attrs, lf, lazy):
+    '''Return the data from a cache file or None if it is missing or outdated'''
+    if not os.path.isfile(fn_cache):
+        return None
+    try:
+        with LockedH5File(fn_cache, 'r', count=1) as f:
+            for key, value in source_attrs.iteritems():
+                if f.attrs.get(key) != value:
+                    return None
+            nbasis = f.attrs.get('nbasis')
+            if not lazy:
+                result = load_h5(f)
+        if lazy:
+            result = load_h5(fn_cache, lazy=True)
+    except (IOError, KeyError):
+        # The cache file is being written or it is corrupt.
+        return None
+    if nbasis is not None:
+        if lf.default_nbasis is not None and lf.default_nbasis != nbasis:
+            raise TypeError('The value of lf.default_nbasis does not match nbasis in the cache file %s.' % fn_cache)
+        lf.default_nbasis = nbasis
+    result['lf'] = lf
+    if log.do_medium:
+        log('Loaded cached data from %s' % fn_cache)
+    return result
+
+
+def _dump_cache(fn_cache, source_attrs, lf, result):
+    '''Write a cache file, without raising an exception when this fails
+
+       **Returns:** True when the cache file was written.
+    '''
+    data = result.copy()
+    data.pop('lf', None)
+    fn_tmp = None
+    try:
+        fd, fn_tmp = tempfile.mkstemp(suffix='.h5', prefix='.', dir=os.path.dirname(fn_cache) or '.')
+        os.close(fd)
+        with LockedH5File(fn_tmp, 'w', count=1) as f:
+            dump_h5(f, data)
+            f.attrs.update(source_attrs)
+            if lf.default_nbasis is not None:
+                f.attrs['nbasis'] = lf.default_nbasis
+        # The rename is atomic, such that concurrent jobs never read a partially
+        # written cache file.
+        os.rename(fn_tmp, fn_cache)
+    except (IOError, OSError), e:
+        if fn_tmp is not None and os.path.isfile(fn_tmp):
+            os.remove(fn_tmp)
+        if log.do_warning:
+            log.warn('Could not write cache file %s: %s' % (fn_cache, e))
+        return False
+    if log.do_medium:
+        log('Stored cached data in %s' % fn_cache)
+    return True
@@ -22,6 +22,8 @@
 
 
 import numpy as np
+
+from horton.io.utils import parse_numbers
 from horton.cext import Cell
 from horton.grid.cext import UniformGrid
 
@@ -79,18 +81,10 @@ def _read_cube_header(f):
 
 
 def _read_cube_data(f, ugrid):
-    data = np.zeros(tuple(ugrid.shape), float)
-    tmp = data.ravel()
-    counter = 0
-    while True:
-        line = f.readline()
-        if len(line) == 0:
-            break
-        words = line.split()
-        for word in words:
-            tmp[counter] = float(word)
-            counter += 1
-    return data
+    # The remainder of the file contains the data, with an arbitrary number of
+    # values per line.
+    data = parse_numbers(f.read(), ugrid.shape.prod())
+    return data.reshape(tuple(ugrid.shape))
 
 
 def load_cube(filename):
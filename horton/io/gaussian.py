@@ -23,6 +23,8 @@
 
 import numpy as np
 
+from horton.io.utils import read_numbers, skip_numbers, LazyField
+
 
 __all__ = ['load_operators_g09', 'FCHKFile', 'load_fchk']
 
@@ -152,7 +154,7 @@ class FCHKFile(dict):
        command, lot (level of theory) and basis.
     """
 
-    def __init__(self, filename, field_labels=None):
+    def __init__(self, filename, field_labels=None, lazy=False):
         """
            **Arguments:**
 
@@ -164,12 +166,42 @@ class FCHKFile(dict):
            field_labels
                 When provided, only these fields are read from the formatted
                 checkpoint file. (This can save a lot of time.)
+
+           lazy
+                When set to True, arrays are not read when the file is opened.
+                Only their positions in the file are recorded and each array is
+                read when it is accessed for the first time.
         """
         dict.__init__(self, [])
         self.filename = filename
-        self._read(filename, set(field_labels))
-
-    def _read(self, filename, field_labels=None):
+        self._offsets = {}
+        if field_labels is not None:
+            field_labels = set(field_labels)
+        self._read(filename, field_labels, lazy)
+
+    def __missing__(self, label):
+        """Read an array that was skipped in lazy mode"""
+        if label not in self._offsets:
+            raise KeyError(label)
+        offset, length, datatype = self._offsets.pop(label)
+        with open(self.filename) as f:
+            f.seek(offset)
+            try:
+                value = read_numbers(iter(f.readline, ''), length, datatype)
+            except IOError, e:
+                raise IOError('Could not read field %s from %s: %s' % (label, self.filename, e))
+        self[label] = value
+        return value
+
+    def __contains__(self, label):
+        return dict.__contains__(self, label) or label in self._offsets
+
+    def get(self, label, default=None):
+        if label in self:
+            return self[label]
+        return default
+
+    def _read(self, filename, field_labels=None, lazy=False):
         """Read all the requested fields"""
         # if fields is None, all fields are read
         def read_field(f):
@@ -208,21 +240,14 @@ class FCHKFile(dict):
                 if words[1] != "N=":
                     raise IOError("Unexpected line in formatted checkpoint file %s\n%s" % (filename, line[:-1]))
                 length = int(words[2])
-                value = np.zeros(length, datatype)
-                counter = 0
                 try:
-                    while counter < length:
-                        line = f.readline()
-                        if line == "":
-                            raise IOError("Unexpected end of formatted checkpoint file %s" % filename)
-                        for word in line.split():
-                            try:
-                                value[counter] = datatype(word)
-                            except (ValueError, OverflowError), e:
-                                raise IOError('Could not interpret word while reading %s: %s' % (word, filename))
-                            counter += 1
-                except ValueError:
-                    return True
+                    if lazy:
+                        self._offsets[label] = (f.tell(), length, datatype)
+                        skip_numbers(iter(f.readline, ''), length)
+                        return True
+                    value = read_numbers(iter(f.readline, ''), length, datatype)
+                except IOError, e:
+                    raise IOError('Could not read field %s from %s: %s' % (label, filename, e))
             else:
                 raise IOError("Unexpected line in formatted checkpoint file %s\n%s" % (filename, line[:-1]))
 
@@ -268,7 +293,7 @@ def triangle_to_dense(triangle):
     return result
 
 
-def load_fchk(filename, lf):
+def load_fchk(filename, lf, lazy=False):
     '''Load from a formatted checkpoint file.
 
        **Arguments:**
@@ -279,6 +304,13 @@ def load_fchk(filename, lf):
        lf
             A LinalgFactory instance.
 
+       **Optional arguments:**
+
+       lazy
+            When set to True, the orbitals and density matrices are returned as
+            :py:class:`horton.io.utils.LazyField` instances, which are only read
+            from the file when they are loaded.
+
        **Returns** a dictionary with: ``title``, ``coordinates``, ``numbers``,
        ``obasis``, ``exp_alpha``, ``permutation``, ``energy``,
        ``pseudo_numbers``, ``mulliken_charges``. The dictionary may also
@@ -307,7 +339,7 @@ def load_fchk(filename, lf):
         'Total CI Density', 'Spin CI Density',
         'Mulliken Charges', 'ESP Charges', 'NPA Charges',
         'Polarizability',
-    ])
+    ], lazy)
 
     # A) Load the geometry
     numbers = fchk["Atomic numbers"]
@@ -405,27 +437,29 @@ def load_fchk(filename, lf):
         'pseudo_numbers': pseudo_numbers,
     }
 
+    def load_field(load, *args):
+        # In lazy mode, large objects are only constructed when needed.
+        if lazy:
+            return LazyField(load, *args)
+        return load(*args)
+
     # C) Load density matrices
     def load_dm(label):
-        if label in fchk:
-            dm = lf.create_two_index(obasis.nbasis)
-            start = 0
-            for i in xrange(obasis.nbasis):
-                stop = start+i+1
-                dm._array[i,:i+1] = fchk[label][start:stop]
-                dm._array[:i+1,i] = fchk[label][start:stop]
-                start = stop
-            return dm
+        dm = lf.create_two_index(obasis.nbasis)
+        start = 0
+        for i in xrange(obasis.nbasis):
+            stop = start+i+1
+            dm._array[i,:i+1] = fchk[label][start:stop]
+            dm._array[:i+1,i] = fchk[label][start:stop]
+            start = stop
+        return dm
 
     # First try to load the post-hf density matrices.
-    load_orbitals = True
     for key in 'MP2', 'MP3', 'CC', 'CI', 'SCF':
-        dm_full = load_dm('Total %s Density' % key)
-        if dm_full is not None:
-            result['dm_full_%s' % key.lower()] = dm_full
-        dm_spin = load_dm('Spin %s Density' % key)
-        if dm_spin is not None:
-            result['dm_spin_%s' % key.lower()] = dm_spin
+        if 'Total %s Density' % key in fchk:
+            result['dm_full_%s' % key.lower()] = load_field(load_dm, 'Total %s Density' % key)
+        if 'Spin %s Density' % key in fchk:
+            result['dm_spin_%s' % key.lower()] = load_field(load_dm, 'Spin %s Density' % key)
 
     # D) Load the wavefunction
     # Handle small difference in fchk files from g03 and g09
@@ -439,25 +473,21 @@ def load_fchk(filename, lf):
     nbeta = fchk['Number of beta electrons']
     if nalpha < 0 or nbeta < 0 or nalpha+nbeta <= 0:
         raise ValueError('The file %s does not contain a positive number of electrons.' % filename)
-    exp_alpha = lf.create_expansion(obasis.nbasis, nbasis_indep)
-    exp_alpha.coeffs[:] = fchk['Alpha MO coefficients'].reshape(nbasis_indep, obasis.nbasis).T
-    exp_alpha.energies[:] = fchk['Alpha Orbital Energies']
-    exp_alpha.occupations[:nalpha] = 1.0
-    result['exp_alpha'] = exp_alpha
+
+    def load_exp(spin, nocc):
+        exp = lf.create_expansion(obasis.nbasis, nbasis_indep)
+        exp.coeffs[:] = fchk['%s MO coefficients' % spin].reshape(nbasis_indep, obasis.nbasis).T
+        exp.energies[:] = fchk['%s Orbital Energies' % spin]
+        exp.occupations[:nocc] = 1.0
+        return exp
+
+    result['exp_alpha'] = load_field(load_exp, 'Alpha', nalpha)
     if 'Beta Orbital Energies' in fchk:
         # UHF case
-        exp_beta = lf.create_expansion(obasis.nbasis, nbasis_indep)
-        exp_beta.coeffs[:] = fchk['Beta MO coefficients'].reshape(nbasis_indep, obasis.nbasis).T
-        exp_beta.energies[:] = fchk['Beta Orbital Energies']
-        exp_beta.occupations[:nbeta] = 1.0
-        result['exp_beta'] = exp_beta
+        result['exp_beta'] = load_field(load_exp, 'Beta', nbeta)
     elif fchk['Number of beta electrons'] != fchk['Number of alpha electrons']:
         # ROHF case
-        exp_beta = lf.create_expansion(obasis.nbasis, nbasis_indep)
-        exp_beta.coeffs[:] = fchk['Alpha MO coefficients'].reshape(nbasis_indep, obasis.nbasis).T
-        exp_beta.energies[:] = fchk['Alpha Orbital Energies']
-        exp_beta.occupations[:nbeta] = 1.0
-        result['exp_beta'] = exp_beta
+        result['exp_beta'] = load_field(load_exp, 'Alpha', nbeta)
         # Delete dm_full_scf because it is known to be buggy
         result.pop('dm_full_scf')
 
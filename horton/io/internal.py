@@ -23,22 +23,37 @@
 
 import numpy as np, h5py as h5
 from horton.io.lockedh5 import LockedH5File
+from horton.io.utils import LazyField
 
 
 __all__ = ['load_h5', 'dump_h5']
 
 
-def load_h5(item):
+def load_h5(item, lazy=False):
     '''Load a (HORTON) object from an h5py File/Group
 
        **Arguments:**
 
        item
             A HD5 Dataset or group, or a filename of an HDF5 file
+
+       **Optional arguments:**
+
+       lazy
+            When set to True, the members of a group (without class attribute)
+            are not loaded. Instead, arrays that are stored contiguously in a
+            file are memory-mapped and the remaining members are returned as
+            :py:class:`horton.io.utils.LazyField` instances. When ``item`` is a
+            filename, the file is opened again to load a member. Otherwise, the
+            group must remain open until all members are loaded.
     '''
     if isinstance(item, basestring):
         with LockedH5File(item, 'r') as f:
+            if lazy:
+                return _load_h5_lazy(f, item)
             return load_h5(f)
+    elif lazy and isinstance(item, h5.Group):
+        return _load_h5_lazy(item)
     elif isinstance(item, h5.Dataset):
         if len(item.shape) > 0:
             # convert to a numpy array
@@ -60,6 +75,50 @@ def load_h5(item):
             return cls.from_hdf5(item)
 
 
+def _load_h5_lazy(grp, filename=None):
+    '''Load the members of a group in lazy mode, see load_h5'''
+    if grp.attrs.get('class') is not None:
+        return load_h5(grp)
+    result = {}
+    for key, subitem in grp.iteritems():
+        if isinstance(subitem, h5.Dataset):
+            if len(subitem.shape) == 0:
+                # Scalars are cheap.
+                result[key] = subitem[()]
+                continue
+            if filename is not None:
+                array = _mmap_dataset(subitem, filename)
+                if array is not None:
+                    result[key] = array
+                    continue
+        if filename is None:
+            result[key] = LazyField(load_h5, subitem)
+        else:
+            result[key] = LazyField(_load_h5_member, filename, subitem.name)
+    return result
+
+
+def _load_h5_member(filename, name):
+    '''Load an object from an HDF5 file with the full path of the object'''
+    with LockedH5File(filename, 'r') as f:
+        return load_h5(f[name])
+
+
+def _mmap_dataset(dataset, filename):
+    '''Return a copy-on-write memory map of a dataset or None if not possible
+
+       Only contiguous datasets with a numerical dtype can be mapped. Chunked
+       (e.g. compressed) datasets and datasets without allocated storage must
+       be read with h5py.
+    '''
+    if dataset.chunks is not None or dataset.dtype.kind not in 'biuf':
+        return None
+    offset = dataset.id.get_offset()
+    if offset is None:
+        return None
+    return np.memmap(filename, dtype=dataset.dtype, mode='c', offset=offset, shape=dataset.shape)
+
+
 def dump_h5(grp, data):
     '''Dump a (HORTON) object to a HDF5 file.
 
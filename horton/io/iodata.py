@@ -27,6 +27,7 @@
 
 
 from horton.matrix import DenseLinalgFactory, LinalgObject
+from horton.io.utils import LazyField
 import h5py as h5, os, numpy as np
 
 
@@ -109,7 +110,8 @@ class ArrayTypeCheckDescriptor(object):
                                 type(obj), self._dtype.type))
         if self._matching is not None:
             for othername in self._matching:
-                other = getattr(obj, '_'+othername, None)
+                # Lazy attributes are checked when they are loaded.
+                other = obj.__dict__.get('_'+othername)
                 if other is not None:
                     for i in xrange(len(self._shape)):
                         if self._shape[i] == -1 and \
@@ -124,6 +126,22 @@ class ArrayTypeCheckDescriptor(object):
         delattr(obj, '_'+self._name)
 
 
+def _convert_basis(value, permutation, signs):
+    '''Apply changes in the order and signs of the basis functions'''
+    if permutation is not None:
+        value.permute_basis(permutation)
+    if signs is not None:
+        value.change_basis_signs(signs)
+
+
+def _load_convert_basis(field, permutation, signs):
+    '''Load a lazy field and apply changes in the basis functions if needed'''
+    value = field.load()
+    if isinstance(value, LinalgObject):
+        _convert_basis(value, permutation, signs)
+    return value
+
+
 class IOData(object):
     '''A container class for data loaded from (or to be written to) a file.
 
@@ -231,11 +249,45 @@ class IOData(object):
 
        two_mo
             Two-electron integrals in the (Hartree-Fock) molecular-orbital basis
+
+       Attributes that are set to a :py:class:`horton.io.utils.LazyField`
+       instance are only loaded when they are accessed for the first time. Note
+       that ``hasattr`` also loads such an attribute.
     '''
     def __init__(self, **kwargs):
         for key, value in kwargs.iteritems():
             setattr(self, key, value)
 
+    def __setattr__(self, name, value):
+        if isinstance(value, LazyField):
+            # Discard a loaded value, such that the lazy field is used instead.
+            if isinstance(getattr(self.__class__, name, None), ArrayTypeCheckDescriptor):
+                self.__dict__.pop('_' + name, None)
+            else:
+                self.__dict__.pop(name, None)
+            self.__dict__.setdefault('_lazy', {})[name] = value
+        else:
+            self.__dict__.get('_lazy', {}).pop(name, None)
+            object.__setattr__(self, name, value)
+
+    def __getattr__(self, name):
+        # This is only called when an attribute is not found in the usual way.
+        # The type-checked attributes are stored with a leading underscore.
+        lazy = self.__dict__.get('_lazy', {})
+        if name not in lazy and name.startswith('_') and name[1:] in lazy:
+            name = name[1:]
+        if name not in lazy:
+            raise AttributeError('\'%s\' object has no attribute \'%s\'' % (self.__class__.__name__, name))
+        setattr(self, name, lazy[name].load())
+        return object.__getattribute__(self, name)
+
+    def __delattr__(self, name):
+        lazy = self.__dict__.get('_lazy', {})
+        if name in lazy:
+            del lazy[name]
+        else:
+            object.__delattr__(self, name)
+
     # only perform type checking on minimal attributes
     numbers = ArrayTypeCheckDescriptor('numbers', 1, (-1,), int, ['coordinates', 'pseudo_numbers'])
     coordinates = ArrayTypeCheckDescriptor('coordinates', 2, (-1, 3), float, ['numbers', 'pseudo_numbers'])
@@ -272,6 +324,23 @@ class IOData(object):
            lf
                 A LinalgFactory instance. DenseLinalgFactory is used as default.
 
+           fields
+                A list of attribute names. When given, all other data from the
+                files is discarded.
+
+           lazy
+                When set to True, large fields from HDF5 and formatted checkpoint
+                files are only loaded when the corresponding attributes are
+                accessed. Contiguous arrays in HDF5 files are memory-mapped. In
+                combination with ``fields``, this avoids reading data that is
+                not needed.
+
+           cache
+                When set to True, the data loaded from formatted checkpoint files
+                is stored in a binary cache file next to each file, which is used
+                instead as long as the formatted checkpoint file does not change.
+                See :py:func:`horton.io.cache.load_cached`.
+
            This routine uses the extension or prefix of the filename to
            determine the file format. It returns a dictionary with data loaded
            from the file.
@@ -284,19 +353,26 @@ class IOData(object):
         lf = kwargs.pop('lf', None)
         if lf is None:
             lf = DenseLinalgFactory()
+        fields = kwargs.pop('fields', None)
+        lazy = kwargs.pop('lazy', False)
+        cache = kwargs.pop('cache', False)
         if len(kwargs) > 0:
             raise TypeError('Keyword argument(s) not supported: %s' % kwargs.keys())
 
         for filename in filenames:
             if isinstance(filename, h5.Group) or filename.endswith('.h5'):
                 from horton.io.internal import load_h5
-                result.update(load_h5(filename))
+                result.update(load_h5(filename, lazy))
             elif filename.endswith('.xyz'):
                 from horton.io.xyz import load_xyz
                 result.update(load_xyz(filename))
             elif filename.endswith('.fchk'):
                 from horton.io.gaussian import load_fchk
-                result.update(load_fchk(filename, lf))
+                if cache:
+                    from horton.io.cache import load_cached
+                    result.update(load_cached(filename, load_fchk, lf, lazy))
+                else:
+                    result.update(load_fchk(filename, lf, lazy))
             elif filename.endswith('.log'):
                 from horton.io.gaussian import load_operators_g09
                 result.update(load_operators_g09(filename, lf))
@@ -333,17 +409,21 @@ class IOData(object):
             else:
                 raise ValueError('Unknown file format for reading: %s' % filename)
 
+        # Discard fields that are not needed
+        if fields is not None:
+            for key in result.keys():
+                if key not in fields and key not in ['permutation', 'signs']:
+                    del result[key]
+
         # Apply changes in orbital order and sign conventions
-        if 'permutation' in result:
-            for key, value in result.iteritems():
-                if isinstance(value, LinalgObject):
-                    value.permute_basis(result['permutation'])
-            del result['permutation']
-        if 'signs' in result:
-            for key, value in result.iteritems():
+        permutation = result.pop('permutation', None)
+        signs = result.pop('signs', None)
+        if permutation is not None or signs is not None:
+            for key, value in result.items():
                 if isinstance(value, LinalgObject):
-                    value.change_basis_signs(result['signs'])
-            del result['signs']
+                    _convert_basis(value, permutation, signs)
+                elif isinstance(value, LazyField):
+                    result[key] = LazyField(_load_convert_basis, value, permutation, signs)
 
         return cls(**result)
 
@@ -362,6 +442,9 @@ class IOData(object):
 
         if isinstance(filename, h5.Group) or filename.endswith('.h5'):
             data = vars(self).copy()
+            # load all lazy fields
+            for key in data.pop('_lazy', {}).keys():
+                data[key] = getattr(self, key)
             # get rid of leading underscores
             for key in data.keys():
                 if key[0] == '_':
@@ -393,6 +476,8 @@ class IOData(object):
     def copy(self):
         '''Return a shallow copy'''
         kwargs = vars(self).copy()
+        # lazy fields are copied without loading them
+        kwargs.update(kwargs.pop('_lazy', {}))
         # get rid of leading underscores
         for key in kwargs.keys():
             if key[0] == '_':
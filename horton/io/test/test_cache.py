@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+#pylint: skip-file
+
+
+import os, shutil
+
+import numpy as np
+
+from horton import *
+from horton.io.cache import load_cached
+from horton.io.gaussian import load_fchk
+from horton.test.common import tmpdir, compare_mols
+
+
+def test_load_cached_fchk():
+    with tmpdir('horton.io.test.test_cache.test_load_cached_fchk') as dn:
+        fn_fchk = '%s/water.fchk' % dn
+        shutil.copy(context.get_fn('test/water_sto3g_hf_g03.fchk'), fn_fchk)
+        fn_cache = get_cache_filename(fn_fchk)
+        mol1 = IOData.from_file(fn_fchk)
+        assert not os.path.isfile(fn_cache)
+        mol2 = IOData.from_file(fn_fchk, cache=True)
+        assert os.path.isfile(fn_cache)
+        compare_mols(mol1, mol2)
+        # Load from the cache
+        mtime = os.path.getmtime(fn_cache)
+        mol3 = IOData.from_file(fn_fchk, cache=True)
+        assert os.path.getmtime(fn_cache) == mtime
+        compare_mols(mol1, mol3)
+        assert mol3.lf.default_nbasis == mol1.obasis.nbasis
+        mol4 = IOData.from_file(fn_fchk, cache=True, lazy=True, fields=['coordinates', 'numbers'])
+        assert sorted(vars(mol4)) == ['_coordinates', '_numbers']
+        assert (mol4.coordinates == mol1.coordinates).all()
+
+
+def test_load_cached_lazy_miss():
+    with tmpdir('horton.io.test.test_cache.test_load_cached_lazy_miss') as dn:
+        fn_fchk = '%s/water.fchk' % dn
+        shutil.copy(context.get_fn('test/water_sto3g_hf_g03.fchk'), fn_fchk)
+        mol1 = IOData.from_file(fn_fchk)
+        # The first call writes the cache file and returns its lazy contents.
+        data = load_cached(fn_fchk, load_fchk, DenseLinalgFactory(), lazy=True)
+        assert os.path.isfile(get_cache_filename(fn_fchk))
+        assert isinstance(data['coordinates'], np.memmap)
+        assert (data['coordinates'] == mol1.coordinates).all()
+
+
+def test_load_cached_outdated():
+    with tmpdir('horton.io.test.test_cache.test_load_cached_outdated') as dn:
+        fn_fchk = '%s/foo.fchk' % dn
+        shutil.copy(context.get_fn('test/water_sto3g_hf_g03.fchk'), fn_fchk)
+        IOData.from_file(fn_fchk, cache=True)
+        # Replace the file by a different one.
+        shutil.copy(context.get_fn('test/li_h_3-21G_hf_g09.fchk'), fn_fchk)
+        mol1 = IOData.from_file(fn_fchk)
+        mol2 = IOData.from_file(fn_fchk, cache=True)
+        compare_mols(mol1, mol2)
+        mol3 = IOData.from_file(fn_fchk, cache=True)
+        compare_mols(mol1, mol3)
@@ -21,9 +21,12 @@
 #pylint: skip-file
 
 
+import numpy as np
 from nose.tools import assert_raises
 
 from horton import *
+from horton.io.utils import LazyField
+from horton.test.common import compare_mols
 
 
 def test_load_operators_water_sto3g_hf_g03():
@@ -375,3 +378,44 @@ def test_load_water_hfs_321g():
     assert mol.polar[0, 0] == 7.23806684E+00
     assert mol.polar[1, 1] == 8.04213953E+00
     assert mol.polar[1, 2] == 1.20021770E-10
+
+
+def test_fchk_file_lazy():
+    fn_fchk = context.get_fn('test/water_sto3g_hf_g03.fchk')
+    fchk1 = FCHKFile(fn_fchk)
+    fchk2 = FCHKFile(fn_fchk, lazy=True)
+    # Only the scalars are read when the file is opened.
+    assert 'Total Energy' in dict(fchk2)
+    assert 'Alpha MO coefficients' not in dict(fchk2)
+    for label, value in fchk1.iteritems():
+        assert label in fchk2
+        assert np.all(fchk2[label] == value)
+    assert 'Foo' not in fchk2
+    assert fchk2.get('Foo') is None
+    with assert_raises(KeyError):
+        fchk2['Foo']
+
+
+def test_load_fchk_lazy():
+    fn_fchk = context.get_fn('test/ch3_rohf_sto3g_g03.fchk')
+    fields1 = load_fchk(fn_fchk, DenseLinalgFactory())
+    fields2 = load_fchk(fn_fchk, DenseLinalgFactory(), lazy=True)
+    assert sorted(fields1) == sorted(fields2)
+    for key in 'exp_alpha', 'exp_beta':
+        assert isinstance(fields2[key], LazyField)
+        exp = fields2[key].load()
+        assert (exp.coeffs == fields1[key].coeffs).all()
+        assert (exp.occupations == fields1[key].occupations).all()
+    assert (fields1['coordinates'] == fields2['coordinates']).all()
+
+
+def test_iodata_fchk_lazy():
+    fn_fchk = context.get_fn('test/li_h_3-21G_hf_g09.fchk')
+    mol1 = IOData.from_file(fn_fchk)
+    mol2 = IOData.from_file(fn_fchk, lazy=True)
+    assert sorted(mol2._lazy) == ['dm_full_scf', 'dm_spin_scf', 'exp_alpha', 'exp_beta']
+    compare_mols(mol1, mol2)
+    assert not hasattr(mol2, '_lazy') or len(mol2._lazy) == 0
+    mol3 = IOData.from_file(fn_fchk, lazy=True, fields=['coordinates', 'numbers', 'mulliken_charges'])
+    assert sorted(vars(mol3)) == ['_coordinates', '_numbers', 'mulliken_charges']
+    assert (mol3.mulliken_charges == mol1.mulliken_charges).all()
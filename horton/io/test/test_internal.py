@@ -21,9 +21,10 @@
 #pylint: skip-file
 
 
-import h5py as h5
+import numpy as np, h5py as h5
 
 from horton import *
+from horton.io.utils import LazyField
 from horton.test.common import tmpdir
 from horton.test.common import compare_mols
 
@@ -47,3 +48,38 @@ def test_consistency_core():
         mol1.to_file(f)
         mol2 = IOData.from_file(f)
         compare_mols(mol1, mol2)
+
+
+def test_load_h5_lazy():
+    with tmpdir('horton.io.test.test_internal.test_load_h5_lazy') as dn:
+        fn_h5 = '%s/foo.h5' % dn
+        with h5.File(fn_h5, 'w') as f:
+            f['contiguous'] = np.arange(12.0).reshape(3, 4)
+            f.create_dataset('compressed', data=np.arange(10), compression='gzip')
+            f['scalar'] = 3.0
+            f['group/array'] = np.arange(3)
+        data = load_h5(fn_h5, lazy=True)
+        assert isinstance(data['contiguous'], np.memmap)
+        assert (data['contiguous'] == np.arange(12.0).reshape(3, 4)).all()
+        assert isinstance(data['compressed'], LazyField)
+        assert (data['compressed'].load() == np.arange(10)).all()
+        assert data['scalar'] == 3.0
+        assert isinstance(data['group'], LazyField)
+        assert (data['group'].load()['array'] == np.arange(3)).all()
+        # The memory map is copy-on-write.
+        data['contiguous'][0, 0] = 5.0
+        assert load_h5(fn_h5)['contiguous'][0, 0] == 0.0
+
+
+def test_consistency_file_lazy():
+    with tmpdir('horton.io.test.test_internal.test_consistency_file_lazy') as dn:
+        fn_h5 = '%s/foo.h5' % dn
+        fn_fchk = context.get_fn('test/water_sto3g_hf_g03.fchk')
+        fn_log = context.get_fn('test/water_sto3g_hf_g03.log')
+        mol1 = IOData.from_file(fn_fchk, fn_log)
+        mol1.to_file(fn_h5)
+        mol2 = IOData.from_file(fn_h5, lazy=True)
+        assert 'er' in mol2._lazy
+        compare_mols(mol1, mol2)
+        mol3 = IOData.from_file(fn_h5, lazy=True, fields=['coordinates', 'numbers'])
+        assert sorted(vars(mol3)) == ['_coordinates', '_numbers']
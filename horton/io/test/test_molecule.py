@@ -25,6 +25,7 @@ import numpy as np
 from nose.tools import assert_raises
 
 from horton import *
+from horton.io.utils import LazyField
 
 
 def test_typecheck():
@@ -101,3 +102,31 @@ def test_dm_ch3_rohf_g03():
     assert abs(olp.contract_two('ab,ab', dm) - 9) < 1e-6
     dm = mol.get_dm_spin()
     assert abs(olp.contract_two('ab,ab', dm) - 1) < 1e-6
+
+
+def test_lazy_attributes():
+    loaded = []
+    def load(value):
+        loaded.append(value)
+        return value
+    m = IOData(numbers=LazyField(load, np.array([1, 8])), coordinates=np.zeros((2, 3)), title=LazyField(load, 'foo'))
+    assert loaded == []
+    assert issubclass(m.pseudo_numbers.dtype.type, float)
+    assert len(loaded) == 1
+    assert m.natom == 2
+    # A copy does not load lazy attributes.
+    m2 = m.copy()
+    assert len(loaded) == 1
+    assert m2.title == 'foo'
+    assert len(loaded) == 2
+    # Lazy attributes can be overwritten and deleted without loading them.
+    m.title = 'bar'
+    assert m.title == 'bar'
+    m.foo = LazyField(load, 1)
+    del m.foo
+    assert not hasattr(m, 'foo')
+    assert len(loaded) == 2
+    # The type checking is also applied to lazy attributes.
+    m.numbers = LazyField(load, np.array([[1, 2]]))
+    with assert_raises(TypeError):
+        m.numbers
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+#pylint: skip-file
+
+
+from StringIO import StringIO
+
+import numpy as np
+from nose.tools import assert_raises
+
+from horton.io.utils import parse_numbers, read_numbers
+
+
+def test_parse_numbers():
+    result = parse_numbers(' 1.0 -2.5E-01\n3\n\n  4.0e+2 ', 4)
+    assert result.dtype == float
+    assert (result == [1.0, -0.25, 3.0, 400.0]).all()
+    result = parse_numbers('1 2\n3', 3, int)
+    assert result.dtype == int
+    assert (result == [1, 2, 3]).all()
+
+
+def test_parse_numbers_errors():
+    with assert_raises(IOError):
+        parse_numbers('1.0 2.0', 3)
+    with assert_raises(IOError):
+        parse_numbers('1.0 2.0 3.0', 2)
+    with assert_raises(IOError):
+        parse_numbers('1.0 foo 3.0', 3)
+
+
+def test_read_numbers():
+    f = StringIO('1.0 2.0 3.0\n4.0 5.0 6.0\n7.0\nfoo bar\n')
+    result = read_numbers(f, 7)
+    assert (result == np.arange(1, 8)).all()
+    assert f.readline() == 'foo bar\n'
+    f = StringIO('1 2\n3 4\nfoo\n')
+    result = read_numbers(f, 4, int)
+    assert (result == [1, 2, 3, 4]).all()
+    assert f.readline() == 'foo\n'
+    assert read_numbers(f, 0).size == 0
+
+
+def test_read_numbers_errors():
+    with assert_raises(IOError):
+        read_numbers(StringIO('1.0 2.0\n3.0\n'), 4)
+    with assert_raises(IOError):
+        read_numbers(StringIO('1.0 2.0\n3.0 4.0 5.0\n'), 4)
+    with assert_raises(IOError):
+        read_numbers(StringIO('\n1.0 2.0\n'), 2)
@@ -28,19 +28,6 @@ from horton.test.common import get_random_cell, tmpdir
 
 
 
-def test_unravel_counter():
-    from horton.io.vasp import _unravel_counter
-    assert _unravel_counter(0, [3, 3, 3]) == [0, 0, 0]
-    assert _unravel_counter(0, [2, 4, 3]) == [0, 0, 0]
-    assert _unravel_counter(1, [2, 4, 3]) == [1, 0, 0]
-    assert _unravel_counter(2, [2, 4, 3]) == [0, 1, 0]
-    assert _unravel_counter(3, [2, 4, 3]) == [1, 1, 0]
-    assert _unravel_counter(8, [2, 4, 3]) == [0, 0, 1]
-    assert _unravel_counter(9, [2, 4, 3]) == [1, 0, 1]
-    assert _unravel_counter(11, [2, 4, 3]) == [1, 1, 1]
-    assert _unravel_counter(24, [2, 4, 3]) == [0, 0, 0]
-
-
 def test_load_chgcar_oxygen():
     fn = context.get_fn('test/CHGCAR.oxygen')
     mol = IOData.from_file(fn)
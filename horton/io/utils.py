@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+'''Utilities shared by the loaders of different file formats'''
+
+
+import numpy as np
+
+
+__all__ = ['parse_numbers', 'read_numbers', 'skip_numbers', 'LazyField']
+
+
+def parse_numbers(text, size, dtype=float):
+    '''Convert all whitespace-separated numbers in a string to an array
+
+       **Arguments:**
+
+       text
+            The string with the numbers. Newlines are treated as any other
+            whitespace.
+
+       size
+            The expected number of numbers. An IOError is raised when the
+            string contains a different number of numbers.
+
+       **Optional arguments:**
+
+       dtype
+            The data type of the numbers, ``float`` or ``int``.
+
+       The conversion is carried out by Numpy, which is orders of magnitude
+       faster than calling ``float`` for every word.
+    '''
+    # Numpy silently stops parsing at the first word it does not understand,
+    # which is detected by the size check.
+    result = np.fromstring(text, dtype=dtype, sep=' ')
+    if result.size != size:
+        raise IOError('Expected %i numbers, found %i.' % (size, result.size))
+    return result
+
+
+def read_numbers(f, size, dtype=float):
+    '''Read a given number of numbers from the next lines of a text file
+
+       **Arguments:**
+
+       f
+            A file object or an iterator over the lines of a file.
+
+       size
+            The number of numbers to read.
+
+       **Optional arguments:**
+
+       dtype
+            The data type of the numbers, ``float`` or ``int``.
+
+       All lines, except for the last one, must contain the same number of
+       numbers as the first line. Exactly the lines with the requested numbers
+       are consumed from ``f``.
+    '''
+    if size == 0:
+        return np.zeros(0, dtype)
+    return parse_numbers(''.join(_iter_number_lines(f, size)), size, dtype)
+
+
+def skip_numbers(f, size):
+    '''Skip the lines with a given number of numbers in a text file
+
+       **Arguments:**
+
+       f
+            A file object or an iterator over the lines of a file.
+
+       size
+            The number of numbers to skip.
+
+       The same lines are consumed from ``f`` as in :py:func:`read_numbers`,
+       but the numbers are not converted.
+    '''
+    if size > 0:
+        for line in _iter_number_lines(f, size):
+            pass
+
+
+def _iter_number_lines(f, size):
+    '''Iterate over the lines of a file that contain the next size numbers'''
+    try:
+        line = next(f)
+        nword = len(line.split())
+        if nword == 0:
+            raise IOError('Expected %i numbers, found an empty line.' % size)
+        yield line
+        for iline in xrange((size - 1)/nword):
+            yield next(f)
+    except StopIteration:
+        raise IOError('Unexpected end of file while reading %i numbers.' % size)
+
+
+class LazyField(object):
+    '''A field from a file that is only loaded when it is needed
+
+       Loaders return instances of this class instead of the actual values when
+       they are called in lazy mode. :py:class:`horton.io.iodata.IOData` calls
+       the ``load`` method on first access of the corresponding attribute.
+    '''
+    def __init__(self, load, *args):
+        '''
+           **Arguments:**
+
+           load
+                A function that returns the value of the field.
+
+           **Optional arguments:**
+
+           arg1, arg2, ...
+                Arguments for the load function.
+        '''
+        self._load = load
+        self._args = args
+
+    def load(self):
+        '''Return the value of the field'''
+        return self._load(*self._args)
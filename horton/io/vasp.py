@@ -26,19 +26,12 @@ from horton.units import angstrom, electronvolt
 from horton.periodic import periodic
 from horton.cext import Cell
 from horton.grid.cext import UniformGrid
+from horton.io.utils import read_numbers
 
 
 __all__ = ['load_chgcar', 'load_locpot', 'load_poscar', 'dump_poscar']
 
 
-def _unravel_counter(counter, shape):
-    result = []
-    for i in xrange(0, len(shape)):
-        result.append(counter % shape[i])
-        counter /= shape[i]
-    return result
-
-
 def _load_vasp_header(f, nskip):
     '''Load the cell and atoms from a VASP file
 
@@ -107,18 +100,10 @@ def _load_vasp_grid(filename):
         shape = np.array([int(w) for w in f.next().split()])
 
         # read data
-        cube_data = np.zeros(shape, float)
-        counter = 0
-        for line in f:
-            if counter >= cube_data.size:
-                break
-            for w in line.split():
-                i0, i1, i2 = _unravel_counter(counter, shape)
-                # Fill in the data with transposed indexes. In horton, X is
-                # the slowest index while Z is the fastest.
-                cube_data[i0, i1, i2] = float(w)
-                counter += 1
-        assert counter == cube_data.size
+        cube_data = read_numbers(f, shape.prod())
+        # Transpose the data. In the file, X is the fastest index, while it is
+        # the slowest index in HORTON.
+        cube_data = cube_data.reshape(shape[::-1]).transpose(2, 1, 0).copy()
 
     return {
         'title': title,
@@ -44,3 +44,4 @@ from horton.matrix.base import *
 from horton.matrix.cext import *
 from horton.matrix.dense import *
 from horton.matrix.cholesky import *
+from horton.matrix.mmap import *
@@ -487,7 +487,9 @@ class CholeskyFourIndex(FourIndex):
                 ``parse_four_index_transform_exps`` for details.
 
            method
-                Either ``einsum`` or ``tensordot`` (default).
+                Either ``einsum`` or ``tensordot`` (default). For compatibility
+                with the dense implementation, ``blocked`` is accepted as an
+                alias for ``tensordot``.
         '''
         check_type('ao_integrals', ao_integrals, CholeskyFourIndex)
         exp0, exp1, exp2, exp3 = parse_four_index_transform_exps(exp0, exp1, exp2, exp3, DenseExpansion)
@@ -498,7 +500,7 @@ class CholeskyFourIndex(FourIndex):
                 self._array2[:] = np.einsum('dj,kid->kij', exp3.coeffs, self._array2)
             self._array[:] = np.einsum('ai,kac->kic', exp0.coeffs, ao_integrals._array)
             self._array[:] = np.einsum('cj,kic->kij', exp2.coeffs, self._array)
-        elif method == 'tensordot':
+        elif method in ('tensordot', 'blocked'):
             if ao_integrals.is_decoupled or not (exp0 is exp1 and exp2 is exp3):
                 self.decouple_array2()
                 self._array2[:] = np.tensordot(ao_integrals._array2, exp1.coeffs, axes=([1],[0]))
@@ -3530,7 +3530,7 @@ class DenseFourIndex(FourIndex):
             for i in range(self.nbasis1):
                 self._array[:,i,:,i] += three._array[:,:,i]*factor
 
-    def assign_four_index_transform(self, ao_integrals, exp0, exp1=None, exp2=None, exp3=None, method='tensordot'):
+    def assign_four_index_transform(self, ao_integrals, exp0, exp1=None, exp2=None, exp3=None, method='tensordot', begin0=0, end0=None, begin1=0, end1=None, begin2=0, end2=None, begin3=0, end3=None):
         '''Perform four index transformation.
 
            **Arguments:**
@@ -3547,11 +3547,32 @@ class DenseFourIndex(FourIndex):
                 Can be provided to transform each index differently.
 
            method
-                Either ``einsum`` or ``tensordot`` (default).
+                Either ``einsum``, ``tensordot`` (default) or ``blocked``. The
+                latter uses less memory and assumes that the atomic-orbital
+                integrals have the symmetry
+                :math:`\langle pq \vert rs \rangle = \langle rq \vert ps \rangle`,
+                which holds for electron repulsion integrals. See
+                ``_four_index_transform_blocked`` for details.
+
+           begin0, end0, begin1, end1, begin2, end2, begin3, end3
+                Can be used to select a subset of the orbitals (a range of
+                columns of exp0, ...) for each index, e.g. to transform only
+                the occupied-occupied-virtual-virtual block. The shape of self
+                must match the selected ranges. This is only supported by the
+                ``blocked`` method.
         '''
         # parse arguments
         check_type('ao_integrals', ao_integrals, DenseFourIndex)
         exp0, exp1, exp2, exp3 = parse_four_index_transform_exps(exp0, exp1, exp2, exp3, DenseExpansion)
+        end0 = exp0.nfn if end0 is None else end0
+        end1 = exp1.nfn if end1 is None else end1
+        end2 = exp2.nfn if end2 is None else end2
+        end3 = exp3.nfn if end3 is None else end3
+        ranges = (begin0, end0, begin1, end1, begin2, end2, begin3, end3)
+        if self.shape != (end0-begin0, end1-begin1, end2-begin2, end3-begin3):
+            raise TypeError('The shape of the output does not match the selected orbitals.')
+        if method != 'blocked' and ranges != (0, exp0.nfn, 0, exp1.nfn, 0, exp2.nfn, 0, exp3.nfn):
+            raise ValueError('Only the blocked method supports a subset of the orbitals.')
         # actual transform
         if method == 'einsum':
             # The order of the dot products is according to literature
@@ -3567,5 +3588,57 @@ class DenseFourIndex(FourIndex):
             self._array[:] = np.tensordot(self._array, exp1.coeffs, axes=([0],[0]))
             self._array[:] = np.tensordot(self._array, exp2.coeffs, axes=([0],[0]))
             self._array[:] = np.tensordot(self._array, exp3.coeffs, axes=([0],[0]))
+        elif method == 'blocked':
+            _four_index_transform_blocked(
+                ao_integrals._array, exp0.coeffs[:,begin0:end0],
+                exp1.coeffs[:,begin1:end1], exp2.coeffs[:,begin2:end2],
+                exp3.coeffs[:,begin3:end3], self._array)
         else:
-            raise ValueError('The method must either be \'einsum\' or \'tensordot\'.')
+            raise ValueError('The method must either be \'einsum\', \'tensordot\' or \'blocked\'.')
+
+
+def _four_index_transform_blocked(ao, coeffs0, coeffs1, coeffs2, coeffs3, out, blocksize=2**24):
+    '''Blocked four-index transformation of symmetric integrals
+
+       **Arguments:**
+
+       ao
+            Array with integrals in atomic orbitals, shape (n, n, n, n).
+
+       coeffs0, coeffs1, coeffs2, coeffs3
+            Arrays with orbital coefficients, shape (n, m0), (n, m1), ...
+
+       out
+            The output array, shape (m0, m1, m2, m3).
+
+       **Optional arguments:**
+
+       blocksize
+            The maximal number of floats in the intermediate half-transformed
+            integrals.
+
+       The integrals must satisfy ``ao[p,q,r,s] == ao[r,q,p,s]``. The
+       transformation is carried out for blocks of the second output index. For
+       every block, the second and fourth index are transformed for all pairs
+       (p, r) with p >= r. The remaining pairs are obtained by symmetry, which
+       halves the cost of this step. Then the first and third index are
+       transformed. The peak memory usage, in addition to the input and output
+       arrays, is in the order of ``blocksize``, instead of ``n**4``.
+    '''
+    n = ao.shape[0]
+    m1 = coeffs1.shape[1]
+    m3 = coeffs3.shape[1]
+    ntile = max(1, blocksize/(n*n*m3))
+    half = np.zeros((n, n, min(ntile, m1), m3))
+    for begin in xrange(0, m1, ntile):
+        end = min(begin + ntile, m1)
+        half_block = half[:,:,:end-begin]
+        # First half: half[p,r,b,d] = sum_qs coeffs1[q,b] coeffs3[s,d] ao[p,q,r,s]
+        for p in xrange(n):
+            tmp = np.tensordot(coeffs1[:,begin:end], ao[p,:,:p+1,:], axes=([0],[0]))
+            tmp = np.tensordot(tmp, coeffs3, axes=([2],[0]))
+            half_block[p,:p+1] = tmp.transpose(1,0,2)
+            half_block[:p,p] = half_block[p,:p]
+        # Second half: out[a,b,c,d] = sum_pr coeffs0[p,a] coeffs2[r,c] half[p,r,b,d]
+        tmp = np.tensordot(coeffs0, half_block, axes=([0],[0]))
+        out[:,begin:end] = np.tensordot(tmp, coeffs2, axes=([1],[0])).transpose(0,1,3,2)
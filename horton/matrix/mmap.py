@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+'''Out-of-core four-index objects stored in memory-mapped files
+
+   The :py:class:`MMapFourIndex` is a :py:class:`DenseFourIndex` whose elements
+   are stored in a temporary file instead of an array in memory. The file is
+   unlinked as soon as it is mapped, such that it is removed automatically when
+   the object is deallocated, even when the program crashes.
+
+   All methods of the dense implementation remain available. The methods that
+   are typically applied to large four-index objects, i.e.
+   ``contract_two_to_two``, ``slice_to_two``, ``iadd`` and
+   ``assign_four_index_transform``, process the object in tiles along the first
+   index, such that the memory usage is bounded by the ``blocksize`` argument.
+   Other methods may still create temporaries with the size of the full
+   object.
+'''
+
+
+import os, tempfile
+
+import numpy as np
+
+from horton.utils import check_type, check_options, doc_inherit
+from horton.matrix.base import parse_four_index_transform_exps
+from horton.matrix.dense import DenseLinalgFactory, DenseTwoIndex, \
+    DenseFourIndex, DenseExpansion
+
+
+__all__ = ['create_mmap', 'MMapLinalgFactory', 'MMapFourIndex']
+
+
+def create_mmap(shape, dirname=None):
+    '''Return a zero-initialized memory-mapped array in a temporary file
+
+       **Arguments:**
+
+       shape
+            The shape of the array with double precision elements.
+
+       **Optional arguments:**
+
+       dirname
+            The directory in which the temporary file is created. When not
+            given, the default directory of the tempfile module is used. The
+            file is removed immediately, such that only the mapping refers to
+            it.
+    '''
+    fd, filename = tempfile.mkstemp(suffix='.mmap', dir=dirname)
+    try:
+        os.close(fd)
+        return np.memmap(filename, dtype=float, mode='w+', shape=shape)
+    finally:
+        # The mapping remains valid after the file is removed.
+        os.remove(filename)
+
+
+class MMapLinalgFactory(DenseLinalgFactory):
+    '''Dense linear algebra with four-index objects stored on disk'''
+    def __init__(self, default_nbasis=None, dirname=None, blocksize=2**26):
+        '''
+           **Optional arguments:**
+
+           default_nbasis
+                The default basis size when constructing new
+                operators/expansions.
+
+           dirname
+                The directory in which the files of the four-index objects are
+                created. When not given, the default directory of the tempfile
+                module is used, which can be controlled with the environment
+                variable ``TMPDIR``.
+
+           blocksize
+                The maximum size in bytes of a tile of a four-index object that
+                is loaded into memory at once.
+        '''
+        DenseLinalgFactory.__init__(self, default_nbasis)
+        self.dirname = dirname
+        self.blocksize = blocksize
+
+    @doc_inherit(DenseLinalgFactory)
+    def create_four_index(self, nbasis=None, nbasis1=None, nbasis2=None, nbasis3=None):
+        nbasis = nbasis or self.default_nbasis
+        return MMapFourIndex(nbasis, nbasis1, nbasis2, nbasis3, self.dirname, self.blocksize)
+
+    create_four_index.__check_init_args__ = DenseLinalgFactory._check_four_index_init_args
+
+
+class MMapFourIndex(DenseFourIndex):
+    '''Dense four-dimensional matrix stored in a memory-mapped file'''
+
+    #
+    # Constructor and destructor
+    #
+
+    def __init__(self, nbasis, nbasis1=None, nbasis2=None, nbasis3=None, dirname=None, blocksize=2**26):
+        '''
+           **Arguments:**
+
+           nbasis
+                The number of basis functions.
+
+           **Optional arguments:**
+
+           nbasis1, nbasis2, nbasis3
+                The sizes of the other axes, if different from nbasis.
+
+           dirname, blocksize
+                See :py:class:`MMapLinalgFactory`.
+        '''
+        if nbasis1 is None:
+            nbasis1 = nbasis
+        if nbasis2 is None:
+            nbasis2 = nbasis
+        if nbasis3 is None:
+            nbasis3 = nbasis
+        self._dirname = dirname
+        self._blocksize = blocksize
+        self._array = create_mmap((nbasis, nbasis1, nbasis2, nbasis3), dirname)
+
+    def __del__(self):
+        # The memory-mapped file is not accounted for in the memory log.
+        pass
+
+    #
+    # Methods from base class
+    #
+
+    @doc_inherit(DenseFourIndex)
+    def new(self):
+        return MMapFourIndex(self.nbasis, self.nbasis1, self.nbasis2, self.nbasis3, self._dirname, self._blocksize)
+
+    new.__check_init_args__ = DenseFourIndex._check_new_init_args
+
+    def _get_ntile(self, size):
+        '''Number of slices along an axis that fit in a tile
+
+           **Arguments:**
+
+           size
+                The number of floats per slice.
+        '''
+        return max(1, self._blocksize/(8*max(size, 1)))
+
+    @doc_inherit(DenseFourIndex)
+    def iadd(self, other, factor=1.0):
+        check_type('other', other, DenseFourIndex)
+        check_type('factor', factor, float, int)
+        ntile = self._get_ntile(self._array[0].size)
+        for begin in xrange(0, self.nbasis, ntile):
+            end = min(begin + ntile, self.nbasis)
+            self._array[begin:end] += other._array[begin:end]*factor
+
+    def _tiled_einsum(self, subscripts, out, factor, clear, ranges, *others):
+        '''Evaluate a contraction of self with small operands in tiles
+
+           **Arguments:**
+
+           subscripts
+                The einsum subscripts. The first operand is self.
+
+           out, factor, clear
+                See :py:meth:`DenseLinalgFactory.einsum`
+
+           ranges
+                The begin and end of each axis of self, as for the slicing
+                arguments of the other methods.
+
+           other1, other2, ...
+                Other operands, each a two-tuple of an object and its ranges.
+
+           The tiles are taken along the first index of self. All axes of the
+           operands and the output that share that index are sliced
+           accordingly. When the index is summed over, the contributions of the
+           tiles are accumulated.
+        '''
+        inscripts, outscript = subscripts.split('->')
+        inscripts = inscripts.split(',')
+        char = inscripts[0][0]
+        size = ranges[1] - ranges[0]
+        outshape = []
+        for outchar in outscript:
+            for inscript, (tensor, tensor_ranges) in zip(inscripts, [(self, ranges)] + list(others)):
+                if outchar in inscript:
+                    i = inscript.index(outchar)
+                    outshape.append(tensor_ranges[2*i+1] - tensor_ranges[2*i])
+                    break
+        out = DenseLinalgFactory._allocate_check_output(out, tuple(outshape))
+        if clear:
+            out.clear()
+
+        def get_tile(array, inscript, ranges, begin, end):
+            slices = []
+            for i, c in enumerate(inscript):
+                if c == char:
+                    slices.append(slice(ranges[2*i] + begin, ranges[2*i] + end))
+                else:
+                    slices.append(slice(ranges[2*i], ranges[2*i+1]))
+            return array[tuple(slices)]
+
+        ntile = self._get_ntile(self._array[0].size*inscripts[0].count(char))
+        for begin in xrange(0, size, ntile):
+            end = min(begin + ntile, size)
+            operands = [np.asarray(get_tile(self._array, inscripts[0], ranges, begin, end))]
+            for inscript, (other, other_ranges) in zip(inscripts[1:], others):
+                operands.append(get_tile(other._array, inscript, other_ranges, begin, end))
+            result = get_tile(out._array, outscript, sum([(0, n) for n in outshape], ()), begin, end)
+            result += np.einsum(subscripts, *operands)*factor
+        return out
+
+    @doc_inherit(DenseFourIndex)
+    def slice_to_two(self, subscripts, out=None, factor=1.0, clear=True, begin0=0, end0=None, begin1=0, end1=None, begin2=0, end2=None, begin3=0, end3=None):
+        check_options('subscripts', subscripts, 'aabb->ab', 'abab->ab', 'abba->ab')
+        end0, end1, end2, end3 = self._fix_ends(end0, end1, end2, end3)
+        ranges = (begin0, end0, begin1, end1, begin2, end2, begin3, end3)
+        return self._tiled_einsum(subscripts, out, factor, clear, ranges)
+
+    @doc_inherit(DenseFourIndex)
+    def contract_two_to_two(self, subscripts, two, out=None, factor=1.0, clear=True, begin0=0, end0=None, begin1=0, end1=None, begin2=0, end2=None, begin3=0, end3=None, begin4=0, end4=None, begin5=0, end5=None):
+        check_options('subscripts', subscripts, 'abcd,bd->ac', 'abcd,cb->ad',
+            'aabb,cb->ac', 'aabb,cb->ca', 'abcc,bc->ab', 'aabc,ab->bc',
+            'aabc,ac->bc', 'abcc,ac->ab', 'abcb,cb->ac', 'abcb,ab->ac',
+            'abcc,bc->ba', 'abcc,bc->ab', 'abcd,ac->db', 'abcd,ad->cb',
+            'abcd,ac->bd', 'abcd,ad->bc', 'abcd,ab->cd')
+        check_type('two', two, DenseTwoIndex)
+        end0, end1, end2, end3 = self._fix_ends(end0, end1, end2, end3)
+        end4, end5 = two._fix_ends(end4, end5)
+        ranges = (begin0, end0, begin1, end1, begin2, end2, begin3, end3)
+        return self._tiled_einsum(subscripts, out, factor, clear, ranges, (two, (begin4, end4, begin5, end5)))
+
+    @doc_inherit(DenseFourIndex)
+    def assign_four_index_transform(self, ao_integrals, exp0, exp1=None, exp2=None, exp3=None, method='tensordot', begin0=0, end0=None, begin1=0, end1=None, begin2=0, end2=None, begin3=0, end3=None):
+        check_type('ao_integrals', ao_integrals, DenseFourIndex)
+        check_options('method', method, 'einsum', 'tensordot', 'blocked')
+        exp0, exp1, exp2, exp3 = parse_four_index_transform_exps(exp0, exp1, exp2, exp3, DenseExpansion)
+        end0 = exp0.nfn if end0 is None else end0
+        end1 = exp1.nfn if end1 is None else end1
+        end2 = exp2.nfn if end2 is None else end2
+        end3 = exp3.nfn if end3 is None else end3
+        if self.shape != (end0-begin0, end1-begin1, end2-begin2, end3-begin3):
+            raise TypeError('The shape of the output does not match the selected orbitals.')
+        coeffs0 = exp0.coeffs[:,begin0:end0]
+        coeffs1 = exp1.coeffs[:,begin1:end1]
+        coeffs2 = exp2.coeffs[:,begin2:end2]
+        coeffs3 = exp3.coeffs[:,begin3:end3]
+        # The transformation is carried out in two halves with an intermediate
+        # result on disk. All methods are implemented with tensordot.
+        nbasis0, nbasis1 = ao_integrals.shape[:2]
+        half = create_mmap((nbasis0, nbasis1) + self.shape[2:], self._dirname)
+        # First half: transform the last two indexes for tiles of the first
+        # index.
+        ntile = self._get_ntile(ao_integrals._array[0].size + half[0].size)
+        for begin in xrange(0, nbasis0, ntile):
+            end = min(begin + ntile, nbasis0)
+            tmp = np.tensordot(ao_integrals._array[begin:end], coeffs2, axes=([2],[0]))
+            half[begin:end] = np.tensordot(tmp, coeffs3, axes=([2],[0]))
+        # Second half: transform the first two indexes for tiles of the third
+        # index.
+        ntile = self._get_ntile(nbasis0*nbasis1*self.shape[3] + self.nbasis*self.nbasis1*self.shape[3])
+        for begin in xrange(0, self.nbasis2, ntile):
+            end = min(begin + ntile, self.nbasis2)
+            tmp = np.tensordot(coeffs0, half[:,:,begin:end], axes=([0],[0]))
+            self._array[:,:,begin:end] = np.tensordot(coeffs1, tmp, axes=([0],[1])).transpose(1,0,2,3)
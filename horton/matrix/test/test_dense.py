@@ -2473,7 +2473,7 @@ def test_four_index_iadd_expand_three_to_four():
 
 
 def test_four_index_assign_four_index_transform():
-    for method in 'tensordot', 'einsum':
+    for method in 'tensordot', 'einsum', 'blocked':
         lf = DenseLinalgFactory(5)
         a = lf.create_four_index()
         e0 = lf.create_expansion()
@@ -2524,6 +2524,30 @@ def test_four_index_assign_four_index_transform_consistency():
     assert np.allclose(b._array, c._array)
 
 
+def test_four_index_assign_four_index_transform_blocked():
+    lf = DenseLinalgFactory(6)
+    a = lf.create_four_index()
+    e0 = lf.create_expansion()
+    e1 = lf.create_expansion()
+    a.randomize()
+    a.symmetrize(4)
+    e0.randomize()
+    e1.randomize()
+    b = a.new()
+    b.assign_four_index_transform(a, e0, e1, method='tensordot')
+    c = a.new()
+    c.assign_four_index_transform(a, e0, e1, method='blocked')
+    assert np.allclose(b._array, c._array)
+    # Transform only the occupied-occupied-virtual-virtual block
+    d = DenseFourIndex(2, 2, 4, 4)
+    d.assign_four_index_transform(a, e0, e1, method='blocked', end0=2, end1=2, begin2=2, begin3=2)
+    assert np.allclose(d._array, b._array[:2,:2,2:,2:])
+    with assert_raises(ValueError):
+        d.assign_four_index_transform(a, e0, e1, method='tensordot', end0=2, end1=2, begin2=2, begin3=2)
+    with assert_raises(TypeError):
+        d.assign_four_index_transform(a, e0, e1, method='blocked')
+
+
 #
 # Tests on water (not really unit tests. oh well...)
 #
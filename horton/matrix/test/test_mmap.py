@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+#pylint: skip-file
+
+
+import os
+
+import numpy as np
+
+from horton import *
+from horton.test.common import tmpdir
+
+
+def get_four_index_pair(nbasis, blocksize):
+    '''Return an MMapFourIndex and a DenseFourIndex with the same contents'''
+    lf = MMapLinalgFactory(nbasis, blocksize=blocksize)
+    four = lf.create_four_index()
+    four.randomize()
+    four.symmetrize()
+    ref = DenseFourIndex(nbasis)
+    ref.assign(four._array)
+    return four, ref
+
+
+def test_create_mmap():
+    with tmpdir('horton.matrix.test.test_mmap.test_create_mmap') as dn:
+        array = create_mmap((3, 4), dn)
+        assert isinstance(array, np.memmap)
+        assert array.shape == (3, 4)
+        assert (array == 0).all()
+        assert os.listdir(dn) == []
+
+
+def test_linalg_factory_constructors():
+    with tmpdir('horton.matrix.test.test_mmap.test_linalg_factory_constructors') as dn:
+        lf = MMapLinalgFactory(5, dirname=dn)
+        op4 = lf.create_four_index()
+        assert isinstance(op4, MMapFourIndex)
+        assert isinstance(op4._array, np.memmap)
+        lf.create_four_index.__check_init_args__(lf, op4)
+        assert op4.shape == (5, 5, 5, 5)
+        assert (op4._array == 0).all()
+        # The file is removed right after it is mapped.
+        assert os.listdir(dn) == []
+        op4b = op4.new()
+        assert isinstance(op4b, MMapFourIndex)
+        op4.new.__check_init_args__(op4, op4b)
+
+
+def test_contract_two_to_two():
+    # A small blocksize forces the use of multiple tiles.
+    four, ref = get_four_index_pair(7, 8*7**3*2)
+    two = DenseTwoIndex(7)
+    two.randomize()
+    for subscripts in ('abcd,bd->ac', 'abcd,cb->ad', 'aabb,cb->ac',
+                       'aabb,cb->ca', 'abcc,bc->ab', 'aabc,ab->bc',
+                       'aabc,ac->bc', 'abcc,ac->ab', 'abcb,cb->ac',
+                       'abcb,ab->ac', 'abcc,bc->ba', 'abcd,ac->db',
+                       'abcd,ad->cb', 'abcd,ac->bd', 'abcd,ad->bc',
+                       'abcd,ab->cd'):
+        out = four.contract_two_to_two(subscripts, two, factor=1.3)
+        expected = ref.contract_two_to_two(subscripts, two, factor=1.3)
+        assert abs(out._array - expected._array).max() < 1e-12
+        four.contract_two_to_two(subscripts, two, out, factor=0.5, clear=False)
+        ref.contract_two_to_two(subscripts, two, expected, factor=0.5, clear=False)
+        assert abs(out._array - expected._array).max() < 1e-12
+    # With ranges
+    two = DenseTwoIndex(4)
+    two.randomize()
+    ranges = dict(begin0=1, end0=5, begin1=2, end1=6, begin2=0, end2=4, begin3=3, end3=7)
+    for subscripts in 'abcd,cb->ad', 'abcd,ac->db', 'abcd,ab->cd':
+        out = four.contract_two_to_two(subscripts, two, **ranges)
+        expected = ref.contract_two_to_two(subscripts, two, **ranges)
+        assert abs(out._array - expected._array).max() < 1e-12
+
+
+def test_slice_to_two():
+    four, ref = get_four_index_pair(7, 8*7**3*2)
+    ranges = dict(begin0=1, end0=5, begin1=1, end1=5, begin2=2, end2=6, begin3=2, end3=6)
+    for subscripts in 'aabb->ab', 'abab->ab', 'abba->ab':
+        out = four.slice_to_two(subscripts, factor=2.0)
+        expected = ref.slice_to_two(subscripts, factor=2.0)
+        assert abs(out._array - expected._array).max() < 1e-12
+        out = four.slice_to_two(subscripts, **ranges)
+        expected = ref.slice_to_two(subscripts, **ranges)
+        assert abs(out._array - expected._array).max() < 1e-12
+
+
+def test_iadd():
+    four, ref = get_four_index_pair(6, 8*6**3)
+    result = four.new()
+    result.iadd(four, 2.0)
+    result.iadd(ref, -1.0)
+    assert abs(result._array - ref._array).max() < 1e-14
+
+
+def test_assign_four_index_transform():
+    four, ref = get_four_index_pair(7, 8*7**3*2)
+    exp0 = DenseExpansion(7)
+    exp0.randomize()
+    for method in 'tensordot', 'einsum':
+        mo = four.new()
+        mo.assign_four_index_transform(four, exp0, method=method)
+        expected = DenseFourIndex(7)
+        expected.assign_four_index_transform(ref, exp0, method=method)
+        assert abs(mo._array - expected._array).max() < 1e-10
+    # Fewer orbitals than basis functions for the last two indexes
+    exp1 = DenseExpansion(7, 4)
+    exp1.randomize()
+    mo = MMapFourIndex(7, 7, 4, 4, blocksize=100)
+    mo.assign_four_index_transform(ref, exp0, exp0, exp1, exp1)
+    expected = np.einsum('pqrs,pa,qb,rc,sd->abcd', ref._array, exp0.coeffs,
+                         exp0.coeffs, exp1.coeffs, exp1.coeffs)
+    assert abs(mo._array - expected).max() < 1e-10
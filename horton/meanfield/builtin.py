@@ -58,14 +58,17 @@ class BeckeHartree(GridObservable):
             # Construct spherical decompositions of atomic densities, derive
             # hartree potentials and evaluate
             begin = 0
-            pot[:] = 0
+            hartree_decompositions = []
             for atgrid in grid.subgrids:
                 end = begin + atgrid.size
                 becke_weights = grid.becke_weights[begin:end]
                 density_decomposition = atgrid.get_spherical_decomposition(rho[begin:end], becke_weights, lmax=self.lmax)
-                hartree_decomposition = solve_poisson_becke(density_decomposition)
-                grid.eval_decomposition(hartree_decomposition, atgrid.center, pot)
+                hartree_decompositions.append(solve_poisson_becke(density_decomposition))
                 begin = end
+            # Evaluate all potentials in one pass over the grid
+            centers = np.array([atgrid.center for atgrid in grid.subgrids])
+            pot[:] = 0
+            grid.eval_decompositions(hartree_decompositions, centers, pot)
         return pot
 
     @doc_inherit(GridObservable)
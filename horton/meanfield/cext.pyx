@@ -26,13 +26,16 @@ import numpy as np
 cimport numpy as np
 np.import_array()
 
+cimport cython
+from cython.parallel cimport prange
+
 
 __all__ = [
     'RLibXCWrapper', 'ULibXCWrapper'
 ]
 
 
-cdef extern from "xc.h":
+cdef extern from "xc.h" nogil:
     enum: XC_UNPOLARIZED
     enum: XC_POLARIZED
 
@@ -53,9 +56,46 @@ cdef extern from "xc.h":
     void xc_lda_vxc(xc_func_type *p, int npoint, double *rho, double *vrho)
     void xc_gga_exc(xc_func_type *p, int npoint, double *rho, double *sigma, double *zk)
     void xc_gga_vxc(xc_func_type *p, int npoint, double *rho, double *sigma, double *vrho, double *vsigma)
+    void xc_lda_exc_vxc(xc_func_type *p, int npoint, double *rho, double *zk, double *vrho)
+    void xc_gga_exc_vxc(xc_func_type *p, int npoint, double *rho, double *sigma, double *zk, double *vrho, double *vsigma)
     double xc_hyb_exx_coef(xc_func_type *p)
 
 
+@cython.cdivision(True)
+cdef void _lda_exc_vxc(xc_func_type* func, long npoint, double* rho,
+                       double* zk, double* vrho, long nspin, long chunk,
+                       int nthreads) nogil:
+    # The grid is split in chunks of at most chunk points that are processed
+    # by a single LibXC call each, such that the working set of LibXC remains
+    # in the cache. The chunks are distributed over nthreads threads.
+    cdef long nchunk = (npoint + chunk - 1)/chunk
+    cdef long ichunk, begin, size
+    for ichunk in prange(nchunk, num_threads=nthreads, schedule='dynamic'):
+        begin = ichunk*chunk
+        size = npoint - begin
+        if size > chunk:
+            size = chunk
+        xc_lda_exc_vxc(func, <int>size, rho + begin*nspin, zk + begin,
+                       vrho + begin*nspin)
+
+
+@cython.cdivision(True)
+cdef void _gga_exc_vxc(xc_func_type* func, long npoint, double* rho,
+                       double* sigma, double* zk, double* vrho, double* vsigma,
+                       long nspin, long chunk, int nthreads) nogil:
+    # See _lda_exc_vxc. The sigma and vsigma arrays have 2*nspin-1 columns.
+    cdef long nchunk = (npoint + chunk - 1)/chunk
+    cdef long nsigma = 2*nspin - 1
+    cdef long ichunk, begin, size
+    for ichunk in prange(nchunk, num_threads=nthreads, schedule='dynamic'):
+        begin = ichunk*chunk
+        size = npoint - begin
+        if size > chunk:
+            size = chunk
+        xc_gga_exc_vxc(func, <int>size, rho + begin*nspin, sigma + begin*nsigma,
+                       zk + begin, vrho + begin*nspin, vsigma + begin*nsigma)
+
+
 cdef class LibXCWrapper(object):
     cdef xc_func_type _func
     cdef int _func_id
@@ -142,6 +182,43 @@ cdef class RLibXCWrapper(LibXCWrapper):
         assert vrho.shape[0] == npoint
         xc_lda_vxc(&self._func, npoint, &rho[0], &vrho[0])
 
+    def compute_lda_exc_vxc(self, np.ndarray[double, ndim=1] rho not None,
+                                  np.ndarray[double, ndim=1] zk not None,
+                                  np.ndarray[double, ndim=1] vrho not None,
+                                  long chunk=4096, int nthreads=1):
+        '''Compute the energy density and the potential in one pass
+
+           **Arguments:**
+
+           rho
+                The total density.
+
+           zk
+                Output array for the energy density per electron.
+
+           vrho
+                Output array for the potential.
+
+           **Optional arguments:**
+
+           chunk
+                The number of grid points passed to LibXC at once.
+
+           nthreads
+                The number of threads over which the chunks are distributed.
+        '''
+        assert rho.flags['C_CONTIGUOUS']
+        npoint = rho.shape[0]
+        assert zk.flags['C_CONTIGUOUS']
+        assert zk.shape[0] == npoint
+        assert vrho.flags['C_CONTIGUOUS']
+        assert vrho.shape[0] == npoint
+        assert chunk > 0
+        assert nthreads > 0
+        if npoint > 0:
+            _lda_exc_vxc(&self._func, npoint, &rho[0], &zk[0], &vrho[0], 1,
+                         chunk, nthreads)
+
     ## GGA
 
     def compute_gga_exc(self, np.ndarray[double, ndim=1] rho not None,
@@ -169,6 +246,56 @@ cdef class RLibXCWrapper(LibXCWrapper):
         assert vsigma.shape[0] == npoint
         xc_gga_vxc(&self._func, npoint, &rho[0], &sigma[0], &vrho[0], &vsigma[0])
 
+    def compute_gga_exc_vxc(self, np.ndarray[double, ndim=1] rho not None,
+                                  np.ndarray[double, ndim=1] sigma not None,
+                                  np.ndarray[double, ndim=1] zk not None,
+                                  np.ndarray[double, ndim=1] vrho not None,
+                                  np.ndarray[double, ndim=1] vsigma not None,
+                                  long chunk=4096, int nthreads=1):
+        '''Compute the energy density and the potential in one pass
+
+           **Arguments:**
+
+           rho
+                The total density.
+
+           sigma
+                The norm squared of the gradient of the total density.
+
+           zk
+                Output array for the energy density per electron.
+
+           vrho
+                Output array for the derivative of the energy towards the
+                density.
+
+           vsigma
+                Output array for the derivative of the energy towards sigma.
+
+           **Optional arguments:**
+
+           chunk
+                The number of grid points passed to LibXC at once.
+
+           nthreads
+                The number of threads over which the chunks are distributed.
+        '''
+        assert rho.flags['C_CONTIGUOUS']
+        npoint = rho.shape[0]
+        assert sigma.flags['C_CONTIGUOUS']
+        assert sigma.shape[0] == npoint
+        assert zk.flags['C_CONTIGUOUS']
+        assert zk.shape[0] == npoint
+        assert vrho.flags['C_CONTIGUOUS']
+        assert vrho.shape[0] == npoint
+        assert vsigma.flags['C_CONTIGUOUS']
+        assert vsigma.shape[0] == npoint
+        assert chunk > 0
+        assert nthreads > 0
+        if npoint > 0:
+            _gga_exc_vxc(&self._func, npoint, &rho[0], &sigma[0], &zk[0],
+                         &vrho[0], &vsigma[0], 1, chunk, nthreads)
+
 
 cdef class ULibXCWrapper(LibXCWrapper):
     def __cinit__(self, bytes key):
@@ -204,6 +331,46 @@ cdef class ULibXCWrapper(LibXCWrapper):
         assert vrho.shape[1] == 2
         xc_lda_vxc(&self._func, npoint, &rho[0, 0], &vrho[0, 0])
 
+    def compute_lda_exc_vxc(self, np.ndarray[double, ndim=2] rho not None,
+                                  np.ndarray[double, ndim=1] zk not None,
+                                  np.ndarray[double, ndim=2] vrho not None,
+                                  long chunk=4096, int nthreads=1):
+        '''Compute the energy density and the potential in one pass
+
+           **Arguments:**
+
+           rho
+                The alpha and beta densities, shape (npoint, 2).
+
+           zk
+                Output array for the energy density per electron.
+
+           vrho
+                Output array for the alpha and beta potentials, shape
+                (npoint, 2).
+
+           **Optional arguments:**
+
+           chunk
+                The number of grid points passed to LibXC at once.
+
+           nthreads
+                The number of threads over which the chunks are distributed.
+        '''
+        assert rho.flags['C_CONTIGUOUS']
+        npoint = rho.shape[0]
+        assert rho.shape[1] == 2
+        assert zk.flags['C_CONTIGUOUS']
+        assert zk.shape[0] == npoint
+        assert vrho.flags['C_CONTIGUOUS']
+        assert vrho.shape[0] == npoint
+        assert vrho.shape[1] == 2
+        assert chunk > 0
+        assert nthreads > 0
+        if npoint > 0:
+            _lda_exc_vxc(&self._func, npoint, &rho[0, 0], &zk[0], &vrho[0, 0],
+                         2, chunk, nthreads)
+
     ## GGA
 
     def compute_gga_exc(self, np.ndarray[double, ndim=2] rho not None,
@@ -236,3 +403,59 @@ cdef class ULibXCWrapper(LibXCWrapper):
         assert vsigma.shape[0] == npoint
         assert vsigma.shape[1] == 3
         xc_gga_vxc(&self._func, npoint, &rho[0, 0], &sigma[0, 0], &vrho[0, 0], &vsigma[0, 0])
+
+    def compute_gga_exc_vxc(self, np.ndarray[double, ndim=2] rho not None,
+                                  np.ndarray[double, ndim=2] sigma not None,
+                                  np.ndarray[double, ndim=1] zk not None,
+                                  np.ndarray[double, ndim=2] vrho not None,
+                                  np.ndarray[double, ndim=2] vsigma not None,
+                                  long chunk=4096, int nthreads=1):
+        '''Compute the energy density and the potential in one pass
+
+           **Arguments:**
+
+           rho
+                The alpha and beta densities, shape (npoint, 2).
+
+           sigma
+                The (alpha, alpha), (alpha, beta) and (beta, beta) dot
+                products of the density gradients, shape (npoint, 3).
+
+           zk
+                Output array for the energy density per electron.
+
+           vrho
+                Output array for the derivatives of the energy towards the
+                alpha and beta densities, shape (npoint, 2).
+
+           vsigma
+                Output array for the derivatives of the energy towards the
+                three sigma components, shape (npoint, 3).
+
+           **Optional arguments:**
+
+           chunk
+                The number of grid points passed to LibXC at once.
+
+           nthreads
+                The number of threads over which the chunks are distributed.
+        '''
+        assert rho.flags['C_CONTIGUOUS']
+        npoint = rho.shape[0]
+        assert rho.shape[1] == 2
+        assert sigma.flags['C_CONTIGUOUS']
+        assert sigma.shape[0] == npoint
+        assert sigma.shape[1] == 3
+        assert zk.flags['C_CONTIGUOUS']
+        assert zk.shape[0] == npoint
+        assert vrho.flags['C_CONTIGUOUS']
+        assert vrho.shape[0] == npoint
+        assert vrho.shape[1] == 2
+        assert vsigma.flags['C_CONTIGUOUS']
+        assert vsigma.shape[0] == npoint
+        assert vsigma.shape[1] == 3
+        assert chunk > 0
+        assert nthreads > 0
+        if npoint > 0:
+            _gga_exc_vxc(&self._func, npoint, &rho[0, 0], &sigma[0, 0], &zk[0],
+                         &vrho[0, 0], &vsigma[0, 0], 2, chunk, nthreads)
@@ -21,6 +21,8 @@
 '''Container for observables involving numerical integration'''
 
 
+import numpy as np
+
 from horton.meanfield.observable import Observable
 from horton.utils import doc_inherit
 
@@ -91,22 +93,38 @@ class GridGroup(Observable):
             self.obasis.compute_grid_density_dm(dm, self.grid.points, rho)
         return rho
 
-    def _update_grad(self, cache, select):
-        '''Recompute a density gradient when not present in the cache.
+    def _update_rho_grad(self, cache, selects):
+        '''Recompute densities and their gradients when not present in the cache.
+
+           The densities and gradients of all given spin channels are computed
+           in a single pass over the grid.
 
            **Arguments:**
 
            cache
                 An instance of Cache, used to store intermediate results.
 
-           select
-                'alpha' or 'beta'.
+           selects
+                A list with 'alpha' and/or 'beta'.
+
+           **Returns:** a list of densities and a list of density gradients.
         '''
-        grad_rho, new = cache.load('grad_rho_%s' % select, alloc=(self.grid.size, 3))
+        rhos = []
+        grad_rhos = []
+        new = False
+        for select in selects:
+            rho, rnew = cache.load('rho_%s' % select, alloc=self.grid.size)
+            grad_rho, gnew = cache.load('grad_rho_%s' % select, alloc=(self.grid.size, 3))
+            rhos.append(rho)
+            grad_rhos.append(grad_rho)
+            new |= rnew or gnew
         if new:
-            dm = cache['dm_%s' % select]
-            self.obasis.compute_grid_gradient_dm(dm, self.grid.points, grad_rho)
-        return grad_rho
+            dms = [cache['dm_%s' % select] for select in selects]
+            output = self.obasis.compute_grid_gga_dms(dms, self.grid.points)
+            for i in xrange(len(selects)):
+                rhos[i][:] = output[i,:,0]
+                grad_rhos[i][:] = output[i,:,1:]
+        return rhos, grad_rhos
 
     def _update_grid_data(self, cache):
         '''Compute all grid data used as input for GridObservable instances
@@ -167,14 +185,19 @@ class GridGroup(Observable):
                     grid_term.add_pot(cache, self.grid, *dpots)
 
         for ichannel in xrange(len(focks)):
-            # d = density
-            self.obasis.compute_grid_density_fock(
-                self.grid.points, self.grid.weights,
-                dpots[ichannel], focks[ichannel])
             if self.gga:
-                self.obasis.compute_grid_gradient_fock(
+                # d = density and g = gradient, in a single pass over the grid
+                pots = np.zeros((self.grid.size, 4), float)
+                pots[:,0] = dpots[ichannel]
+                pots[:,1:] = gpots[ichannel]
+                self.obasis.compute_grid_gga_fock(
                     self.grid.points, self.grid.weights,
-                    gpots[ichannel], focks[ichannel])
+                    pots, focks[ichannel])
+            else:
+                # d = density
+                self.obasis.compute_grid_density_fock(
+                    self.grid.points, self.grid.weights,
+                    dpots[ichannel], focks[ichannel])
 
 
 class RGridGroup(GridGroup):
@@ -225,13 +248,15 @@ class RGridGroup(GridGroup):
 
     @doc_inherit(GridGroup)
     def _update_grid_data(self, cache):
-        rho_alpha = self._update_rho(cache, 'alpha')
+        if self.gga:
+            (rho_alpha,), (grad_rho_alpha,) = self._update_rho_grad(cache, ['alpha'])
+        else:
+            rho_alpha = self._update_rho(cache, 'alpha')
         rho_full, new = cache.load('rho_full', alloc=self.grid.size)
         if new:
             rho_full[:] = rho_alpha
             rho_full *= 2
         if self.gga:
-            grad_rho_alpha = self._update_grad(cache, 'alpha')
             sigma_alpha, new = cache.load('sigma_alpha', alloc=self.grid.size)
             if new:
                 sigma_alpha[:] = (grad_rho_alpha**2).sum(axis=1)
@@ -311,8 +336,13 @@ class UGridGroup(GridGroup):
 
     @doc_inherit(GridGroup)
     def _update_grid_data(self, cache):
-        rho_alpha = self._update_rho(cache, 'alpha')
-        rho_beta = self._update_rho(cache, 'beta')
+        if self.gga:
+            rhos, grad_rhos = self._update_rho_grad(cache, ['alpha', 'beta'])
+            rho_alpha, rho_beta = rhos
+            grad_rho_alpha, grad_rho_beta = grad_rhos
+        else:
+            rho_alpha = self._update_rho(cache, 'alpha')
+            rho_beta = self._update_rho(cache, 'beta')
         rho_full, new = cache.load('rho_full', alloc=self.grid.size)
         if new:
             rho_full[:] = rho_alpha
@@ -323,8 +353,6 @@ class UGridGroup(GridGroup):
             rho_both[:,1] = rho_beta
 
         if self.gga:
-            grad_rho_alpha = self._update_grad(cache, 'alpha')
-            grad_rho_beta = self._update_grad(cache, 'beta')
             sigma_alpha, new = cache.load('sigma_alpha', alloc=self.grid.size)
             if new:
                 sigma_alpha[:] = (grad_rho_alpha**2).sum(axis=1)
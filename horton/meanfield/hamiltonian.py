@@ -143,6 +143,19 @@ class EffHam(object):
         for term in self.terms:
             term.add_fock(self.cache, *focks)
 
+    def set_incremental(self, incremental):
+        '''Allow or forbid incremental Fock builds in the terms that support it
+
+           **Arguments:**
+
+           incremental
+                When True, the terms may update their Fock contributions from
+                the change in density matrix since the previous call to
+                ``reset``. See ``Observable.set_incremental``.
+        '''
+        for term in self.terms:
+            term.set_incremental(incremental)
+
 
 class REffHam(EffHam):
     ndm = 1
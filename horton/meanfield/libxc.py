@@ -43,7 +43,7 @@ class LibXCEnergy(GridObservable):
     prefix = None
     LibXCWrapper = None
 
-    def __init__(self, name):
+    def __init__(self, name, nthreads=1):
         '''
            **Arguments:**
 
@@ -51,9 +51,17 @@ class LibXCEnergy(GridObservable):
                 The name of the functional in LibXC, without the ``lda_``,
                 ``gga_`` or ``hyb_gga_`` prefix. (The type of functional is
                 determined by the subclass.)
+
+           **Optional arguments:**
+
+           nthreads
+                The number of threads used to evaluate the functional on the
+                grid. The grid is processed in chunks that are distributed
+                over the threads.
         '''
         name = '%s_%s' % (self.prefix, name)
         self._name = name
+        self._nthreads = nthreads
         self._libxc_wrapper = self.LibXCWrapper(name)
         log.cite('marques2012', 'using LibXC, the library of exchange and correlation functionals')
         GridObservable.__init__(self, 'libxc_%s' % name)
@@ -66,30 +74,29 @@ class RLibXCLDA(LibXCEnergy):
     prefix = 'lda'
     LibXCWrapper = RLibXCWrapper
 
-    @timer.with_section('LDA edens')
-    @doc_inherit(LibXCEnergy)
-    def compute_energy(self, cache, grid):
+    def _update_libxc(self, cache, grid):
         # LibXC expects the following input:
         #   - total density
         # LibXC computes:
         #   - the energy density per electron.
-        rho_full = cache['rho_full']
-        edens, new = cache.load('edens_libxc_%s_full' % self._name, alloc=grid.size)
-        if new:
-            self._libxc_wrapper.compute_lda_exc(rho_full, edens)
-        return grid.integrate(edens, rho_full)
+        #   - the potential for the alpha electrons.
+        edens, newe = cache.load('edens_libxc_%s_full' % self._name, alloc=grid.size)
+        pot, newp = cache.load('pot_libxc_%s_alpha' % self._name, alloc=grid.size)
+        if newe or newp:
+            self._libxc_wrapper.compute_lda_exc_vxc(cache['rho_full'], edens, pot,
+                                                    nthreads=self._nthreads)
+        return edens, pot
+
+    @timer.with_section('LDA edens')
+    @doc_inherit(LibXCEnergy)
+    def compute_energy(self, cache, grid):
+        edens = self._update_libxc(cache, grid)[0]
+        return grid.integrate(edens, cache['rho_full'])
 
     @timer.with_section('LDA pot')
     @doc_inherit(LibXCEnergy)
     def add_pot(self, cache, grid, dpot_alpha):
-        # LibXC expects the following input:
-        #   - total density
-        # LibXC computes:
-        #   - the potential for the alpha electrons.
-        pot, new = cache.load('pot_libxc_%s_alpha' % self._name, alloc=grid.size)
-        if new:
-            self._libxc_wrapper.compute_lda_vxc(cache['rho_full'], pot)
-        dpot_alpha += pot
+        dpot_alpha += self._update_libxc(cache, grid)[1]
 
 
 class ULibXCLDA(LibXCEnergy):
@@ -97,34 +104,34 @@ class ULibXCLDA(LibXCEnergy):
     prefix = 'lda'
     LibXCWrapper = ULibXCWrapper
 
-    @timer.with_section('LDA edens')
-    @doc_inherit(LibXCEnergy)
-    def compute_energy(self, cache, grid):
+    def _update_libxc(self, cache, grid):
         # LibXC expects the following input:
         #   - alpha density
         #   - beta density
         # LibXC computes:
         #   - the energy density per electron.
+        #   - potential for the alpha electrons
+        #   - potential for the beta electrons
 
         # In case of spin-polarized computations, alpha and beta densities
         # go in and the 'total' energy density comes out.
-        edens, new = cache.load('edens_libxc_%s_full' % self._name, alloc=grid.size)
-        if new:
-            self._libxc_wrapper.compute_lda_exc(cache['rho_both'], edens)
+        edens, newe = cache.load('edens_libxc_%s_full' % self._name, alloc=grid.size)
+        pot_both, newp = cache.load('pot_libxc_%s_both' % self._name, alloc=(grid.size, 2))
+        if newe or newp:
+            self._libxc_wrapper.compute_lda_exc_vxc(cache['rho_both'], edens, pot_both,
+                                                    nthreads=self._nthreads)
+        return edens, pot_both
+
+    @timer.with_section('LDA edens')
+    @doc_inherit(LibXCEnergy)
+    def compute_energy(self, cache, grid):
+        edens = self._update_libxc(cache, grid)[0]
         return grid.integrate(edens, cache['rho_full'])
 
     @timer.with_section('LDA pot')
     @doc_inherit(LibXCEnergy)
     def add_pot(self, cache, grid, dpot_alpha, dpot_beta):
-        # LibXC expects the following input:
-        #   - alpha density
-        #   - beta density
-        # LibXC computes:
-        #   - potential for the alpha electrons
-        #   - potential for the beta electrons
-        pot_both, new = cache.load('pot_libxc_%s_both' % self._name, alloc=(grid.size, 2))
-        if new:
-            self._libxc_wrapper.compute_lda_vxc(cache['rho_both'], pot_both)
+        pot_both = self._update_libxc(cache, grid)[1]
         dpot_alpha += pot_both[:,0]
         dpot_beta += pot_both[:,1]
 
@@ -134,36 +141,34 @@ class RLibXCGGA(LibXCEnergy):
     prefix = 'gga'
     LibXCWrapper = RLibXCWrapper
 
-    @timer.with_section('GGA edens')
-    @doc_inherit(LibXCEnergy)
-    def compute_energy(self, cache, grid):
+    def _update_libxc(self, cache, grid):
         # LibXC expects the following input:
         #   - total density
         #   - norm squared of the gradient of the total density
         # LibXC computes:
         #   - energy density per electron
-        rho_full = cache['rho_full']
-        edens, new = cache.load('edens_libxc_%s_full' % self._name, alloc=grid.size)
-        if new:
-            sigma_full = cache['sigma_full']
-            self._libxc_wrapper.compute_gga_exc(rho_full, sigma_full, edens)
-        return grid.integrate(edens, rho_full)
-
-    @timer.with_section('GGA pot')
-    @doc_inherit(LibXCEnergy)
-    def add_pot(self, cache, grid, dpot_alpha, gpot_alpha):
-        # LibXC expects the following input:
-        #   - total density
-        #   - norm of the gradient of the total density
-        # LibXC computes:
         #   - the derivative of the energy towards the alpha density.
         #   - the derivative of the energy towards the norm squared of the alpha density.
+        edens, newe = cache.load('edens_libxc_%s_full' % self._name, alloc=grid.size)
         dpot, newd = cache.load('dpot_libxc_%s_alpha' % self._name, alloc=grid.size)
         spot, news = cache.load('spot_libxc_%s_alpha' % self._name, alloc=grid.size)
-        if newd or news:
+        if newe or newd or news:
             rho_full = cache['rho_full']
             sigma_full = cache['sigma_full']
-            self._libxc_wrapper.compute_gga_vxc(rho_full, sigma_full, dpot, spot)
+            self._libxc_wrapper.compute_gga_exc_vxc(rho_full, sigma_full, edens,
+                                                    dpot, spot, nthreads=self._nthreads)
+        return edens, dpot, spot
+
+    @timer.with_section('GGA edens')
+    @doc_inherit(LibXCEnergy)
+    def compute_energy(self, cache, grid):
+        edens = self._update_libxc(cache, grid)[0]
+        return grid.integrate(edens, cache['rho_full'])
+
+    @timer.with_section('GGA pot')
+    @doc_inherit(LibXCEnergy)
+    def add_pot(self, cache, grid, dpot_alpha, gpot_alpha):
+        dpot, spot = self._update_libxc(cache, grid)[1:]
 
         gpot, new = cache.load('gpot_libxc_%s_alpha' % self._name, alloc=(grid.size,3))
         if new:
@@ -180,9 +185,7 @@ class ULibXCGGA(LibXCEnergy):
     prefix = 'gga'
     LibXCWrapper = ULibXCWrapper
 
-    @timer.with_section('GGA edens')
-    @doc_inherit(LibXCEnergy)
-    def compute_energy(self, cache, grid):
+    def _update_libxc(self, cache, grid):
         # LibXC expects the following input:
         #   - alpha density
         #   - beta density
@@ -191,35 +194,31 @@ class ULibXCGGA(LibXCEnergy):
         #   - norm squared of the gradient of the beta density
         # LibXC computes:
         #   - energy density per electron
-        edens, new = cache.load('edens_libxc_%s_full' % self._name, alloc=grid.size)
-        if new:
-            rho_both = cache['rho_both']
-            sigma_all = cache['sigma_all']
-            self._libxc_wrapper.compute_gga_exc(rho_both, sigma_all, edens)
-        rho_full = cache['rho_full']
-        return grid.integrate(edens, rho_full)
-
-    @doc_inherit(LibXCEnergy)
-    @timer.with_section('GGA pot')
-    def add_pot(self, cache, grid, dpot_alpha, dpot_beta, gpot_alpha, gpot_beta):
-        # LibXC expects the following input:
-        #   - alpha density
-        #   - beta density
-        #   - norm squared of the gradient of the alpha density
-        #   - dot product of the gradient of the alpha and beta densities
-        #   - norm squared of the gradient of the beta density
-        # LibXC computes:
         #   - the derivative of the energy towards the alpha density.
         #   - the derivative of the energy towards the beta density.
         #   - the derivative of the energy towards the norm squared of the alpha density.
         #   - the derivative of the energy towards the dot product of the alpha and beta densities.
         #   - the derivative of the energy towards the norm squared of the beta density.
+        edens, newe = cache.load('edens_libxc_%s_full' % self._name, alloc=grid.size)
         dpot_both, newd = cache.load('dpot_libxc_%s_both' % self._name, alloc=(grid.size, 2))
         spot_all, newt = cache.load('spot_libxc_%s_all' % self._name, alloc=(grid.size, 3))
-        if newd or newt:
+        if newe or newd or newt:
             rho_both = cache['rho_both']
             sigma_all = cache['sigma_all']
-            self._libxc_wrapper.compute_gga_vxc(rho_both, sigma_all, dpot_both, spot_all)
+            self._libxc_wrapper.compute_gga_exc_vxc(rho_both, sigma_all, edens, dpot_both,
+                                                    spot_all, nthreads=self._nthreads)
+        return edens, dpot_both, spot_all
+
+    @timer.with_section('GGA edens')
+    @doc_inherit(LibXCEnergy)
+    def compute_energy(self, cache, grid):
+        edens = self._update_libxc(cache, grid)[0]
+        return grid.integrate(edens, cache['rho_full'])
+
+    @doc_inherit(LibXCEnergy)
+    @timer.with_section('GGA pot')
+    def add_pot(self, cache, grid, dpot_alpha, dpot_beta, gpot_alpha, gpot_beta):
+        dpot_both, spot_all = self._update_libxc(cache, grid)[1:]
 
         gpot_xc_alpha, new = cache.load('gpot_libxc_%s_alpha' % self._name, alloc=(grid.size,3))
         if new:
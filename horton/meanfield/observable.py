@@ -28,6 +28,8 @@ __all__ = [
     'RTwoIndexTerm', 'UTwoIndexTerm',
     'RDirectTerm', 'UDirectTerm',
     'RExchangeTerm', 'UExchangeTerm',
+    'RIntegralDirectTerm', 'UIntegralDirectTerm',
+    'RIntegralExchangeTerm', 'UIntegralExchangeTerm',
 ]
 
 
@@ -72,6 +74,20 @@ class Observable(object):
         '''
         raise NotImplementedError
 
+    def set_incremental(self, incremental):
+        '''Allow or forbid incremental updates of the Fock contributions
+
+           **Arguments:**
+
+           incremental
+                When True, a term may compute its contribution to the Fock
+                matrix from the change in density matrix since its previous
+                evaluation, instead of starting from scratch. Terms that do not
+                support this (e.g. because they are not linear in the density
+                matrix) ignore this setting.
+        '''
+        pass
+
 
 class RTwoIndexTerm(Observable):
     '''Class for all observables that are linear in the density matrix of a
@@ -257,3 +273,155 @@ class UExchangeTerm(Observable):
         fock_alpha.iadd(exchange_alpha, -self.fraction)
         exchange_beta = cache['op_%s_beta' % self.label]
         fock_beta.iadd(exchange_beta, -self.fraction)
+
+
+class IntegralDirect(object):
+    '''Common code for terms that never store the electron repulsion integrals
+
+       The Coulomb and exchange operators are constructed by contracting the
+       electron repulsion integrals with the density matrix while they are
+       computed, such that the memory usage scales quadratically with the size
+       of the basis set.
+    '''
+    def __init__(self, obasis, schwarz_threshold):
+        '''
+           **Arguments:**
+
+           obasis
+                The orbital basis (GOBasis instance).
+
+           schwarz_threshold
+                Shell quartets whose density-weighted Cauchy-Schwarz bound is
+                below this threshold are skipped. Set to zero to compute all
+                integrals.
+        '''
+        self.obasis = obasis
+        self.schwarz_threshold = schwarz_threshold
+        self.incremental = False
+        self._schwarz = None
+        # Reference density matrices and operators for incremental updates.
+        self._refs = {}
+
+    @doc_inherit(Observable)
+    def set_incremental(self, incremental):
+        self.incremental = incremental
+
+    def _contract_dm(self, key, dm, op, exchange=False):
+        '''Compute the Coulomb or exchange operator for a density matrix
+
+           **Arguments:**
+
+           key
+                A label for the reference used in incremental updates.
+
+           dm
+                The density matrix.
+
+           op
+                The output operator.
+
+           **Optional arguments:**
+
+           exchange
+                When True, the exchange operator is computed instead of the
+                Coulomb operator.
+
+           When incremental updates are allowed and a reference is available,
+           only the contribution of the change in density matrix is computed
+           and added to the reference operator. Because of the
+           density-weighted screening, this is much cheaper than a full build
+           when the change is small, e.g. in the last SCF iterations.
+        '''
+        if self.schwarz_threshold > 0 and self._schwarz is None:
+            # The bounds only depend on the basis set and are reused in every
+            # SCF iteration.
+            self._schwarz = self.obasis.compute_schwarz_bounds()
+        ref = self._refs.get(key)
+        if self.incremental and ref is not None:
+            dm_ref, op_ref = ref
+            # Transform the reference into the change in density matrix.
+            dm_ref.iscale(-1)
+            dm_ref.iadd(dm)
+            dm_todo = dm_ref
+        else:
+            dm_ref, op_ref = dm.new(), op.new()
+            self._refs[key] = dm_ref, op_ref
+            dm_todo = dm
+        if exchange:
+            self.obasis.compute_electron_repulsion_dm(
+                dm_todo, exchange=op, schwarz=self._schwarz,
+                schwarz_threshold=self.schwarz_threshold)
+        else:
+            self.obasis.compute_electron_repulsion_dm(
+                dm_todo, coulomb=op, schwarz=self._schwarz,
+                schwarz_threshold=self.schwarz_threshold)
+        if dm_todo is dm_ref:
+            op.iadd(op_ref)
+        dm_ref.assign(dm)
+        op_ref.assign(op)
+
+
+class RIntegralDirectTerm(IntegralDirect, RDirectTerm):
+    '''Integral-direct variant of RDirectTerm'''
+    def __init__(self, obasis, label, schwarz_threshold=1e-12):
+        IntegralDirect.__init__(self, obasis, schwarz_threshold)
+        RDirectTerm.__init__(self, None, label)
+
+    def _update_direct(self, cache):
+        '''Recompute the direct operator if it has become invalid'''
+        dm_alpha = cache['dm_alpha']
+        direct, new = cache.load('op_%s_alpha' % self.label, alloc=dm_alpha.new)
+        if new:
+            self._contract_dm('alpha', dm_alpha, direct)
+            direct.iscale(2) # contribution from beta electrons is identical
+
+
+class UIntegralDirectTerm(IntegralDirect, UDirectTerm):
+    '''Integral-direct variant of UDirectTerm'''
+    def __init__(self, obasis, label, schwarz_threshold=1e-12):
+        IntegralDirect.__init__(self, obasis, schwarz_threshold)
+        UDirectTerm.__init__(self, None, label)
+
+    def _update_direct(self, cache):
+        '''Recompute the direct operator if it has become invalid'''
+        dm_full = compute_dm_full(cache)
+        direct, new = cache.load('op_%s' % self.label, alloc=dm_full.new)
+        if new:
+            self._contract_dm('full', dm_full, direct)
+
+
+class RIntegralExchangeTerm(IntegralDirect, RExchangeTerm):
+    '''Integral-direct variant of RExchangeTerm'''
+    def __init__(self, obasis, label, fraction=1.0, schwarz_threshold=1e-12):
+        IntegralDirect.__init__(self, obasis, schwarz_threshold)
+        RExchangeTerm.__init__(self, None, label, fraction)
+
+    def _update_exchange(self, cache):
+        '''Recompute the Exchange operator if invalid'''
+        dm_alpha = cache['dm_alpha']
+        exchange_alpha, new = cache.load('op_%s_alpha' % self.label,
+                                         alloc=dm_alpha.new)
+        if new:
+            self._contract_dm('alpha', dm_alpha, exchange_alpha, exchange=True)
+
+
+class UIntegralExchangeTerm(IntegralDirect, UExchangeTerm):
+    '''Integral-direct variant of UExchangeTerm'''
+    def __init__(self, obasis, label, fraction=1.0, schwarz_threshold=1e-12):
+        IntegralDirect.__init__(self, obasis, schwarz_threshold)
+        UExchangeTerm.__init__(self, None, label, fraction)
+
+    def _update_exchange(self, cache):
+        '''Recompute the Exchange operator(s) if invalid'''
+        # alpha
+        dm_alpha = cache['dm_alpha']
+        exchange_alpha, new = cache.load('op_%s_alpha' % self.label,
+                                         alloc=dm_alpha.new)
+        if new:
+            self._contract_dm('alpha', dm_alpha, exchange_alpha, exchange=True)
+        # beta
+        dm_beta = cache['dm_beta']
+        exchange_beta, new = cache.load('op_%s_beta' % self.label,
+                                         alloc=dm_beta.new)
+        if new:
+            self._contract_dm('beta', dm_beta, exchange_beta, exchange=True)
@@ -36,7 +36,7 @@ class DIISSCFSolver(object):
     '''Base class for all DIIS SCF solvers'''
     kind = 'dm' # input/output variable is the density matrix
 
-    def __init__(self, DIISHistoryClass, threshold=1e-6, maxiter=128, nvector=6, skip_energy=False, prune_old_states=False):
+    def __init__(self, DIISHistoryClass, threshold=1e-6, maxiter=128, nvector=6, skip_energy=False, prune_old_states=False, nincremental=0):
         '''
            **Arguments:**
 
@@ -62,6 +62,15 @@ class DIISSCFSolver(object):
                 coefficient is zero. Pruning starts at the oldest state and stops
                 as soon as a state is encountered with a non-zero coefficient. Even
                 if some newer states have a zero coefficient.
+
+           nincremental
+                The maximum number of consecutive incremental Fock builds. In
+                an incremental build, terms that support it (e.g. the
+                integral-direct Hartree and exchange terms) only compute the
+                contribution of the change in density matrix since the previous
+                iteration. After nincremental such builds, the Fock matrix is
+                rebuilt from scratch to avoid the accumulation of (screening)
+                errors. The default, zero, disables incremental builds.
         '''
         self.DIISHistoryClass = DIISHistoryClass
         self.threshold = threshold
@@ -69,6 +78,7 @@ class DIISSCFSolver(object):
         self.nvector = nvector
         self.skip_energy = skip_energy
         self.prune_old_states = prune_old_states
+        self.nincremental = nincremental
 
     @timer.with_section('SCF')
     def __call__(self, ham, lf, overlap, occ_model, *dms):
@@ -114,11 +124,12 @@ class DIISSCFSolver(object):
 
         converged = False
         counter = 0
+        self._nbuild = 0
         while self.maxiter is None or counter < self.maxiter:
             # Construct the Fock operator from scratch if the history is empty:
             if self._history.nused == 0:
                 # feed the latest density matrices in the hamiltonian
-                ham.reset(*dms)
+                self._reset_ham(ham, dms)
                 # Construct the Fock operators
                 ham.compute_fock(*self._focks)
                 # Compute the energy if needed by the history
@@ -154,7 +165,7 @@ class DIISSCFSolver(object):
             occ_model.assign(*self._exps)
             for i in xrange(ham.ndm):
                 self._exps[i].to_dm(dms[i])
-            ham.reset(*dms)
+            self._reset_ham(ham, dms)
             energy = ham.compute_energy() if self._history.need_energy else None
             ham.compute_fock(*self._focks)
 
@@ -256,6 +267,9 @@ class DIISSCFSolver(object):
             # counter
             counter += 1
 
+        if self.nincremental > 0:
+            ham.set_incremental(False)
+
         if log.do_medium:
             if converged:
                 log('%4i %12.5e (converged)' % (counter, error))
@@ -272,6 +286,17 @@ class DIISSCFSolver(object):
 
         return counter
 
+    def _reset_ham(self, ham, dms):
+        '''Feed new density matrices in the Hamiltonian
+
+           In the incremental mode, every (nincremental+1)-th Fock build
+           starts from scratch.
+        '''
+        if self.nincremental > 0:
+            ham.set_incremental(self._nbuild % (self.nincremental + 1) != 0)
+            self._nbuild += 1
+        ham.reset(*dms)
+
     def error(self, ham, lf, overlap, *dms):
         return convergence_error_commutator(ham, lf, overlap, *dms)
 
@@ -35,7 +35,7 @@ __all__ = ['EDIISSCFSolver']
 class EDIISSCFSolver(DIISSCFSolver):
     '''The Energy DIIS SCF solver [kudin2002]_'''
 
-    def __init__(self, threshold=1e-6, maxiter=128, nvector=6, skip_energy=False, prune_old_states=False):
+    def __init__(self, threshold=1e-6, maxiter=128, nvector=6, skip_energy=False, prune_old_states=False, nincremental=0):
         '''
            **Optional arguments:**
 
@@ -56,9 +56,14 @@ class EDIISSCFSolver(DIISSCFSolver):
                 coefficient is zero. Pruning starts at the oldest state and stops
                 as soon as a state is encountered with a non-zero coefficient. Even
                 if some newer states have a zero coefficient.
+
+           nincremental
+                The maximum number of consecutive incremental Fock builds. See
+                ``DIISSCFSolver``. The default, zero, disables incremental
+                builds.
         '''
         log.cite('kudin2002', 'the EDIIS method.')
-        DIISSCFSolver.__init__(self, EDIISHistory, threshold, maxiter, nvector, skip_energy, prune_old_states)
+        DIISSCFSolver.__init__(self, EDIISHistory, threshold, maxiter, nvector, skip_energy, prune_old_states, nincremental)
 
 
 class EDIISHistory(DIISHistory):
@@ -46,6 +46,62 @@ def test_energy_hydrogen():
     assert abs(ham.cache['energy'] - -4.665818503844346E-01) < 1e-8
 
 
+def check_integral_direct(fn_fchk, unrestricted):
+    mol = IOData.from_file(context.get_fn(fn_fchk))
+    er = mol.obasis.compute_electron_repulsion(mol.lf)
+    if unrestricted:
+        exps = [mol.exp_alpha, mol.exp_beta]
+        ham1 = UEffHam([UDirectTerm(er, 'hartree'), UExchangeTerm(er, 'x_hf', 0.7)])
+        ham2 = UEffHam([UIntegralDirectTerm(mol.obasis, 'hartree'),
+                        UIntegralExchangeTerm(mol.obasis, 'x_hf', 0.7)])
+    else:
+        exps = [mol.exp_alpha]
+        ham1 = REffHam([RDirectTerm(er, 'hartree'), RExchangeTerm(er, 'x_hf', 0.7)])
+        ham2 = REffHam([RIntegralDirectTerm(mol.obasis, 'hartree'),
+                        RIntegralExchangeTerm(mol.obasis, 'x_hf', 0.7)])
+    dms = [exp.to_dm() for exp in exps]
+    ham1.reset(*dms)
+    ham2.reset(*dms)
+    assert abs(ham1.compute_energy() - ham2.compute_energy()) < 1e-8
+    focks1 = [mol.lf.create_two_index() for exp in exps]
+    focks2 = [mol.lf.create_two_index() for exp in exps]
+    ham1.compute_fock(*focks1)
+    ham2.compute_fock(*focks2)
+    for fock1, fock2 in zip(focks1, focks2):
+        assert abs(fock1._array - fock2._array).max() < 1e-8
+
+
+def test_integral_direct_water():
+    check_integral_direct('test/water_hfs_321g.fchk', False)
+
+
+def test_integral_direct_hydrogen():
+    check_integral_direct('test/h_sto3g.fchk', True)
+
+
+def test_integral_direct_incremental():
+    mol = IOData.from_file(context.get_fn('test/water_hfs_321g.fchk'))
+    er = mol.obasis.compute_electron_repulsion(mol.lf)
+    ham1 = REffHam([RDirectTerm(er, 'hartree'), RExchangeTerm(er, 'x_hf')])
+    ham2 = REffHam([RIntegralDirectTerm(mol.obasis, 'hartree'),
+                    RIntegralExchangeTerm(mol.obasis, 'x_hf')])
+    dm1 = mol.exp_alpha.to_dm()
+    dm2 = dm1.copy()
+    dm2.iscale(0.9)
+    ham2.reset(dm1)
+    ham2.compute_energy()
+    # Incremental update of the Fock contributions from dm1 to dm2
+    ham2.set_incremental(True)
+    ham1.reset(dm2)
+    ham2.reset(dm2)
+    assert abs(ham1.compute_energy() - ham2.compute_energy()) < 1e-8
+    fock1 = mol.lf.create_two_index()
+    fock2 = mol.lf.create_two_index()
+    ham1.compute_fock(fock1)
+    ham2.compute_fock(fock2)
+    assert abs(fock1._array - fock2._array).max() < 1e-8
+
+
 def test_cubic_interpolation_hfs_cs():
     fn_fchk = context.get_fn('test/water_hfs_321g.fchk')
     mol = IOData.from_file(fn_fchk)
@@ -244,6 +244,45 @@ def test_lda_c_vwn_present():
     t = RLibXCLDA('c_vwn_4')   # The VWN 4 functional
 
 
+def test_exc_vxc_combined():
+    np.random.seed(1)
+    npoint = 1000
+    for W, shape_rho, shape_sigma in (RLibXCWrapper, (npoint,), (npoint,)), \
+                                     (ULibXCWrapper, (npoint, 2), (npoint, 3)):
+        rho = np.random.uniform(0.01, 1.0, shape_rho)
+        sigma = np.random.uniform(0.0, 0.1, shape_sigma)
+        if len(shape_sigma) == 2:
+            # The (alpha, beta) component must be a valid dot product.
+            sigma[:,1] = 0.5*np.sqrt(sigma[:,0]*sigma[:,2])
+
+        w = W('lda_c_vwn')
+        zk1 = np.zeros(npoint)
+        vrho1 = np.zeros(shape_rho)
+        w.compute_lda_exc(rho, zk1)
+        w.compute_lda_vxc(rho, vrho1)
+        for chunk, nthreads in (4096, 1), (77, 1), (77, 4):
+            zk2 = np.zeros(npoint)
+            vrho2 = np.zeros(shape_rho)
+            w.compute_lda_exc_vxc(rho, zk2, vrho2, chunk, nthreads)
+            assert abs(zk1 - zk2).max() < 1e-13
+            assert abs(vrho1 - vrho2).max() < 1e-13
+
+        w = W('gga_x_pbe')
+        zk1 = np.zeros(npoint)
+        vrho1 = np.zeros(shape_rho)
+        vsigma1 = np.zeros(shape_sigma)
+        w.compute_gga_exc(rho, sigma, zk1)
+        w.compute_gga_vxc(rho, sigma, vrho1, vsigma1)
+        for chunk, nthreads in (4096, 1), (77, 1), (77, 4):
+            zk2 = np.zeros(npoint)
+            vrho2 = np.zeros(shape_rho)
+            vsigma2 = np.zeros(shape_sigma)
+            w.compute_gga_exc_vxc(rho, sigma, zk2, vrho2, vsigma2, chunk, nthreads)
+            assert abs(zk1 - zk2).max() < 1e-13
+            assert abs(vrho1 - vrho2).max() < 1e-13
+            assert abs(vsigma1 - vsigma2).max() < 1e-13
+
+
 def test_info():
     t = RLibXCWrapper('lda_x')
     assert t.key == 'lda_x'
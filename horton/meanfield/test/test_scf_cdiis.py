@@ -54,3 +54,28 @@ def test_co_cs_pbe():
 
 def test_h3_os_pbe():
     check_h3_os_pbe(CDIISSCFSolver(threshold=1e-6))
+
+
+def test_hf_cs_hf_incremental():
+    fn_fchk = context.get_fn('test/hf_sto3g.fchk')
+    mol = IOData.from_file(fn_fchk)
+    olp = mol.obasis.compute_overlap(mol.lf)
+    kin = mol.obasis.compute_kinetic(mol.lf)
+    na = mol.obasis.compute_nuclear_attraction(mol.coordinates, mol.pseudo_numbers, mol.lf)
+    external = {'nn': compute_nucnuc(mol.coordinates, mol.pseudo_numbers)}
+    terms = [
+        RTwoIndexTerm(kin, 'kin'),
+        RIntegralDirectTerm(mol.obasis, 'hartree'),
+        RIntegralExchangeTerm(mol.obasis, 'x_hf'),
+        RTwoIndexTerm(na, 'ne'),
+    ]
+    ham = REffHam(terms, external)
+    occ_model = AufbauOccModel(5)
+    guess_core_hamiltonian(olp, kin, na, mol.exp_alpha)
+    dm_alpha = mol.exp_alpha.to_dm()
+    scf_solver = CDIISSCFSolver(threshold=1e-7, nincremental=3)
+    scf_solver(ham, mol.lf, olp, occ_model, dm_alpha)
+    # The incremental mode is switched off after the SCF.
+    assert not terms[1].incremental
+    # compare with g09
+    assert abs(ham.cache['energy'] - -9.856961609951867E+01) < 1e-8
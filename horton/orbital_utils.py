@@ -94,7 +94,9 @@ def transform_integrals(one, two, indextrans='tensordot', *exps):
        **Optional arguments:**
 
        indextrans
-           Choice of 4-index transformation. Default 'tensordot'.
+           Choice of 4-index transformation. One of ``tensordot`` (default),
+           ``einsum`` or ``blocked``. The latter needs less memory for dense
+           four-index objects.
 
        args
            The expansion coefficients.
@@ -167,7 +169,8 @@ def split_core_active(one, two, ecore, orb, ncore, nactive, indextrans='tensordo
        **Optional arguments:**
 
        indextrans
-            4-index transformation (str). One of ``tensordot``, ``einsum``
+            4-index transformation (str). One of ``tensordot``, ``einsum``,
+            ``blocked``
 
        **Returns** a tuple with three values:
 
@@ -186,7 +189,7 @@ def split_core_active(one, two, ecore, orb, ncore, nactive, indextrans='tensordo
     #
     check_type('ncore', ncore, int)
     check_type('nactive', nactive, int)
-    check_options('indextrans', indextrans, 'tensordot', 'einsum')
+    check_options('indextrans', indextrans, 'tensordot', 'einsum', 'blocked')
     if ncore <= 0 or nactive <= 0:
         raise ValueError('ncore and nactive must be strictly positive.')
     if nactive+ncore > one.nbasis:
@@ -23,7 +23,7 @@
 
 import numpy as np
 
-from horton.cache import JustOnceClass, just_once, Cache
+from horton.cache import JustOnceClass, just_once, Cache, MMapCache
 from horton.log import log
 from horton.moments import get_ncart_cumul, get_npure_cumul
 from horton.utils import typecheck_geo
@@ -38,7 +38,7 @@ class Part(JustOnceClass):
     name = None
     linear = False # whether the populations are linear in the density matrix.
 
-    def __init__(self, coordinates, numbers, pseudo_numbers, grid, moldens, spindens, local, lmax):
+    def __init__(self, coordinates, numbers, pseudo_numbers, grid, moldens, spindens, local, lmax, cache=None):
         '''
            **Arguments:**
 
@@ -67,6 +67,12 @@ class Part(JustOnceClass):
 
            lmax
                 The maximum angular momentum in multipole expansions.
+
+           **Optional arguments:**
+
+           cache
+                The Cache instance in which all (intermediate) results are
+                stored. When not given, an ordinary Cache is used.
         '''
 
         # Init base class
@@ -87,7 +93,9 @@ class Part(JustOnceClass):
         self._lmax = lmax
 
         # Caching stuff, to avoid recomputation of earlier results
-        self._cache = Cache()
+        if cache is None:
+            cache = Cache()
+        self._cache = cache
 
         # Initialize the subgrids
         if local:
@@ -436,7 +444,7 @@ class CPart(Part):
     '''Base class for density partitioning schemes of cube files'''
     def __init__(self, coordinates, numbers, pseudo_numbers, grid, moldens,
                  spindens=None, local=True, lmax=3, wcor_numbers=None,
-                 wcor_rcut_max=2.0, wcor_rcond=0.1):
+                 wcor_rcut_max=2.0, wcor_rcond=0.1, scratch=None, nthreads=1):
         '''
            **Arguments:**
 
@@ -467,6 +475,16 @@ class CPart(Part):
 
            wcor_rcond
                 The regularization strength for the weight correction equations.
+
+           scratch
+                A directory for scratch files. When given, the large arrays,
+                e.g. the atomic weights, are stored in memory-mapped files in
+                this directory instead of in memory. One may also pass an
+                instance of :py:class:`horton.cache.MMapCache`, e.g. to change
+                the minimum size of the arrays stored in scratch files.
+
+           nthreads
+                The number of threads used to compute the atomic weights.
         '''
         if wcor_numbers is None:
             self._wcor_numbers = range(1, 119)
@@ -474,7 +492,15 @@ class CPart(Part):
             self._wcor_numbers = wcor_numbers
         self._wcor_rcut_max = wcor_rcut_max
         self._wcor_rcond = wcor_rcond
-        Part.__init__(self, coordinates, numbers, pseudo_numbers, grid, moldens, spindens, local, lmax)
+        if scratch is None:
+            cache = None
+        elif isinstance(scratch, MMapCache):
+            cache = scratch
+        else:
+            cache = MMapCache(scratch)
+        self._scratch = None if cache is None else cache.dirname
+        self._nthreads = nthreads
+        Part.__init__(self, coordinates, numbers, pseudo_numbers, grid, moldens, spindens, local, lmax, cache)
 
     def _get_wcor_numbers(self):
         return self._wcor_numbers
@@ -500,6 +526,8 @@ class CPart(Part):
                 ('Weight corr. numbers', ' '.join(str(n) for n in self.wcor_numbers)),
                 ('Weight corr. max rcut', '%10.5f' % self._wcor_rcut_max),
                 ('Weight corr. rcond', '%10.5e' % self._wcor_rcond),
+                ('Scratch directory', self._scratch),
+                ('Threads', self._nthreads),
             ])
 
     def get_memory_estimates(self):
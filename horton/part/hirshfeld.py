@@ -138,7 +138,8 @@ class HirshfeldCPart(HirshfeldMixin, StockholderCPart):
 
     def __init__(self, coordinates, numbers, pseudo_numbers, grid, moldens,
                  proatomdb, spindens=None, local=True, lmax=3,
-                 wcor_numbers=None, wcor_rcut_max=2.0, wcor_rcond=0.1):
+                 wcor_numbers=None, wcor_rcut_max=2.0, wcor_rcond=0.1,
+                 scratch=None, nthreads=1):
         '''
            **Arguments:** (that are not defined in ``CPart``)
 
@@ -149,7 +150,8 @@ class HirshfeldCPart(HirshfeldMixin, StockholderCPart):
         HirshfeldMixin. __init__(self, numbers, pseudo_numbers, proatomdb)
         StockholderCPart.__init__(self, coordinates, numbers, pseudo_numbers,
                                   grid, moldens, spindens, local, lmax,
-                                  wcor_numbers, wcor_rcut_max, wcor_rcond)
+                                  wcor_numbers, wcor_rcut_max, wcor_rcond,
+                                  scratch, nthreads)
 
     def get_cutoff_radius(self, index):
         '''The radius at which the weight function goes to zero'''
@@ -185,6 +185,8 @@ class HirshfeldEMixin(object):
                 ('Scheme', 'Hirshfeld-E'),
                 ('Convergence threshold', '%.1e' % self._threshold),
                 ('Maximum iterations', self._maxiter),
+                ('DIIS vectors', self._diis),
+                ('Parallel jobs', self._jobs),
                 ('Proatomic DB',  self._proatomdb),
             ])
             log.cite('verstraelen2013', 'the use of Hirshfeld-E partitioning')
@@ -264,6 +266,18 @@ class HirshfeldEMixin(object):
         self._cache.dump('propars', propars, tags='o')
         return propars
 
+    def _fix_propars(self, propars):
+        # Respect the lower bounds of the coefficients.
+        for index in xrange(self.natom):
+            begin = self.hebasis.get_atom_begin(index)
+            for j in xrange(self.hebasis.get_atom_nbasis(index)):
+                lower_bound = self.hebasis.get_lower_bound(index, j)
+                propars[begin+j] = max(propars[begin+j], lower_bound)
+
+    def _get_propars_range(self, index):
+        begin = self.hebasis.get_atom_begin(index)
+        return begin, begin + self.hebasis.get_atom_nbasis(index)
+
     def _update_propars_atom(self, index):
         # Prepare some things
         charges = self._cache.load('charges', alloc=self.natom, tags='o')[0]
@@ -359,18 +373,16 @@ class HirshfeldEMixin(object):
             else:
                 # In the case of a global grid, the radial integration is not
                 # suitable as it does not account for periodic boundary
-                # conditions
-                basis0 = grid.zeros()
-                basis1 = grid.zeros()
+                # conditions. Each basis function is evaluated only once.
+                basis = []
                 for j0 in xrange(nbasis):
-                    basis0[:] = 0.0
+                    basis0 = grid.zeros()
                     spline0 = self.hebasis.get_basis_spline(index, j0)
                     self.eval_spline(index, spline0, basis0, label='basis %i' % j0)
+                    basis.append(basis0)
+                for j0 in xrange(nbasis):
                     for j1 in xrange(j0+1):
-                        basis1[:] = 0.0
-                        spline1 = self.hebasis.get_basis_spline(index, j1)
-                        self.eval_spline(index, spline1, basis1, label='basis %i' % j1)
-                        A[j0, j1] = grid.integrate(basis0, basis1, wcor_fit)
+                        A[j0, j1] = grid.integrate(basis[j0], basis[j1], wcor_fit)
                         A[j1, j0] = A[j0, j1]
 
             if (np.diag(A) < 0).any():
@@ -397,7 +409,7 @@ class HirshfeldEWPart(HirshfeldEMixin, HirshfeldIWPart):
     '''Extended Hirshfeld partitioning with Becke-Lebedev grids'''
     def __init__(self, coordinates, numbers, pseudo_numbers, grid, moldens,
                  proatomdb, spindens=None, local=True, lmax=3, threshold=1e-6,
-                 maxiter=500, greedy=False):
+                 maxiter=500, greedy=False, diis=0, jobs=1):
         '''
            **Arguments:** (that are not defined in ``WPart``)
 
@@ -418,12 +430,21 @@ class HirshfeldEWPart(HirshfeldEMixin, HirshfeldIWPart):
 
            greedy
                 Reduce the CPU cost at the expense of more memory consumption.
+
+           diis
+                The number of previous iterations used to extrapolate the
+                proatom parameters with the DIIS method. When zero, plain
+                fixed-point iterations are carried out.
+
+           jobs
+                The number of processes used to update the proatom parameters
+                of the atoms in parallel.
         '''
         hebasis = HEBasis(numbers, proatomdb)
         HirshfeldEMixin.__init__(self, hebasis)
         HirshfeldIWPart.__init__(self, coordinates, numbers, pseudo_numbers,
                                  grid, moldens, proatomdb, spindens, local,
-                                 lmax, threshold, maxiter, greedy)
+                                 lmax, threshold, maxiter, greedy, diis, jobs)
 
     def get_wcor_fit(self, index):
         return None
@@ -447,7 +468,8 @@ class HirshfeldECPart(HirshfeldEMixin, HirshfeldICPart):
     def __init__(self, coordinates, numbers, pseudo_numbers, grid, moldens,
                  proatomdb, spindens=None, local=True, lmax=3,
                  wcor_numbers=None, wcor_rcut_max=2.0, wcor_rcond=0.1,
-                 threshold=1e-6, maxiter=500, greedy=False):
+                 threshold=1e-6, maxiter=500, greedy=False, diis=0, jobs=1,
+                 scratch=None, nthreads=1):
         '''
            **Arguments:** (that are not defined in ``CPart``)
 
@@ -468,13 +490,23 @@ class HirshfeldECPart(HirshfeldEMixin, HirshfeldICPart):
 
            greedy
                 Reduce the CPU cost at the expense of more memory consumption.
+
+           diis
+                The number of previous iterations used to extrapolate the
+                proatom parameters with the DIIS method. When zero, plain
+                fixed-point iterations are carried out.
+
+           jobs
+                The number of processes used to update the proatom parameters
+                of the atoms in parallel.
         '''
         hebasis = HEBasis(numbers, proatomdb)
         HirshfeldEMixin.__init__(self, hebasis)
         HirshfeldICPart.__init__(self, coordinates, numbers, pseudo_numbers,
                                  grid, moldens, proatomdb, spindens, local,
                                  lmax, wcor_numbers, wcor_rcut_max, wcor_rcond,
-                                 threshold, maxiter, greedy)
+                                 threshold, maxiter, greedy, diis, jobs,
+                                 scratch, nthreads)
 
     def get_memory_estimates(self):
         if self.local:
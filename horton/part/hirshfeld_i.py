@@ -26,6 +26,7 @@ import numpy as np
 from horton.log import log
 from horton.part.hirshfeld import HirshfeldWPart, HirshfeldCPart
 from horton.part.iterstock import IterativeProatomMixin
+from horton.part.stockholder import StockHolderMixin
 
 
 __all__ = ['HirshfeldIWPart', 'HirshfeldICPart']
@@ -33,13 +34,15 @@ __all__ = ['HirshfeldIWPart', 'HirshfeldICPart']
 
 class HirshfeldIMixin(IterativeProatomMixin):
     name = 'hi'
-    options = ['lmax', 'threshold', 'maxiter', 'greedy']
+    options = ['lmax', 'threshold', 'maxiter', 'greedy', 'diis', 'jobs']
     linear = False
 
-    def __init__(self, threshold=1e-6, maxiter=500, greedy=False):
+    def __init__(self, threshold=1e-6, maxiter=500, greedy=False, diis=0, jobs=1):
         self._threshold = threshold
         self._maxiter = maxiter
         self._greedy = greedy
+        self._diis = diis
+        self._jobs = jobs
 
     def _init_log_scheme(self):
         if log.do_medium:
@@ -47,6 +50,8 @@ class HirshfeldIMixin(IterativeProatomMixin):
                 ('Scheme', 'Hirshfeld-I'),
                 ('Convergence threshold', '%.1e' % self._threshold),
                 ('Maximum iterations', self._maxiter),
+                ('DIIS vectors', self._diis),
+                ('Parallel jobs', self._jobs),
                 ('Proatomic DB',  self._proatomdb),
             ])
             log.cite('bultinck2007', 'the use of Hirshfeld-I partitioning')
@@ -57,6 +62,13 @@ class HirshfeldIMixin(IterativeProatomMixin):
         else:
             return []
 
+    def get_proatom_splines(self):
+        if self._greedy:
+            # The proatoms are constructed from cached isolated atoms.
+            return None
+        else:
+            return StockHolderMixin.get_proatom_splines(self)
+
     def get_interpolation_info(self, i, charges=None):
         if charges is None:
             charges = self.cache.load('charges')
@@ -113,6 +125,20 @@ class HirshfeldIMixin(IterativeProatomMixin):
         self.cache.dump('propars', charges, tags='o')
         return charges
 
+    def _fix_propars(self, propars):
+        # Keep the charges within the range of the proatom database.
+        for index in xrange(self.natom):
+            charges = self.proatomdb.get_charges(self.numbers[index])
+            upper = max(charges)
+            if self.pseudo_numbers[index] - upper == 1:
+                # The proatom with one electron is scaled down linearly for
+                # higher charges, see get_proatom_rho.
+                upper = np.nextafter(upper + 1, upper)
+            propars[index] = np.clip(propars[index], min(charges), upper)
+
+    def _get_propars_range(self, index):
+        return index, index+1
+
     def _update_propars_atom(self, index):
         # Compute population
         pseudo_population = self.compute_pseudo_population(index)
@@ -127,7 +153,7 @@ class HirshfeldIWPart(HirshfeldIMixin, HirshfeldWPart):
 
     def __init__(self, coordinates, numbers, pseudo_numbers, grid, moldens,
                  proatomdb, spindens=None, local=True, lmax=3, threshold=1e-6,
-                 maxiter=500, greedy=False):
+                 maxiter=500, greedy=False, diis=0, jobs=1):
         '''
            **Arguments:** (that are not defined in ``WPart``)
 
@@ -148,8 +174,17 @@ class HirshfeldIWPart(HirshfeldIMixin, HirshfeldWPart):
 
            greedy
                 Reduce the CPU cost at the expense of more memory consumption.
+
+           diis
+                The number of previous iterations used to extrapolate the
+                proatom parameters with the DIIS method. When zero, plain
+                fixed-point iterations are carried out.
+
+           jobs
+                The number of processes used to update the proatom parameters
+                of the atoms in parallel.
         '''
-        HirshfeldIMixin.__init__(self, threshold, maxiter, greedy)
+        HirshfeldIMixin.__init__(self, threshold, maxiter, greedy, diis, jobs)
         HirshfeldWPart.__init__(self, coordinates, numbers, pseudo_numbers,
                                 grid, moldens, proatomdb, spindens, local, lmax)
 
@@ -172,7 +207,8 @@ class HirshfeldICPart(HirshfeldIMixin, HirshfeldCPart):
     def __init__(self, coordinates, numbers, pseudo_numbers, grid, moldens,
                  proatomdb, spindens=None, local=True, lmax=3,
                  wcor_numbers=None, wcor_rcut_max=2.0, wcor_rcond=0.1,
-                 threshold=1e-6, maxiter=500, greedy=False):
+                 threshold=1e-6, maxiter=500, greedy=False, diis=0, jobs=1,
+                 scratch=None, nthreads=1):
         '''
            **Arguments:** (that are not defined in ``CPart``)
 
@@ -193,11 +229,21 @@ class HirshfeldICPart(HirshfeldIMixin, HirshfeldCPart):
 
            greedy
                 Reduce the CPU cost at the expense of more memory consumption.
+
+           diis
+                The number of previous iterations used to extrapolate the
+                proatom parameters with the DIIS method. When zero, plain
+                fixed-point iterations are carried out.
+
+           jobs
+                The number of processes used to update the proatom parameters
+                of the atoms in parallel.
         '''
-        HirshfeldIMixin.__init__(self, threshold, maxiter, greedy)
+        HirshfeldIMixin.__init__(self, threshold, maxiter, greedy, diis, jobs)
         HirshfeldCPart.__init__(self, coordinates, numbers, pseudo_numbers,
                                 grid, moldens, proatomdb, spindens, local,
-                                lmax, wcor_numbers, wcor_rcut_max, wcor_rcond)
+                                lmax, wcor_numbers, wcor_rcut_max, wcor_rcond,
+                                scratch, nthreads)
 
     def get_memory_estimates(self):
         return (
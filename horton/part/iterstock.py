@@ -21,16 +21,94 @@
 '''Iterative Stockholder Analysis (ISA) partitioning'''
 
 
+import time
+from multiprocessing import Pool, RawArray
+
 import numpy as np
 from horton.cache import just_once
+from horton.grid.cext import set_omp_num_threads
 from horton.log import log
 from horton.part.stockholder import StockholderWPart
+from horton.quadprog import solve_safe
 
 
 __all__ = ['IterativeProatomMixin', 'IterativeStockholderWPart']
 
 
+# The partitioning object used by the worker processes of _update_propars.
+_pool_part = None
+
+
+def _init_pool_worker(part):
+    '''Prepare a worker process of the pool used by _update_propars
+
+       The partitioning object is inherited from the parent process, such that
+       the grids, densities and (shared) atomic weights are available without
+       copying. The OpenMP runtime can not create
+       new threads in a forked process after the parent has used it, so the
+       workers are restricted to a single OpenMP thread.
+    '''
+    global _pool_part
+    _pool_part = part
+    set_omp_num_threads(1)
+
+
+def _update_propars_atom_worker(args):
+    '''Update the proatom parameters of one atom in a worker process
+
+       The current proatom parameters of the atom are sent along with the
+       index. The atomic weights are read from shared memory. Only the results
+       for the atom are returned.
+    '''
+    index, atom_propars = args
+    begin, end = _pool_part._get_propars_range(index)
+    propars = _pool_part.cache.load('propars')
+    propars[begin:end] = atom_propars
+    _pool_part._update_propars_atom(index)
+    charge = _pool_part.cache.load('charges')[index]
+    return charge, propars[begin:end].copy()
+
+
+def extrapolate_propars(history):
+    '''Extrapolate proatom parameters with the DIIS (Anderson) method
+
+       **Arguments:**
+
+       history
+            A list of (input, output) pairs of proatom parameters from previous
+            iterations of the fixed-point equations. The output is obtained by
+            updating the partitioning with the input parameters.
+
+       **Returns:** the extrapolated parameters and the coefficients of the
+       linear combination.
+
+       The coefficients minimize the norm of the linear combination of the
+       residuals (output - input), under the constraint that they sum up to
+       one. The same combination of the outputs is returned.
+    '''
+    n = len(history)
+    residuals = np.array([output - input for input, output in history])
+    a = np.zeros((n+1, n+1))
+    a[:n,:n] = np.dot(residuals, residuals.T)
+    # Rescale to avoid an ill-conditioned matrix near convergence.
+    scale = abs(a[:n,:n]).max()
+    if scale > 0:
+        a[:n,:n] /= scale
+    a[n,:n] = 1
+    a[:n,n] = 1
+    b = np.zeros(n+1)
+    b[n] = 1
+    coeffs = solve_safe(a, b)[:n]
+    propars = sum(coeff*output for coeff, (input, output) in zip(coeffs, history))
+    return propars, coeffs
+
+
 class IterativeProatomMixin():
+    # The pool of worker processes used during do_partitioning when jobs > 1.
+    _pool = None
+    # Set when the DIIS history must be complete before extrapolating again.
+    _diis_wait = False
+
     def compute_change(self, propars1, propars2):
         '''Compute the difference between an old and a new proatoms'''
         msd = 0.0 # mean-square deviation
@@ -54,15 +132,110 @@ class IterativeProatomMixin():
         self.update_at_weights()
 
         # Update the proatoms
-        for index in xrange(self.natom):
-            self._update_propars_atom(index)
+        if self._pool is not None:
+            self._update_propars_parallel()
+        else:
+            for index in xrange(self.natom):
+                self._update_propars_atom(index)
 
         # Keep track of history
         self.history_charges.append(self.cache.load('charges').copy())
 
+    def _share_at_weights(self):
+        '''Move the atomic weights to memory that is shared with forked processes
+
+           Arrays in memory-mapped scratch files are already shared and are
+           left untouched.
+        '''
+        for index in xrange(self.natom):
+            grid = self.get_grid(index)
+            at_weights, new = self.cache.load('at_weights', index, alloc=grid.shape)
+            if isinstance(at_weights, np.memmap):
+                continue
+            shared = np.frombuffer(RawArray('d', at_weights.size)).reshape(at_weights.shape)
+            if not new:
+                shared[:] = at_weights
+            self.cache.dump('at_weights', index, shared)
+
+    def _update_propars_parallel(self):
+        '''Update the proatom parameters of all atoms with the pool of processes
+
+           The worker processes share the grids, densities and atomic weights
+           with this process without copying, see _share_at_weights. Only the
+           proatom parameters of one atom are sent to a worker, and its new
+           proatom parameters and charge are sent back.
+        '''
+        propars = self.cache.load('propars')
+        tasks = []
+        for index in xrange(self.natom):
+            begin, end = self._get_propars_range(index)
+            tasks.append((index, propars[begin:end]))
+        results = self._pool.map(_update_propars_atom_worker, tasks)
+
+        charges = self.cache.load('charges', alloc=self.natom, tags='o')[0]
+        for index, (charge, atom_propars) in enumerate(results):
+            begin, end = self._get_propars_range(index)
+            propars[begin:end] = atom_propars
+            charges[index] = charge
+
+    def _extrapolate_propars(self, propars, old_propars, history, restart):
+        '''Replace the proatom parameters by a DIIS extrapolation, in-place
+
+           **Arguments:**
+
+           propars
+                The output of the last iteration. It is replaced by the
+                extrapolation.
+
+           old_propars
+                The input of the last iteration.
+
+           history
+                The list of (input, output) pairs used for the extrapolation.
+                The last pair is added and old pairs are removed.
+
+           restart
+                When True, all previous pairs are discarded because the
+                previous extrapolation increased the change. The extrapolation
+                is then only resumed when the history is complete again.
+
+           **Returns:** the number of pairs used in the extrapolation, or zero
+           when no extrapolation was carried out.
+        '''
+        if restart:
+            del history[:]
+            self._diis_wait = True
+        history.append((old_propars, propars.copy()))
+        del history[:-self._diis]
+        if len(history) < 2 or (self._diis_wait and len(history) < self._diis):
+            return 0
+        self._diis_wait = False
+        new_propars = extrapolate_propars(history)[0]
+        fixed_propars = new_propars.copy()
+        self._fix_propars(fixed_propars)
+        if abs(fixed_propars - new_propars).max() > self._threshold:
+            # The extrapolation goes outside the allowed range. Keep the plain
+            # fixed-point update and start over from the last pair.
+            del history[:-1]
+            return 0
+        propars[:] = fixed_propars
+        return len(history)
+
     def _update_propars_atom(self, index):
         raise NotImplementedError
 
+    def _get_propars_range(self, index):
+        '''Return the begin and end of the proatom parameters of one atom'''
+        raise NotImplementedError
+
+    def _fix_propars(self, propars):
+        '''Make extrapolated proatom parameters acceptable, in-place
+
+           The default implementation does nothing. Subclasses should bring
+           parameters within their allowed range.
+        '''
+        pass
+
     def _finalize_propars(self):
         charges = self._cache.load('charges')
         self.cache.dump('history_propars', np.array(self.history_propars), tags='o')
@@ -78,30 +251,62 @@ class IterativeProatomMixin():
         new |= 'change'not in self.cache
         if new:
             propars = self._init_propars()
+            history = []
             if log.medium:
                 log.hline()
-                log('Iteration       Change')
+                log('Iteration       Change  DIIS     Time [s]')
                 log.hline()
 
             counter = 0
             change = 1e100
-
-            while True:
-                counter += 1
-
-                # Update the parameters that determine the pro-atoms.
-                old_propars = propars.copy()
-                self._update_propars()
-
-                # Check for convergence
-                change = self.compute_change(propars, old_propars)
-                if log.medium:
-                    log('%9i   %10.5e' % (counter, change))
-                if change < self._threshold or counter >= self._maxiter:
-                    break
+            ndiis = 0
+            self._diis_wait = False
+            time_begin = time.time()
+
+            if self._jobs > 1:
+                self._share_at_weights()
+                self._pool = Pool(self._jobs, _init_pool_worker, (self,))
+            try:
+                while True:
+                    counter += 1
+                    time_iter = time.time()
+
+                    # Update the parameters that determine the pro-atoms.
+                    old_propars = propars.copy()
+                    self._update_propars()
+
+                    # Check for convergence
+                    old_change = change
+                    change = self.compute_change(propars, old_propars)
+                    converged = change < self._threshold
+                    done = converged or counter >= self._maxiter
+
+                    # Replace the new parameters by a DIIS extrapolation. The
+                    # first iteration starts from the initial guess, which is
+                    # too far from the solution to be useful for DIIS.
+                    restart = ndiis > 0 and change > old_change
+                    ndiis = 0
+                    if self._diis > 0 and counter > 1 and not done:
+                        ndiis = self._extrapolate_propars(propars, old_propars, history, restart)
+
+                    if log.medium:
+                        log('%9i   %10.5e  %4s   %10.3f' % (
+                            counter, change, '' if ndiis == 0 else ndiis,
+                            time.time() - time_iter))
+                    if done:
+                        break
+            finally:
+                if self._pool is not None:
+                    self._pool.terminate()
+                    self._pool = None
 
             if log.medium:
                 log.hline()
+                if converged:
+                    log('Converged in %i iterations (%.1f s).' % (counter, time.time() - time_begin))
+                else:
+                    log('Not converged in %i iterations (%.1f s).' % (counter, time.time() - time_begin))
+                log.hline()
 
             self._finalize_propars()
             self.cache.dump('niter', counter, tags='o')
@@ -111,11 +316,12 @@ class IterativeProatomMixin():
 class IterativeStockholderWPart(IterativeProatomMixin, StockholderWPart):
     '''Iterative Stockholder Partitioning with Becke-Lebedev grids'''
     name = 'is'
-    options = ['lmax', 'threshold', 'maxiter']
+    options = ['lmax', 'threshold', 'maxiter', 'diis', 'jobs']
     linear = False
 
     def __init__(self, coordinates, numbers, pseudo_numbers, grid, moldens,
-                 spindens=None, lmax=3, threshold=1e-6, maxiter=500):
+                 spindens=None, lmax=3, threshold=1e-6, maxiter=500, diis=0,
+                 jobs=1):
         '''
            **Optional arguments:** (that are not defined in ``WPart``)
 
@@ -128,9 +334,20 @@ class IterativeStockholderWPart(IterativeProatomMixin, StockholderWPart):
                 The maximum number of iterations. If no convergence is reached
                 in the end, no warning is given.
                 Reduce the CPU cost at the expense of more memory consumption.
+
+           diis
+                The number of previous iterations used to extrapolate the
+                proatom parameters with the DIIS method. When zero, plain
+                fixed-point iterations are carried out.
+
+           jobs
+                The number of processes used to update the proatom parameters
+                of the atoms in parallel.
         '''
         self._threshold = threshold
         self._maxiter = maxiter
+        self._diis = diis
+        self._jobs = jobs
         StockholderWPart.__init__(self, coordinates, numbers, pseudo_numbers,
                                   grid, moldens, spindens, True, lmax)
 
@@ -140,6 +357,8 @@ class IterativeStockholderWPart(IterativeProatomMixin, StockholderWPart):
                 ('Scheme', 'Iterative Stockholder'),
                 ('Convergence threshold', '%.1e' % self._threshold),
                 ('Maximum iterations', self._maxiter),
+                ('DIIS vectors', self._diis),
+                ('Parallel jobs', self._jobs),
             ])
             log.cite('lillestolen2008', 'the use of Iterative Stockholder partitioning')
 
@@ -160,6 +379,9 @@ class IterativeStockholderWPart(IterativeProatomMixin, StockholderWPart):
         ntotal = self._ranges[-1]
         return self.cache.load('propars', alloc=ntotal, tags='o')[0]
 
+    def _get_propars_range(self, index):
+        return self._ranges[index], self._ranges[index+1]
+
     def _update_propars_atom(self, index):
         # compute spherical average
         atgrid = self.get_grid(index)
@@ -175,3 +397,6 @@ class IterativeStockholderWPart(IterativeProatomMixin, StockholderWPart):
         pseudo_population = atgrid.rgrid.integrate(spherical_average)
         charges = self.cache.load('charges', alloc=self.natom, tags='o')[0]
         charges[index] = self.pseudo_numbers[index] - pseudo_population
+
+    def _fix_propars(self, propars):
+        np.clip(propars, 1e-100, np.inf, out=propars)
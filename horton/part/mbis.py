@@ -88,11 +88,12 @@ def _opt_mbis_propars(rho, propars, rgrid, threshold):
 class MBISWPart(IterativeProatomMixin, StockholderWPart):
     '''Iterative Stockholder Partitioning with Becke-Lebedev grids'''
     name = 'mbis'
-    options = ['lmax', 'threshold', 'maxiter']
+    options = ['lmax', 'threshold', 'maxiter', 'diis', 'jobs']
     linear = False
 
     def __init__(self, coordinates, numbers, pseudo_numbers, grid, moldens,
-                 spindens=None, lmax=3, threshold=1e-6, maxiter=500):
+                 spindens=None, lmax=3, threshold=1e-6, maxiter=500, diis=0,
+                 jobs=1):
         '''
            **Optional arguments:** (that are not defined in ``WPart``)
 
@@ -105,9 +106,20 @@ class MBISWPart(IterativeProatomMixin, StockholderWPart):
                 The maximum number of iterations. If no convergence is reached
                 in the end, no warning is given.
                 Reduce the CPU cost at the expense of more memory consumption.
+
+           diis
+                The number of previous iterations used to extrapolate the
+                proatom parameters with the DIIS method. When zero, plain
+                fixed-point iterations are carried out.
+
+           jobs
+                The number of processes used to update the proatom parameters
+                of the atoms in parallel.
         '''
         self._threshold = threshold
         self._maxiter = maxiter
+        self._diis = diis
+        self._jobs = jobs
         StockholderWPart.__init__(self, coordinates, numbers, pseudo_numbers,
                                   grid, moldens, spindens, True, lmax)
 
@@ -117,6 +129,8 @@ class MBISWPart(IterativeProatomMixin, StockholderWPart):
                 ('Scheme', 'Minimal Basis Iterative Stockholder (MBIS)'),
                 ('Convergence threshold', '%.1e' % self._threshold),
                 ('Maximum iterations', self._maxiter),
+                ('DIIS vectors', self._diis),
+                ('Parallel jobs', self._jobs),
             ])
 
     def get_rgrid(self, iatom):
@@ -151,6 +165,9 @@ class MBISWPart(IterativeProatomMixin, StockholderWPart):
             propars[self._ranges[iatom]:self._ranges[iatom+1]] = _get_initial_mbis_propars(self.numbers[iatom])
         return propars
 
+    def _get_propars_range(self, iatom):
+        return self._ranges[iatom], self._ranges[iatom+1]
+
     def _update_propars_atom(self, iatom):
         # compute spherical average
         atgrid = self.get_grid(iatom)
@@ -168,6 +185,10 @@ class MBISWPart(IterativeProatomMixin, StockholderWPart):
         charges = self.cache.load('charges', alloc=self.natom, tags='o')[0]
         charges[iatom] = self.pseudo_numbers[iatom] - pseudo_population
 
+    def _fix_propars(self, propars):
+        # Populations and exponents must remain positive.
+        np.clip(propars, 1e-100, np.inf, out=propars)
+
     def _finalize_propars(self):
         IterativeProatomMixin._finalize_propars(self)
         propars = self.cache.load('propars')
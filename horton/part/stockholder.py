@@ -79,6 +79,14 @@ class StockHolderMixin(object):
         rtf = self.get_rgrid(index).rtransform
         return CubicSpline(rho, deriv, rtf)
 
+    def get_proatom_splines(self):
+        '''Return a list with the proatom splines of all atoms
+
+           When the proatoms can not be represented by one spline per atom,
+           None is returned.
+        '''
+        return [self.get_proatom_spline(index) for index in xrange(self.natom)]
+
     def eval_spline(self, index, spline, output, grid=None, label='noname'):
         center = self.coordinates[index]
         if grid is None:
@@ -138,6 +146,33 @@ class StockHolderMixin(object):
 
 
 class StockholderWPart(StockHolderMixin, WPart):
+    def update_at_weights(self):
+        # With local grids, the promolecule is evaluated with one batched call
+        # on the molecular grid and each proatom only on its own atomic grid.
+        splines = None
+        if self.local:
+            splines = self.get_proatom_splines()
+        if splines is None:
+            StockHolderMixin.update_at_weights(self)
+            return
+
+        promoldens = self.cache.load('promoldens', alloc=self.grid.shape)[0]
+        promoldens[:] = 0.0
+        if log.do_debug:
+            log('  Evaluating the promolecule for %i atoms' % self.natom)
+        self.grid.eval_splines(splines, self.coordinates, promoldens)
+        # Same offset as in eval_proatom, once for each atom.
+        promoldens += self.natom*1e-100
+
+        for index in xrange(self.natom):
+            grid = self.get_grid(index)
+            at_weights = self.cache.load('at_weights', index, alloc=grid.shape)[0]
+            at_weights[:] = 0.0
+            self.eval_spline(index, splines[index], at_weights, grid, label='proatom')
+            at_weights += 1e-100
+            at_weights /= self.to_atomic_grid(index, promoldens)
+            np.clip(at_weights, 0, 1, out=at_weights)
+
     def update_pro(self, index, proatdens, promoldens):
         work = self.grid.zeros()
         self.eval_proatom(index, work, self.grid)
@@ -146,6 +181,29 @@ class StockholderWPart(StockHolderMixin, WPart):
 
 
 class StockholderCPart(StockHolderMixin, CPart):
+    def update_at_weights(self):
+        # With local grids, the proatoms, the promolecule and the atomic
+        # weights are computed in one pass over the cube. Only the atoms whose
+        # windows overlap with a part of the cube are considered there.
+        splines = None
+        if self.local:
+            splines = self.get_proatom_splines()
+        if splines is None:
+            StockHolderMixin.update_at_weights(self)
+            return
+
+        promoldens = self.cache.load('promoldens', alloc=self.grid.shape)[0]
+        windows = []
+        at_weights = []
+        for index in xrange(self.natom):
+            grid = self.get_grid(index)
+            windows.append(grid)
+            at_weights.append(self.cache.load('at_weights', index, alloc=grid.shape)[0])
+        if log.do_debug:
+            log('  Evaluating proatoms and atomic weights for %i atoms' % self.natom)
+        self.grid.compute_stockholder_weights(splines, self.coordinates, windows, at_weights, promoldens, nthreads=self._nthreads)
+        assert np.isfinite(promoldens).all()
+
     def update_pro(self, index, proatdens, promoldens):
         self.eval_proatom(index, proatdens)
         promoldens += self.to_sys_grid(index, proatdens)
@@ -24,6 +24,8 @@
 from horton import *
 from horton.part.test.common import check_names, check_proatom_splines, \
     get_fake_co, get_fake_pseudo_oo
+from horton.part.stockholder import StockHolderMixin
+from horton.test.common import tmpdir
 from horton.scripts.cpart import cpart_schemes
 
 
@@ -65,6 +67,31 @@ def test_hirshfeld_jbw_coarse_global():
     check_jbw_coarse(False)
 
 
+def check_fused_at_weights(scheme, **kwargs):
+    coordinates, numbers, ugrid, moldens, proatomdb = get_fake_co()
+    pseudo_numbers = numbers.astype(float)
+    CPartClass = cpart_schemes[scheme]
+    cpart = CPartClass(coordinates, numbers, pseudo_numbers, ugrid,
+                       moldens, proatomdb, local=True, **kwargs)
+    cpart.do_charges()
+
+    # Recompute the atomic weights with the generic (non-fused) implementation
+    at_weights = [cpart.cache.load('at_weights', i).copy() for i in xrange(cpart.natom)]
+    promoldens = cpart.cache.load('promoldens').copy()
+    StockHolderMixin.update_at_weights(cpart)
+    assert abs(cpart.cache.load('promoldens') - promoldens).max() < 1e-10
+    for i in xrange(cpart.natom):
+        assert abs(cpart.cache.load('at_weights', i) - at_weights[i]).max() < 1e-10
+
+
+def test_fused_at_weights_hirshfeld():
+    check_fused_at_weights('h')
+
+
+def test_fused_at_weights_hirshfeld_i():
+    check_fused_at_weights('hi', threshold=1e-5)
+
+
 def check_fake(scheme, pseudo, dowcor, local, absmean, **kwargs):
     if pseudo:
         coordinates, numbers, pseudo_numbers, ugrid, moldens, proatomdb = get_fake_pseudo_oo()
@@ -95,11 +122,27 @@ def check_fake(scheme, pseudo, dowcor, local, absmean, **kwargs):
         # proatom splines
         check_proatom_splines(cpart)
 
+    return cpart
+
+
+def test_hirshfeld_i_fake_local_scratch():
+    with tmpdir('horton.part.test.test_cpart.test_hirshfeld_i_fake_local_scratch') as dn:
+        # The cube is too small for the default minimum size of the scratch files.
+        scratch = MMapCache(dn, minsize=1000)
+        cpart = check_fake('hi', pseudo=False, dowcor=True, local=True, absmean=0.428, threshold=1e-5, scratch=scratch)
+        assert cpart.cache is scratch
+        for index in xrange(cpart.natom):
+            assert isinstance(cpart.cache.load('at_weights', index), np.memmap)
+
 
 def test_hirshfeld_fake_local():
     check_fake('h', pseudo=False, dowcor=True, local=True, absmean=0.112)
 
 
+def test_hirshfeld_fake_local_nthreads():
+    check_fake('h', pseudo=False, dowcor=True, local=True, absmean=0.112, nthreads=2)
+
+
 def test_hirshfeld_fake_global():
     check_fake('h', pseudo=False, dowcor=True, local=False, absmean=0.112)
 
@@ -145,6 +188,22 @@ def test_hirshfeld_i_fake_pseudo_nowcor_global():
     check_fake('hi', pseudo=True, dowcor=True, local=False, absmean=0.400, threshold=1e-4)
 
 
+def test_hirshfeld_i_fake_local_diis():
+    check_fake('hi', pseudo=False, dowcor=True, local=True, absmean=0.428, threshold=1e-5, diis=6)
+
+
+def test_hirshfeld_i_fake_pseudo_global_diis():
+    check_fake('hi', pseudo=True, dowcor=True, local=False, absmean=0.400, threshold=1e-4, diis=6)
+
+
+def test_hirshfeld_i_fake_local_jobs():
+    check_fake('hi', pseudo=False, dowcor=True, local=True, absmean=0.428, threshold=1e-5, jobs=2)
+
+
+def test_hirshfeld_e_fake_local_jobs():
+    check_fake('he', pseudo=False, dowcor=True, local=True, absmean=0.323, threshold=1e-4, jobs=2)
+
+
 def test_hirshfeld_i_fake_local_greedy():
     check_fake('hi', pseudo=False, dowcor=True, local=True, absmean=0.428, threshold=1e-5, greedy=True)
 
@@ -195,6 +254,10 @@ def test_hirshfeld_e_fake_pseudo_nowcor_global():
     check_fake('he', pseudo=True, dowcor=True, local=False, absmean=0.396, threshold=1e-4)
 
 
+def test_hirshfeld_e_fake_local_diis():
+    check_fake('he', pseudo=False, dowcor=True, local=True, absmean=0.323, threshold=1e-4, diis=6)
+
+
 def test_hirshfeld_e_fake_local_greedy():
     check_fake('he', pseudo=False, dowcor=True, local=True, absmean=0.323, threshold=1e-4, greedy=True)
 
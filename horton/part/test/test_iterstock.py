@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+#pylint: skip-file
+
+
+import numpy as np
+
+from horton.part.iterstock import extrapolate_propars
+
+
+def test_extrapolate_propars_linear():
+    # For a linear fixed-point problem, the exact solution is found with
+    # sufficient history.
+    a = np.random.uniform(-0.2, 0.2, (3, 3))
+    b = np.random.normal(0, 1, 3)
+    history = []
+    for i in xrange(4):
+        x = np.random.normal(0, 1, 3)
+        history.append((x, np.dot(a, x) + b))
+    propars, coeffs = extrapolate_propars(history)
+    assert abs(coeffs.sum() - 1) < 1e-10
+    expected = np.linalg.solve(np.identity(3) - a, b)
+    assert abs(propars - expected).max() < 1e-8
+
+
+def test_extrapolate_propars_converged():
+    # The latest output is returned when its residual vanishes.
+    x = np.random.normal(0, 1, 5)
+    history = [(x + np.random.normal(0, 1, 5), x), (x, x)]
+    propars, coeffs = extrapolate_propars(history)
+    assert abs(coeffs - [0, 1]).max() < 1e-10
+    assert abs(propars - x).max() < 1e-10
@@ -125,6 +125,32 @@ def test_mbis_water_hf_sto3g():
     assert (wpart['valence_widths'] > 0).all()
 
 
+def test_hirshfeld_i_water_hf_sto3g_local_diis():
+    expecting = np.array([-0.4214, 0.2107, 0.2107]) # From HiPart
+    wpart = check_water_hf_sto3g('hi', expecting, local=True, diis=6)
+
+
+def test_is_water_hf_sto3g_diis():
+    expecting = np.array([-0.490017586929, 0.245018706885, 0.244998880045]) # From HiPart
+    check_water_hf_sto3g('is', expecting, needs_padb=False, diis=6)
+
+
+def test_mbis_water_hf_sto3g_diis():
+    expecting = np.array([-0.61891067, 0.3095756, 0.30932584])
+    wpart = check_water_hf_sto3g('mbis', expecting, needs_padb=False, diis=6)
+    assert (wpart['valence_widths'] > 0).all()
+
+
+def test_hirshfeld_i_water_hf_sto3g_local_jobs():
+    expecting = np.array([-0.4214, 0.2107, 0.2107]) # From HiPart
+    check_water_hf_sto3g('hi', expecting, local=True, jobs=2)
+
+
+def test_mbis_water_hf_sto3g_jobs():
+    expecting = np.array([-0.61891067, 0.3095756, 0.30932584])
+    check_water_hf_sto3g('mbis', expecting, needs_padb=False, jobs=2)
+
+
 def check_msa_hf_lan(scheme, expecting, needs_padb=True, **kwargs):
     if needs_padb:
         proatomdb = get_proatomdb_hf_lan()
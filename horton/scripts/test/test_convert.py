@@ -20,6 +20,9 @@
 #--
 #pylint: skip-file
 
+import os
+
+from horton.io.cache import get_cache_filename
 from horton.test.common import check_script, tmpdir
 from horton.scripts.test.common import copy_files, check_files
 
@@ -28,3 +31,14 @@ def test_scripts():
         fn_fchk = 'water_sto3g_hf_g03.fchk'
         copy_files(dn, [fn_fchk])
         check_script('horton-convert.py %s test.xyz' % fn_fchk, dn)
+
+
+def test_script_cache():
+    with tmpdir('horton.scripts.test.test_convert.test_script_cache') as dn:
+        fns_fchk = ['water_sto3g_hf_g03.fchk', 'li_h_3-21G_hf_g09.fchk']
+        copy_files(dn, fns_fchk)
+        os.mkdir(os.path.join(dn, 'sub'))
+        copy_files(os.path.join(dn, 'sub'), ['ch3_rohf_sto3g_g03.fchk'])
+        check_script('horton-convert.py --cache . -j 2', dn)
+        check_files(dn, [get_cache_filename(fn) for fn in fns_fchk])
+        check_files(os.path.join(dn, 'sub'), [get_cache_filename('ch3_rohf_sto3g_g03.fchk')])
@@ -21,9 +21,12 @@
 #pylint: skip-file
 
 
+import os
+
 import numpy as np
 from nose.tools import assert_raises
 from horton import *
+from horton.test.common import tmpdir
 
 
 class Example(JustOnceClass):
@@ -440,3 +443,34 @@ def test_tags():
         c.load('tmp', alloc=5, tags='aw')
     with assert_raises(ValueError):
         c.load('tmp', alloc=5, tags='ab')
+
+
+def test_mmap_cache():
+    with tmpdir('horton.test.test_cache.test_mmap_cache') as dn:
+        c = MMapCache(dn, minsize=100)
+        assert c.dirname == dn
+        # Small arrays remain in memory, large ones are memory-mapped.
+        small, new = c.load('small', alloc=10)
+        assert new
+        assert not isinstance(small, np.memmap)
+        large, new = c.load('large', 3, alloc=(10, 20))
+        assert new
+        assert isinstance(large, np.memmap)
+        assert large.shape == (10, 20)
+        assert (large == 0).all()
+        # The scratch files are removed right away.
+        assert len(os.listdir(dn)) == 0
+        large[:] = 1.5
+        assert (c.load('large', 3) == 1.5).all()
+        # Reuse of memory after clearing
+        c.clear()
+        assert ('large', 3) not in c
+        large2, new = c.load('large', 3, alloc=(10, 20))
+        assert new
+        assert large2 is large
+        assert (large2 == 0).all()
+        # Other objects are allocated as usual
+        c.clear(dealloc=True)
+        assert len(c) == 0
+        c.load('obj', alloc=(list, [1, 2]))
+        assert c.load('obj') == [1, 2]
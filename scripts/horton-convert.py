@@ -22,6 +22,7 @@
 
 
 import sys, argparse, os, numpy as np
+from multiprocessing import Pool
 
 from horton import __version__, IOData
 
@@ -38,7 +39,7 @@ def parse_args():
     parser.add_argument('-V', '--version', action='version',
         version="%%(prog)s (HORTON version %s)" % __version__)
 
-    parser.add_argument('input',
+    parser.add_argument('input', nargs='?',
         help='The input file. Supported file types are: '
              '*.h5 (HORTON\'s native format), '
              '*.cif (Crystallographic Information File), '
@@ -51,7 +52,7 @@ def parse_args():
              '*.wfn (Gaussian/GAMESS wavefunction file), '
              'CHGCAR, LOCPOT or POSCAR (VASP files), '
              '*.xyz (The XYZ format).')
-    parser.add_argument('output',
+    parser.add_argument('output', nargs='?',
         help='The output file. Supported file types are: '
              '*.h5 (HORTON\'s native format), '
              '*.cif (Crystallographic Information File), '
@@ -59,14 +60,57 @@ def parse_args():
              '*.molden.input (Molden wavefunction file), '
              'POSCAR (VASP files), '
              '*.xyz (The XYZ format).')
+    parser.add_argument('--cache', default=None, metavar='DIRECTORY',
+        help='Instead of converting a file, build the binary cache files of '
+             'all formatted checkpoint files (*.fchk) in the given directory '
+             'and its subdirectories. Afterwards, these files are loaded '
+             'faster with IOData.from_file(filename, cache=True).')
+    parser.add_argument('-j', '--jobs', default=1, type=int,
+        help='The number of processes used to build cache files. '
+             '[default=%(default)s]')
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.cache is None and args.output is None:
+        parser.error('Both an input and an output file are required.')
+    if args.cache is not None and args.input is not None:
+        parser.error('No input or output files can be given with --cache.')
+    return args
+
+
+def find_fchk_files(dirname):
+    '''Return a list of all formatted checkpoint files in a directory tree'''
+    result = []
+    for root, dirnames, filenames in os.walk(dirname):
+        for filename in filenames:
+            if filename.endswith('.fchk'):
+                result.append(os.path.join(root, filename))
+    result.sort()
+    return result
+
+
+def build_cache(filename):
+    '''Build the cache file of a formatted checkpoint file, if needed'''
+    # With lazy loading, an existing cache file is hardly read.
+    IOData.from_file(filename, cache=True, lazy=True)
 
 
 def main():
     args = parse_args()
-    mol = IOData.from_file(args.input)
-    mol.to_file(args.output)
+    if args.cache is None:
+        mol = IOData.from_file(args.input)
+        mol.to_file(args.output)
+    else:
+        filenames = find_fchk_files(args.cache)
+        if args.jobs > 1:
+            pool = Pool(args.jobs)
+            try:
+                pool.map(build_cache, filenames)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for filename in filenames:
+                build_cache(filename)
 
 
 if __name__ == '__main__':
@@ -105,10 +105,25 @@ def parse_args():
         help='The iterative scheme is converged when the maximum change of '
              'the charges between two iterations drops below this threshold. '
              '[default=%(default)s]')
+    parser.add_argument('--diis', default=0, type=int,
+        help='The number of previous iterations used to accelerate the '
+             'convergence of the iterative schemes with the DIIS method. The '
+             'default (0) disables DIIS. [default=%(default)s]')
+    parser.add_argument('-j', '--jobs', default=1, type=int,
+        help='The number of processes used to update the pro-atoms of the '
+             'iterative schemes in parallel. [default=%(default)s]')
     parser.add_argument('--greedy', default=False, action='store_true',
         help='Keep more precomputed results in memory. This speeds up the '
              'partitioning but consumes more memory. It is only applicable to '
              'the Hirshfeld-I (hi) and Hirhfeld-E (he) schemes.')
+    parser.add_argument('--scratch', default=None, metavar='DIRECTORY',
+        help='Store the atomic weights and other large arrays in memory-mapped '
+             'files in this directory, instead of in memory. This makes it '
+             'possible to partition cube files of large systems, at the cost '
+             'of some disk I/O.')
+    parser.add_argument('--nthreads', default=1, type=int,
+        help='The number of threads used to compute the atomic weights. '
+             '[default=%(default)s]')
     parser.add_argument('--lmax', default=3, type=int,
         help='The maximum angular momentum to consider in multipole expansions')
 
@@ -168,7 +183,8 @@ def main():
     cpart = cpart_schemes[args.scheme](
         mol.coordinates, mol.numbers, mol.pseudo_numbers, ugrid, moldens,
         proatomdb, spindens=spindens, local=True, wcor_numbers=wcor_numbers,
-        wcor_rcut_max=args.wcor_rcut_max, wcor_rcond=args.wcor_rcond, **kwargs)
+        wcor_rcut_max=args.wcor_rcut_max, wcor_rcond=args.wcor_rcond,
+        scratch=args.scratch, nthreads=args.nthreads, **kwargs)
     keys = cpart.do_all()
 
     # Do a symmetry analysis if requested.
@@ -109,6 +109,9 @@ def parse_args():
     parser.add_argument('--pbc', default='111', type=str, choices=['000', '111'],
         help='Specify the periodicity. The three digits refer to a, b and c '
              'cell vectors. 1=periodic, 0=aperiodic.')
+    parser.add_argument('--nthreads', default=1, type=int,
+        help='The number of threads used to set up the cost function. '
+             '[default=%(default)s]')
 
     return parser.parse_args()
 
@@ -203,7 +206,7 @@ def main():
     # Construct the cost function
     if log.do_medium:
         log('Setting up cost function (may take a while)   ')
-    cost = ESPCost.from_grid_data(mol_pot.coordinates, mol_pot.grid, esp, weights, rcut, alpha, gcut)
+    cost = ESPCost.from_grid_data(mol_pot.coordinates, mol_pot.grid, esp, weights, rcut, alpha, gcut, args.nthreads)
 
     # Store cost function info
     results = {}
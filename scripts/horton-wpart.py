@@ -78,6 +78,13 @@ def parse_args():
         help='The iterative scheme is converged when the maximum change of '
              'the charges between two iterations drops below this threshold. '
              '[default=%(default)s]')
+    parser.add_argument('--diis', default=0, type=int,
+        help='The number of previous iterations used to accelerate the '
+             'convergence of the iterative schemes with the DIIS method. The '
+             'default (0) disables DIIS. [default=%(default)s]')
+    parser.add_argument('-j', '--jobs', default=1, type=int,
+        help='The number of processes used to update the pro-atoms of the '
+             'iterative schemes in parallel. [default=%(default)s]')
     parser.add_argument('--greedy', default=False, action='store_true',
         help='Keep more precomputed results in memory. This speeds up the '
              'partitioning but consumes more memory. It is only applicable to '
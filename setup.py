@@ -309,6 +309,16 @@ else:
 print 'BLAS precompiler directive: -D%s' % blas_precompiler[0]
 
 
+# Configuration of OpenMP
+# -----------------------
+
+# OpenMP is used to parallelize loops over shells and grid points. The compiler
+# flags can be overridden with the environment variable OPENMP_FLAGS. Set it to
+# an empty string to compile without OpenMP support.
+openmp_flags = os.getenv('OPENMP_FLAGS', '-fopenmp').split()
+print 'OpenMP compiler flags: %s' % ' '.join(openmp_flags)
+
+
 # Call distutils setup
 # --------------------
 
@@ -379,9 +389,11 @@ setup(
             extra_objects=libint2_config['extra_objects'] +
                           blas_config['extra_objects'],
             extra_compile_args=libint2_config['extra_compile_args'] +
-                                blas_config['extra_compile_args'],
+                                blas_config['extra_compile_args'] +
+                                openmp_flags,
             extra_link_args=libint2_config['extra_link_args'] +
-                             blas_config['extra_link_args'],
+                             blas_config['extra_link_args'] +
+                             openmp_flags,
             define_macros=[blas_precompiler],
             language="c++"),
         Extension("horton.grid.cext",
@@ -392,8 +404,8 @@ setup(
                 'horton/cell.pxd', 'horton/cell.h',
                 'horton/moments.pxd', 'horton/moments.h'],
             include_dirs=[np.get_include(), '.'],
-            #extra_compile_args=["-fopenmp"],
-            #extra_link_args=["-fopenmp"],
+            extra_compile_args=openmp_flags,
+            extra_link_args=openmp_flags,
             language="c++",),
         Extension("horton.meanfield.cext",
             sources=get_sources('horton/meanfield'),
@@ -402,8 +414,8 @@ setup(
             library_dirs=libxc_config['library_dirs'],
             libraries=libxc_config['libraries'],
             extra_objects=libxc_config['extra_objects'],
-            extra_compile_args=libxc_config['extra_compile_args'],
-            extra_link_args=libxc_config['extra_link_args'],
+            extra_compile_args=libxc_config['extra_compile_args'] + openmp_flags,
+            extra_link_args=libxc_config['extra_link_args'] + openmp_flags,
             language="c++"),
         Extension("horton.espfit.cext",
             sources=get_sources('horton/espfit') + [
@@ -412,7 +424,13 @@ setup(
             depends=get_depends('horton/espfit') + [
                 'horton/cell.pxd', 'horton/cell.h',
                 'horton/grid/uniform.pxd', 'horton/grid/uniform.h'],
-            include_dirs=[np.get_include(), '.'],
+            include_dirs=[np.get_include(), '.'] + blas_config['include_dirs'],
+            library_dirs=blas_config['library_dirs'],
+            libraries=blas_config['libraries'],
+            extra_objects=blas_config['extra_objects'],
+            extra_compile_args=blas_config['extra_compile_args'] + openmp_flags,
+            extra_link_args=blas_config['extra_link_args'] + openmp_flags,
+            define_macros=[blas_precompiler],
             language="c++"),
     ],
     headers=get_headers(),
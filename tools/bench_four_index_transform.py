@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+"""Compares the timings of the methods for the four-index transformation.
+
+   Usage: bench_four_index_transform.py [nbasis1 nbasis2 ...]
+
+   For every basis size, random integrals with eight-fold symmetry are
+   transformed with all methods of ``DenseFourIndex.assign_four_index_transform``.
+   The transformation of only the occupied-occupied-virtual-virtual block is
+   included for the blocked method, assuming one fifth of the orbitals is
+   occupied.
+"""
+
+
+import sys, time
+
+import numpy as np
+
+from horton import *
+
+
+def bench(nbasis, repeat=3):
+    lf = DenseLinalgFactory(nbasis)
+    ao = lf.create_four_index()
+    ao.randomize()
+    ao.symmetrize()
+    exp = lf.create_expansion()
+    exp.randomize()
+    mo = lf.create_four_index()
+    nocc = max(1, nbasis/5)
+
+    def timeit(fn):
+        result = None
+        for irep in xrange(repeat):
+            start = time.time()
+            fn()
+            duration = time.time() - start
+            if result is None or duration < result:
+                result = duration
+        return result
+
+    timings = []
+    for method in 'tensordot', 'einsum', 'blocked':
+        timings.append(timeit(lambda: mo.assign_four_index_transform(ao, exp, method=method)))
+    oovv = DenseFourIndex(nocc, nocc, nbasis-nocc, nbasis-nocc)
+    timings.append(timeit(lambda: oovv.assign_four_index_transform(
+        ao, exp, method='blocked', end0=nocc, end1=nocc, begin2=nocc, begin3=nocc)))
+    return timings
+
+
+def main(nbasiss):
+    log.set_level(log.silent)
+    print '%6s %10s %10s %10s %10s' % ('nbasis', 'tensordot', 'einsum', 'blocked', 'oovv')
+    for nbasis in nbasiss:
+        print '%6i %10.3f %10.3f %10.3f %10.3f' % ((nbasis,) + tuple(bench(nbasis)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main([int(arg) for arg in sys.argv[1:]])
+    else:
+        main([10, 20, 40, 60])
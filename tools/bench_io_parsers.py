@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# HORTON: Helpful Open-source Research TOol for N-fermion systems.
+# Copyright (C) 2011-2015 The HORTON Development Team
+#
+# This file is part of HORTON.
+#
+# HORTON is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# HORTON is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+"""Measures the time needed to load large cube, CHGCAR and FCHK files.
+
+   Usage: bench_io_parsers.py [npoint1 npoint2 ...]
+
+   For every number of grid points along one axis, a cube file and a CHGCAR
+   file with ``npoint**3`` random values, and an FCHK file with a density
+   matrix of the same size, are written to a temporary directory. The time
+   needed to load each file is compared with the time needed to convert all
+   its numbers with ``float``, one word at a time.
+"""
+
+
+import os, shutil, sys, tempfile, time
+
+import numpy as np
+
+from horton import *
+
+
+def write_cube(fn, npoint):
+    with open(fn, 'w') as f:
+        print >> f, 'Benchmark cube file'
+        print >> f, 'Random data'
+        print >> f, '%5i %11.6f %11.6f %11.6f' % (1, 0.0, 0.0, 0.0)
+        for i in xrange(3):
+            spacing = np.zeros(3)
+            spacing[i] = 0.2
+            print >> f, '%5i %11.6f %11.6f %11.6f' % ((npoint,) + tuple(spacing))
+        print >> f, '%5i %11.6f %11.6f %11.6f %11.6f' % (8, 8.0, 1.0, 1.0, 1.0)
+        data = np.random.uniform(0, 1, npoint**3).reshape(-1, npoint)
+        np.savetxt(f, data, fmt='%12.5E')
+
+
+def write_chgcar(fn, npoint):
+    with open(fn, 'w') as f:
+        print >> f, 'Benchmark CHGCAR file'
+        print >> f, '  1.00000000000000'
+        for i in xrange(3):
+            rvec = np.zeros(3)
+            rvec[i] = 10.0
+            print >> f, '  %12.6f %12.6f %12.6f' % tuple(rvec)
+        print >> f, '   O'
+        print >> f, '     1'
+        print >> f, 'Direct'
+        print >> f, '  0.000000  0.000000  0.000000'
+        print >> f
+        print >> f, '  %3i %3i %3i' % (npoint, npoint, npoint)
+        data = np.random.uniform(0, 1, npoint**3)
+        np.savetxt(f, data[:(data.size/5)*5].reshape(-1, 5), fmt='%18.11E')
+        if data.size % 5 > 0:
+            np.savetxt(f, data[(data.size/5)*5:].reshape(1, -1), fmt='%18.11E')
+        print >> f, 'augmentation occupancies'
+
+
+def write_fchk(fn, size):
+    with open(fn, 'w') as f:
+        print >> f, 'Benchmark FCHK file'
+        print >> f, 'SP        RHF                                                         STO-3G'
+        print >> f, '%-43s%-4s%s' % ('Number of atoms', 'I', '%17i' % 1)
+        print >> f, '%-43s%-4s%s' % ('Total SCF Density', 'R', 'N=%12i' % size)
+        data = np.random.uniform(-1, 1, size)
+        np.savetxt(f, data[:(data.size/5)*5].reshape(-1, 5), fmt='%16.8E')
+        if data.size % 5 > 0:
+            np.savetxt(f, data[(data.size/5)*5:].reshape(1, -1), fmt='%16.8E')
+
+
+def convert_words(fn):
+    '''Reference: convert all numbers in a file with float, word by word'''
+    result = []
+    with open(fn) as f:
+        for line in f:
+            for word in line.split():
+                try:
+                    result.append(float(word))
+                except ValueError:
+                    pass
+    return result
+
+
+def timeit(fn):
+    start = time.time()
+    fn()
+    return time.time() - start
+
+
+def bench(npoint, dn):
+    timings = []
+    fn_cube = os.path.join(dn, 'bench.cube')
+    write_cube(fn_cube, npoint)
+    timings.append(timeit(lambda: IOData.from_file(fn_cube)))
+    timings.append(timeit(lambda: convert_words(fn_cube)))
+    fn_chgcar = os.path.join(dn, 'CHGCAR')
+    write_chgcar(fn_chgcar, npoint)
+    timings.append(timeit(lambda: IOData.from_file(fn_chgcar)))
+    timings.append(timeit(lambda: convert_words(fn_chgcar)))
+    fn_fchk = os.path.join(dn, 'bench.fchk')
+    write_fchk(fn_fchk, npoint**3)
+    timings.append(timeit(lambda: FCHKFile(fn_fchk, ['Total SCF Density'])))
+    timings.append(timeit(lambda: convert_words(fn_fchk)))
+    return timings
+
+
+def main(npoints):
+    log.set_level(log.silent)
+    dn = tempfile.mkdtemp('horton.bench_io_parsers')
+    try:
+        print '%6s %10s %10s %10s %10s %10s %10s' % ('npoint', 'cube', 'words', 'chgcar', 'words', 'fchk', 'words')
+        for npoint in npoints:
+            print '%6i %10.3f %10.3f %10.3f %10.3f %10.3f %10.3f' % ((npoint,) + tuple(bench(npoint, dn)))
+    finally:
+        shutil.rmtree(dn)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main([int(arg) for arg in sys.argv[1:]])
+    else:
+        main([50, 100, 150])